@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models import Count, Sum, Avg, Q
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
@@ -12,13 +13,17 @@ from apps.patients.models import Patient
 from apps.appointments.models import Appointment
 from apps.billing.models import Bill
 from apps.core.performance import CacheManager, PerformanceMonitor
+from apps.core.tiered_cache import TieredCache
+from apps.core.db_routing import reporting_db
 import logging
 
 logger = logging.getLogger('zain_hms.analytics')
 
 @login_required
 @PerformanceMonitor.log_slow_queries
-@CacheManager.cache_result('analytics', ['dashboard', 'user'], 300)
+@CacheManager.cache_result('analytics', ['dashboard'], 300,
+                           tags=['patients', 'appointments', 'billing'])
+@reporting_db
 def analytics_dashboard(request):
     """Analytics dashboard - ZAIN HMS unified system with performance optimization"""
     today = timezone.now().date()
@@ -49,30 +54,22 @@ def analytics_dashboard(request):
         # Emergency cases (optimized)
         emergency_cases = 0  # Implement when emergency module is ready
         
-        # Department stats with caching
-        department_stats = cache.get('analytics:department_stats')
-        if department_stats is None:
-            department_stats = _get_department_statistics()
-            cache.set('analytics:department_stats', department_stats, 900)  # 15 min
-        
-        # Monthly appointment trends (cached)
-        appointment_trends = cache.get('analytics:appointment_trends')
-        if appointment_trends is None:
-            appointment_trends = _get_appointment_trends()
-            cache.set('analytics:appointment_trends', appointment_trends, 1800)  # 30 min
-            month_start = today.replace(day=1) - timedelta(days=30*i)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            count = Appointment.objects.filter(
-                appointment_date__range=[month_start, month_end]
-            ).count()
-            
-            appointment_trends.append({
-                'month': month_start.strftime('%b %Y'),
-                'appointments': count
-            })
+        # Department stats and monthly trends (two-tier cached, refreshed in background)
+        department_stats = TieredCache.get_or_set(
+            'analytics:department_stats', _get_department_statistics,
+            timeout=900, tags=['appointments']
+        )
+        appointment_trends = TieredCache.get_or_set(
+            'analytics:appointment_trends', _get_appointment_trends,
+            timeout=1800, tags=['appointments']
+        )
         
-        appointment_trends.reverse()
+        total_patients = patient_stats['total']
+        new_patients = patient_stats['new_this_month']
+        total_appointments = appointment_stats['total']
+        today_appointments = appointment_stats['today']
+        total_revenue = revenue_stats['total'] or 0
+        monthly_revenue = revenue_stats['monthly'] or 0
         
     except Exception as e:
         # Fallback values if queries fail
@@ -101,6 +98,45 @@ def analytics_dashboard(request):
     
     return render(request, 'analytics/dashboard.html', context)
 
+def _get_department_statistics():
+    """Patients seen per department, with share of the total"""
+    rows = list(
+        Appointment.objects.values('department')
+        .annotate(count=Count('patient', distinct=True))
+        .order_by('-count')[:10]
+    )
+    total = sum(row['count'] for row in rows) or 1
+    return [
+        {
+            'department__name': row['department'] or 'General',
+            'count': row['count'],
+            'percentage': round(row['count'] * 100.0 / total, 1),
+        }
+        for row in rows
+    ]
+
+
+def _get_appointment_trends(months=6):
+    """Appointments per month for the last ``months`` months in one grouped query"""
+    today = timezone.now().date()
+    start = (today.replace(day=1) - timedelta(days=31 * (months - 1))).replace(day=1)
+    counts = {
+        row['month'].strftime('%b %Y'): row['count']
+        for row in Appointment.objects.filter(appointment_date__gte=start)
+        .annotate(month=TruncMonth('appointment_date'))
+        .values('month')
+        .annotate(count=Count('id'))
+        if row['month']
+    }
+    
+    trends = []
+    month_start = start
+    while month_start <= today:
+        label = month_start.strftime('%b %Y')
+        trends.append({'month': label, 'appointments': counts.get(label, 0)})
+        month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return trends
+
 @login_required
 def patient_analytics(request):
     """Patient analytics page - ZAIN HMS unified system"""
@@ -12,7 +12,6 @@ from django.views.generic import View, TemplateView
 from django.http import JsonResponse
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
 from django.core.paginator import Paginator
 from django.db.models import Q, Count, Avg
 import logging
@@ -21,6 +20,7 @@ from .models import Appointment, AppointmentType
 from .ai_scheduler import AIScheduler, AppointmentReminderEngine
 from apps.doctors.models import Doctor
 from apps.patients.models import Patient
+from apps.core.sqlite import serialized_write
 # 
 logger = logging.getLogger(__name__)
 
@@ -254,7 +254,7 @@ class AIOptimizedSchedulingView(View):
     def post(self, request):
         """Create appointment with AI optimization"""
         try:
-            with transaction.atomic():
+            with serialized_write():
                 # Extract form data
                 doctor_id = request.POST.get('doctor')
                 patient_id = request.POST.get('patient')
@@ -5,6 +5,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django_filters import rest_framework as filters
 from .models import Appointment
 from .serializers import AppointmentSerializer
+from apps.core.pagination import KeysetPagination
 from apps.doctors.models import Doctor, DoctorSchedule
 from datetime import datetime
 
@@ -24,6 +25,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = AppointmentFilter  # Use the custom filter set instead of filterset_fields
+    pagination_class = KeysetPagination
+    keyset_ordering = ('appointment_date', 'appointment_time', 'id')
+    keyset_count_tags = ['appointments']
 
     # Rest of your code remains the same
     def check_doctor_availability(self, doctor, date, time):
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='no_show_risk',
+            field=models.FloatField(blank=True, help_text='No-show probability when the reminder was planned', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentreminder',
+            index=models.Index(fields=['is_sent', 'scheduled_at'], name='appointment_is_sent_3dc9c7_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentreminder',
+            name='retry_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
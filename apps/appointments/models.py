@@ -117,7 +117,7 @@ class Appointment(models.Model):
     class Meta:
         ordering = ['appointment_date', 'appointment_time']
         indexes = [
-            models.Index(fields=['appointment_date', 'appointment_time']),
+            models.Index(fields=['appointment_date', 'appointment_time', 'id']),
             models.Index(fields=['status']),
             models.Index(fields=['patient']),
             models.Index(fields=['doctor']),
@@ -311,9 +311,14 @@ class AppointmentReminder(models.Model):
     sent_at = models.DateTimeField(null=True, blank=True)
     is_sent = models.BooleanField(default=False)
     error_message = models.TextField(blank=True)
+    retry_count = models.PositiveSmallIntegerField(default=0)
+    no_show_risk = models.FloatField(null=True, blank=True, help_text="No-show probability when the reminder was planned")
     
     class Meta:
         ordering = ['scheduled_at']
+        indexes = [
+            models.Index(fields=['is_sent', 'scheduled_at']),  # Due reminders (apps.appointments.reminders)
+        ]
     
     def __str__(self):
         return f"{self.reminder_type} reminder for {self.appointment.appointment_number}"
\ No newline at end of file
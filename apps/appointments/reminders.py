@@ -0,0 +1,374 @@
+# apps/appointments/reminders.py
+"""
+Scheduled appointment reminders.
+
+``plan()`` (Celery beat) reads every open appointment from today to
+``APPOINTMENT_REMINDER_HORIZON_DAYS`` ahead (tomorrow's and next week's
+included) in one query. It scores no-show risk for all of them at once: one
+grouped query over the patients' history, then the weighting
+``AIScheduler.predict_no_show_probability`` uses. It then brings the
+``AppointmentReminder`` rows in line with what each risk level needs
+(``AppointmentReminderEngine._determine_reminder_strategy``): one
+``bulk_create`` for new rows, one delete for unsent future rows that no
+longer fit (the appointment moved, or the preferences changed); reminders
+already due are left for dispatch, even if it runs late. Each patient's
+``PatientCommunicationPreference`` sets the channels, the lead time of the
+main reminder and the hours a reminder may arrive in.
+
+``dispatch()`` (Celery beat) sends the reminders that are due, per channel,
+in batches of ``APPOINTMENT_REMINDER_BATCH_SIZES`` (one SMTP connection per
+email batch). Each batch is recorded with one ``bulk_create`` of
+``CommunicationLog`` rows and one UPDATE of the reminders. So a run takes a
+handful of queries however large the clinic is.
+
+Only channels something can deliver are planned and sent: email, plus each
+type given a sender in ``APPOINTMENT_REMINDER_GATEWAYS`` (dotted path to a
+callable taking the batch's ``(reminder, subject, body)`` list). A failed
+batch stays pending and is retried with a doubling delay from
+``APPOINTMENT_REMINDER_RETRY_DELAY`` seconds, counting attempts on
+``retry_count``; after ``APPOINTMENT_REMINDER_MAX_ATTEMPTS`` the error is
+kept on the reminder and it is not tried again.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from zoneinfo import ZoneInfo
+import logging
+
+from apps.communications.models import CommunicationLog, CommunicationTemplate
+from apps.core.sqlite import serialized_write
+from .ai_scheduler import AIScheduler, AppointmentReminderEngine
+from .models import Appointment, AppointmentReminder
+
+logger = logging.getLogger('zain_hms.performance')
+
+LOCK_KEY = 'zain_hms:appointments:reminders'
+OPEN_STATUSES = ['SCHEDULED', 'CONFIRMED']
+SENDABLE_STATUSES = OPEN_STATUSES + ['CHECKED_IN']
+
+# Strategy channel -> reminder type (there is no voice reminder type, so 'call' is not materialized)
+REMINDER_TYPES = {'email': 'EMAIL', 'sms': 'SMS', 'whatsapp': 'WHATSAPP'}
+
+DEFAULT_BATCH_SIZES = {'EMAIL': 100, 'SMS': 200, 'WHATSAPP': 80, 'PUSH': 500}
+
+
+def _deliverable():
+    """Reminder types with a sender: email, plus the configured gateways"""
+    return {'EMAIL', *getattr(settings, 'APPOINTMENT_REMINDER_GATEWAYS', {})}
+
+
+def _recipient(reminder_type, patient):
+    return patient.email if reminder_type == 'EMAIL' else patient.phone
+
+
+def _allowed(reminder_type, preferences):
+    """Whether the patient accepts this reminder (no preferences row: everything)"""
+    if preferences is None:
+        return True
+    return preferences.send_reminder and preferences.can_receive(reminder_type.lower())
+
+
+def _appointment_time(appointment):
+    return timezone.make_aware(datetime.combine(appointment.appointment_date, appointment.appointment_time))
+
+
+def _in_preferred_hours(at, preferences):
+    """Move ``at`` back to the end of the patient's preferred hours if it falls outside them"""
+    if preferences is None:
+        return at
+    try:
+        zone = ZoneInfo(preferences.timezone)
+    except (KeyError, ValueError):
+        zone = timezone.get_current_timezone()
+    local = at.astimezone(zone)
+    start, end = preferences.preferred_time_start, preferences.preferred_time_end
+    if not isinstance(start, time) or not isinstance(end, time) or start <= local.time() <= end:
+        return at
+    day = local.date() if local.time() > end else local.date() - timedelta(days=1)
+    return datetime.combine(day, end, tzinfo=zone)
+
+
+def no_show_risks(appointments, window):
+    """
+    ``{appointment id: probability}`` for ``appointments`` in one grouped query
+    over the history of every patient booked in ``window`` (an Appointment
+    queryset), weighted like ``AIScheduler.predict_no_show_probability``.
+    """
+    history = {
+        row['patient_id']: row for row in
+        Appointment.objects.filter(patient_id__in=window.values('patient_id')).order_by()
+        .values('patient_id').annotate(total=Count('id'), no_shows=Count('id', filter=Q(status='NO_SHOW')))
+    }
+    scheduler = AIScheduler('reminders')
+    risks = {}
+    for appointment in appointments:
+        row = history.get(appointment.patient_id)
+        base = row['no_shows'] / max(row['total'], 1) if row else 0.0
+        # Only the time matters to the contextual factors; the doctor is not loaded
+        factors = scheduler._get_contextual_factors(
+            appointment.patient, None, _appointment_time(appointment), 'CONSULTATION'
+        )
+        risks[appointment.pk] = min(max(scheduler._combine_probability_factors(base, factors), 0.0), 1.0)
+    return risks
+
+
+class AppointmentReminders:
+    """Plan reminder rows for upcoming appointments and send the due ones"""
+
+    @staticmethod
+    def _lock(name):
+        return cache.add(f"{LOCK_KEY}:{name}", 1, getattr(settings, 'APPOINTMENT_REMINDER_LOCK_TIMEOUT', 300))
+
+    @staticmethod
+    def _unlock(name):
+        cache.delete(f"{LOCK_KEY}:{name}")
+
+    # Planning
+
+    @classmethod
+    def _wanted(cls, appointment, strategy, now):
+        """``{(reminder type, scheduled_at)}`` one appointment should have"""
+        patient = appointment.patient
+        preferences = getattr(patient, 'communication_preferences', None)
+        lead_hours = set(strategy['timing'])
+        if preferences is not None and 24 in lead_hours:
+            lead_hours.discard(24)
+            lead_hours.add(preferences.reminder_advance_hours)
+
+        start = _appointment_time(appointment)
+        deliverable = _deliverable()
+        wanted = set()
+        for hours in lead_hours:
+            at = _in_preferred_hours(start - timedelta(hours=hours), preferences)
+            if at <= now:
+                continue
+            for channel in strategy['channels']:
+                reminder_type = REMINDER_TYPES.get(channel)
+                if reminder_type in deliverable and _allowed(reminder_type, preferences) and _recipient(reminder_type, patient):
+                    wanted.add((reminder_type, at))
+        return wanted
+
+    @classmethod
+    def plan(cls, now=None):
+        """
+        Materialize reminders for open appointments from today to the
+        horizon; returns ``(created, removed)``.
+        """
+        now = now or timezone.now()
+        if not cls._lock('plan'):
+            return 0, 0
+        try:
+            today = timezone.localdate(now)
+            horizon = getattr(settings, 'APPOINTMENT_REMINDER_HORIZON_DAYS', 7)
+            window = Appointment.objects.filter(
+                status__in=OPEN_STATUSES,
+                appointment_date__gte=today,
+                appointment_date__lte=today + timedelta(days=horizon),
+                appointment_time__isnull=False,
+            )
+            appointments = list(window.select_related('patient__communication_preferences'))
+            if not appointments:
+                return 0, 0
+            risks = no_show_risks(appointments, window)
+
+            pending = defaultdict(dict)
+            for reminder_id, appointment_id, reminder_type, scheduled_at, is_sent, retry_count in (
+                AppointmentReminder.objects.filter(appointment__in=window)
+                .values_list('id', 'appointment_id', 'reminder_type', 'scheduled_at', 'is_sent', 'retry_count')
+            ):
+                # Kept like a sent one: a reminder being retried (it has moved off its planned time) and
+                # one already due - _wanted only plans future times, but dispatch may be running late
+                pending[appointment_id][(reminder_type, scheduled_at)] = (
+                    None if is_sent or retry_count or scheduled_at <= now else reminder_id
+                )
+
+            engine = AppointmentReminderEngine()
+            new, stale = [], []
+            for appointment in appointments:
+                risk = risks[appointment.pk]
+                wanted = cls._wanted(appointment, engine._determine_reminder_strategy(risk), now)
+                existing = pending.get(appointment.pk, {})
+                new.extend(
+                    AppointmentReminder(appointment=appointment, reminder_type=reminder_type,
+                                        scheduled_at=scheduled_at, no_show_risk=round(risk, 3))
+                    for reminder_type, scheduled_at in wanted - set(existing)
+                )
+                stale.extend(reminder_id for key, reminder_id in existing.items()
+                             if reminder_id is not None and key not in wanted)
+
+            with serialized_write():
+                if stale:
+                    AppointmentReminder.objects.filter(
+                        pk__in=stale, is_sent=False, retry_count=0, scheduled_at__gt=now,
+                    ).delete()
+                AppointmentReminder.objects.bulk_create(new, batch_size=500)
+        finally:
+            cls._unlock('plan')
+        logger.info(f"Reminder plan: {len(appointments)} appointments, {len(new)} reminders added, {len(stale)} dropped")
+        return len(new), len(stale)
+
+    @classmethod
+    def send_now(cls, appointment_ids):
+        """
+        Queue an immediate reminder on every deliverable channel each patient
+        accepts, then dispatch them; returns ``(queued, sent)``. Reminders
+        not sent here (another dispatch holds the lock, or the batch failed)
+        go out with the next dispatch run.
+        """
+        now = timezone.now()
+        appointments = Appointment.objects.filter(
+            pk__in=appointment_ids, status__in=SENDABLE_STATUSES
+        ).select_related('patient__communication_preferences')
+        reminders = [
+            AppointmentReminder(appointment=appointment, reminder_type=reminder_type, scheduled_at=now)
+            for appointment in appointments
+            for reminder_type in ('EMAIL', 'SMS') if reminder_type in _deliverable()
+            if _allowed(reminder_type, getattr(appointment.patient, 'communication_preferences', None))
+            and _recipient(reminder_type, appointment.patient)
+        ]
+        if not reminders:
+            return 0, 0
+        with serialized_write():
+            AppointmentReminder.objects.bulk_create(reminders, batch_size=500)
+        return len(reminders), cls.dispatch(now=now, appointment_ids=appointment_ids)
+
+    # Dispatch
+
+    @staticmethod
+    def _messages(reminders, templates):
+        """``(reminder, subject, body)`` per reminder, from the active reminder template of its channel"""
+        rendered = []
+        for reminder in reminders:
+            appointment = reminder.appointment
+            context = {
+                'patient_name': appointment.patient.get_full_name(),
+                'doctor_name': appointment.doctor.get_full_name(),
+                'appointment_date': appointment.appointment_date.strftime('%B %d, %Y'),
+                'appointment_time': appointment.appointment_time.strftime('%I:%M %p') if appointment.appointment_time else '',
+                'department': appointment.department or 'General',
+            }
+            template = templates.get(reminder.reminder_type.lower())
+            try:
+                subject, body = template.render(context) if template else (None, None)
+            except ValueError as e:
+                logger.error(f"Reminder template for {reminder.reminder_type}: {e}")
+                subject = body = None
+            if body is None:
+                subject = 'Appointment Reminder'
+                body = (f"Dear {context['patient_name']}, this is a reminder of your appointment with "
+                        f"{context['doctor_name']} on {context['appointment_date']} at {context['appointment_time']}.")
+            rendered.append((reminder, subject, body))
+        return rendered
+
+    @staticmethod
+    def _send(reminder_type, messages):
+        """Hand one batch to the channel's provider; raises if it was not accepted"""
+        if reminder_type == 'EMAIL':
+            connection = get_connection()
+            connection.send_messages([
+                EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [reminder.appointment.patient.email],
+                             connection=connection)
+                for reminder, subject, body in messages
+            ])
+        else:
+            # Delivery status arrives later via webhooks (apps.communications.ingest)
+            import_string(settings.APPOINTMENT_REMINDER_GATEWAYS[reminder_type])(messages)
+
+    @classmethod
+    def _record(cls, reminder_type, messages, error, now):
+        """One bulk_create of CommunicationLog rows and one UPDATE of the reminders"""
+        CommunicationLog.objects.bulk_create([
+            CommunicationLog(
+                appointment_id=reminder.appointment_id,
+                patient_id=reminder.appointment.patient_id,
+                channel=reminder_type.lower(),
+                template_type='reminder',
+                recipient_phone=(reminder.appointment.patient.phone or '')[:20],
+                recipient_email=reminder.appointment.patient.email or '',
+                message=body,
+                subject=subject[:200],
+                status='failed' if error else 'sent',
+                failed_at=now if error else None,
+                error_message=error or '',
+                retry_count=reminder.retry_count,
+            )
+            for reminder, subject, body in messages
+        ], batch_size=500)
+        reminders = [reminder for reminder, _, _ in messages]
+        if not error:
+            AppointmentReminder.objects.filter(pk__in=[r.pk for r in reminders]).update(is_sent=True, sent_at=now)
+            return
+        # Failed batches stay pending: back off and retry, until the attempts run out
+        attempts = getattr(settings, 'APPOINTMENT_REMINDER_MAX_ATTEMPTS', 5)
+        delay = getattr(settings, 'APPOINTMENT_REMINDER_RETRY_DELAY', 300)
+        for reminder in reminders:
+            reminder.retry_count += 1
+            if reminder.retry_count >= attempts:
+                reminder.error_message = error
+            else:
+                reminder.scheduled_at = now + timedelta(seconds=delay * 2 ** (reminder.retry_count - 1))
+        AppointmentReminder.objects.bulk_update(reminders, ['retry_count', 'scheduled_at', 'error_message'],
+                                                batch_size=500)
+
+    @classmethod
+    def dispatch(cls, now=None, appointment_ids=None):
+        """Send due reminders in provider-sized batches per channel; returns how many were sent"""
+        now = now or timezone.now()
+        if not cls._lock('dispatch'):
+            return 0
+        sent = 0
+        try:
+            # Types without a sender stay pending until a gateway is configured
+            due = AppointmentReminder.objects.filter(
+                is_sent=False, error_message='', scheduled_at__lte=now, reminder_type__in=_deliverable(),
+            ).select_related('appointment__patient__communication_preferences', 'appointment__doctor')
+            if appointment_ids is not None:
+                due = due.filter(appointment_id__in=appointment_ids)
+            due = list(due.order_by('scheduled_at')[:getattr(settings, 'APPOINTMENT_REMINDER_DISPATCH_LIMIT', 5000)])
+            if not due:
+                return 0
+
+            by_type, skipped = defaultdict(list), defaultdict(list)
+            for reminder in due:
+                appointment = reminder.appointment
+                preferences = getattr(appointment.patient, 'communication_preferences', None)
+                if appointment.status not in SENDABLE_STATUSES:
+                    skipped['Appointment is no longer scheduled'].append(reminder.pk)
+                elif not _allowed(reminder.reminder_type, preferences):
+                    skipped['Patient opted out of this channel'].append(reminder.pk)
+                elif not _recipient(reminder.reminder_type, appointment.patient):
+                    skipped['No contact details for this channel'].append(reminder.pk)
+                else:
+                    by_type[reminder.reminder_type].append(reminder)
+            for reason, ids in skipped.items():
+                AppointmentReminder.objects.filter(pk__in=ids).update(error_message=reason)
+
+            templates = {
+                template.channel: template
+                for template in CommunicationTemplate.objects.filter(template_type='reminder', is_active=True)
+            }
+            sizes = {**DEFAULT_BATCH_SIZES, **getattr(settings, 'APPOINTMENT_REMINDER_BATCH_SIZES', {})}
+            for reminder_type, reminders in by_type.items():
+                size = sizes.get(reminder_type, 100)
+                for start in range(0, len(reminders), size):
+                    messages = cls._messages(reminders[start:start + size], templates)
+                    error = None
+                    try:
+                        cls._send(reminder_type, messages)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"[:500]
+                        logger.error(f"{reminder_type} reminder batch of {len(messages)} failed: {error}")
+                    with serialized_write():
+                        cls._record(reminder_type, messages, error, now)
+                    if not error:
+                        sent += len(messages)
+        finally:
+            cls._unlock('dispatch')
+        logger.info(f"Reminder dispatch: {sent} of {len(due)} due reminders sent")
+        return sent
@@ -0,0 +1,20 @@
+# apps/appointments/tasks.py
+"""
+Periodic appointment tasks; scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+
+from .reminders import AppointmentReminders
+
+
+@shared_task(ignore_result=True)
+def plan_appointment_reminders():
+    """Materialize reminders for the coming week's appointments"""
+    AppointmentReminders.plan()
+
+
+@shared_task(ignore_result=True)
+def dispatch_appointment_reminders():
+    """Send the reminders that are due"""
+    AppointmentReminders.dispatch()
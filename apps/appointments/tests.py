@@ -0,0 +1,132 @@
+from datetime import date, time, timedelta
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from smtplib import SMTPException
+from unittest import mock
+
+from apps.communications.models import CommunicationLog
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+from .models import Appointment, AppointmentReminder
+from .reminders import LOCK_KEY, AppointmentReminders
+
+gateway_batches = []
+
+
+def collect_sms(messages):
+    gateway_batches.append([reminder.pk for reminder, _, _ in messages])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', APPOINTMENT_REMINDER_GATEWAYS={})
+class AppointmentReminderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F',
+            phone='0501234567', email='amina@example.com',
+        )
+        cls.doctor = Doctor.objects.create(
+            first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+        gateway_batches.clear()
+
+    def book(self, days=5, status='SCHEDULED'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=timezone.localdate() + timedelta(days=days),
+            appointment_time=time(10, 0), status=status, chief_complaint='Checkup',
+        )
+
+    def due_reminder(self, appointment, reminder_type='EMAIL'):
+        return AppointmentReminder.objects.create(
+            appointment=appointment, reminder_type=reminder_type, scheduled_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def test_plan_only_materializes_deliverable_channels(self):
+        # A past no-show makes the patient high risk: email and SMS at 72, 24 and 2 hours
+        self.book(days=-10, status='NO_SHOW')
+        appointment = self.book()
+        AppointmentReminders.plan()
+        self.assertEqual(set(appointment.reminders.values_list('reminder_type', flat=True)), {'EMAIL'})
+        self.assertEqual(appointment.reminders.count(), 3)
+
+        with override_settings(APPOINTMENT_REMINDER_GATEWAYS={'SMS': 'apps.appointments.tests.collect_sms'}):
+            AppointmentReminders.plan()
+        self.assertEqual(appointment.reminders.filter(reminder_type='SMS').count(), 3)
+
+    def test_plan_keeps_reminders_that_are_already_due(self):
+        # Dispatch is running late: the planner would not plan this time any more, but must not drop it
+        late = self.due_reminder(self.book())
+        AppointmentReminders.plan()
+        self.assertTrue(AppointmentReminder.objects.filter(pk=late.pk).exists())
+        self.assertEqual(AppointmentReminders.dispatch(), 1)
+        late.refresh_from_db()
+        self.assertTrue(late.is_sent)
+
+    def test_dispatch_leaves_channels_without_a_sender_pending(self):
+        appointment = self.book()
+        email = self.due_reminder(appointment)
+        sms = self.due_reminder(appointment, 'SMS')
+
+        self.assertEqual(AppointmentReminders.dispatch(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        sms.refresh_from_db()
+        self.assertFalse(sms.is_sent)
+        self.assertEqual(sms.error_message, '')
+        self.assertFalse(CommunicationLog.objects.filter(channel='sms').exists())
+
+        with override_settings(APPOINTMENT_REMINDER_GATEWAYS={'SMS': 'apps.appointments.tests.collect_sms'}):
+            self.assertEqual(AppointmentReminders.dispatch(), 1)
+        self.assertEqual(gateway_batches, [[sms.pk]])
+        sms.refresh_from_db()
+        email.refresh_from_db()
+        self.assertTrue(sms.is_sent and email.is_sent)
+
+    @override_settings(APPOINTMENT_REMINDER_RETRY_DELAY=60, APPOINTMENT_REMINDER_MAX_ATTEMPTS=3)
+    def test_failed_batch_is_retried_with_backoff(self):
+        reminder = self.due_reminder(self.book())
+        now = timezone.now()
+        with mock.patch.object(AppointmentReminders, '_send', side_effect=SMTPException('try later')):
+            self.assertEqual(AppointmentReminders.dispatch(now=now), 0)
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.is_sent, reminder.error_message, reminder.retry_count), (False, '', 1))
+        self.assertEqual(reminder.scheduled_at, now + timedelta(seconds=60))
+
+        # Not due again until the delay has passed
+        self.assertEqual(AppointmentReminders.dispatch(now=now + timedelta(seconds=30)), 0)
+        self.assertEqual(AppointmentReminders.dispatch(now=now + timedelta(seconds=61)), 1)
+        reminder.refresh_from_db()
+        self.assertTrue(reminder.is_sent)
+        self.assertEqual(list(CommunicationLog.objects.order_by('retry_count').values_list('status', 'retry_count')),
+                         [('failed', 0), ('sent', 1)])
+
+    @override_settings(APPOINTMENT_REMINDER_RETRY_DELAY=60, APPOINTMENT_REMINDER_MAX_ATTEMPTS=2)
+    def test_reminder_is_given_up_after_the_last_attempt(self):
+        reminder = self.due_reminder(self.book())
+        now = timezone.now()
+        with mock.patch.object(AppointmentReminders, '_send', side_effect=SMTPException('mailbox down')):
+            AppointmentReminders.dispatch(now=now)
+            AppointmentReminders.dispatch(now=now + timedelta(seconds=61))
+            self.assertEqual(AppointmentReminders.dispatch(now=now + timedelta(days=1)), 0)
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.retry_count, 2)
+        self.assertIn('mailbox down', reminder.error_message)
+        self.assertEqual(CommunicationLog.objects.count(), 2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_send_now_reports_queued_reminders_while_dispatch_is_locked(self):
+        appointment = self.book()
+        cache.add(f"{LOCK_KEY}:dispatch", 1)
+        self.assertEqual(AppointmentReminders.send_now([appointment.pk]), (1, 0))
+        self.assertFalse(appointment.reminders.get().is_sent)
+
+        cache.delete(f"{LOCK_KEY}:dispatch")
+        self.assertEqual(AppointmentReminders.dispatch(), 1)
+        self.assertEqual(mail.outbox[0].to, ['amina@example.com'])
@@ -14,7 +14,9 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django_filters import rest_framework as filters
 from .models import Appointment
 from .serializers import AppointmentSerializer
+from apps.core.pagination import KeysetPagination
 from apps.doctors.models import Doctor, DoctorSchedule
+from apps.opd.token_queue import TokenQueue
 from datetime import datetime
 from django.utils import timezone
 
@@ -34,6 +36,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = AppointmentFilter
+    pagination_class = KeysetPagination
+    keyset_ordering = ('appointment_date', 'appointment_time', 'id')
+    keyset_count_tags = ['appointments']
 
     def check_doctor_availability(self, doctor, date, time):
         schedules = DoctorSchedule.objects.filter(doctor=doctor, day_of_week=date.weekday())
@@ -61,6 +66,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from .models import Appointment, AppointmentType, AppointmentHistory
+from .reminders import AppointmentReminders
 from .forms import (
     AppointmentForm, QuickAppointmentForm, AppointmentSearchForm,
     RescheduleAppointmentForm, CancelAppointmentForm
@@ -68,10 +74,13 @@ from .forms import (
 from apps.patients.models import Patient
 from apps.doctors.models import Doctor, DoctorSchedule
 from apps.core.utils.barcode_generator import DocumentBarcodeGenerator
+from apps.core.pagination import KeysetPaginationMixin
 from apps.core.permissions import (
     PatientAccessMixin, SecureViewMixin, audit_action, 
     patient_access_required, get_client_ip
 )
+from apps.core.tiered_cache import TieredCache
+from apps.core.sqlite import serialized_write
 
 
 # Compatibility helpers for existing URL names used elsewhere in the project.
@@ -271,13 +280,16 @@ def upcoming_appointments(request):
     return JsonResponse({'upcoming': data})
 
 
-class AppointmentListView(SecureViewMixin, PatientAccessMixin, ListView):
+class AppointmentListView(KeysetPaginationMixin, SecureViewMixin, PatientAccessMixin, ListView):
     """List appointments with filtering and search - SECURE"""
     model = Appointment
     template_name = 'appointments/appointment_list.html'
     context_object_name = 'appointments'
     paginate_by = 20
     required_roles = ['admin', 'doctor', 'nurse', 'receptionist']
+    # Matches the (appointment_date, appointment_time, id) index
+    keyset_ordering = ('appointment_date', 'appointment_time', 'id')
+    keyset_count_tags = ['appointments']
     
     def get_queryset(self):
         queryset = Appointment.objects.all().select_related('patient', 'doctor', 'created_by')
@@ -325,8 +337,21 @@ class AppointmentListView(SecureViewMixin, PatientAccessMixin, ListView):
                 logger.warning(f"Doctor instance not found for user {self.request.user.username}")
                 queryset = queryset.none()
         
-        return queryset.order_by('appointment_date', 'appointment_time')
-    
+        # Ordering is applied by the keyset paginator
+        return queryset
+    
+    @staticmethod
+    def _appointment_statistics(today):
+        """Header counters in a single aggregate query"""
+        return Appointment.objects.aggregate(
+            total_appointments=Count('id'),
+            scheduled_appointments=Count('id', filter=Q(status='SCHEDULED')),
+            pending_appointments=Count('id', filter=Q(status='PENDING')),
+            cancelled_appointments=Count('id', filter=Q(status='CANCELLED')),
+            today_appointments=Count('id', filter=Q(appointment_date=today)),
+            completed_today=Count('id', filter=Q(appointment_date=today, status='COMPLETED')),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -336,31 +361,13 @@ class AppointmentListView(SecureViewMixin, PatientAccessMixin, ListView):
         appointment_queryset = self.model.objects.all()
         today = timezone.now().date()
 
-        # Total appointments count
-        context['total_appointments'] = appointment_queryset.count()
-
-        # Appointments by status
-        context['scheduled_appointments'] = appointment_queryset.filter(
-            status='SCHEDULED'
-        ).count()
-
-        context['pending_appointments'] = appointment_queryset.filter(
-            status='PENDING'
-        ).count()
-
-        context['cancelled_appointments'] = appointment_queryset.filter(
-            status='CANCELLED'
-        ).count()
-
-        # Today's appointments count
-        context['today_appointments'] = appointment_queryset.filter(
-            appointment_date=today
-        ).count()
-
-        context['completed_today'] = appointment_queryset.filter(
-            appointment_date=today,
-            status='COMPLETED'
-        ).count()
+        # Cached rollup, invalidated by the 'appointments' cache tag
+        context.update(TieredCache.get_or_set(
+            f"appointments:list_stats:{today.isoformat()}",
+            lambda: self._appointment_statistics(today),
+            timeout=300,
+            tags=self.keyset_count_tags,
+        ))
 
         # Get all active doctors for filter dropdown
         # Try to respect tenant/hospital routing similar to doctors module
@@ -655,7 +662,10 @@ def check_in_appointment(request, pk):
         changed_by=request.user
     )
     
-    messages.success(request, f'{appointment.patient.get_full_name()} has been checked in.')
+    # Join the doctor's OPD token queue
+    visit = TokenQueue.check_in(appointment)
+    
+    messages.success(request, f'{appointment.patient.get_full_name()} has been checked in (token #{visit.token_number}).')
     return redirect('appointments:detail', pk=pk)
 
 
@@ -1165,8 +1175,13 @@ def send_reminder(request, pk):
     """Send reminder for appointment"""
     appointment = get_object_or_404(Appointment, pk=pk)
     
-    # TODO: Implement SMS/Email reminder logic
-    messages.success(request, f'Reminder sent to {appointment.patient.get_full_name()}')
+    queued, sent = AppointmentReminders.send_now([appointment.pk])
+    if sent:
+        messages.success(request, f'Reminder sent to {appointment.patient.get_full_name()}')
+    elif queued:
+        messages.info(request, f'Reminder queued for {appointment.patient.get_full_name()}; it goes out shortly.')
+    else:
+        messages.warning(request, 'No reminder could be sent now; check the contact details and preferences.')
     return redirect('appointments:appointment_detail_enhanced', pk=pk)
 
 
@@ -1238,8 +1253,7 @@ def bulk_appointment_action(request):
                 updated_count = appointments.update(status=status)
                 
         elif action == 'send-reminders':
-            # TODO: Implement reminder sending logic
-            updated_count = len(appointment_ids)
+            updated_count, _ = AppointmentReminders.send_now(appointment_ids)
             
         elif action == 'cancel':
             reason = request.POST.get('reason', 'Bulk cancellation')
@@ -1370,7 +1384,7 @@ def appointment_create_super_enhanced(request):
 def create_enhanced_appointment(request):
     """Create appointment with notifications and serial number generation"""
     try:
-        with transaction.atomic():
+        with serialized_write():
             # Get form data
             patient_id = request.POST.get('patient_id')
             doctor_id = request.POST.get('doctor_id')
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Bill, PoSCategory, PoSItem, PoSTransaction, 
-    PoSTransactionItem, PoSDayClose
+    PoSTransactionItem, PoSDayClose, PoSShiftTotals
 )
 
 @admin.register(Bill)
@@ -32,10 +32,11 @@ class PoSItemAdmin(admin.ModelAdmin):
     search_fields = ['name', 'item_code', 'barcode', 'manufacturer']
     ordering = ['name']
     readonly_fields = ['profit_margin', 'is_low_stock', 'is_expired']
+    raw_id_fields = ['medicine']
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('category', 'item_code', 'name', 'description', 'item_type')
+            'fields': ('category', 'item_code', 'name', 'description', 'item_type', 'medicine')
         }),
         ('Pricing', {
             'fields': ('cost_price', 'selling_price', 'discount_price', 'profit_margin')
@@ -123,7 +124,7 @@ class PoSDayCloseAdmin(admin.ModelAdmin):
     readonly_fields = [
         'total_transactions', 'total_sales', 'total_tax', 'total_discount',
         'cash_payments', 'card_payments', 'digital_payments', 'credit_sales',
-        'cash_variance'
+        'cash_variance', 'totals_snapshot'
     ]
     
     fieldsets = (
@@ -139,8 +140,27 @@ class PoSDayCloseAdmin(admin.ModelAdmin):
         ('Payment Breakdown', {
             'fields': ('cash_payments', 'card_payments', 'digital_payments', 'credit_sales')
         }),
+        ('Shift Totals Snapshot', {
+            'fields': ('totals_snapshot',),
+            'classes': ('collapse',)
+        }),
         ('Notes', {
             'fields': ('notes',),
             'classes': ('collapse',)
         })
     )
+
+
+@admin.register(PoSShiftTotals)
+class PoSShiftTotalsAdmin(admin.ModelAdmin):
+    list_display = [
+        'date', 'till', 'cashier', 'payment_method', 'status',
+        'transaction_count', 'total_sales', 'updated_at'
+    ]
+    list_filter = ['till', 'date', 'payment_method', 'status']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
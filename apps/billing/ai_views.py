@@ -23,6 +23,7 @@ from .models import (
 from .ai_billing_engine import BillingAutomationEngine
 from apps.appointments.models import Appointment
 from apps.patients.models import Patient
+from apps.core.db_routing import reporting_db
 # 
 logger = logging.getLogger(__name__)
 
@@ -160,6 +161,7 @@ class AIBillingDashboardView(TemplateView):
             logger.error(f"Error getting AI insights: {str(e)}")
             return []
     
+    @reporting_db
     def _get_revenue_analytics(self):
         """Get revenue analytics and forecasting"""
         try:
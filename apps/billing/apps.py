@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BillingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.billing'
+
+    def ready(self):
+        # Import signal handlers when app is ready
+        import apps.billing.signals  # noqa
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+        ('patients', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='postransaction',
+            index=models.Index(fields=['created_at', 'id'], name='billing_pos_created_46b222_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_keyset_pagination_indexes'),
+        ('pharmacy', '0003_medicine_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='positem',
+            name='medicine',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pos_items', to='pharmacy.medicine'),
+        ),
+    ]
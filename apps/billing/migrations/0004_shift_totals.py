@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:31
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_shift_totals(apps, schema_editor):
+    PoSShiftTotals = apps.get_model('billing', 'PoSShiftTotals')
+    tills = (
+        ('BILLING', apps.get_model('billing', 'PoSTransaction'), 'transaction_date'),
+        ('PHARMACY', apps.get_model('pharmacy', 'PharmacyPoSTransaction'), 'date'),
+    )
+    rows = {}
+    for till, model, date_field in tills:
+        for when, cashier_id, method, status, total, tax, discount in model.objects.values_list(
+            date_field, 'cashier_id', 'payment_method', 'status', 'total_amount', 'tax_amount', 'discount_amount'
+        ).iterator():
+            key = (till, timezone.localdate(when), cashier_id, method, status)
+            row = rows.setdefault(key, PoSShiftTotals(
+                till=till, date=key[1], cashier_id=cashier_id, payment_method=method, status=status,
+            ))
+            row.transaction_count += 1
+            row.total_sales += total or 0
+            row.total_tax += tax or 0
+            row.total_discount += discount or 0
+    PoSShiftTotals.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_positem_medicine'),
+        ('pharmacy', '0005_shift_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posdayclose',
+            name='totals_snapshot',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='PoSShiftTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('till', models.CharField(choices=[('BILLING', 'Billing PoS'), ('PHARMACY', 'Pharmacy PoS')], max_length=10)),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cashier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pos_shift_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'PoS Shift Totals',
+                'verbose_name_plural': 'PoS Shift Totals',
+                'ordering': ['-date', 'till', 'cashier', 'payment_method', 'status'],
+                'indexes': [models.Index(fields=['till', 'date'], name='billing_pos_till_06a7cf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('till', 'date', 'cashier', 'payment_method', 'status'), name='unique_pos_shift_totals')],
+            },
+        ),
+        migrations.RunPython(backfill_shift_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+        ('billing', '0004_shift_totals'),
+        ('patients', '0004_master_patient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['patient', 'invoice_date', 'id'], name='billing_inv_patient_20f54c_idx'),
+        ),
+    ]
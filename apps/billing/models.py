@@ -132,6 +132,8 @@ class Invoice(SerialNumberMixin):
             models.Index(fields=['status']),
             models.Index(fields=['due_date']),
             models.Index(fields=['patient']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'invoice_date', 'id']),
         ]
     
     def __str__(self):
@@ -722,6 +724,10 @@ class PoSItem(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     item_type = models.CharField(max_length=20, choices=ITEM_TYPES, default='OTHER')
+    # Medicines sold at the billing counter draw from the pharmacy's batch stock
+    medicine = models.ForeignKey(
+        'pharmacy.Medicine', on_delete=models.SET_NULL, null=True, blank=True, related_name='pos_items'
+    )
     
     # Pricing
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
@@ -834,6 +840,9 @@ class PoSTransaction(SerialNumberMixin):
     class Meta:
         ordering = ['-created_at']
         verbose_name = "PoS Transaction"
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
         verbose_name_plural = "PoS Transactions"
     
     def __str__(self):
@@ -967,6 +976,8 @@ class PoSDayClose(models.Model):
     # Status
     is_closed = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    # PoSShiftTotals rows at close: [{payment_method, status, transaction_count, total_sales, ...}]
+    totals_snapshot = models.JSONField(default=list, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -978,4 +989,46 @@ class PoSDayClose(models.Model):
         verbose_name_plural = "PoS Day Closes"
     
     def __str__(self):
-        return f"Day Close - {self.date} - {self.cashier.get_full_name()}"
\ No newline at end of file
+        return f"Day Close - {self.date} - {self.cashier.get_full_name()}"
+
+
+class PoSShiftTotals(models.Model):
+    """
+    Running sales counters per till, day, cashier, payment method and status.
+    Kept current in the same transaction as each sale (apps.billing.shift_totals)
+    so day close and the daily report never re-aggregate transactions.
+    """
+    
+    TILLS = [
+        ('BILLING', 'Billing PoS'),
+        ('PHARMACY', 'Pharmacy PoS'),
+    ]
+    
+    till = models.CharField(max_length=10, choices=TILLS)
+    date = models.DateField()
+    cashier = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='pos_shift_totals')
+    payment_method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    
+    transaction_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_tax = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_discount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', 'till', 'cashier', 'payment_method', 'status']
+        verbose_name = "PoS Shift Totals"
+        verbose_name_plural = "PoS Shift Totals"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['till', 'date', 'cashier', 'payment_method', 'status'], name='unique_pos_shift_totals'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['till', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.till} {self.date} {self.cashier_id} {self.payment_method}/{self.status}: {self.total_sales}"
@@ -0,0 +1,20 @@
+# apps/billing/pos_catalog.py
+"""
+In-memory index of the billing PoS catalog; see apps.core.catalog_index.
+"""
+
+from apps.core.catalog_index import CatalogIndex
+from .models import PoSItem
+
+
+class PoSItemIndex(CatalogIndex):
+    model = PoSItem
+    tag = 'pos_catalog:items'
+    search_fields = ('name', 'item_code', 'manufacturer')
+    exact_fields = ('barcode', 'item_code')
+    display_fields = ('item_code', 'name', 'is_taxable', 'tax_rate', 'is_prescription_required')
+    price_field = 'selling_price'
+    stock_field = 'current_stock'
+
+
+pos_item_index = PoSItemIndex()
@@ -19,6 +19,11 @@ from .models import (
 )
 from apps.patients.models import Patient
 from apps.core.mixins import UnifiedSystemMixin
+from apps.core.pagination import KeysetPaginationMixin
+from apps.core.sqlite import serialized_write
+from apps.pharmacy.inventory import BatchInventory, InsufficientStock
+from .pos_catalog import pos_item_index
+from .shift_totals import ShiftTotals
 # from apps.core.db_router import TenantDatabaseManager  # Removed for unified ZAIN HMS
 
 
@@ -36,19 +41,15 @@ def _ensure_hospital_context(request):
 def pos_dashboard(request):
     """Main PoS dashboard with quick stats and navigation"""
     _ensure_hospital_context(request)
-    today = timezone.now().date()
+    today = timezone.localdate()
     
     # Daily stats
-    today_transactions = PoSTransaction.objects.filter(
-        transaction_date__date=today,
-        status='COMPLETED'
-    )
-    
+    totals = ShiftTotals.summary('BILLING', today)
     daily_stats = {
-        'total_sales': today_transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-        'transaction_count': today_transactions.count(),
-        'cash_sales': today_transactions.filter(payment_method='CASH').aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-        'card_sales': today_transactions.filter(payment_method='CARD').aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
+        'total_sales': totals['total_sales'],
+        'transaction_count': totals['transaction_count'],
+        'cash_sales': totals['by_method']['CASH'],
+        'card_sales': totals['by_method']['CARD'],
     }
     
     # Low stock items
@@ -99,25 +100,20 @@ def pos_search_items(request):
     if not query:
         return JsonResponse({'items': []})
     
-    items = PoSItem.objects.filter(
-        Q(name__icontains=query) |
-        Q(item_code__icontains=query) |
-        Q(barcode__icontains=query),
-        is_active=True,
-        current_stock__gt=0
-    )[:20]
+    # Served from the per-process catalog index; barcode/code matches come first
+    items = pos_item_index.search(query, limit=20)
     
     items_data = []
     for item in items:
         items_data.append({
-            'id': item.id,
-            'code': item.item_code,
-            'name': item.name,
-            'price': float(item.selling_price),
-            'stock': item.current_stock,
-            'taxable': item.is_taxable,
-            'tax_rate': float(item.tax_rate),
-            'prescription_required': item.is_prescription_required
+            'id': item['pk'],
+            'code': item['item_code'],
+            'name': item['name'],
+            'price': item['price'],
+            'stock': item['stock'],
+            'taxable': item['is_taxable'],
+            'tax_rate': float(item['tax_rate']),
+            'prescription_required': item['is_prescription_required']
         })
     
     return JsonResponse({'items': items_data})
@@ -160,49 +156,57 @@ def pos_create_transaction(request):
         try:
             data = json.loads(request.body)
             
-            # Create transaction
-            transaction = PoSTransaction.objects.create(
-                patient_id=data.get('patient_id') if data.get('patient_id') else None,
-                customer_name=data.get('customer_name', ''),
-                customer_phone=data.get('customer_phone', ''),
-                payment_method=data.get('payment_method', 'CASH'),
-                amount_received=Decimal(data.get('amount_received', '0')),
-                discount_amount=Decimal(data.get('discount_amount', '0')),
-                notes=data.get('notes', ''),
-                cashier=request.user,
-                status='COMPLETED'
-            )
-            
-            # Add transaction items
-            for item_data in data.get('items', []):
-                item = PoSItem.objects.get(id=item_data['item_id'])
+            with serialized_write():
+                # Create transaction
+                transaction = PoSTransaction.objects.create(
+                    patient_id=data.get('patient_id') if data.get('patient_id') else None,
+                    customer_name=data.get('customer_name', ''),
+                    customer_phone=data.get('customer_phone', ''),
+                    payment_method=data.get('payment_method', 'CASH'),
+                    amount_received=Decimal(data.get('amount_received', '0')),
+                    discount_amount=Decimal(data.get('discount_amount', '0')),
+                    notes=data.get('notes', ''),
+                    cashier=request.user,
+                    status='COMPLETED'
+                )
                 
-                # Check stock availability
-                if item.current_stock < item_data['quantity']:
-                    transaction.delete()  # Rollback
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Insufficient stock for {item.name}. Available: {item.current_stock}'
-                    })
+                # Add transaction items
+                medicine_lines = []
+                for item_data in data.get('items', []):
+                    item = PoSItem.objects.select_for_update().get(id=item_data['item_id'])
+                    
+                    # Check stock availability
+                    if item.current_stock < item_data['quantity']:
+                        raise InsufficientStock(item, item_data['quantity'], item.current_stock)
+                    
+                    # Create transaction item
+                    PoSTransactionItem.objects.create(
+                        transaction=transaction,
+                        item=item,
+                        quantity=item_data['quantity'],
+                        unit_price=Decimal(item_data.get('unit_price', item.selling_price)),
+                        discount_percentage=Decimal(item_data.get('discount_percentage', '0')),
+                        prescription_number=item_data.get('prescription_number', ''),
+                        prescribed_by_id=item_data.get('prescribed_by_id') if item_data.get('prescribed_by_id') else None
+                    )
+                    
+                    # Update stock
+                    item.current_stock -= item_data['quantity']
+                    item.save()
+                    if item.medicine_id:
+                        medicine_lines.append((item.medicine_id, item_data['quantity']))
                 
-                # Create transaction item
-                PoSTransactionItem.objects.create(
-                    transaction=transaction,
-                    item=item,
-                    quantity=item_data['quantity'],
-                    unit_price=Decimal(item_data.get('unit_price', item.selling_price)),
-                    discount_percentage=Decimal(item_data.get('discount_percentage', '0')),
-                    prescription_number=item_data.get('prescription_number', ''),
-                    prescribed_by_id=item_data.get('prescribed_by_id') if item_data.get('prescribed_by_id') else None
+                # Medicines also leave the pharmacy's batches, earliest expiry first
+                BatchInventory.allocate(
+                    medicine_lines,
+                    user=request.user,
+                    reference=transaction.transaction_number,
+                    notes=f"Billing PoS Sale - {transaction.transaction_number}",
                 )
                 
-                # Update stock
-                item.current_stock -= item_data['quantity']
-                item.save()
-            
-            # Recalculate transaction totals
-            transaction.calculate_totals()
-            transaction.save()
+                # Recalculate transaction totals
+                transaction.calculate_totals()
+                transaction.save()
             
             return JsonResponse({
                 'success': True,
@@ -211,6 +215,11 @@ def pos_create_transaction(request):
                 'total_amount': float(transaction.total_amount)
             })
             
+        except InsufficientStock as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Insufficient stock for {e.medicine.name}. Available: {e.available}'
+            })
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -220,16 +229,19 @@ def pos_create_transaction(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 
-class PoSTransactionListView(LoginRequiredMixin, ListView):
+class PoSTransactionListView(KeysetPaginationMixin, LoginRequiredMixin, ListView):
     """List all PoS transactions"""
     model = PoSTransaction
     template_name = 'billing/pos/transaction_list.html'
     context_object_name = 'transactions'
     paginate_by = 25
+    keyset_ordering = ('-created_at', '-id')
+    keyset_count_tags = ['pos']
     
     def get_queryset(self):
         _ensure_hospital_context(self.request)
-        queryset = PoSTransaction.objects.select_related('patient', 'cashier').order_by('-created_at')
+        # Ordering is applied by the keyset paginator
+        queryset = PoSTransaction.objects.select_related('patient', 'cashier')
 
         # Filter by date range
         date_from = self.request.GET.get('date_from')
@@ -362,7 +374,7 @@ def pos_daily_report(request):
     if date_str:
         report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     else:
-        report_date = timezone.now().date()
+        report_date = timezone.localdate()
     
     # Get transactions for the day
     transactions = PoSTransaction.objects.filter(
@@ -370,19 +382,13 @@ def pos_daily_report(request):
         status='COMPLETED'
     ).select_related('patient', 'cashier')
     
-    # Calculate totals
-    summary = transactions.aggregate(
-        total_sales=Sum('total_amount'),
-        total_tax=Sum('tax_amount'),
-        total_discount=Sum('discount_amount'),
-        transaction_count=Count('id')
-    )
-    
-    # Payment method breakdown
-    payment_breakdown = {}
-    for method_code, method_name in PoSTransaction.PAYMENT_METHODS:
-        amount = transactions.filter(payment_method=method_code).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        payment_breakdown[method_name] = amount
+    # Totals and payment method breakdown from the shift counters / day close snapshots
+    totals = ShiftTotals.daily_summary('BILLING', report_date, PoSDayClose)
+    summary = {name: totals[name] for name in ('total_sales', 'total_tax', 'total_discount', 'transaction_count')}
+    payment_breakdown = {
+        method_name: totals['by_method'].get(method_code, 0)
+        for method_code, method_name in PoSTransaction.PAYMENT_METHODS
+    }
     
     # Top selling items
     top_items = PoSTransactionItem.objects.filter(
@@ -410,7 +416,7 @@ def pos_daily_report(request):
 @login_required
 def pos_close_day(request):
     """Close the day and generate closing report"""
-    today = timezone.now().date()
+    today = timezone.localdate()
     
     # Check if day is already closed
     existing_close = PoSDayClose.objects.filter(
@@ -428,59 +434,40 @@ def pos_close_day(request):
         closing_cash = Decimal(request.POST.get('closing_cash', '0'))
         notes = request.POST.get('notes', '')
         
-        # Calculate day's transactions
-        day_transactions = PoSTransaction.objects.filter(
-            transaction_date__date=today,
-            cashier=request.user,
-            status='COMPLETED'
-        )
-        
-        totals = day_transactions.aggregate(
-            total_transactions=Count('id'),
-            total_sales=Sum('total_amount'),
-            total_tax=Sum('tax_amount'),
-            total_discount=Sum('discount_amount'),
-            cash_payments=Sum('total_amount', filter=Q(payment_method='CASH')),
-            card_payments=Sum('total_amount', filter=Q(payment_method='CARD')),
-            digital_payments=Sum('total_amount', filter=Q(payment_method='DIGITAL')),
-            credit_sales=Sum('total_amount', filter=Q(payment_method='CREDIT'))
-        )
-        
-        # Create day close record
-        day_close = PoSDayClose.objects.create(
-            date=today,
-            cashier=request.user,
-            opening_cash=opening_cash,
-            closing_cash=closing_cash,
-            cash_sales=totals['cash_payments'] or 0,
-            cash_variance=closing_cash - opening_cash - (totals['cash_payments'] or 0),
-            total_transactions=totals['total_transactions'] or 0,
-            total_sales=totals['total_sales'] or 0,
-            total_tax=totals['total_tax'] or 0,
-            total_discount=totals['total_discount'] or 0,
-            cash_payments=totals['cash_payments'] or 0,
-            card_payments=totals['card_payments'] or 0,
-            digital_payments=totals['digital_payments'] or 0,
-            credit_sales=totals['credit_sales'] or 0,
-            notes=notes,
-            is_closed=True
-        )
+        # Snapshot the cashier's shift counters into the close record
+        with serialized_write():
+            totals = ShiftTotals.summary('BILLING', today, request.user)
+            cash = totals['by_method'].get('CASH', 0)
+            day_close = PoSDayClose.objects.create(
+                date=today,
+                cashier=request.user,
+                opening_cash=opening_cash,
+                closing_cash=closing_cash,
+                cash_sales=cash,
+                cash_variance=closing_cash - opening_cash - cash,
+                total_transactions=totals['transaction_count'],
+                total_sales=totals['total_sales'],
+                total_tax=totals['total_tax'],
+                total_discount=totals['total_discount'],
+                cash_payments=cash,
+                card_payments=totals['by_method'].get('CARD', 0),
+                digital_payments=totals['by_method'].get('DIGITAL', 0),
+                credit_sales=totals['by_method'].get('CREDIT', 0),
+                totals_snapshot=ShiftTotals.snapshot('BILLING', today, request.user),
+                notes=notes,
+                is_closed=True
+            )
         
         messages.success(request, f'Day {today} closed successfully!')
         return redirect('billing:pos_day_close_detail', pk=day_close.pk)
     
     # GET request - show closing form
-    day_transactions = PoSTransaction.objects.filter(
-        transaction_date__date=today,
-        cashier=request.user,
-        status='COMPLETED'
-    )
-    
-    daily_summary = day_transactions.aggregate(
-        total_sales=Sum('total_amount'),
-        cash_sales=Sum('total_amount', filter=Q(payment_method='CASH')),
-        transaction_count=Count('id')
-    )
+    totals = ShiftTotals.summary('BILLING', today, request.user)
+    daily_summary = {
+        'total_sales': totals['total_sales'],
+        'cash_sales': totals['by_method'].get('CASH', 0),
+        'transaction_count': totals['transaction_count'],
+    }
     
     context = {
         'today': today,
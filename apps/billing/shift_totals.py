@@ -0,0 +1,246 @@
+# apps/billing/shift_totals.py
+"""
+Running PoS shift totals for the billing and pharmacy tills.
+
+Every save of a ``PoSTransaction`` / ``PharmacyPoSTransaction`` moves its
+contribution (count, total, tax, discount) between ``PoSShiftTotals`` rows
+keyed by (till, day, cashier, payment method, status) - inside the sale's
+own transaction, via the signal handlers in apps.billing.signals. So:
+
+* day close copies the cashier's counter rows into the close record
+  (``totals_snapshot``) instead of re-aggregating the day's sales;
+* the daily report is one conditional aggregation over a handful of counter
+  rows, and closed shifts are read from their snapshots plus whatever the
+  cashier rang up after closing.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from apps.core.sqlite import serialized_write
+from .models import PoSShiftTotals
+
+COUNTERS = ('transaction_count', 'total_sales', 'total_tax', 'total_discount')
+
+# Till -> (transaction model, its date field)
+TILLS = {
+    'BILLING': ('billing.PoSTransaction', 'transaction_date'),
+    'PHARMACY': ('pharmacy.PharmacyPoSTransaction', 'date'),
+}
+TILL_BY_MODEL = {label: till for till, (label, _) in TILLS.items()}
+
+_ZERO = Decimal('0.00')
+
+
+def contribution(instance, date_field):
+    """``(key, counters)`` a transaction adds to the totals, or None if its fields are not loaded"""
+    values = instance.__dict__
+    if any(name not in values for name in (date_field, 'cashier_id', 'payment_method', 'status',
+                                           'total_amount', 'tax_amount', 'discount_amount')):
+        return None
+    when = values[date_field]
+    if when is None:
+        return None
+    day = timezone.localdate(when) if timezone.is_aware(when) else when.date()
+    key = (day, values['cashier_id'], values['payment_method'], values['status'])
+    return key, (1, values['total_amount'] or _ZERO, values['tax_amount'] or _ZERO, values['discount_amount'] or _ZERO)
+
+
+def _methods(till):
+    model = apps.get_model(TILLS[till][0])
+    return [code for code, _ in model.PAYMENT_METHODS]
+
+
+def _statuses(till):
+    model = apps.get_model(TILLS[till][0])
+    choices = getattr(model, 'STATUS_CHOICES', None) or getattr(model, 'TRANSACTION_STATUS')
+    return [code for code, _ in choices]
+
+
+class ShiftTotals:
+    """Maintain and read PoSShiftTotals"""
+
+    @classmethod
+    def apply(cls, till, old, new):
+        """Move a transaction's contribution from ``old`` to ``new`` (either may be None)"""
+        if old == new:
+            return
+        with serialized_write():
+            if old is not None:
+                cls._bump(till, old[0], [-value for value in old[1]])
+            if new is not None:
+                cls._bump(till, new[0], new[1])
+
+    @staticmethod
+    def _bump(till, key, deltas):
+        day, cashier_id, payment_method, status = key
+        lookup = {'till': till, 'date': day, 'cashier_id': cashier_id,
+                  'payment_method': payment_method, 'status': status}
+        changes = {name: F(name) + delta for name, delta in zip(COUNTERS, deltas)}
+        changes['updated_at'] = timezone.now()
+        if PoSShiftTotals.objects.filter(**lookup).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                PoSShiftTotals.objects.create(**lookup, **dict(zip(COUNTERS, deltas)))
+        except IntegrityError:
+            # Another worker created the row first
+            PoSShiftTotals.objects.filter(**lookup).update(**changes)
+
+    # Reading
+
+    @staticmethod
+    def rows(till, day, cashier=None):
+        queryset = PoSShiftTotals.objects.filter(till=till, date=day)
+        if cashier is not None:
+            queryset = queryset.filter(cashier=cashier)
+        return queryset
+
+    @classmethod
+    def snapshot(cls, till, day, cashier):
+        """The cashier's counter rows as JSON-ready dicts, for a day close record"""
+        return [
+            {
+                'payment_method': row['payment_method'],
+                'status': row['status'],
+                'transaction_count': row['transaction_count'],
+                'total_sales': str(row['total_sales']),
+                'total_tax': str(row['total_tax']),
+                'total_discount': str(row['total_discount']),
+            }
+            for row in cls.rows(till, day, cashier).values('payment_method', 'status', *COUNTERS)
+            if row['transaction_count']
+        ]
+
+    @staticmethod
+    def _empty(till):
+        return {
+            'transaction_count': 0,
+            'total_sales': _ZERO,
+            'total_tax': _ZERO,
+            'total_discount': _ZERO,
+            'by_method': {method: _ZERO for method in _methods(till)},
+            'by_status': {status: 0 for status in _statuses(till)},
+        }
+
+    @classmethod
+    def summary(cls, till, day, cashier=None, exclude_cashiers=()):
+        """
+        Completed-sale totals, sales per payment method and transaction counts
+        per status, in one conditional aggregation over the counter rows.
+        """
+        completed = Q(status='COMPLETED')
+        aggregates = {f'sum_{name}': Sum(name, filter=completed) for name in COUNTERS}
+        methods, statuses = _methods(till), _statuses(till)
+        for method in methods:
+            aggregates[f'method_{method}'] = Sum('total_sales', filter=completed & Q(payment_method=method))
+        for status in statuses:
+            aggregates[f'status_{status}'] = Sum('transaction_count', filter=Q(status=status))
+
+        queryset = cls.rows(till, day, cashier)
+        if exclude_cashiers:
+            queryset = queryset.exclude(cashier__in=exclude_cashiers)
+        totals = queryset.aggregate(**aggregates)
+
+        result = cls._empty(till)
+        for name in COUNTERS:
+            result[name] = totals[f'sum_{name}'] or result[name]
+        for method in methods:
+            result['by_method'][method] = totals[f'method_{method}'] or _ZERO
+        for status in statuses:
+            result['by_status'][status] = totals[f'status_{status}'] or 0
+        return result
+
+    @classmethod
+    def merge(cls, summary, snapshot):
+        """Add a day close's ``totals_snapshot`` rows into a summary dict"""
+        for row in snapshot:
+            count, sales = row['transaction_count'], Decimal(row['total_sales'] or _ZERO)
+            summary['by_status'][row['status']] = summary['by_status'].get(row['status'], 0) + count
+            if row['status'] != 'COMPLETED':
+                continue
+            summary['transaction_count'] += count
+            summary['total_sales'] += sales
+            summary['total_tax'] += Decimal(row['total_tax'] or _ZERO)
+            summary['total_discount'] += Decimal(row['total_discount'] or _ZERO)
+            summary['by_method'][row['payment_method']] = summary['by_method'].get(row['payment_method'], _ZERO) + sales
+        return summary
+
+    @staticmethod
+    def after_close(till, day, closes):
+        """
+        Snapshot-shaped rows for the sales ``closes`` (``(cashier id, closed
+        at)`` pairs) rang up after closing, in one grouped query.
+        """
+        if not closes:
+            return []
+        label, date_field = TILLS[till]
+        after = Q(pk__in=[])
+        for cashier_id, closed_at in closes:
+            if closed_at is None:
+                continue
+            after |= Q(cashier_id=cashier_id, **{f'{date_field}__gt': closed_at})
+        return list(
+            apps.get_model(label).objects.filter(after, **{f'{date_field}__date': day}).order_by()
+            .values('payment_method', 'status')
+            .annotate(transaction_count=Count('pk'), total_sales=Sum('total_amount'),
+                      total_tax=Sum('tax_amount'), total_discount=Sum('discount_amount'))
+        )
+
+    @classmethod
+    def daily_summary(cls, till, day, close_model):
+        """
+        Whole-till summary for a day: closed shifts from their day close
+        snapshots plus the sales made after the close, shifts still open
+        from the live counters.
+        """
+        # Pharmacy closes record closed_at; billing closes are created closed
+        fields = {field.name for field in close_model._meta.fields}
+        closed_field = 'closed_at' if 'closed_at' in fields else 'created_at'
+        closes = list(
+            close_model.objects.filter(date=day, is_closed=True).exclude(totals_snapshot=[])
+            .values_list('cashier_id', 'totals_snapshot', closed_field)
+        )
+        summary = cls.summary(till, day, exclude_cashiers=[cashier_id for cashier_id, _, _ in closes])
+        for _, snapshot, _ in closes:
+            cls.merge(summary, snapshot)
+        late = cls.after_close(till, day, [(cashier_id, closed_at) for cashier_id, _, closed_at in closes])
+        return cls.merge(summary, late)
+
+    @staticmethod
+    def rebuild(till, start=None, end=None):
+        """Recompute the counters from the transactions (backfill / repair); returns rows written"""
+        label, date_field = TILLS[till]
+        model = apps.get_model(label)
+        queryset = model.objects.all()
+        if start is not None:
+            queryset = queryset.filter(**{f'{date_field}__date__gte': start})
+        if end is not None:
+            queryset = queryset.filter(**{f'{date_field}__date__lte': end})
+
+        totals = defaultdict(lambda: [0, _ZERO, _ZERO, _ZERO])
+        fields = (date_field, 'cashier_id', 'payment_method', 'status', 'total_amount', 'tax_amount', 'discount_amount')
+        for when, cashier_id, method, status, total, tax, discount in queryset.values_list(*fields).iterator():
+            counters = totals[(timezone.localdate(when), cashier_id, method, status)]
+            counters[0] += 1
+            counters[1] += total or _ZERO
+            counters[2] += tax or _ZERO
+            counters[3] += discount or _ZERO
+
+        with serialized_write():
+            existing = PoSShiftTotals.objects.filter(till=till)
+            if start is not None:
+                existing = existing.filter(date__gte=start)
+            if end is not None:
+                existing = existing.filter(date__lte=end)
+            existing.delete()
+            PoSShiftTotals.objects.bulk_create([
+                PoSShiftTotals(till=till, date=day, cashier_id=cashier_id, payment_method=method, status=status,
+                               **dict(zip(COUNTERS, counters)))
+                for (day, cashier_id, method, status), counters in totals.items()
+            ], batch_size=500)
+        return len(totals)
@@ -0,0 +1,46 @@
+# apps/billing/signals.py
+"""
+Billing signal handlers: keep PoSShiftTotals (apps.billing.shift_totals) in
+step with every billing and pharmacy PoS transaction save / delete.
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .shift_totals import TILLS, TILL_BY_MODEL, ShiftTotals, contribution
+
+BILLING_TRANSACTION = 'billing.PoSTransaction'
+PHARMACY_TRANSACTION = 'pharmacy.PharmacyPoSTransaction'
+
+
+def _till(sender):
+    till = TILL_BY_MODEL[sender._meta.label]
+    return till, TILLS[till][1]
+
+
+@receiver(post_init, sender=BILLING_TRANSACTION)
+@receiver(post_init, sender=PHARMACY_TRANSACTION)
+def remember_shift_contribution(sender, instance, **kwargs):
+    """Keep what the loaded row adds to the shift totals, so a save can move only the difference"""
+    instance._shift_contribution = contribution(instance, _till(sender)[1])
+
+
+@receiver(post_save, sender=BILLING_TRANSACTION)
+@receiver(post_save, sender=PHARMACY_TRANSACTION)
+def update_shift_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    till, date_field = _till(sender)
+    old = None if created else getattr(instance, '_shift_contribution', None)
+    new = contribution(instance, date_field)
+    if not created and (old is None or new is None):
+        # Loaded with deferred fields: the old contribution is unknown, leave the counters alone
+        return
+    ShiftTotals.apply(till, old, new)
+    instance._shift_contribution = new
+
+
+@receiver(post_delete, sender=BILLING_TRANSACTION)
+@receiver(post_delete, sender=PHARMACY_TRANSACTION)
+def remove_from_shift_totals(sender, instance, **kwargs):
+    till = _till(sender)[0]
+    ShiftTotals.apply(till, getattr(instance, '_shift_contribution', None), None)
@@ -1,3 +1,68 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from apps.pharmacy.models import PharmacyPoSDayClose, PharmacyPoSTransaction
+from .models import PoSShiftTotals
+from .shift_totals import ShiftTotals
+
+DAY = date(2026, 3, 10)
+
+
+def at(hour):
+    return timezone.make_aware(datetime.combine(DAY, time(hour)))
+
+
+class ShiftTotalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.closed = User.objects.create_user(username='cashier1', password='x')
+        cls.open = User.objects.create_user(username='cashier2', password='x')
+
+    def sale(self, cashier, hour, total, method='CASH', status='COMPLETED'):
+        return PharmacyPoSTransaction.objects.create(
+            cashier=cashier, date=at(hour), total_amount=Decimal(total), tax_amount=Decimal('1.00'),
+            payment_method=method, status=status,
+        )
+
+    def close(self, cashier, hour):
+        return PharmacyPoSDayClose.objects.create(
+            date=DAY, cashier=cashier, is_closed=True, closed_at=at(hour),
+            totals_snapshot=ShiftTotals.snapshot('PHARMACY', DAY, cashier),
+        )
+
+    def test_counters_follow_status_changes(self):
+        sale = self.sale(self.closed, 9, '50.00')
+        sale.status = 'REFUNDED'
+        sale.save()
+        summary = ShiftTotals.summary('PHARMACY', DAY)
+        self.assertEqual(summary['total_sales'], Decimal('0.00'))
+        self.assertEqual((summary['by_status']['COMPLETED'], summary['by_status']['REFUNDED']), (0, 1))
+        self.assertEqual(PoSShiftTotals.objects.get(status='REFUNDED').total_sales, Decimal('50.00'))
+
+    def test_daily_summary_adds_sales_made_after_a_close(self):
+        self.sale(self.closed, 9, '40.00')
+        self.sale(self.closed, 10, '10.00', method='CARD')
+        self.close(self.closed, 12)
+        self.sale(self.closed, 14, '25.00')
+        self.sale(self.open, 15, '5.00')
+
+        summary = ShiftTotals.daily_summary('PHARMACY', DAY, PharmacyPoSDayClose)
+        self.assertEqual(summary['transaction_count'], 4)
+        self.assertEqual(summary['total_sales'], Decimal('80.00'))
+        self.assertEqual(summary['total_tax'], Decimal('4.00'))
+        self.assertEqual(summary['by_method']['CASH'], Decimal('70.00'))
+        self.assertEqual(summary['by_method']['CARD'], Decimal('10.00'))
+
+    def test_close_figures_stand_for_sales_before_it(self):
+        sale = self.sale(self.closed, 9, '40.00')
+        self.close(self.closed, 12)
+        # Edited after the close: the day close keeps what was closed
+        sale.total_amount = Decimal('45.00')
+        sale.save()
+        summary = ShiftTotals.daily_summary('PHARMACY', DAY, PharmacyPoSDayClose)
+        self.assertEqual(summary['total_sales'], Decimal('40.00'))
@@ -0,0 +1,241 @@
+# Messaging provider status ingestion
+"""
+Batched, idempotent ingestion of delivery-status webhooks.
+
+Webhook views only parse the request body and queue the raw payload
+(``webhook_ingestor.submit``), so the provider gets its 200 immediately even
+when the database is slow - a late answer is what makes providers retry and
+send the same events again. A background worker (apps.core.batching) then:
+
+1. normalises every queued payload into ``StatusEvent``s;
+2. loads all referenced messages with one ``external_id__in`` query per channel;
+3. applies only forward transitions (pending -> sent -> delivered -> read,
+   or failed before delivery), so replays and out-of-order callbacks are no-ops;
+4. writes every changed row with a single ``bulk_update``.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pathlib import Path
+import logging
+
+from apps.core.batching import SpillingBatchQueue
+from apps.core.sqlite import serialized_write
+from .models import CommunicationLog
+
+logger = logging.getLogger(__name__)
+
+StatusEvent = namedtuple('StatusEvent', ['channel', 'external_id', 'status', 'at'])
+
+# Position in the delivery lifecycle; a message only ever moves forward
+STATUS_RANK = {'pending': 0, 'sent': 1, 'delivered': 2, 'read': 3}
+
+STATUS_TIMESTAMP_FIELDS = {
+    'delivered': 'delivered_at',
+    'read': 'read_at',
+    'failed': 'failed_at',
+}
+
+KNOWN_STATUSES = set(STATUS_RANK) | {'failed'}
+
+EMAIL_STATUS_MAP = {
+    'processed': 'sent',
+    'deferred': 'sent',
+    'delivered': 'delivered',
+    'open': 'read',
+    'opened': 'read',
+    'click': 'read',
+    'clicked': 'read',
+    'bounce': 'failed',
+    'dropped': 'failed',
+    'failed': 'failed',
+}
+
+SMS_STATUS_MAP = {
+    'queued': 'pending',
+    'sending': 'pending',
+    'sent': 'sent',
+    'delivered': 'delivered',
+    'read': 'read',
+    'undelivered': 'failed',
+    'failed': 'failed',
+}
+
+LOOKUP_CHUNK = 500
+
+
+def _event_time(value, default):
+    """Provider timestamps arrive as epoch seconds (int or str) or ISO strings"""
+    if value in (None, ''):
+        return default
+    try:
+        return datetime.fromtimestamp(int(float(value)), tz=dt_timezone.utc)
+    except (TypeError, ValueError):
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            return default
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+# -- payload parsers: (raw provider JSON, time received) -> [StatusEvent] -------
+
+def parse_whatsapp(data, received_at):
+    events = []
+    for entry in data.get('entry', []):
+        for change in entry.get('changes', []):
+            if change.get('field') != 'messages':
+                continue
+            for status in change.get('value', {}).get('statuses', []):
+                if status.get('id') and status.get('status') in KNOWN_STATUSES:
+                    events.append(StatusEvent('whatsapp', status['id'], status['status'],
+                                              _event_time(status.get('timestamp'), received_at)))
+    return events
+
+
+def parse_telegram(data, received_at):
+    message_data = data.get('callback_query', {}).get('data', '')
+    if message_data.startswith('delivered_'):
+        return [StatusEvent('telegram', message_data[len('delivered_'):], 'delivered', received_at)]
+    return []
+
+
+def parse_email(data, received_at):
+    if isinstance(data, list):
+        # SendGrid: a list of events
+        raw = [(event.get('sg_message_id') or event.get('smtp-id'), event.get('event'), event.get('timestamp'))
+               for event in data]
+    elif 'event-data' in data:
+        # Mailgun: one event per callback
+        event_data = data['event-data']
+        raw = [(event_data.get('message', {}).get('headers', {}).get('message-id'),
+                event_data.get('event'), event_data.get('timestamp'))]
+    else:
+        raw = []
+
+    return [
+        StatusEvent('email', message_id, EMAIL_STATUS_MAP[event_type], _event_time(timestamp, received_at))
+        for message_id, event_type, timestamp in raw
+        if message_id and event_type in EMAIL_STATUS_MAP
+    ]
+
+
+def parse_sms(data, received_at):
+    message_sid = data.get('MessageSid') or data.get('message_id')
+    status = SMS_STATUS_MAP.get(data.get('MessageStatus') or data.get('status'))
+    if message_sid and status:
+        return [StatusEvent('sms', message_sid, status, received_at)]
+    return []
+
+
+PARSERS = {
+    'whatsapp': parse_whatsapp,
+    'telegram': parse_telegram,
+    'email': parse_email,
+    'sms': parse_sms,
+}
+
+
+# -- applying events -------------------------------------------------------------
+
+def is_forward_transition(current, new):
+    if new == current or current in ('failed', 'read'):
+        return False
+    if new == 'failed':
+        # Failure after delivery is a provider glitch, not a state change
+        return current in ('pending', 'sent')
+    return STATUS_RANK.get(new, -1) > STATUS_RANK.get(current, -1)
+
+
+def _apply(comm_log, event):
+    if not is_forward_transition(comm_log.status, event.status):
+        return False
+    comm_log.status = event.status
+    field = STATUS_TIMESTAMP_FIELDS.get(event.status)
+    if field:
+        setattr(comm_log, field, event.at)
+    if event.status == 'read' and comm_log.delivered_at is None:
+        # The delivery receipt may never come (or come later and be ignored)
+        comm_log.delivered_at = event.at
+    return True
+
+
+def apply_status_events(events):
+    """Apply events with one lookup query per channel and one bulk_update; returns rows changed"""
+    by_channel = {}
+    for event in events:
+        by_channel.setdefault(event.channel, []).append(event)
+
+    changed = {}
+    for channel, channel_events in by_channel.items():
+        external_ids = list({event.external_id for event in channel_events})
+        logs = {}
+        for offset in range(0, len(external_ids), LOOKUP_CHUNK):
+            for comm_log in CommunicationLog.objects.filter(
+                channel=channel,
+                external_id__in=external_ids[offset:offset + LOOKUP_CHUNK],
+            ).only('id', 'external_id', 'status', 'delivered_at', 'read_at', 'failed_at'):
+                logs.setdefault(comm_log.external_id, []).append(comm_log)
+
+        missing = 0
+        for event in sorted(channel_events, key=lambda event: (event.at, STATUS_RANK.get(event.status, 9))):
+            matches = logs.get(event.external_id)
+            if not matches:
+                missing += 1
+                continue
+            for comm_log in matches:
+                if _apply(comm_log, event):
+                    changed[comm_log.pk] = comm_log
+        if missing:
+            logger.warning(f"{missing} {channel} status events for unknown messages")
+
+    if changed:
+        CommunicationLog.objects.bulk_update(
+            list(changed.values()),
+            ['status', 'delivered_at', 'read_at', 'failed_at'],
+            batch_size=LOOKUP_CHUNK,
+        )
+    return len(changed)
+
+
+class WebhookIngestor(SpillingBatchQueue):
+    """Queue raw webhook payloads and apply them in batches"""
+
+    name = 'webhook-ingest'
+
+    def __init__(self):
+        super().__init__(
+            spill_path=Path(getattr(
+                settings, 'WEBHOOK_SPILL_PATH', Path(settings.BASE_DIR) / 'logs' / 'webhook_spill.jsonl'
+            )),
+            enabled=getattr(settings, 'WEBHOOK_INGEST_ASYNC', True),
+            queue_size=getattr(settings, 'WEBHOOK_QUEUE_SIZE', 5000),
+            flush_interval=getattr(settings, 'WEBHOOK_FLUSH_INTERVAL', 1.0),
+            batch_size=getattr(settings, 'WEBHOOK_FLUSH_BATCH', 100),
+            log=logger,
+        )
+
+    def submit(self, provider, payload):
+        self.put({'provider': provider, 'payload': payload, 'received_at': timezone.now()})
+
+    def process(self, records):
+        events = []
+        for record in records:
+            try:
+                received_at = record['received_at']
+                if isinstance(received_at, str):  # replayed from the spill file
+                    received_at = parse_datetime(received_at)
+                events.extend(PARSERS[record['provider']](record['payload'], received_at))
+            except Exception as e:
+                # A payload that cannot be parsed now never will be; keep it in the log
+                logger.error(f"Unparseable {record.get('provider')} webhook payload ({e}): {record.get('payload')!r}")
+
+        with serialized_write():
+            updated = apply_status_events(events)
+        logger.info(f"Webhooks: {len(records)} payloads, {len(events)} status events, {updated} messages updated")
+        return []
+
+
+webhook_ingestor = WebhookIngestor()
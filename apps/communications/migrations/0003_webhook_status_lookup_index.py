@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_keyset_pagination_indexes'),
+        ('communications', '0002_audit_retention'),
+        ('patients', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='communicationlog',
+            index=models.Index(fields=['channel', 'external_id'], name='communicati_channel_48d5f8_idx'),
+        ),
+    ]
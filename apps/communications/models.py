@@ -84,6 +84,8 @@ class CommunicationLog(models.Model):
             models.Index(fields=['appointment', 'channel']),
             models.Index(fields=['patient', 'sent_at']),
             models.Index(fields=['status', 'sent_at']),
+            models.Index(fields=['sent_at']),  # Retention scans (apps.core.retention)
+            models.Index(fields=['channel', 'external_id']),  # Webhook status lookups
         ]
 
     def __str__(self):
@@ -0,0 +1,86 @@
+from datetime import date, time, timedelta
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+
+from apps.appointments.models import Appointment
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+from .ingest import StatusEvent, apply_status_events, webhook_ingestor
+from .models import CommunicationLog
+
+
+class WebhookIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F', phone='0501234567',
+        )
+        doctor = Doctor.objects.create(
+            first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=doctor, appointment_date=date(2026, 1, 5), appointment_time=time(10, 0),
+            chief_complaint='Checkup',
+        )
+
+    def setUp(self):
+        # Apply payloads inline instead of on the background worker
+        inline = mock.patch.object(webhook_ingestor, 'enabled', False)
+        inline.start()
+        self.addCleanup(inline.stop)
+
+    def message(self, channel, external_id, status='sent'):
+        return CommunicationLog.objects.create(
+            appointment=self.appointment, patient=self.patient, channel=channel, message='Reminder',
+            status=status, external_id=external_id,
+        )
+
+    def test_sendgrid_batch_moves_messages_forward_only(self):
+        first = self.message('email', 'sg-1')
+        second = self.message('email', 'sg-2', status='read')
+        now = int(timezone.now().timestamp())
+        events = [
+            {'sg_message_id': 'sg-1', 'event': 'open', 'timestamp': now + 5},
+            {'sg_message_id': 'sg-1', 'event': 'delivered', 'timestamp': now},
+            {'sg_message_id': 'sg-2', 'event': 'bounce', 'timestamp': now},
+            {'sg_message_id': 'unknown', 'event': 'delivered', 'timestamp': now},
+        ]
+        response = self.client.post(reverse('communications:email_webhook'), events, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'read')
+        self.assertEqual(first.read_at - first.delivered_at, timedelta(seconds=5))
+        self.assertEqual((second.status, second.failed_at), ('read', None))
+
+    def test_replayed_callbacks_are_no_ops(self):
+        self.message('sms', 'SM1')
+        payload = {'MessageSid': 'SM1', 'MessageStatus': 'delivered'}
+        for _ in range(2):
+            self.client.post(reverse('communications:sms_webhook'), payload)
+        delivered_at = CommunicationLog.objects.get().delivered_at
+
+        self.client.post(reverse('communications:sms_webhook'), payload)
+        self.client.post(reverse('communications:sms_webhook'), {'MessageSid': 'SM1', 'MessageStatus': 'failed'})
+        message = CommunicationLog.objects.get()
+        self.assertEqual((message.status, message.delivered_at, message.failed_at), ('delivered', delivered_at, None))
+
+    def test_batch_is_one_lookup_and_one_update(self):
+        for index in range(3):
+            self.message('whatsapp', f'wamid.{index}')
+        at = timezone.now()
+        events = [StatusEvent('whatsapp', f'wamid.{index}', 'delivered', at) for index in range(3)]
+        with self.assertNumQueries(2):
+            self.assertEqual(apply_status_events(events), 3)
+        self.assertEqual(CommunicationLog.objects.filter(status='delivered').count(), 3)
+
+    def test_malformed_body_is_rejected(self):
+        response = self.client.post(reverse('communications:email_webhook'), 'not json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import (
     Notification, ActivityLog, SystemConfiguration, 
-    FileUpload, SystemSetting, HospitalModule
+    FileUpload, SystemSetting, HospitalModule, AuditArchive
 )
 
 
@@ -85,6 +85,28 @@ class ActivityLogAdmin(admin.ModelAdmin):
         return qs
 
 
+@admin.register(AuditArchive)
+class AuditArchiveAdmin(admin.ModelAdmin):
+    list_display = [
+        'model_label', 'partition_date', 'row_count', 'path', 'purged_at'
+    ]
+    list_filter = ['model_label', 'partition_date']
+    readonly_fields = [
+        'model_label', 'partition_date', 'path', 'row_count', 'sha256',
+        'first_timestamp', 'last_timestamp', 'created_at', 'purged_at'
+    ]
+    date_hierarchy = 'partition_date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(SystemConfiguration)
 class SystemConfigurationAdmin(admin.ModelAdmin):
     list_display = [
@@ -25,6 +25,7 @@ from apps.appointments.models import Appointment
 from apps.billing.models import Bill
 from apps.emergency.models import EmergencyCase
 from .models import Notification, ActivityLog, SystemConfiguration, FileUpload
+from .pagination import KeysetPagination
 from .version_models import SystemUpdate, UpdateNotification, DeploymentLog
 from .serializers import (
     NotificationSerializer, ActivityLogSerializer, SystemConfigurationSerializer,
@@ -38,6 +39,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     """Notification API ViewSet"""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         tenant = getattr(self.request, 'tenant', None)
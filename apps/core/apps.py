@@ -11,4 +11,5 @@ class CoreConfig(AppConfig):
     def ready(self):
         """Called when Django is ready - ZAIN HMS unified system"""
         # ZAIN HMS - unified system, no need for deferred database loading
-        pass
+        # Cache tag invalidation hooks; a broken import must fail startup, not leave caches stale
+        from . import signals  # noqa: F401
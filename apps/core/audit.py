@@ -0,0 +1,95 @@
+# ZAIN HMS Buffered Audit Writer
+"""
+Asynchronous, lossless writer for audit rows (core.ActivityLog and
+dashboard.ActivityLog).
+
+Producers call ``audit_writer.submit()`` with a model label and plain field
+values; the record goes onto a bounded in-process queue and the request
+carries on. A daemon flusher thread drains the queue and ``bulk_create``s the
+rows every ``AUDIT_FLUSH_INTERVAL`` seconds or ``AUDIT_FLUSH_BATCH`` records,
+whichever comes first.
+
+Nothing is dropped: when the queue is full, when the database rejects a
+batch, and at interpreter shutdown, records are appended as JSON lines to
+``AUDIT_SPILL_PATH``. The flusher replays that file once the database is
+writable again (``manage.py replay_audit_spill`` does the same on demand).
+The queue mechanics live in apps.core.batching.
+
+Event time is captured at ``submit()`` time, so rows written late - or
+replayed from the spill file hours later - keep the time the access happened.
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from pathlib import Path
+import logging
+
+from .batching import SpillingBatchQueue
+from .sqlite import serialized_write
+
+logger = logging.getLogger('zain_hms.audit')
+
+
+class AuditWriter(SpillingBatchQueue):
+    """Queue audit rows and bulk_create them in the background"""
+
+    name = 'audit-writer'
+
+    def __init__(self):
+        super().__init__(
+            spill_path=Path(getattr(
+                settings, 'AUDIT_SPILL_PATH', Path(settings.BASE_DIR) / 'logs' / 'audit_spill.jsonl'
+            )),
+            enabled=getattr(settings, 'AUDIT_ASYNC', True),
+            queue_size=getattr(settings, 'AUDIT_QUEUE_SIZE', 10000),
+            flush_interval=getattr(settings, 'AUDIT_FLUSH_INTERVAL', 0.5),
+            batch_size=getattr(settings, 'AUDIT_FLUSH_BATCH', 200),
+            replay_interval=getattr(settings, 'AUDIT_REPLAY_INTERVAL', 60),
+            log=logger,
+        )
+
+    def submit(self, model_label, **fields):
+        """Queue one row for ``model_label``; never touches the database"""
+        fields.setdefault('timestamp', timezone.now())
+        self.put({'model': model_label, 'fields': fields})
+
+    @staticmethod
+    def _instances(model, records):
+        return [model(**record['fields']) for record in records]
+
+    def process(self, records):
+        """bulk_create grouped by model; returns the records that could not be written"""
+        failed = []
+        groups = {}
+        for record in records:
+            groups.setdefault(record['model'], []).append(record)
+
+        for label, group in groups.items():
+            try:
+                model = apps.get_model(label)
+            except LookupError:
+                logger.error(f"Unknown audit model {label}, spilling {len(group)} records")
+                failed.extend(group)
+                continue
+            try:
+                with serialized_write():
+                    model.objects.bulk_create(self._instances(model, group), batch_size=self.batch_size)
+            except Exception as e:
+                logger.error(f"Audit bulk write to {label} failed ({e}), retrying row by row")
+                failed.extend(self._write_rows(model, group))
+        return failed
+
+    def _write_rows(self, model, records):
+        """Isolate the rows a failed batch choked on; returns the ones still failing"""
+        failed = []
+        for record in records:
+            try:
+                with serialized_write():
+                    model.objects.bulk_create(self._instances(model, [record]))
+            except Exception:
+                failed.append(record)
+        return failed
+
+
+audit_writer = AuditWriter()
@@ -1,6 +1,7 @@
 # apps/core/barcode_views.py
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
@@ -9,6 +10,7 @@ from django.views import View
 import json
 
 from .utils.barcode_generator import BarcodeScanner, DocumentBarcodeGenerator
+from .utils.label_service import LABEL_SOURCES, build_labels, labels_pdf, labels_zip
 from apps.patients.models import Patient
 from apps.doctors.models import Doctor
 from apps.appointments.models import Appointment
@@ -16,6 +18,8 @@ from apps.laboratory.models import LabOrder
 from apps.radiology.models import RadiologyOrder
 from apps.billing.models import Invoice
 
+LABEL_BATCH_MAX = getattr(settings, 'LABEL_BATCH_MAX', 500)
+
 @method_decorator(login_required, name='dispatch')
 class BarcodeScannerView(View):
     """Hospital barcode scanner interface"""
@@ -220,3 +224,47 @@ def generate_barcode(request):
             'success': False,
             'error': f'Barcode generation failed: {str(e)}'
         })
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def batch_labels(request):
+    """
+    Printable labels for many objects at once.
+
+    Params: object_type (patient | appointment | laborder), ids (repeated or
+    comma-separated), format (pdf | zip). Images come from the label cache,
+    so reprinting a batch costs file reads only.
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    object_type = params.get('object_type', '').lower()
+    output_format = params.get('format', 'pdf').lower()
+    ids = [value.strip() for raw in params.getlist('ids') for value in raw.split(',') if value.strip()]
+
+    if object_type not in LABEL_SOURCES:
+        return JsonResponse({
+            'success': False,
+            'error': f'Unsupported object type: {object_type}'
+        }, status=400)
+    if output_format not in ('pdf', 'zip'):
+        return JsonResponse({'success': False, 'error': 'Format must be pdf or zip'}, status=400)
+    if not ids:
+        return JsonResponse({'success': False, 'error': 'No ids provided'}, status=400)
+    if len(ids) > LABEL_BATCH_MAX:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {LABEL_BATCH_MAX} labels per batch'
+        }, status=400)
+
+    try:
+        labels = build_labels(object_type, ids)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'Invalid ids: {str(e)}'}, status=400)
+    if not labels:
+        return JsonResponse({'success': False, 'error': 'No records found'}, status=404)
+
+    if output_format == 'zip':
+        response = HttpResponse(labels_zip(labels), content_type='application/zip')
+    else:
+        response = HttpResponse(labels_pdf(labels), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{object_type}_labels.{output_format}"'
+    return response
@@ -0,0 +1,229 @@
+# ZAIN HMS Background Batch Queue
+"""
+In-process bounded queue drained in batches by a daemon thread, with an
+append-only spill file so queued work survives overflow, database outages
+and shutdown.
+
+Subclasses implement ``process(records)`` - called with a list of
+JSON-serialisable records, returning the ones that could not be handled -
+and producers call ``put(record)``. A batch is processed every
+``flush_interval`` seconds or ``batch_size`` records, whichever comes first.
+Records that overflow the queue, fail processing or are still queued at
+interpreter shutdown are appended as JSON lines to ``spill_path``; the
+worker replays that file every ``replay_interval`` seconds.
+
+Used by the audit writer (apps.core.audit) and messaging webhook ingestion
+(apps.communications.ingest).
+"""
+
+from django.db import close_old_connections
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows development boxes: single process, no locking needed
+    fcntl = None
+
+logger = logging.getLogger('zain_hms.performance')
+
+
+def json_default(value):
+    """``json.dumps`` fallback that keeps full datetime precision"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class SpillingBatchQueue:
+    """Bounded queue + background batch worker with an append-only spill file"""
+
+    name = 'batch'
+
+    def __init__(self, spill_path, enabled=True, queue_size=10000, flush_interval=0.5,
+                 batch_size=200, replay_interval=60, log=None):
+        self.spill_path = spill_path
+        self.enabled = enabled
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.replay_interval = replay_interval
+        self.log = log or logger
+
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._last_replay = 0.0
+
+    def process(self, records):
+        """Handle a batch; return the records that failed and should be spilled"""
+        raise NotImplementedError
+
+    # -- producers -------------------------------------------------------------
+
+    def put(self, record):
+        """Queue one record; processed inline when the queue is disabled"""
+        if not self.enabled:
+            self._spill(self._process([record]))
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.log.warning(f"{self.name} queue full, spilling record to disk")
+            self._spill([record])
+
+    # -- worker ----------------------------------------------------------------
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # Forked worker: the parent's queue and thread do not exist here
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._stopping = threading.Event()
+                if self._pid is None:
+                    atexit.register(self.shutdown)
+                self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            try:
+                if batch:
+                    self._spill(self._process(batch))
+                self._maybe_replay()
+            except Exception as e:
+                self.log.error(f"{self.name} worker error: {e}")
+            finally:
+                close_old_connections()
+
+    def _process(self, records):
+        try:
+            return self.process(records)
+        except Exception as e:
+            self.log.error(f"{self.name}: processing {len(records)} records failed ({e}), spilling")
+            return records
+
+    def flush(self):
+        """Process everything queued so far in the calling thread"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        batch = self._drain()
+        if batch:
+            self._spill(self._process(batch))
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def shutdown(self):
+        """Stop the worker and spill whatever it did not get to"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval * 2)
+        self._spill(self._drain())
+
+    # -- spill file ----------------------------------------------------------
+
+    def _spill(self, records):
+        if not records:
+            return
+        lines = ''.join(json.dumps(record, default=json_default) + '\n' for record in records)
+        with self._spill_lock:
+            try:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                while True:
+                    with open(self.spill_path, 'a', encoding='utf-8') as handle:
+                        if fcntl is not None:
+                            fcntl.flock(handle, fcntl.LOCK_EX)
+                            # A replay may have claimed (renamed) the file while we waited
+                            if os.fstat(handle.fileno()).st_ino != _inode(self.spill_path):
+                                continue
+                        handle.write(lines)
+                        handle.flush()
+                        os.fsync(handle.fileno())
+                        return
+            except OSError as e:
+                # Last resort: the log handlers still carry the full records
+                self.log.critical(f"{self.name} spill failed ({e}); records: {lines}")
+
+    def _maybe_replay(self):
+        now = time.monotonic()
+        if now - self._last_replay < self.replay_interval:
+            return
+        self._last_replay = now
+        if self.spill_path.exists():
+            self.replay_spill()
+
+    def replay_spill(self):
+        """Process spilled records again; returns the number handled"""
+        claimed = self.spill_path.with_name(f"{self.spill_path.name}.{os.getpid()}.replay")
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return 0
+
+        records = []
+        with open(claimed, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    self.log.error(f"Skipping corrupt {self.name} spill line: {line[:200]}")
+
+        failed = self._process(records)
+        self._spill(failed)
+        claimed.unlink()
+
+        if failed:
+            self.log.warning(f"{len(failed)} spilled {self.name} records are still failing and were spilled again")
+        self.log.info(f"Replayed {len(records) - len(failed)} spilled {self.name} records")
+        return len(records) - len(failed)
@@ -0,0 +1,163 @@
+# ZAIN HMS Tag-Versioned Cache
+"""
+Tag-versioned caching for ZAIN HMS.
+
+Every cached value is stored under a key that embeds the current version of
+each tag it depends on (``patients``, ``appointments:doctor:42`` ...).
+Invalidating a tag is a single INCR of its version counter: entries built
+against the previous version are never read again and simply age out through
+their TTL, so no KEYS scan or LIKE delete is ever needed.
+"""
+
+from django.core.cache import cache
+from django.db.models import Model
+from django.http import HttpRequest
+from functools import wraps
+import hashlib
+import inspect
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger('zain_hms.performance')
+
+# Sentinel stored in place of ``None`` so cached "no result" values are hits
+_NONE = '__zain_hms_none__'
+
+
+class TagCache:
+    """Version counters for cache tags and tag-aware get/set helpers"""
+
+    VERSION_PREFIX = 'zain_hms:tagver'
+    DEFAULT_TIMEOUT = 300
+
+    @classmethod
+    def _version_key(cls, tag: str) -> str:
+        return f"{cls.VERSION_PREFIX}:{tag}"
+
+    @staticmethod
+    def _seed_version() -> int:
+        """
+        Initial version for a tag with no counter in the cache.
+        Time based so an evicted counter never rolls back to a version that
+        still has live entries.
+        """
+        return int(time.time() * 1000)
+
+    @classmethod
+    def get_versions(cls, tags: Iterable[str]) -> Dict[str, int]:
+        """Fetch the current version of every tag in a single round-trip"""
+        keys = {cls._version_key(tag): tag for tag in tags}
+        if not keys:
+            return {}
+
+        found = cache.get_many(list(keys))
+        versions = {}
+        for key, tag in keys.items():
+            version = found.get(key)
+            if version is None:
+                version = cls._seed_version()
+                # add() keeps the first writer's seed if several workers race
+                if not cache.add(key, version, None):
+                    version = cache.get(key, version)
+            versions[tag] = version
+        return versions
+
+    @classmethod
+    def invalidate(cls, *tags: str):
+        """Invalidate everything cached under the given tags (one INCR each)"""
+        for tag in tags:
+            key = cls._version_key(tag)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Counter missing or evicted - reseed past any previous value
+                cache.set(key, cls._seed_version(), None)
+            logger.debug(f"Cache tag invalidated: {tag}")
+
+    @classmethod
+    def make_key(cls, prefix: str, tags: Iterable[str], *parts) -> str:
+        """Build a cache key bound to the current versions of ``tags``"""
+        tags = sorted(set(tags))
+        versions = cls.get_versions(tags)
+        signature = '|'.join(
+            [repr(part) for part in parts] + [f"{tag}={versions[tag]}" for tag in tags]
+        )
+        digest = hashlib.md5(signature.encode('utf-8')).hexdigest()
+        return f"zain_hms:{prefix}:{digest}"
+
+    @classmethod
+    def get_or_set(cls, prefix: str, tags: Iterable[str], func: Callable,
+                   timeout: Optional[int] = None, key_parts: tuple = ()):
+        """Return the cached value for ``prefix``/``key_parts`` or compute and store it"""
+        cache_key = cls.make_key(prefix, tags, *key_parts)
+        cached_value = cache.get(cache_key)
+        if cached_value is not None:
+            logger.debug(f"Cache hit for {cache_key}")
+            return None if isinstance(cached_value, str) and cached_value == _NONE else cached_value
+
+        result = func()
+        cache_timeout = timeout or cls.DEFAULT_TIMEOUT
+        cache.set(cache_key, _NONE if result is None else result, cache_timeout)
+        logger.debug(f"Cache set for {cache_key} (timeout: {cache_timeout}s)")
+        return result
+
+
+def _key_part(value):
+    """Reduce a call argument to a stable, hashable key component"""
+    if isinstance(value, HttpRequest):
+        user = getattr(value, 'user', None)
+        user_id = getattr(user, 'pk', None) if user is not None else None
+        return ('request', user_id, value.get_full_path())
+    if isinstance(value, Model):
+        return (value._meta.label_lower, value.pk)
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _key_part(item)) for key, item in value.items()))
+    return value
+
+
+def cached(cache_type: str, tags: Iterable[str] = (), timeout: Optional[int] = None):
+    """
+    Cache a function's result per call arguments, bound to cache tags.
+
+    ``tags`` may reference the call's arguments with ``str.format`` syntax,
+    e.g. ``@cached('schedule', tags=['appointments:doctor:{doctor_id}'])``.
+    Requests contribute their user and full path to the key, model instances
+    their primary key, so per-user views never share a cached response.
+    """
+    tags = tuple(tags) or (cache_type,)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        qualname = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+                resolved_tags = [tag.format(**arguments) for tag in tags]
+                key_parts = (qualname,) + tuple(
+                    (name, _key_part(value)) for name, value in arguments.items()
+                )
+            except (TypeError, KeyError, AttributeError, IndexError) as e:
+                logger.error(f"Cache key resolution failed for {qualname}: {e}")
+                return func(*args, **kwargs)
+
+            return TagCache.get_or_set(
+                cache_type,
+                resolved_tags,
+                lambda: func(*args, **kwargs),
+                timeout=timeout,
+                key_parts=key_parts,
+            )
+        return wrapper
+    return decorator
+
+
+def invalidate_tags(*tags: str):
+    """Shortcut for :meth:`TagCache.invalidate`"""
+    TagCache.invalidate(*tags)
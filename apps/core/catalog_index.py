@@ -0,0 +1,285 @@
+# ZAIN HMS In-Memory Catalog Index
+"""
+Per-process search index for the PoS catalogs (billing ``PoSItem``, pharmacy
+``Medicine``), so till searches and barcode scans never query the database.
+
+Each index loads its model once with ``values_list`` into compact columns:
+
+* an exact-match hash map for barcodes / codes;
+* a sorted token array (a flattened prefix trie) over the normalized words of
+  the searchable fields, searched with ``bisect``;
+* a price / stock / active side-table in ``array`` / ``bytearray`` columns.
+
+Staleness is tracked with a TagCache version (``CACHE_TAG_RULES`` bumps it on
+save/delete; bulk stock updates bump it explicitly). A search checks the
+version at most every ``CATALOG_INDEX_CHECK_INTERVAL`` seconds - a cache read,
+not a query - and on a change re-reads only rows whose ``updated_at`` moved.
+Deletes also bump a separate ``<tag>:deleted`` version
+(``CACHE_TAG_DELETE_RULES``), and only that triggers a full rebuild.
+
+A search matches words by prefix and codes / barcodes whole; a code fragment
+of ``MIN_CODE_FRAGMENT`` or more characters also matches codes containing it,
+so a partly typed barcode still finds its item.
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from django.conf import settings
+import logging
+import re
+import threading
+import time
+
+from .cache_tags import TagCache
+
+logger = logging.getLogger('zain_hms.performance')
+
+_SPLIT = re.compile(r'[^0-9a-z]+')
+
+# Re-read rows saved this long before the newest one seen, so a transaction
+# that committed late (older updated_at) is still picked up
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Shortest query that is also matched as a substring of codes / barcodes
+MIN_CODE_FRAGMENT = 3
+
+
+def normalize(value):
+    """Lowercased alphanumeric form of a code or search term"""
+    return _SPLIT.sub('', str(value or '').lower())
+
+
+def tokens(value):
+    """Searchable words of a field value: each alphanumeric run, plus the whole value joined"""
+    text = str(value or '').lower()
+    words = [word for word in _SPLIT.split(text) if word]
+    joined = ''.join(words)
+    if len(words) > 1 and joined:
+        words.append(joined)
+    return words
+
+
+class CatalogIndex:
+    """Base class; subclasses name the model, tag and fields"""
+
+    model = None
+    tag = None
+    search_fields = ()    # Tokenized into the prefix index
+    exact_fields = ()     # Looked up whole (barcode scans, codes)
+    display_fields = ()   # Returned with each hit
+    price_field = None
+    stock_field = None
+    active_field = 'is_active'
+    sort_field = 'name'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._checked_at = 0.0
+        self._version = None
+        self._deletes = None
+        self._watermark = None
+        self._loaded_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._slots = {}                 # pk -> slot
+        self._pks = []
+        self._display = []               # slot -> tuple of display_fields
+        self._price = array('d')
+        self._stock = array('q')
+        self._active = bytearray()
+        self._slot_tokens = []           # slot -> tokens indexed for it
+        self._slot_codes = []            # slot -> exact keys indexed for it
+        self._tokens = []                # Sorted tokens ...
+        self._token_slots = array('l')   # ... and the slot each belongs to
+        self._exact = {}                 # normalized code -> tuple of slots
+
+    def queryset(self):
+        return self.model._default_manager.all()
+
+    @property
+    def _columns(self):
+        fields = dict.fromkeys(
+            ('pk', 'updated_at', self.price_field, self.stock_field, self.active_field, self.sort_field)
+            + tuple(self.search_fields) + tuple(self.exact_fields) + tuple(self.display_fields)
+        )
+        return list(fields)
+
+    @property
+    def delete_tag(self):
+        return f"{self.tag}:deleted"
+
+    # Loading
+
+    def refresh(self, force=False):
+        """Bring the index up to date if its version moved (or ``force``)"""
+        with self._lock:
+            versions = TagCache.get_versions([self.tag, self.delete_tag])
+            version, deletes = versions[self.tag], versions[self.delete_tag]
+            if self._loaded and not force and version == self._version and deletes == self._deletes:
+                return False
+            started = time.monotonic()
+            columns = self._columns
+            queryset = self.queryset().order_by()
+
+            full_interval = getattr(settings, 'CATALOG_INDEX_FULL_RELOAD', 900)
+            # Deleted rows never show up as changed: rebuild when the delete tag moved
+            full = (force or not self._loaded or self._watermark is None or deletes != self._deletes
+                    or time.monotonic() - self._loaded_at >= full_interval)
+            if not full:
+                changed = list(queryset.filter(updated_at__gt=self._watermark - WATERMARK_OVERLAP)
+                               .values_list(*columns))
+            else:
+                self._reset()
+                self._watermark = None
+                self._loaded_at = time.monotonic()
+                # Slots follow sort_field order, so ranking hits is comparing ints
+                position = columns.index(self.sort_field)
+                changed = sorted(queryset.values_list(*columns), key=lambda row: str(row[position] or '').lower())
+
+            pending = [] if full else None
+            for row in changed:
+                self._apply(dict(zip(columns, row)), pending)
+            if pending:
+                # Bulk load: sort the token array once instead of inserting token by token
+                pending.sort()
+                self._tokens = [token for token, _ in pending]
+                self._token_slots = array('l', (slot for _, slot in pending))
+            if changed:
+                newest = max(row[1] for row in changed)
+                self._watermark = newest if self._watermark is None else max(self._watermark, newest)
+
+            self._version, self._deletes, self._loaded = version, deletes, True
+            logger.info(
+                f"Catalog index {self.tag}: {'loaded' if full else 'updated'} {len(changed)} rows "
+                f"({len(self._pks)} total) in {(time.monotonic() - started) * 1000:.0f}ms"
+            )
+            return True
+
+    def _apply(self, row, pending=None):
+        slot = self._slots.get(row['pk'])
+        if slot is None:
+            slot = len(self._pks)
+            self._slots[row['pk']] = slot
+            self._pks.append(row['pk'])
+            self._display.append(None)
+            self._price.append(0.0)
+            self._stock.append(0)
+            self._active.append(0)
+            self._slot_tokens.append(())
+            self._slot_codes.append(())
+
+        self._display[slot] = tuple(row[field] for field in self.display_fields)
+        self._price[slot] = float(row[self.price_field] or 0)
+        self._stock[slot] = int(row[self.stock_field] or 0)
+        self._active[slot] = 1 if row[self.active_field] else 0
+
+        new_tokens = tuple(sorted({token for field in self.search_fields for token in tokens(row[field])}))
+        if pending is not None:
+            pending.extend((token, slot) for token in new_tokens)
+            self._slot_tokens[slot] = new_tokens
+        elif new_tokens != self._slot_tokens[slot]:
+            for token in self._slot_tokens[slot]:
+                self._remove_token(token, slot)
+            for token in new_tokens:
+                position = bisect_left(self._tokens, token)
+                self._tokens.insert(position, token)
+                self._token_slots.insert(position, slot)
+            self._slot_tokens[slot] = new_tokens
+
+        new_codes = tuple({normalize(row[field]) for field in self.exact_fields} - {''})
+        if new_codes != self._slot_codes[slot]:
+            for code in self._slot_codes[slot]:
+                remaining = tuple(s for s in self._exact.get(code, ()) if s != slot)
+                if remaining:
+                    self._exact[code] = remaining
+                else:
+                    self._exact.pop(code, None)
+            for code in new_codes:
+                self._exact[code] = self._exact.get(code, ()) + (slot,)
+            self._slot_codes[slot] = new_codes
+
+    def _remove_token(self, token, slot):
+        position = bisect_left(self._tokens, token)
+        while position < len(self._tokens) and self._tokens[position] == token:
+            if self._token_slots[position] == slot:
+                del self._tokens[position]
+                del self._token_slots[position]
+                return
+            position += 1
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._checked_at >= getattr(settings, 'CATALOG_INDEX_CHECK_INTERVAL', 2.0):
+            self._checked_at = now
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last good index; the next interval retries
+                if not self._loaded:
+                    raise
+                logger.error(f"Catalog index {self.tag} refresh failed: {e}")
+
+    # Lookups
+
+    def _prefix_range(self, term):
+        start = bisect_left(self._tokens, term)
+        # Tokens are [0-9a-z]; '{' sorts after all of them
+        return start, bisect_left(self._tokens, term + '{', start)
+
+    def _entry(self, slot):
+        entry = dict(zip(self.display_fields, self._display[slot]))
+        entry.update(pk=self._pks[slot], price=self._price[slot], stock=self._stock[slot])
+        return entry
+
+    def lookup(self, code, in_stock=False):
+        """Active entries whose barcode/code equals ``code`` exactly (a scan)"""
+        self._ensure_fresh()
+        with self._lock:
+            return [
+                self._entry(slot) for slot in self._exact.get(normalize(code), ())
+                if self._active[slot] and (not in_stock or self._stock[slot] > 0)
+            ]
+
+    def search(self, query, limit=20, in_stock=True):
+        """
+        Active entries matching every word of ``query`` as a prefix of one of
+        their words, or whose code/barcode equals or contains it; exact code
+        matches first, then partial codes, then by name. Rows added since the
+        last full rebuild sort after the others.
+        """
+        self._ensure_fresh()
+        terms = [word for word in _SPLIT.split(str(query).lower()) if word]
+        if not terms:
+            return []
+        with self._lock:
+            code = normalize(query)
+            exact = sorted(self._exact.get(code, ()))
+            partial = []
+            if len(code) >= MIN_CODE_FRAGMENT:
+                partial = sorted({slot for key, slots in self._exact.items() if code in key for slot in slots})
+            # Narrowest term first, then intersect with the others' slot ranges
+            ranges = sorted((self._prefix_range(term) for term in terms), key=lambda r: r[1] - r[0])
+            candidates = set(self._token_slots[ranges[0][0]:ranges[0][1]])
+            for start, stop in ranges[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(self._token_slots[start:stop])
+
+            stock, active = self._stock, self._active
+            hits, seen = [], set()
+            for slot in exact + partial + sorted(candidates):
+                if slot in seen or not active[slot] or (in_stock and stock[slot] <= 0):
+                    continue
+                seen.add(slot)
+                hits.append(self._entry(slot))
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    def stats(self):
+        with self._lock:
+            return {'rows': len(self._pks), 'tokens': len(self._tokens), 'codes': len(self._exact),
+                    'version': self._version}
@@ -0,0 +1,165 @@
+# ZAIN HMS Reporting Database Routing
+"""
+Opt-in routing of read-only analytical queries to a ``reporting`` replica.
+
+Heavy reports and dashboards wrap their queries in ``use_reporting_db()`` (or
+decorate a function/method with ``@reporting_db``, or mix
+``ReportingDatabaseMixin`` into a class-based view). Inside that scope
+``ReportingRouter`` sends reads to the ``reporting`` alias; everything else,
+and every write, stays on ``default``.
+
+Reads fall back to ``default`` when:
+
+* no ``reporting`` database is configured (single-database installs);
+* the replica cannot be reached (re-checked every ``REPORTING_DB_RECHECK`` s);
+* the current request - or a recent one from the same browser, within
+  ``REPORTING_STICKY_SECONDS`` - wrote to the database, so a user never sees
+  a report that is missing the row they just saved (replica lag).
+  ``ReplicaStickinessMiddleware`` carries that window in a cookie.
+
+Writes only pin reads to ``default`` inside a request (``begin_request`` /
+``end_request``). Celery tasks, management commands and other long-lived
+threads have no request to end, so a pin there would never be lifted; code
+outside a request that must read its own writes wraps those reads in
+``use_primary_db()``.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from functools import wraps
+import logging
+import threading
+import time
+
+logger = logging.getLogger('zain_hms.performance')
+
+REPORTING_DB = 'reporting'
+
+_reporting_reads = ContextVar('reporting_reads', default=False)
+_primary_pinned = ContextVar('primary_pinned', default=False)
+_wrote = ContextVar('wrote', default=False)
+_in_request = ContextVar('in_request', default=False)
+
+_health_lock = threading.Lock()
+_health = {'ok': False, 'checked_at': None}
+
+
+def reporting_configured():
+    return REPORTING_DB in settings.DATABASES
+
+
+def reporting_available():
+    """Whether the replica is configured and answered its last connection check"""
+    if not reporting_configured():
+        return False
+    recheck = getattr(settings, 'REPORTING_DB_RECHECK', 30)
+    now = time.monotonic()
+    checked_at = _health['checked_at']
+    if checked_at is not None and now - checked_at < recheck:
+        return _health['ok']
+
+    with _health_lock:
+        if _health['checked_at'] is not None and now - _health['checked_at'] < recheck:
+            return _health['ok']
+        try:
+            # A bare connect would "succeed" on an empty SQLite file; probe a table
+            with connections[REPORTING_DB].cursor() as cursor:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+            ok = True
+        except Exception as e:
+            logger.warning(f"Reporting database unavailable, reading from default: {e}")
+            ok = False
+        _health.update(ok=ok, checked_at=now)
+        return ok
+
+
+@contextmanager
+def use_reporting_db():
+    """Route reads in this block to the reporting replica (when it is safe to)"""
+    token = _reporting_reads.set(True)
+    try:
+        yield
+    finally:
+        _reporting_reads.reset(token)
+
+
+@contextmanager
+def use_primary_db():
+    """Force reads in this block onto ``default``, even inside ``use_reporting_db``"""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def reporting_db(func):
+    """Decorator form of ``use_reporting_db`` for views, methods and compute functions"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_reporting_db():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReportingDatabaseMixin:
+    """Class-based view mixin: the whole request reads from the reporting replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_reporting_db():
+            return super().dispatch(request, *args, **kwargs)
+
+
+# -- request lifecycle (see ReplicaStickinessMiddleware) -----------------------
+
+def begin_request(pinned=False):
+    """
+    Start per-request routing state; ``pinned`` keeps reads on default.
+    Returns the tokens ``end_request()`` restores the previous state with.
+    """
+    return (_in_request.set(True), _primary_pinned.set(pinned), _wrote.set(False))
+
+
+def end_request(tokens):
+    """Undo ``begin_request()`` - including any pin a write added during the request"""
+    for var, token in zip((_in_request, _primary_pinned, _wrote), tokens):
+        try:
+            var.reset(token)
+        except ValueError:
+            # Token from another context (response finished elsewhere): fall back to the defaults
+            var.set(False)
+
+
+def wrote_in_request():
+    return _wrote.get()
+
+
+class ReportingRouter:
+    """Reads inside ``use_reporting_db`` go to the replica; all writes to default"""
+
+    def db_for_read(self, model, **hints):
+        if _reporting_reads.get() and not _primary_pinned.get() and reporting_available():
+            return REPORTING_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes: later reads in this request (and the sticky window) stay on default.
+        # Only within a request, whose end lifts the pin again.
+        if _in_request.get():
+            _wrote.set(True)
+            _primary_pinned.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', REPORTING_DB}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication, never through migrate
+        if db == REPORTING_DB:
+            return False
+        return None
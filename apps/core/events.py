@@ -0,0 +1,217 @@
+# ZAIN HMS Server-Push Event Broker
+"""
+Fan-out of model-change events to server-push (SSE) subscribers.
+
+Producers call ``event_broker.publish()`` once per change. Events are written
+to a short-lived sequence log in the shared cache so every ASGI worker sees
+them; each worker runs a single poller that reads the log and fans the events
+out to its own subscribers through in-memory queues. Enrichers registered for
+an event type run once per worker (not once per browser) - e.g. rendering the
+admin KPI cards after an appointment changes.
+
+Subscribers are filtered by role and user id, so an event addressed to
+``roles=['ADMIN']`` never reaches a nurse's dashboard.
+"""
+
+from asgiref.sync import sync_to_async
+from collections import deque
+from contextlib import asynccontextmanager
+from django.conf import settings
+from django.core.cache import cache
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger('zain_hms.events')
+
+
+class Subscription:
+    """One connected client: its identity and a bounded event queue"""
+
+    def __init__(self, user_id, role, queue_size):
+        self.user_id = user_id
+        self.role = role
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def wants(self, event: dict) -> bool:
+        users = event.get('users')
+        roles = event.get('roles')
+        if users and self.user_id in users:
+            return True
+        if roles and self.role in roles:
+            return True
+        return not users and not roles
+
+    def offer(self, event: dict):
+        """Queue an event, replacing the backlog with a resync marker if the client lags"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync', 'data': {}})
+
+
+class EventBroker:
+    """Cross-worker event log in the shared cache plus per-worker fan-out"""
+
+    SEQ_KEY = 'zain_hms:events:seq'
+    ITEM_KEY = 'zain_hms:events:item'
+    RETENTION = 300              # seconds an event stays readable in the log
+    MAX_BATCH = 200              # events read per poll
+    MISSING_GRACE = 2.0          # seconds to wait for an item whose seq was claimed
+    POLL_INTERVAL = getattr(settings, 'EVENT_STREAM_POLL_INTERVAL', 1.0)
+    QUEUE_SIZE = getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 100)
+
+    def __init__(self):
+        self._subscribers = set()
+        self._guard = threading.Lock()
+        self._loop = None
+        self._poller = None
+        self._last_seq = None
+        self._missing_since = None
+        self._delivered = deque(maxlen=1000)
+        self._local_seq = itertools.count(-1, -1)
+        self._enrichers = {}
+
+    # -- producers -------------------------------------------------------
+
+    def register_enricher(self, event_types: Iterable[str], func: Callable):
+        """
+        Register ``func(event) -> list[event]`` producing derived events.
+        Runs once per worker for each matching event, off the event loop.
+        """
+        for event_type in event_types:
+            self._enrichers.setdefault(event_type, []).append(func)
+
+    def _next_seq(self) -> Optional[int]:
+        for _ in range(2):
+            try:
+                return cache.incr(self.SEQ_KEY)
+            except ValueError:
+                cache.add(self.SEQ_KEY, 0, None)
+        return None
+
+    def publish(self, event_type: str, data: dict, roles: Iterable[str] = None,
+                users: Iterable[int] = None):
+        """Publish an event to every worker's subscribers (call after commit)"""
+        event = {
+            'type': event_type,
+            'data': data,
+            'roles': list(roles) if roles else None,
+            'users': list(users) if users else None,
+            'ts': time.time(),
+        }
+        try:
+            seq = self._next_seq()
+            if seq is not None:
+                cache.set(f"{self.ITEM_KEY}:{seq}", event, self.RETENTION)
+        except Exception as e:
+            logger.error(f"Event log write failed for {event_type}: {e}")
+            seq = None
+        # Without a shared counter (e.g. dummy cache) events stay worker-local
+        event['seq'] = seq if seq is not None else next(self._local_seq)
+
+        with self._guard:
+            self._delivered.append(event['seq'])
+            loop = self._loop
+        if loop is not None and self._subscribers:
+            try:
+                asyncio.run_coroutine_threadsafe(self._fanout(event), loop)
+            except RuntimeError:
+                pass
+
+    # -- fan-out ---------------------------------------------------------
+
+    def _enrich(self, event: dict) -> list:
+        derived = []
+        for func in self._enrichers.get(event['type'], []):
+            try:
+                derived.extend(func(event) or [])
+            except Exception as e:
+                logger.error(f"Event enricher {func.__name__} failed: {e}")
+        return derived
+
+    async def _fanout(self, event: dict):
+        events = [event]
+        if event['type'] in self._enrichers:
+            events += await sync_to_async(self._enrich, thread_sensitive=False)(event)
+        for item in events:
+            for subscriber in list(self._subscribers):
+                if subscriber.wants(item):
+                    subscriber.offer(item)
+
+    def _read_new(self) -> list:
+        """Read events other workers published since the last poll"""
+        current = cache.get(self.SEQ_KEY)
+        if current is None:
+            # Nothing published yet: everything from the first event on is new
+            self._last_seq = 0
+            return []
+        if self._last_seq is None or current < self._last_seq:
+            # First poll (or counter reset): start from now
+            self._last_seq = current
+            return []
+
+        upper = min(current, self._last_seq + self.MAX_BATCH)
+        seqs = list(range(self._last_seq + 1, upper + 1))
+        if not seqs:
+            return []
+        found = cache.get_many([f"{self.ITEM_KEY}:{seq}" for seq in seqs])
+
+        with self._guard:
+            delivered = set(self._delivered)
+        events = []
+        for seq in seqs:
+            event = found.get(f"{self.ITEM_KEY}:{seq}")
+            if event is None:
+                # Counter claimed but item not written yet - give the producer a moment
+                now = time.time()
+                if self._missing_since is None:
+                    self._missing_since = now
+                if now - self._missing_since < self.MISSING_GRACE:
+                    break
+            self._missing_since = None
+            self._last_seq = seq
+            if event is not None and seq not in delivered:
+                events.append(event)
+        return events
+
+    async def _poll(self):
+        while self._subscribers:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            try:
+                events = await sync_to_async(self._read_new, thread_sensitive=False)()
+            except Exception as e:
+                logger.error(f"Event log poll failed: {e}")
+                continue
+            for event in events:
+                await self._fanout(event)
+        self._poller = None
+
+    # -- subscribers -----------------------------------------------------
+
+    @asynccontextmanager
+    async def subscribe(self, user):
+        """Register a subscriber for the duration of a streaming response"""
+        subscription = Subscription(user.pk, getattr(user, 'role', None), self.QUEUE_SIZE)
+        with self._guard:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(subscription)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        try:
+            yield subscription
+        finally:
+            with self._guard:
+                self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+event_broker = EventBroker()
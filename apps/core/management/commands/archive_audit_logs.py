@@ -0,0 +1,38 @@
+# apps/core/management/commands/archive_audit_logs.py
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.retention import AuditRetention, RETENTION_SOURCES
+
+
+class Command(BaseCommand):
+    help = 'Archive audit rows past their retention period to compressed JSONL, then purge them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=list(RETENTION_SOURCES),
+            help='Only this audit table (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Override AUDIT_RETENTION_DAYS for this run',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the rows that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        results = AuditRetention.run(
+            labels=options['model'],
+            days=options['days'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would archive' if options['dry_run'] else 'Archived and purged'
+        for label, count in results.items():
+            self.stdout.write(self.style.SUCCESS(f'{verb} {count} {label} rows'))
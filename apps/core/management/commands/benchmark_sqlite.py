@@ -0,0 +1,174 @@
+# apps/core/management/commands/benchmark_sqlite.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+SCHEMA = [
+    'CREATE TABLE stock (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)',
+    'CREATE TABLE sale (id INTEGER PRIMARY KEY, receipt TEXT NOT NULL, total REAL NOT NULL, created_at REAL NOT NULL)',
+    'CREATE TABLE sale_item (id INTEGER PRIMARY KEY, sale_id INTEGER NOT NULL REFERENCES sale(id), '
+    'stock_id INTEGER NOT NULL, quantity INTEGER NOT NULL, price REAL NOT NULL)',
+    'CREATE INDEX sale_created_at ON sale (created_at)',
+]
+
+STOCK_ROWS = 200
+
+# Unconfigured Django/SQLite defaults vs the embedded production settings
+MODES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'process_lock': False},
+    'tuned': {'pragmas': None, 'begin': 'BEGIN IMMEDIATE', 'process_lock': True},
+}
+
+
+def _connect(path, mode):
+    connection = sqlite3.connect(path, timeout=20, isolation_level=None, check_same_thread=False)
+    for name, value in mode['pragmas'].items():
+        connection.execute(f'PRAGMA {name}={value}')
+    return connection
+
+
+def _write(connection, mode):
+    """One PoS checkout: a sale, three items, three stock decrements"""
+    connection.execute(mode['begin'])
+    try:
+        cursor = connection.execute(
+            'INSERT INTO sale (receipt, total, created_at) VALUES (?, ?, ?)',
+            (f'R{random.getrandbits(40):x}', random.uniform(5, 500), time.time()),
+        )
+        for stock_id in random.sample(range(1, STOCK_ROWS + 1), 3):
+            connection.execute(
+                'INSERT INTO sale_item (sale_id, stock_id, quantity, price) VALUES (?, ?, 1, ?)',
+                (cursor.lastrowid, stock_id, random.uniform(1, 100)),
+            )
+            connection.execute('UPDATE stock SET quantity = quantity - 1 WHERE id = ?', (stock_id,))
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def _read(connection):
+    """Dashboard-style read: today's takings"""
+    connection.execute(
+        'SELECT COUNT(*), SUM(total) FROM sale WHERE created_at >= ?', (time.time() - 3600,)
+    ).fetchone()
+
+
+def _worker(path, mode, threads, seconds, write_ratio, results):
+    """One gunicorn worker process: ``threads`` request threads sharing a write lock"""
+    write_lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latency': []}
+    stats_lock = threading.Lock()
+
+    def run():
+        connection = _connect(path, mode)
+        local = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latency': []}
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if random.random() < write_ratio:
+                    if mode['process_lock']:
+                        with write_lock:
+                            _write(connection, mode)
+                    else:
+                        _write(connection, mode)
+                    local['writes'] += 1
+                    local['write_latency'].append(time.perf_counter() - start)
+                else:
+                    _read(connection)
+                    local['reads'] += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                local['locked'] += 1
+        connection.close()
+        with stats_lock:
+            for key in ('reads', 'writes', 'locked'):
+                stats[key] += local[key]
+            stats['write_latency'].extend(local['write_latency'])
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(stats)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark SQLite PoS-style write throughput with concurrent gunicorn-like workers'
+
+    def add_arguments(self, parser):
+        # Defaults match docker/supervisord.prod.conf: --workers 4 --worker-class gthread --threads 2
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes')
+        parser.add_argument('--threads', type=int, default=2, help='Request threads per worker')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration per mode')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Fraction of requests that write')
+        parser.add_argument('--modes', default='default,tuned', help=f"Comma-separated: {', '.join(MODES)}")
+
+    def handle(self, *args, **options):
+        MODES['tuned']['pragmas'] = getattr(settings, 'SQLITE_PRAGMAS', {})
+        self.stdout.write(
+            f"{options['workers']} workers x {options['threads']} threads, "
+            f"{options['write_ratio']:.0%} writes, {options['seconds']:g}s per mode"
+        )
+
+        for name in options['modes'].split(','):
+            mode = MODES[name.strip()]
+            with tempfile.TemporaryDirectory() as scratch:
+                path = os.path.join(scratch, 'benchmark.sqlite3')
+                self._prepare(path, mode)
+                stats = self._run(path, mode, options)
+            self._report(name, stats, options['seconds'])
+
+    def _prepare(self, path, mode):
+        connection = _connect(path, mode)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO stock (id, quantity) VALUES (?, ?)', [(i, 10 ** 6) for i in range(1, STOCK_ROWS + 1)]
+        )
+        connection.close()
+
+    def _run(self, path, mode, options):
+        # fork, like gunicorn's worker model; children only use sqlite3
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(path, mode, options['threads'], options['seconds'], options['write_ratio'], results),
+            )
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        total = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latency': []}
+        for stats in collected:
+            for key in ('reads', 'writes', 'locked'):
+                total[key] += stats[key]
+            total['write_latency'].extend(stats['write_latency'])
+        return total
+
+    def _report(self, name, stats, seconds):
+        latency = sorted(stats['write_latency']) or [0]
+        p95 = latency[min(len(latency) - 1, int(len(latency) * 0.95))]
+        line = (
+            f"{name:>8}: {(stats['reads'] + stats['writes']) / seconds:8.0f} req/s  "
+            f"{stats['writes'] / seconds:7.0f} writes/s  "
+            f"write p50 {statistics.median(latency) * 1000:6.1f}ms  p95 {p95 * 1000:6.1f}ms  "
+            f"locked errors {stats['locked']}"
+        )
+        self.stdout.write(self.style.SUCCESS(line) if not stats['locked'] else self.style.WARNING(line))
@@ -16,17 +16,17 @@ class Command(BaseCommand):
         parser.add_argument(
             '--days',
             type=int,
-            default=30,
-            help='Number of days to keep logs (default: 30)',
+            help='Number of days to keep logs (default: 30 for log files, '
+                 'AUDIT_RETENTION_DAYS for --activity-logs)',
         )
         parser.add_argument(
             '--activity-logs',
             action='store_true',
-            help='Also cleanup old activity logs from database',
+            help='Also archive and purge audit logs past --days (or AUDIT_RETENTION_DAYS)',
         )
     
     def handle(self, *args, **options):
-        days_to_keep = options['days']
+        days_to_keep = options['days'] if options['days'] is not None else 30
         cutoff_date = datetime.now() - timedelta(days=days_to_keep)
         
         # Cleanup log files
@@ -50,18 +50,13 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f'Deleted {files_deleted} old log files')
             )
         
-        # Cleanup activity logs from database
+        # Archive, then purge, audit rows past their retention period
         if options['activity_logs']:
-            from apps.core.models import ActivityLog
+            from apps.core.retention import AuditRetention
             
-            old_logs = ActivityLog.objects.filter(
-                timestamp__lt=cutoff_date
-            )
-            count = old_logs.count()
-            old_logs.delete()
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'Deleted {count} old activity log entries')
-            )
+            for label, count in AuditRetention.run(days=options['days']).items():
+                self.stdout.write(
+                    self.style.SUCCESS(f'Archived and purged {count} old {label} entries')
+                )
         
         self.stdout.write(self.style.SUCCESS('Log cleanup completed'))
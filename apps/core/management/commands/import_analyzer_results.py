@@ -0,0 +1,43 @@
+# apps/core/management/commands/import_analyzer_results.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.laboratory.analyzer_import import PARSERS, AnalyzerResultImporter
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import lab analyzer result files (CSV or ASTM) into lab order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Analyzer export files')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='File format (detected when omitted)')
+        parser.add_argument('--user', help='Username recorded as the processing technician')
+        parser.add_argument(
+            '--overwrite-verified',
+            action='store_true',
+            help='Replace results that have already been verified'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user: {options['user']}")
+
+        for path in options['files']:
+            try:
+                handle = open(path, encoding='utf-8-sig', errors='replace', newline='')
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+            with handle:
+                summary = AnalyzerResultImporter(user, options['overwrite_verified']).run(handle, options['format'])
+
+            for error in summary['errors']:
+                self.stdout.write(self.style.WARNING(f'{path}: {error}'))
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: {summary['records']} results, {summary['updated']} items updated, "
+                f"{summary['abnormal']} abnormal, {summary['critical']} critical ({summary['alerts']} alerts), "
+                f"{summary['unmatched']} unmatched, {summary['skipped_verified']} already verified"
+            ))
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.patients.bulk_import import READERS, PatientImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import a patient registry (CSV or XLSX), writing rejected rows to a CSV report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Registry export (.csv or .xlsx)')
+        parser.add_argument('--format', choices=sorted(READERS), help='File format (from the extension when omitted)')
+        parser.add_argument('--user', help='Username recorded as the registering user')
+        parser.add_argument('--rejects', help='Rejected-rows report path (default: <file>.rejected.csv)')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user: {options['user']}")
+
+        path = options['file']
+        fmt = options['format'] or detect_format(path)
+        rejects_path = options['rejects'] or f'{path}.rejected.csv'
+        try:
+            handle = open(path, 'rb') if fmt == 'xlsx' else open(path, encoding='utf-8-sig', errors='replace', newline='')
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        with handle, open(rejects_path, 'w', encoding='utf-8', newline='') as rejects:
+            summary = PatientImporter(user, rejects).run(handle, fmt)
+
+        for error in summary['errors'][:10]:
+            self.stdout.write(self.style.WARNING(f'{path}: {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{path}: {summary['rows']} rows, {summary['imported']} patients imported, "
+            f"{summary['rejected']} rejected ({summary['duplicates']} duplicates)"
+        ))
+        if summary['rejected']:
+            self.stdout.write(f'Rejected rows: {rejects_path}')
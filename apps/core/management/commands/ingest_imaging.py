@@ -0,0 +1,31 @@
+# apps/core/management/commands/ingest_imaging.py
+from django.core.management.base import BaseCommand
+
+from apps.radiology.imaging import imaging_ingestor
+from apps.radiology.models import ImagingImage
+
+
+class Command(BaseCommand):
+    help = 'Ingest imaging uploads: parse DICOM headers and pre-render thumbnails/previews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--study', help='Only images of this study (UUID)')
+        parser.add_argument('--failed', action='store_true', help='Retry images whose ingest failed')
+        parser.add_argument('--all', action='store_true', help='Re-ingest every image (e.g. after a render change)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Images per batch')
+
+    def handle(self, *args, **options):
+        images = ImagingImage.objects.all()
+        if options['study']:
+            images = images.filter(study_id=options['study'])
+        if not options['all']:
+            images = images.filter(ingest_status__in=['PENDING', 'FAILED'] if options['failed'] else ['PENDING'])
+
+        ids = list(images.order_by('id').values_list('id', flat=True))
+        ready = 0
+        for offset in range(0, len(ids), options['batch_size']):
+            batch = ImagingImage.objects.filter(id__in=ids[offset:offset + options['batch_size']])
+            ready += imaging_ingestor.ingest(list(batch))
+            self.stdout.write(f"  {min(offset + options['batch_size'], len(ids))}/{len(ids)} images")
+
+        self.stdout.write(self.style.SUCCESS(f'Ingested {len(ids)} images, {ready} ready'))
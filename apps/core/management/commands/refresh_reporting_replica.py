@@ -0,0 +1,33 @@
+# apps/core/management/commands/refresh_reporting_replica.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from datetime import datetime
+import sqlite3
+
+from apps.core.db_routing import REPORTING_DB, reporting_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite default database into the reporting replica stand-in (online backup)'
+
+    def handle(self, *args, **options):
+        if not reporting_configured():
+            raise CommandError('No reporting database configured (set REPORTING_DB_NAME)')
+
+        source = connections['default']
+        target_settings = connections[REPORTING_DB].settings_dict
+        if source.vendor != 'sqlite' or target_settings['ENGINE'] != source.settings_dict['ENGINE']:
+            raise CommandError('Only SQLite installs use a copied replica; server databases replicate natively')
+
+        start_time = datetime.now()
+        source.ensure_connection()
+        connections[REPORTING_DB].close()
+
+        # sqlite3's online backup copies pages incrementally, so writers are never blocked for long
+        with sqlite3.connect(str(target_settings['NAME'])) as target:
+            source.connection.backup(target, pages=1024)
+
+        duration = (datetime.now() - start_time).total_seconds()
+        self.stdout.write(
+            self.style.SUCCESS(f'Reporting replica refreshed in {duration:.2f}s: {target_settings["NAME"]}')
+        )
@@ -0,0 +1,22 @@
+# apps/core/management/commands/replay_audit_spill.py
+from django.core.management.base import BaseCommand
+from apps.core.audit import audit_writer
+
+
+class Command(BaseCommand):
+    help = 'Write audit records spilled to disk (queue overflow, DB outage, shutdown) into the database'
+
+    def handle(self, *args, **options):
+        if not audit_writer.spill_path.exists():
+            self.stdout.write('No spilled audit records')
+            return
+
+        written = audit_writer.replay_spill()
+        if audit_writer.spill_path.exists():
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Replayed {written} audit records; some still fail and remain in {audit_writer.spill_path}'
+                )
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Replayed {written} audit records'))
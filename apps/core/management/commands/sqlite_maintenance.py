@@ -0,0 +1,32 @@
+# apps/core/management/commands/sqlite_maintenance.py
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.sqlite import is_sqlite, run_maintenance
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite WAL into the database file and run PRAGMA optimize'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+            default='TRUNCATE',
+            help='wal_checkpoint mode (TRUNCATE also shrinks the -wal file back to zero)'
+        )
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        if not is_sqlite(options['database']):
+            raise CommandError('The database is not SQLite; nothing to do')
+
+        result = run_maintenance(options['database'], options['mode'])
+        self.stdout.write(f"Journal mode: {result['journal_mode']}")
+        message = (
+            f"Checkpointed {result['checkpointed_pages']}/{result['wal_pages']} WAL pages "
+            f"in {result['duration']:.2f}s"
+        )
+        if result['busy']:
+            self.stdout.write(self.style.WARNING(f'{message} (readers still active; run again later)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,30 @@
+# apps/core/management/commands/stock_snapshot.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from apps.pharmacy.inventory import BatchInventory
+
+
+class Command(BaseCommand):
+    help = 'Snapshot pharmacy stock on hand per medicine (or report stock on hand at a date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help='Report stock on hand at the end of this date (YYYY-MM-DD) instead')
+        parser.add_argument('--no-prune', action='store_true', help='Keep snapshots older than the retention period')
+
+    def handle(self, *args, **options):
+        if options['at']:
+            day = parse_date(options['at'])
+            on_hand = BatchInventory.on_hand_at(day)
+            self.stdout.write(
+                f"{len(on_hand)} medicines, {sum(on_hand.values())} units on hand at end of {day:%Y-%m-%d}"
+            )
+            return
+
+        count = BatchInventory.take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted stock for {count} medicines'))
+        if not options['no_prune']:
+            deleted = BatchInventory.prune_snapshots(getattr(settings, 'PHARMACY_SNAPSHOT_RETENTION_DAYS', 400))
+            if deleted:
+                self.stdout.write(f'Pruned {deleted} old snapshots')
@@ -2,10 +2,8 @@ from django.core.management.base import BaseCommand
 from django.core.cache import cache
 from django.db import connection
 from apps.core.performance import warm_dashboard_cache, warm_system_cache
-from apps.patients.models import Patient
-from apps.appointments.models import Appointment
-from apps.doctors.models import Doctor
-from datetime import datetime, timedelta
+from apps.core.tiered_cache import TieredCache
+from datetime import datetime
 import logging
 
 logger = logging.getLogger('zain_hms.management')
@@ -67,22 +65,8 @@ class Command(BaseCommand):
         if verbose:
             self.stdout.write('  📊 Warming dashboard cache...')
         
-        # Cache key statistics
-        stats = {
-            'patients': Patient.objects.count(),
-            'appointments': Appointment.objects.count(),
-            'doctors': Doctor.objects.count(),
-        }
-        
-        cache.set('zain_hms:dashboard:stats', stats, 3600)
-        
-        # Cache today's appointments
-        today = datetime.now().date()
-        today_appointments = Appointment.objects.filter(
-            appointment_date=today
-        ).select_related('patient', 'doctor').count()
-        
-        cache.set('zain_hms:dashboard:today_appointments', today_appointments, 1800)
+        # Populate the same two-tier entries the dashboards read
+        warm_dashboard_cache()
         
         if verbose:
             self.stdout.write('    ✓ Dashboard cache warmed')
@@ -102,25 +86,12 @@ class Command(BaseCommand):
         if verbose:
             self.stdout.write('  📈 Warming analytics cache...')
         
-        # Cache monthly trends
-        trends = []
-        today = datetime.now().date()
-        
-        for i in range(6):
-            month_start = today.replace(day=1) - timedelta(days=i*30)
-            month_end = month_start + timedelta(days=30)
-            
-            count = Appointment.objects.filter(
-                appointment_date__gte=month_start,
-                appointment_date__lt=month_end
-            ).count()
-            
-            trends.append({
-                'month': month_start.strftime('%B %Y'),
-                'appointments': count
-            })
+        from apps.analytics.views import _get_department_statistics, _get_appointment_trends
         
-        cache.set('zain_hms:analytics:trends', trends, 1800)
+        TieredCache.refresh('analytics:department_stats', _get_department_statistics,
+                            timeout=900, tags=['appointments'])
+        TieredCache.refresh('analytics:appointment_trends', _get_appointment_trends,
+                            timeout=1800, tags=['appointments'])
         
         if verbose:
             self.stdout.write('    ✓ Analytics cache warmed')
\ No newline at end of file
@@ -11,6 +11,7 @@ from .middleware import (
     SecurityHeadersMiddleware,
     RateLimitMiddleware,
     LoginAttemptMiddleware,
+    ReplicaStickinessMiddleware,
 )
 
 from .security import (
@@ -31,6 +32,7 @@ __all__ = [
     'SecurityHeadersMiddleware',
     'RateLimitMiddleware',
     'LoginAttemptMiddleware',
+    'ReplicaStickinessMiddleware',
     'EnterpriseSecurityMiddleware',
     'SecurityLoginAttemptMiddleware',
 ]
@@ -22,6 +22,10 @@ from cryptography.fernet import Fernet
 import os
 from django_otp import user_has_device
 
+from apps.core import db_routing
+from apps.core.audit import audit_writer
+from apps.core.session_activity import SessionActivity
+
 # Configure audit logger
 audit_logger = logging.getLogger('zain_hms.audit')
 security_logger = logging.getLogger('django.security')
@@ -277,9 +281,20 @@ class HealthcareComplianceMiddleware(MiddlewareMixin):
                 return HttpResponseForbidden("Authentication required for PHI access")
                 
             # Log PHI access for HIPAA compliance
+            ip = self._get_client_ip(request)
             audit_logger.info(
                 f"PHI_ACCESS user={request.user.id} path={request.path} "
-                f"ip={self._get_client_ip(request)} timestamp={datetime.now().isoformat()}"
+                f"ip={ip} timestamp={datetime.now().isoformat()}"
+            )
+            audit_writer.submit(
+                'core.ActivityLog',
+                user_id=request.user.pk,
+                action='VIEW',
+                model_name='PHI',
+                object_repr=request.path[:200],
+                changes={'method': request.method},
+                ip_address=ip,
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
             )
             
         return None
@@ -370,33 +385,30 @@ class SessionTimeoutMiddleware(MiddlewareMixin):
         if not request.user.is_authenticated:
             return None
             
-        current_time = time.time()
-        last_activity = request.session.get('last_activity')
+        time_since_activity = SessionActivity.idle_seconds(request)
         
-        if last_activity:
-            time_since_activity = current_time - last_activity
+        if time_since_activity > self.timeout_seconds:
+            # Log session timeout
+            audit_logger.info(
+                f"SESSION_TIMEOUT user={request.user.id} "
+                f"inactive_time={time_since_activity:.0f}s "
+                f"ip={self._get_client_ip(request)}"
+            )
             
-            if time_since_activity > self.timeout_seconds:
-                # Log session timeout
-                audit_logger.info(
-                    f"SESSION_TIMEOUT user={request.user.id} "
-                    f"inactive_time={time_since_activity:.0f}s "
-                    f"ip={self._get_client_ip(request)}"
-                )
+            # Clear session and logout user
+            SessionActivity.forget(request)
+            logout(request)
                 
-                # Clear session and logout user
-                logout(request)
+            if request.headers.get('Content-Type') == 'application/json':
+                return JsonResponse({
+                    'error': 'Session expired due to inactivity',
+                    'redirect': '/accounts/login/'
+                }, status=401)
+            else:
+                return redirect('/accounts/login/?timeout=1')
                 
-                if request.headers.get('Content-Type') == 'application/json':
-                    return JsonResponse({
-                        'error': 'Session expired due to inactivity',
-                        'redirect': '/accounts/login/'
-                    }, status=401)
-                else:
-                    return redirect('/accounts/login/?timeout=1')
-                    
-        # Update last activity time
-        request.session['last_activity'] = current_time
+        # Update last activity time (cache every request, session once per flush interval)
+        SessionActivity.touch(request)
         
         return None
         
@@ -502,16 +514,28 @@ class ActivityLogMiddleware(MiddlewareMixin):
             
             action = action_map.get(request.method, 'UNKNOWN')
             
-            # Extract model name from path
-            path_parts = request.path.strip('/').split('/')
+            # Extract model name from path (skipping the i18n language prefix)
+            path_parts = [part for part in request.path.strip('/').split('/') if part]
+            if path_parts and path_parts[0] in dict(settings.LANGUAGES):
+                path_parts = path_parts[1:]
             model_name = path_parts[0] if path_parts else 'unknown'
             
-            # Log activity (you may want to create ActivityLog model for single hospital)
             audit_logger.info(
                 f"USER_ACTIVITY user={request.user.id} action={action} "
                 f"model={model_name.title()} path={request.path} "
                 f"ip={ip_address} status={response.status_code}"
             )
+            # Queued for the background writer - no insert on the request path
+            audit_writer.submit(
+                'core.ActivityLog',
+                user_id=request.user.pk,
+                action=action,
+                model_name=model_name.title()[:100],
+                object_repr=request.path[:200],
+                changes={'method': request.method, 'status': response.status_code},
+                ip_address=ip_address.strip(),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            )
             
         except Exception as e:
             # Don't let logging errors break the request
@@ -712,3 +736,37 @@ class HospitalMiddleware(MiddlewareMixin):
     def process_request(self, request):
         # Placeholder for hospital-specific middleware logic
         return None
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """
+    Keep a browser's reads on the primary database for a short window after
+    it wrote, so reports routed to the reporting replica never miss the
+    user's own changes (see apps.core.db_routing)
+    """
+    
+    COOKIE_NAME = 'zain_primary_until'
+    
+    def process_request(self, request):
+        try:
+            primary_until = float(request.COOKIES.get(self.COOKIE_NAME, 0))
+        except ValueError:
+            primary_until = 0
+        request._db_routing_tokens = db_routing.begin_request(pinned=time.time() < primary_until)
+        return None
+    
+    def process_response(self, request, response):
+        if db_routing.wrote_in_request():
+            sticky_seconds = getattr(settings, 'REPORTING_STICKY_SECONDS', 10)
+            response.set_cookie(
+                self.COOKIE_NAME,
+                f"{time.time() + sticky_seconds:.3f}",
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        tokens = getattr(request, '_db_routing_tokens', None)
+        if tokens is not None:
+            db_routing.end_request(tokens)
+        return response
@@ -20,6 +20,8 @@ from django.utils import timezone
 import hashlib
 import socket
 
+from apps.core.session_activity import SessionActivity
+
 
 # Security audit logger
 security_logger = logging.getLogger('zain_hms.security')
@@ -190,15 +192,13 @@ class EnterpriseSecurityMiddleware(MiddlewareMixin):
         if not hasattr(request, 'session'):
             return False
         
-        # Check session timeout
-        last_activity = request.session.get('last_activity')
-        if last_activity:
-            session_timeout = getattr(settings, 'SESSION_TIMEOUT', 3600)  # 1 hour default
-            if time.time() - last_activity > session_timeout:
-                security_logger.warning(
-                    f"Session timeout for user {request.user.username} from IP {self._get_client_ip(request)}"
-                )
-                return False
+        # Check session timeout (last-seen comes from the coalesced activity tracker)
+        session_timeout = getattr(settings, 'SESSION_TIMEOUT', 3600)  # 1 hour default
+        if SessionActivity.is_expired(request, session_timeout):
+            security_logger.warning(
+                f"Session timeout for user {request.user.username} from IP {self._get_client_ip(request)}"
+            )
+            return False
         
         # Check IP consistency (prevent session hijacking)
         session_ip = request.session.get('session_ip')
@@ -281,10 +281,11 @@ class EnterpriseSecurityMiddleware(MiddlewareMixin):
     
     def _handle_invalid_session(self, request):
         """Handle invalid session"""
+        SessionActivity.forget(request)
         logout(request)
         messages.error(request, 'Your session has expired. Please log in again.')
         
-        if request.is_ajax():
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'error': 'Session expired',
                 'redirect': reverse('accounts:login')
@@ -312,9 +313,9 @@ class EnterpriseSecurityMiddleware(MiddlewareMixin):
         return HttpResponseForbidden('Too many failed attempts. Access temporarily blocked.')
     
     def _update_last_activity(self, request):
-        """Update user's last activity timestamp"""
+        """Update user's last activity timestamp (the session is saved at most once per flush interval)"""
         if hasattr(request, 'session'):
-            request.session['last_activity'] = time.time()
+            SessionActivity.touch(request)
     
     def _add_security_headers(self, request):
         """Add security-related request headers"""
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_activity_log_event_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100)),
+                ('partition_date', models.DateField()),
+                ('path', models.CharField(help_text='Archive file, relative to AUDIT_ARCHIVE_ROOT', max_length=500)),
+                ('row_count', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('purged_at', models.DateTimeField(blank=True, help_text='When the archived rows were deleted', null=True)),
+            ],
+            options={
+                'ordering': ['model_label', 'partition_date'],
+                'indexes': [models.Index(fields=['model_label', 'partition_date'], name='core_audita_model_l_75e399_idx')],
+            },
+        ),
+    ]
@@ -45,7 +45,8 @@ class ActivityLog(models.Model):
     changes = models.JSONField(default=dict, blank=True)
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the producer, not at insert time - rows are written by apps.core.audit in batches
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-timestamp']
@@ -58,6 +59,28 @@ class ActivityLog(models.Model):
         return f"{self.user} {self.action} {self.model_name} at {self.timestamp}"
 
 
+
+class AuditArchive(models.Model):
+    """Manifest entry for one archived partition (one model, one day) of an audit table"""
+    model_label = models.CharField(max_length=100)
+    partition_date = models.DateField()
+    path = models.CharField(max_length=500, help_text="Archive file, relative to AUDIT_ARCHIVE_ROOT")
+    row_count = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    purged_at = models.DateTimeField(null=True, blank=True, help_text="When the archived rows were deleted")
+    
+    class Meta:
+        ordering = ['model_label', 'partition_date']
+        indexes = [
+            models.Index(fields=['model_label', 'partition_date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.model_label} {self.partition_date} ({self.row_count} rows)"
+
 class SystemConfiguration(models.Model):
     """System-wide configuration settings"""
     
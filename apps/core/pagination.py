@@ -0,0 +1,411 @@
+# ZAIN HMS Keyset Pagination
+"""
+Keyset (cursor) pagination for large list views and DRF APIs.
+
+OFFSET pagination reads and discards every row before the requested page,
+so deep pages get slower as tables grow, and each page also pays for a
+``COUNT(*)``. Keyset pagination instead remembers the sort key of the last
+row shown and asks for rows strictly after it, which an index on the same
+columns answers directly no matter how deep the page is.
+
+* ``KeysetPaginator`` - core logic: ordering, cursor encoding, page fetch.
+* ``KeysetPaginationMixin`` - drop-in for ``ListView`` (keeps ``page_obj``,
+  ``paginator`` and ``is_paginated`` in the context).
+* ``KeysetPagination`` - DRF pagination class. A keyset needs the fixed
+  ``keyset_ordering``, so a request sorted by the client (``?ordering=`` on
+  a view with ``OrderingFilter``) is paged with page numbers instead.
+
+Totals are approximate: they come from a cached rollup (see
+``approximate_count``) invalidated through cache tags, never from a count
+run on every page.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+import datetime
+import hashlib
+import json
+import logging
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from typing import Iterable, Optional, Sequence
+
+from .tiered_cache import TieredCache
+
+logger = logging.getLogger('zain_hms.performance')
+
+CURSOR_PARAM = 'cursor'
+COUNT_TIMEOUT = 300                 # seconds a cached rollup count is reused
+ESTIMATE_THRESHOLD = 100000         # above this, unfiltered PostgreSQL counts use planner stats
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision - DjangoJSONEncoder truncates to milliseconds"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded against the paginator's ordering"""
+
+
+def approximate_count(queryset, tags: Iterable[str] = (), timeout: int = COUNT_TIMEOUT) -> int:
+    """
+    Row count for ``queryset`` served from a cached rollup.
+
+    The count is computed at most once per ``timeout`` (and per tag version,
+    so a model change bumps it). Unfiltered counts on large PostgreSQL tables
+    use the planner's row estimate instead of scanning the table.
+    """
+    model = queryset.model
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except Exception:
+        # EmptyResultSet and friends
+        return 0
+    digest = hashlib.md5(f"{sql}|{params}".encode(), usedforsecurity=False).hexdigest()
+    key = f"count:{model._meta.label_lower}:{digest}"
+
+    def compute():
+        if not queryset.query.where:
+            estimate = _estimated_table_rows(queryset)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return queryset.count()
+
+    try:
+        return TieredCache.get_or_set(key, compute, timeout=timeout, tags=list(tags))
+    except Exception as e:
+        logger.error(f"Approximate count failed for {model._meta.label}: {e}")
+        return 0
+
+
+def _estimated_table_rows(queryset) -> Optional[int]:
+    """Planner row estimate for the queryset's table (PostgreSQL only)"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class KeysetPage:
+    """One page of keyset results, quacking like ``django.core.paginator.Page`` where it can"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by an ordered, unique key.
+
+    ``ordering`` uses ``order_by`` syntax and must end in a unique column
+    (normally ``id``) so ties are broken deterministically, e.g.
+    ``('-registration_date', '-id')``. Nullable columns sort last in both
+    directions.
+
+    Cursors are opaque url-safe tokens holding the key of the row at the
+    page edge and the direction to move in. Two special cursors exist:
+    no cursor is the first page, and ``KeysetPaginator.LAST`` the last one.
+    """
+
+    LAST = 'last'
+
+    def __init__(self, queryset, per_page: int, ordering: Sequence[str],
+                 count_tags: Iterable[str] = ()):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.count_tags = list(count_tags)
+        self.fields = []
+        for item in ordering:
+            name = item.lstrip('-')
+            meta = queryset.model._meta
+            field = meta.pk if name == 'pk' else meta.get_field(name)
+            self.fields.append((name, item.startswith('-'), field))
+        self._count = None
+
+    # -- cursor encoding ---------------------------------------------------
+
+    def _row_key(self, obj) -> list:
+        return [getattr(obj, field.attname) for _, _, field in self.fields]
+
+    def encode_cursor(self, values, reverse: bool = False) -> str:
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=_CursorEncoder,
+                             separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str):
+        """Return ``(values, reverse)``; ``values`` is None for the first/last page"""
+        if cursor == self.LAST:
+            return None, True
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()).decode())
+            raw = payload['v']
+            reverse = bool(payload.get('r'))
+            if len(raw) != len(self.fields):
+                raise ValueError('cursor does not match ordering')
+            values = [None if value is None else field.to_python(value)
+                      for value, (_, _, field) in zip(raw, self.fields)]
+        except Exception as e:
+            raise InvalidCursor(str(e))
+        return values, reverse
+
+    # -- query building ------------------------------------------------------
+
+    def _order_by(self, reverse: bool) -> list:
+        expressions = []
+        for name, descending, field in self.fields:
+            expr = F(name)
+            ascending = descending if reverse else not descending
+            if field.null:
+                # Nulls sit at the end of the forward order, the start of the reverse one
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+                expressions.append(expr.asc(**nulls) if ascending else expr.desc(**nulls))
+            else:
+                expressions.append(expr.asc() if ascending else expr.desc())
+        return expressions
+
+    def _after(self, name, descending, field, value, reverse) -> Q:
+        """Rows strictly past ``value`` on one column, in the direction of travel"""
+        forward_lookup = 'lt' if descending else 'gt'
+        backward_lookup = 'gt' if descending else 'lt'
+        if not reverse:
+            if value is None:
+                return Q(pk__in=[])
+            condition = Q(**{f'{name}__{forward_lookup}': value})
+            if field.null:
+                condition |= Q(**{f'{name}__isnull': True})
+            return condition
+        if value is None:
+            return Q(**{f'{name}__isnull': False})
+        return Q(**{f'{name}__{backward_lookup}': value})
+
+    @staticmethod
+    def _equal(name, value) -> Q:
+        return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+    def _keyset_filter(self, values, reverse: bool) -> Q:
+        """(a > x) OR (a = x AND b > y) OR ... for the whole key"""
+        condition = Q(pk__in=[])
+        prefix = Q()
+        for (name, descending, field), value in zip(self.fields, values):
+            condition |= prefix & self._after(name, descending, field, value, reverse)
+            prefix &= self._equal(name, value)
+        return condition
+
+    # -- public API ------------------------------------------------------------
+
+    @property
+    def count(self) -> int:
+        """Approximate total from the cached rollup"""
+        if self._count is None:
+            self._count = approximate_count(self.queryset, self.count_tags)
+        return self._count
+
+    def page(self, cursor: Optional[str] = None) -> KeysetPage:
+        values, reverse = (None, False) if not cursor else self.decode_cursor(cursor)
+
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        # Moving forward, rows behind us exist iff we started from a cursor;
+        # the extra row fetched tells whether there are more ahead (and vice versa)
+        more_ahead, more_behind = (values is not None, has_more) if reverse else (has_more, values is not None)
+        next_cursor = previous_cursor = None
+        if rows and more_ahead:
+            next_cursor = self.encode_cursor(self._row_key(rows[-1]))
+        if rows and more_behind:
+            previous_cursor = self.encode_cursor(self._row_key(rows[0]), reverse=True)
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Keyset pagination for ``ListView``.
+
+    Set ``keyset_ordering`` (ending in a unique column) and optionally
+    ``keyset_count_tags`` - the cache tags that invalidate the rollup count.
+    The template context keeps ``paginator``/``page_obj``/``is_paginated``;
+    ``page_obj`` also exposes ``next_query``/``previous_query``/``first_query``/
+    ``last_query`` (the current query string with the cursor swapped) for
+    ``components/keyset_pagination.html``.
+    """
+
+    keyset_ordering = ('-pk',)
+    keyset_count_tags = ()
+    cursor_param = CURSOR_PARAM
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering,
+                                    count_tags=self.keyset_count_tags)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidCursor:
+            # Stale or hand-edited link: fall back to the first page
+            page = paginator.page()
+        self._attach_queries(page)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def _attach_queries(self, page):
+        page.next_query = self._query_with_cursor(page.next_cursor)
+        page.previous_query = self._query_with_cursor(page.previous_cursor)
+        page.first_query = self._query_with_cursor(None)
+        page.last_query = self._query_with_cursor(KeysetPaginator.LAST)
+
+    def _query_with_cursor(self, cursor):
+        params = self.request.GET.copy()
+        params.pop(self.cursor_param, None)
+        params.pop('page', None)
+        if cursor:
+            params[self.cursor_param] = cursor
+        return params.urlencode()
+
+
+def keyset_paginate(request, queryset, per_page, ordering, count_tags=()):
+    """Function-view counterpart of ``KeysetPaginationMixin``; returns the page"""
+    helper = KeysetPaginationMixin()
+    helper.request = request
+    helper.keyset_ordering = ordering
+    helper.keyset_count_tags = count_tags
+    return helper.paginate_queryset(queryset, per_page)[1]
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF keyset pagination. The view may set ``keyset_ordering`` and
+    ``keyset_count_tags``; ``page_size`` can be lowered or raised up to
+    ``max_page_size`` with ``?page_size=``.
+
+    When the view's ``OrderingFilter`` applies a valid ``?ordering=``, the
+    keyset would override it, so that request is paged with ``?page=``
+    numbers in the client's order instead (ties broken by pk), with an exact
+    count and ``count_is_approximate: false``.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = CURSOR_PARAM
+    ordering = ('-pk',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def client_ordering(queryset, request, view):
+        """The valid ``?ordering=`` terms the view's OrderingFilter applies, if any"""
+        for backend in getattr(view, 'filter_backends', ()):
+            if isinstance(backend, type) and issubclass(backend, OrderingFilter):
+                params = request.query_params.get(backend.ordering_param)
+                if params:
+                    terms = [param.strip() for param in params.split(',')]
+                    return backend().remove_invalid_fields(queryset, terms, view, request)
+        return []
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset = None
+        if self.client_ordering(queryset, request, view):
+            self.offset = PageNumberPagination()
+            self.offset.page_size = self.get_page_size(request)
+            self.offset.page_size_query_param = None
+            # A stable order, or rows could repeat or go missing between pages
+            return self.offset.paginate_queryset(queryset.order_by(*queryset.query.order_by, 'pk'),
+                                                 request, view)
+
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        tags = getattr(view, 'keyset_count_tags', ())
+        self.paginator = KeysetPaginator(queryset, self.get_page_size(request), ordering,
+                                         count_tags=tags)
+        try:
+            self.page = self.paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page.object_list)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if self.offset is not None:
+            return Response({
+                'count': self.offset.page.paginator.count,
+                'count_is_approximate': False,
+                'next': self.offset.get_next_link(),
+                'previous': self.offset.get_previous_link(),
+                'results': data,
+            })
+        return Response({
+            'count': self.paginator.count,
+            'count_is_approximate': True,
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'count_is_approximate': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -9,6 +9,8 @@ import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 
+from .cache_tags import TagCache, cached
+
 logger = logging.getLogger('zain_hms.performance')
 
 class PerformanceMonitor:
@@ -89,49 +91,42 @@ class CacheManager:
         return f"zain_hms:{prefix}:{':'.join(key_parts)}"
     
     @classmethod
-    def cache_result(cls, cache_type: str, key_parts: list, timeout: Optional[int] = None):
-        """Decorator for caching function results"""
-        def decorator(func):
-            @wraps(func)
-            def wrapper(*args, **kwargs):
-                # Generate cache key
-                cache_key = cls.get_cache_key(cache_type, *key_parts)
-                
-                # Try to get from cache
-                cached_result = cache.get(cache_key)
-                if cached_result is not None:
-                    logger.debug(f"Cache hit for {cache_key}")
-                    return cached_result
-                
-                # Execute function and cache result
-                result = func(*args, **kwargs)
-                cache_timeout = timeout or cls.CACHE_TIMEOUTS.get(cache_type, 300)
-                cache.set(cache_key, result, cache_timeout)
-                logger.debug(f"Cache set for {cache_key} (timeout: {cache_timeout}s)")
-                
-                return result
-            return wrapper
-        return decorator
+    def cache_result(cls, cache_type: str, key_parts: list, timeout: Optional[int] = None,
+                     tags: Optional[list] = None):
+        """
+        Decorator for caching function results.
+        The key covers ``key_parts`` plus the call arguments, and is bound to
+        ``tags`` (defaults to ``cache_type``) so ``invalidate_pattern`` or a
+        model signal can drop it with a single version bump.
+        """
+        cache_timeout = timeout or cls.CACHE_TIMEOUTS.get(cache_type, 300)
+        prefix = ':'.join([cache_type] + [str(part) for part in key_parts])
+        return cached(prefix, tags=tags or [cache_type], timeout=cache_timeout)
     
     @classmethod
     def invalidate_pattern(cls, pattern: str):
-        """Invalidate cache keys matching a pattern"""
+        """Invalidate every cache entry tagged with ``pattern`` (single INCR, no key scan)"""
         try:
-            from django_redis import get_redis_connection
-            redis_conn = get_redis_connection("default")
-            keys = redis_conn.keys(f"zain_hms:{pattern}:*")
-            if keys:
-                redis_conn.delete(*keys)
-                logger.info(f"Invalidated {len(keys)} cache keys matching pattern: {pattern}")
+            TagCache.invalidate(pattern)
+            logger.info(f"Invalidated cache tag: {pattern}")
         except Exception as e:
             logger.error(f"Cache invalidation failed: {e}")
     
+    @classmethod
+    def user_tags(cls, user_id: int) -> list:
+        """Cache tags scoped to one user, as bumped by apps.core.signals.CACHE_TAG_RULES"""
+        from django.apps import apps
+        tags = [f"staff:{user_id}", f"notifications:user:{user_id}", f"pos:cashier:{user_id}"]
+        # A doctor's own schedule views are tagged by the doctor record, not the user
+        doctors = apps.get_model('doctors', 'Doctor').objects.filter(user_id=user_id).values_list('pk', flat=True)
+        tags.extend(f"appointments:doctor:{doctor_id}" for doctor_id in doctors)
+        return tags
+
     @classmethod
     def clear_user_cache(cls, user_id: int):
         """Clear all cache entries for a specific user"""
-        patterns = ['dashboard_stats', 'patient_list', 'appointments']
-        for pattern in patterns:
-            cls.invalidate_pattern(f"{pattern}:user_{user_id}")
+        for tag in cls.user_tags(user_id):
+            cls.invalidate_pattern(tag)
 
 class DatabaseOptimizer:
     """Database query optimization utilities"""
@@ -192,23 +187,18 @@ class PerformanceMiddleware:
 # Cache warming functions
 def warm_dashboard_cache():
     """Pre-warm dashboard cache with frequently accessed data"""
-    from apps.patients.models import Patient
-    from apps.appointments.models import Appointment
-    from apps.doctors.models import Doctor
+    from apps.dashboard.services import DashboardMetricsService, DashboardChartService
     
     logger.info("Warming dashboard cache...")
     
-    # Cache counts
-    cache.set('zain_hms:dashboard:patient_count', Patient.objects.count(), 3600)
-    cache.set('zain_hms:dashboard:appointment_count', Appointment.objects.count(), 3600)
-    cache.set('zain_hms:dashboard:doctor_count', Doctor.objects.count(), 3600)
-    
-    # Cache today's appointments
-    today = datetime.now().date()
-    today_appointments = Appointment.objects.filter(
-        appointment_date=today
-    ).select_related('patient', 'doctor').count()
-    cache.set('zain_hms:dashboard:today_appointments', today_appointments, 1800)
+    # Fill the two-tier entries read by the dashboards and their HTMX partials
+    DashboardMetricsService.get_patient_metrics()
+    DashboardMetricsService.get_appointment_metrics()
+    DashboardMetricsService.get_revenue_metrics()
+    DashboardMetricsService.get_staff_metrics()
+    DashboardChartService.get_revenue_chart_data(7)
+    DashboardChartService.get_appointments_chart_data(7)
+    DashboardChartService.get_patient_registration_chart_data(7)
     
     logger.info("Dashboard cache warmed successfully")
 
@@ -0,0 +1,228 @@
+# ZAIN HMS Audit Retention
+"""
+Archive-then-purge retention for the audit tables.
+
+Rows older than a table's retention period are moved out of the database one
+day-partition at a time:
+
+1. the partition is streamed (``QuerySet.iterator()`` - a server-side cursor
+   on PostgreSQL) into a gzip-compressed JSONL file under
+   ``AUDIT_ARCHIVE_ROOT/<model>/<YYYY>/<MM>/``, written to a temporary name,
+   fsynced and renamed into place;
+2. an ``AuditArchive`` manifest row records the file, its SHA-256, row count
+   and time span;
+3. only then are the archived rows deleted, in small primary-key chunks with
+   a pause between them so the table is never locked for long.
+
+A run interrupted between 2 and 3 is finished by the next run, from the
+primary keys in the archive file. ``AuditArchiveReader`` re-queries archived
+ranges for compliance audits.
+"""
+
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pathlib import Path
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from .batching import json_default
+from .models import AuditArchive
+
+logger = logging.getLogger('zain_hms.audit')
+
+# Model label -> the field rows are aged by
+RETENTION_SOURCES = {
+    'core.ActivityLog': 'timestamp',
+    'apps_dashboard.ActivityLog': 'timestamp',
+    'notifications.DeliveryLog': 'timestamp',
+    'communications.CommunicationLog': 'sent_at',
+}
+
+
+class ArchiveIntegrityError(Exception):
+    """An archive file is missing or does not match its manifest checksum"""
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archive_root():
+    return Path(getattr(settings, 'AUDIT_ARCHIVE_ROOT', Path(settings.BASE_DIR) / 'archive'))
+
+
+class AuditRetention:
+    """Archive and purge audit rows past their retention period"""
+
+    READ_CHUNK = getattr(settings, 'AUDIT_ARCHIVE_READ_CHUNK', 2000)
+    DELETE_CHUNK = getattr(settings, 'AUDIT_RETENTION_DELETE_CHUNK', 500)
+    DELETE_PAUSE = getattr(settings, 'AUDIT_RETENTION_DELETE_PAUSE', 0.2)
+
+    @staticmethod
+    def retention_days(label):
+        return getattr(settings, 'AUDIT_RETENTION_DAYS', {}).get(label, 365)
+
+    @classmethod
+    def run(cls, labels=None, days=None, dry_run=False):
+        """Archive and purge every source (or ``labels``); returns ``{label: rows}``"""
+        results = {}
+        for label in labels or RETENTION_SOURCES:
+            cutoff = timezone.now() - timedelta(days=days if days is not None else cls.retention_days(label))
+            results[label] = cls.archive(label, cutoff, dry_run=dry_run)
+        return results
+
+    @classmethod
+    def archive(cls, label, cutoff, dry_run=False):
+        """Archive and purge ``label`` rows older than ``cutoff``; returns the number archived"""
+        model = apps.get_model(label)
+        field = RETENTION_SOURCES[label]
+        expired = model._default_manager.filter(**{f'{field}__lt': cutoff})
+
+        if dry_run:
+            return expired.count()
+
+        # Finish purges a previous run archived but did not get to
+        for manifest in AuditArchive.objects.filter(model_label=label, purged_at__isnull=True):
+            cls.purge(manifest)
+
+        archived = 0
+        while True:
+            oldest = expired.order_by(field).values_list(field, flat=True).first()
+            if oldest is None:
+                break
+            day = oldest.astimezone(dt_timezone.utc).date()
+            start = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+            end = min(start + timedelta(days=1), cutoff)
+
+            manifest = cls._archive_partition(model, label, field, day, start, end)
+            if manifest is None:
+                continue
+            archived += manifest.row_count
+            if cls.purge(manifest) < manifest.row_count:
+                # Something kept rows alive (e.g. a new FK); stop rather than re-archive them
+                logger.warning(f"Retention: {manifest} was not fully purged, stopping {label}")
+                break
+
+        if archived:
+            logger.info(f"Retention: archived and purged {archived} {label} rows older than {cutoff:%Y-%m-%d}")
+        return archived
+
+    @classmethod
+    def _archive_partition(cls, model, label, field, day, start, end):
+        rows = (
+            model._default_manager
+            .filter(**{f'{field}__gte': start, f'{field}__lt': end})
+            .order_by(field, 'pk')
+            .values()
+            .iterator(chunk_size=cls.READ_CHUNK)
+        )
+
+        relative = Path(label) / f"{day:%Y}" / f"{day:%m}" / f"{day:%Y-%m-%d}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        path = archive_root() / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + '.part')
+
+        count = 0
+        first = last = None
+        with open(partial, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as archive:
+                for row in rows:
+                    archive.write(json.dumps(row, default=json_default))
+                    archive.write('\n')
+                    count += 1
+                    first = first or row[field]
+                    last = row[field]
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        if not count:
+            partial.unlink()
+            return None
+
+        os.replace(partial, path)
+        return AuditArchive.objects.create(
+            model_label=label,
+            partition_date=day,
+            path=relative.as_posix(),
+            row_count=count,
+            sha256=_file_sha256(path),
+            first_timestamp=first,
+            last_timestamp=last,
+        )
+
+    @classmethod
+    def purge(cls, manifest):
+        """Delete the rows recorded in ``manifest`` from the live table, in small chunks"""
+        model = apps.get_model(manifest.model_label)
+        pk_name = model._meta.pk.attname
+        pk_field = model._meta.pk
+
+        # Exactly the archived keys - rows that arrive later with an old timestamp stay put
+        pks = sorted(pk_field.to_python(row[pk_name]) for row in AuditArchiveReader.rows(manifest))
+        deleted = 0
+        for offset in range(0, len(pks), cls.DELETE_CHUNK):
+            chunk = pks[offset:offset + cls.DELETE_CHUNK]
+            with transaction.atomic():
+                deleted += model._default_manager.filter(pk__in=chunk).delete()[0]
+            if offset + cls.DELETE_CHUNK < len(pks):
+                time.sleep(cls.DELETE_PAUSE)
+
+        manifest.purged_at = timezone.now()
+        manifest.save(update_fields=['purged_at'])
+        return deleted
+
+
+class AuditArchiveReader:
+    """Re-query archived audit rows by time range and field values"""
+
+    @staticmethod
+    def verify(manifest):
+        path = archive_root() / manifest.path
+        if not path.exists():
+            raise ArchiveIntegrityError(f"Archive file missing: {manifest.path}")
+        if _file_sha256(path) != manifest.sha256:
+            raise ArchiveIntegrityError(f"Checksum mismatch: {manifest.path}")
+
+    @staticmethod
+    def rows(manifest):
+        with gzip.open(archive_root() / manifest.path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                if line.strip():
+                    yield json.loads(line)
+
+    @classmethod
+    def query(cls, label, start, end, verify=True, **filters):
+        """
+        Yield archived ``label`` rows with ``start <= time < end`` whose fields
+        equal ``filters`` (compared as strings, e.g. ``user_id=5``), oldest first.
+        """
+        field = RETENTION_SOURCES[label]
+        manifests = AuditArchive.objects.filter(
+            model_label=label,
+            first_timestamp__lt=end,
+            last_timestamp__gte=start,
+        ).order_by('first_timestamp', 'created_at')
+
+        wanted = {key: str(value) for key, value in filters.items()}
+        for manifest in manifests:
+            if verify:
+                cls.verify(manifest)
+            for row in cls.rows(manifest):
+                moment = parse_datetime(row[field])
+                if not (start <= moment < end):
+                    continue
+                if all(str(row.get(key)) == value for key, value in wanted.items()):
+                    yield row
@@ -0,0 +1,122 @@
+# ZAIN HMS Session Activity Tracking
+"""
+Write-coalescing "last seen" tracking for the session timeout checks.
+
+Stamping ``request.session['last_activity']`` on every request marks the
+session modified, which with a database session engine costs one UPDATE on
+``django_session`` per page view, HTMX poll and API call. Instead:
+
+* the exact last-seen time lives in the shared cache, mirrored in a
+  process-local LRU so a single worker stays exact even with DummyCache;
+* the session itself is only stamped - and therefore only saved - when the
+  stored value is ``SESSION_ACTIVITY_FLUSH_INTERVAL`` seconds old or more.
+
+Timeout checks read the most recent of the two. If the cache has lost the
+entry the stored value may lag real activity by up to one flush interval, so
+that much grace is added rather than logging out a user who was active.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import logging
+import time
+
+from .tiered_cache import LocalLRUCache
+
+logger = logging.getLogger('zain_hms.security')
+
+
+class SessionActivity:
+    """Coalesced last-seen timestamps for sessions"""
+
+    FLUSH_INTERVAL = getattr(settings, 'SESSION_ACTIVITY_FLUSH_INTERVAL', 60)
+    TIMEOUT = getattr(settings, 'SESSION_TIMEOUT', 3600)
+    SESSION_FIELD = 'last_activity'
+
+    _local = LocalLRUCache(
+        max_entries=getattr(settings, 'SESSION_ACTIVITY_LOCAL_ENTRIES', 10000),
+        ttl=TIMEOUT,
+    )
+
+    @staticmethod
+    def _cache_key(session_key):
+        # Signed-cookie session keys are the whole payload; keep cache keys short
+        return f"session_activity:{hashlib.md5(session_key.encode()).hexdigest()}"
+
+    @classmethod
+    def last_seen(cls, request):
+        """
+        ``(timestamp, exact)`` of the previous request in this session, or
+        ``(None, True)`` for a fresh session. Memoised per request, so it is
+        the value from before this request's own ``touch()``.
+        """
+        if hasattr(request, '_session_last_seen'):
+            return request._session_last_seen
+
+        stored = request.session.get(cls.SESSION_FIELD)
+        recent = None
+        session_key = request.session.session_key
+        if session_key:
+            key = cls._cache_key(session_key)
+            # Another worker may have seen the session since this one did: take the newest
+            candidates = [cls._local.get(key)]
+            try:
+                candidates.append(cache.get(key))
+            except Exception as e:
+                logger.warning(f"Session activity cache read failed: {e}")
+            recent = max((value for value in candidates if value is not None), default=None)
+
+        if recent is not None and (stored is None or recent >= stored):
+            result = (recent, True)
+        else:
+            result = (stored, stored is None)
+        request._session_last_seen = result
+        return result
+
+    @classmethod
+    def idle_seconds(cls, request, now=None):
+        """Seconds since the previous request, minus grace when only the stored value is known"""
+        last, exact = cls.last_seen(request)
+        if last is None:
+            return 0
+        idle = (now or time.time()) - last
+        return idle if exact else idle - cls.FLUSH_INTERVAL
+
+    @classmethod
+    def is_expired(cls, request, timeout=None, now=None):
+        return cls.idle_seconds(request, now) > (timeout or cls.TIMEOUT)
+
+    @classmethod
+    def touch(cls, request, now=None):
+        """Record activity; writes the session only once per flush interval"""
+        if getattr(request, '_session_activity_touched', False):
+            return
+        request._session_activity_touched = True
+        cls.last_seen(request)  # pin the pre-request value for later checks
+
+        now = now or time.time()
+        stored = request.session.get(cls.SESSION_FIELD)
+        if stored is None or now - stored >= cls.FLUSH_INTERVAL:
+            request.session[cls.SESSION_FIELD] = now
+
+        session_key = request.session.session_key
+        if session_key:
+            key = cls._cache_key(session_key)
+            cls._local.set(key, now)
+            try:
+                cache.set(key, now, timeout=cls.TIMEOUT + cls.FLUSH_INTERVAL)
+            except Exception as e:
+                logger.warning(f"Session activity cache write failed: {e}")
+
+    @classmethod
+    def forget(cls, request):
+        """Drop the cached timestamp, e.g. when the session is flushed on logout"""
+        session_key = request.session.session_key
+        if session_key:
+            key = cls._cache_key(session_key)
+            cls._local.delete(key)
+            try:
+                cache.delete(key)
+            except Exception:
+                pass
@@ -0,0 +1,98 @@
+# apps/core/signals.py
+"""
+Model signal hooks that bump cache tag versions when data changes.
+See apps.core.cache_tags for how tagged cache keys are built.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+import logging
+
+from .cache_tags import TagCache
+
+logger = logging.getLogger('zain_hms.performance')
+
+
+def _fk(instance, field):
+    return getattr(instance, f'{field}_id', None)
+
+
+def _timeline(instance):
+    # First page of the patient timeline (apps.patients.timeline)
+    return f'patient_timeline:{_fk(instance, "patient")}'
+
+
+# Model label -> callable returning the cache tags touched by a change
+CACHE_TAG_RULES = {
+    'patients.Patient': lambda obj: ['patients', f'patients:{obj.pk}'],
+    'appointments.Appointment': lambda obj: [
+        'appointments',
+        f'appointments:doctor:{_fk(obj, "doctor")}',
+        f'appointments:patient:{_fk(obj, "patient")}',
+    ],
+    'doctors.Doctor': lambda obj: ['doctors', f'doctors:{obj.pk}'],
+    'billing.Invoice': lambda obj: ['billing', f'billing:patient:{_fk(obj, "patient")}', _timeline(obj)],
+    'billing.Payment': lambda obj: ['billing'],
+    'accounts.CustomUser': lambda obj: ['staff', f'staff:{obj.pk}'],
+    'core.SystemConfiguration': lambda obj: ['system'],
+    # Rollup counts behind the keyset-paginated lists (apps.core.pagination)
+    'laboratory.LabOrder': lambda obj: ['laboratory', _timeline(obj)],
+    # Precomputed reference range table (apps.laboratory.analyzer_import)
+    'laboratory.LabTest': lambda obj: ['lab_reference_ranges'],
+    'laboratory.LabReferenceRange': lambda obj: ['lab_reference_ranges'],
+    'billing.PoSTransaction': lambda obj: ['pos'],
+    'pharmacy.PharmacyPoSTransaction': lambda obj: ['pos', f'pos:cashier:{_fk(obj, "cashier")}'],
+    # In-memory PoS catalog indexes (apps.core.catalog_index)
+    'billing.PoSItem': lambda obj: ['pos_catalog:items'],
+    'pharmacy.Medicine': lambda obj: ['pos_catalog:medicines'],
+    # Bed board layout (apps.ipd.bed_board); occupancy flips go through BedBoard
+    'ipd.Room': lambda obj: ['ipd:beds'],
+    'ipd.Bed': lambda obj: ['ipd:beds'],
+    'notifications.Notification': lambda obj: [f'notifications:user:{_fk(obj, "recipient")}'],
+    # Patient timeline sources without a rule of their own above
+    'emr.MedicalRecord': lambda obj: [_timeline(obj)],
+    'emr.VitalSigns': lambda obj: [_timeline(obj)],
+    'emr.Medication': lambda obj: [_timeline(obj)],
+    'emr.LabResult': lambda obj: [_timeline(obj)],
+    'radiology.RadiologyOrder': lambda obj: [_timeline(obj)],
+    'pharmacy.Prescription': lambda obj: [_timeline(obj)],
+}
+
+# Extra tags bumped only on delete: the catalog indexes patch themselves from
+# updated_at and would otherwise never see a row disappear
+CACHE_TAG_DELETE_RULES = {
+    'billing.PoSItem': lambda obj: ['pos_catalog:items:deleted'],
+    'pharmacy.Medicine': lambda obj: ['pos_catalog:medicines:deleted'],
+}
+
+
+def _invalidate_for_instance(sender, instance, **kwargs):
+    rule = CACHE_TAG_RULES.get(sender._meta.label)
+    if rule is None:
+        return
+    try:
+        tags = list(rule(instance))
+        delete_rule = CACHE_TAG_DELETE_RULES.get(sender._meta.label)
+        if delete_rule is not None and kwargs.get('signal') is post_delete:
+            tags += delete_rule(instance)
+    except Exception as e:
+        logger.error(f"Cache tag rule failed for {sender._meta.label}: {e}")
+        return
+    # Bump after commit so readers never cache pre-commit data under the new version
+    transaction.on_commit(lambda: TagCache.invalidate(*tags))
+
+
+def connect_cache_tag_signals():
+    """Attach tag invalidation to every model listed in CACHE_TAG_RULES"""
+    for label in CACHE_TAG_RULES:
+        try:
+            model = apps.get_model(label)
+        except LookupError:
+            continue
+        post_save.connect(_invalidate_for_instance, sender=model,
+                          dispatch_uid=f'cache_tags_save_{label}')
+        post_delete.connect(_invalidate_for_instance, sender=model,
+                            dispatch_uid=f'cache_tags_delete_{label}')
+
+
+connect_cache_tag_signals()
@@ -0,0 +1,105 @@
+# ZAIN HMS Embedded Production Database (SQLite)
+"""
+Support code for running a clinic on SQLite in production.
+
+Connection tuning lives in settings (``SQLITE_PRAGMAS`` become the
+``init_command`` of the SQLite connection, and ``transaction_mode`` makes every
+``atomic()`` start with ``BEGIN IMMEDIATE``): WAL lets readers run alongside
+the single writer, and taking the write lock up front means a transaction
+waits in ``busy_timeout`` instead of failing with "database is locked" when it
+tries to upgrade a read lock halfway through.
+
+This module adds:
+
+* ``serialized_write()`` - ``transaction.atomic()`` for hot write paths (PoS
+  checkout, booking, background batch writers). Threads of one worker queue
+  on a process-level lock instead of all polling SQLite's busy handler, so
+  the database lock is only contended between processes.
+* ``run_maintenance()`` - WAL checkpoint and ``PRAGMA optimize``, run
+  periodically by Celery beat (``apps.core.tasks``) or ``manage.py
+  sqlite_maintenance``.
+
+On any other database engine both are thin pass-throughs.
+"""
+
+from contextlib import contextmanager
+from django.db import connections, transaction
+import logging
+import threading
+import time
+
+logger = logging.getLogger('zain_hms.performance')
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def is_sqlite(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def _write_lock(using):
+    lock = _write_locks.get(using)
+    if lock is None:
+        with _write_locks_guard:
+            lock = _write_locks.setdefault(using, threading.Lock())
+    return lock
+
+
+@contextmanager
+def serialized_write(using='default'):
+    """``transaction.atomic()`` that queues this process's SQLite writers one at a time"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        # Nested blocks already hold the database write lock (BEGIN IMMEDIATE)
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    lock = _write_lock(using)
+    waited = time.monotonic()
+    with lock:
+        waited = time.monotonic() - waited
+        if waited > 1:
+            logger.warning(f"SQLite write waited {waited:.2f}s for the process write lock")
+        with transaction.atomic(using=using):
+            yield
+
+
+def pragma(name, using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def checkpoint(using='default', mode='TRUNCATE'):
+    """``PRAGMA wal_checkpoint``; returns ``(busy, wal_pages, checkpointed_pages)``"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        return tuple(cursor.fetchone())
+
+
+def run_maintenance(using='default', mode='TRUNCATE'):
+    """Checkpoint the WAL back into the database file and refresh planner statistics"""
+    if not is_sqlite(using):
+        return None
+
+    start = time.monotonic()
+    busy, wal_pages, checkpointed = checkpoint(using, mode)
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA optimize')
+
+    result = {
+        'journal_mode': pragma('journal_mode', using),
+        'busy': bool(busy),
+        'wal_pages': wal_pages,
+        'checkpointed_pages': checkpointed,
+        'duration': time.monotonic() - start,
+    }
+    if busy:
+        # Long-running readers kept part of the WAL alive; the next run picks it up
+        logger.warning(f"SQLite checkpoint incomplete: {checkpointed}/{wal_pages} pages")
+    else:
+        logger.info(f"SQLite maintenance: checkpointed {checkpointed} pages in {result['duration']:.2f}s")
+    return result
@@ -0,0 +1,15 @@
+# ZAIN HMS Core Periodic Tasks
+"""
+Celery tasks for core housekeeping. Schedules are in ``CELERY_BEAT_SCHEDULE``
+(settings); django_celery_beat's database scheduler picks them up on start.
+"""
+
+from celery import shared_task
+
+from .sqlite import run_maintenance
+
+
+@shared_task(ignore_result=True)
+def sqlite_maintenance():
+    """WAL checkpoint + PRAGMA optimize for SQLite installs (no-op elsewhere)"""
+    run_maintenance()
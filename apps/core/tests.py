@@ -1,3 +1,599 @@
-from django.test import TestCase
-
-# Create your tests here.
+from datetime import date, timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import generics, serializers
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIRequestFactory
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import asyncio
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from apps.core import db_routing
+from apps.core.audit import AuditWriter
+from apps.core.cache_tags import TagCache
+from apps.core.db_routing import REPORTING_DB, use_primary_db, use_reporting_db
+from apps.core.events import EventBroker, Subscription
+from apps.core.middleware import ReplicaStickinessMiddleware
+from apps.core.models import ActivityLog, AuditArchive
+from apps.core.session_activity import SessionActivity
+from apps.core.sqlite import _write_lock, pragma, run_maintenance, serialized_write
+from apps.core.retention import ArchiveIntegrityError, AuditArchiveReader, AuditRetention
+from apps.core.pagination import KeysetPagination
+from apps.core.performance import CacheManager
+from apps.core.tiered_cache import LocalLRUCache, TieredCache
+from apps.core.utils import label_render
+from apps.core.utils.label_service import LabelImageCache, LabelService
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+
+
+class JSONRoundTripCache(LocMemCache):
+    """LocMem cache that hands back what the production JSON serializer (django-redis) would"""
+
+    def add(self, key, value, *args, **kwargs):
+        return super().add(key, json.loads(json.dumps(value, cls=DjangoJSONEncoder)), *args, **kwargs)
+
+    def set(self, key, value, *args, **kwargs):
+        super().set(key, json.loads(json.dumps(value, cls=DjangoJSONEncoder)), *args, **kwargs)
+
+
+def make_patient(**fields):
+    values = dict(first_name='Test', last_name='Patient', date_of_birth=date(1990, 1, 1),
+                  gender='M', phone='0500000000')
+    values.update(fields)
+    return Patient.objects.create(**values)
+
+
+class ReportingRouterTests(TestCase):
+    """Routing against a real second SQLite database standing in for the replica"""
+
+    # Resolved when the class is set up, after setUpClass has added the replica alias
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        settings.DATABASES[REPORTING_DB] = {
+            **connections['default'].settings_dict,
+            'NAME': cls.replica_path,
+            'TEST': {**connections['default'].settings_dict['TEST'], 'NAME': cls.replica_path},
+        }
+        # Copy the schema before the test transactions open; rows written by a test stay off the replica
+        call_command('refresh_reporting_replica', stdout=io.StringIO())
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPORTING_DB].close()
+        del connections[REPORTING_DB]
+        del settings.DATABASES[REPORTING_DB]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        db_routing._health.update(ok=False, checked_at=None)
+
+    def test_reporting_reads_go_to_the_replica(self):
+        patient = make_patient()
+        with use_reporting_db():
+            self.assertEqual(Patient.objects.all().db, REPORTING_DB)
+            # Not replicated yet: the replica really is another database
+            self.assertFalse(Patient.objects.filter(pk=patient.pk).exists())
+            with use_primary_db():
+                self.assertTrue(Patient.objects.filter(pk=patient.pk).exists())
+        self.assertTrue(Patient.objects.filter(pk=patient.pk).exists())
+
+    def test_write_outside_a_request_does_not_pin(self):
+        make_patient()
+        with use_reporting_db():
+            self.assertEqual(Patient.objects.all().db, REPORTING_DB)
+
+    def test_write_pins_reads_until_the_request_ends(self):
+        tokens = db_routing.begin_request()
+        patient = make_patient()
+        with use_reporting_db():
+            self.assertEqual(Patient.objects.all().db, 'default')
+            self.assertTrue(Patient.objects.filter(pk=patient.pk).exists())
+        self.assertTrue(db_routing.wrote_in_request())
+        db_routing.end_request(tokens)
+        with use_reporting_db():
+            self.assertEqual(Patient.objects.all().db, REPORTING_DB)
+
+    def test_sticky_window_after_a_write(self):
+        seen = []
+
+        def write(request):
+            make_patient()
+            return HttpResponse()
+
+        def report(request):
+            with use_reporting_db():
+                seen.append(Patient.objects.all().db)
+            return HttpResponse()
+
+        factory = RequestFactory()
+        response = ReplicaStickinessMiddleware(write)(factory.post('/'))
+        cookie = response.cookies[ReplicaStickinessMiddleware.COOKIE_NAME]
+        self.assertGreater(float(cookie.value), time.time())
+
+        sticky = factory.get('/')
+        sticky.COOKIES[ReplicaStickinessMiddleware.COOKIE_NAME] = cookie.value
+        ReplicaStickinessMiddleware(report)(sticky)
+        ReplicaStickinessMiddleware(report)(factory.get('/'))
+        self.assertEqual(seen, ['default', REPORTING_DB])
+
+        # The window is over once the response is out, whichever thread serves next
+        with use_reporting_db():
+            self.assertEqual(Patient.objects.all().db, REPORTING_DB)
+
+    def test_falls_back_to_default_when_replica_is_down(self):
+        with mock.patch.object(connections[REPORTING_DB], 'cursor', side_effect=OperationalError('down')):
+            with use_reporting_db():
+                self.assertEqual(Patient.objects.all().db, 'default')
+        # The failed check is remembered until REPORTING_DB_RECHECK passes
+        self.assertFalse(db_routing.reporting_available())
+
+
+class PatientRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ['id', 'last_name']
+
+
+class PatientRows(generics.ListAPIView):
+    queryset = Patient.objects.all()
+    serializer_class = PatientRowSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['last_name']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-registration_date', '-id')
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for index, name in enumerate(['Diaz', 'Adams', 'Cole', 'Baker', 'Evans']):
+            make_patient(last_name=name, phone=f'05000000{index:02d}')
+
+    def get(self, url):
+        return PatientRows.as_view()(APIRequestFactory().get(url)).data
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen, url = [], '/patients/?page_size=2'
+        while url:
+            data = self.get(url)
+            self.assertTrue(data['count_is_approximate'])
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        expected = Patient.objects.order_by('-registration_date', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = PatientRows.as_view()(APIRequestFactory().get('/patients/?cursor=garbage'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_client_ordering_falls_back_to_page_numbers(self):
+        data = self.get('/patients/?ordering=last_name&page_size=2')
+        self.assertEqual([row['last_name'] for row in data['results']], ['Adams', 'Baker'])
+        self.assertEqual((data['count'], data['count_is_approximate']), (5, False))
+        self.assertIn('page=2', data['next'])
+
+        data = self.get(data['next'])
+        self.assertEqual([row['last_name'] for row in data['results']], ['Cole', 'Diaz'])
+
+    def test_unknown_ordering_keeps_the_keyset(self):
+        data = self.get('/patients/?ordering=ssn')
+        self.assertTrue(data['count_is_approximate'])
+        self.assertEqual(data['results'][0]['id'], str(Patient.objects.order_by('-registration_date', '-id')[0].pk))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheManagerTests(TestCase):
+
+    def test_clear_user_cache_bumps_the_users_tags(self):
+        user = get_user_model().objects.create_user(username='drsaleh', password='x')
+        doctor = Doctor.objects.create(
+            user=user, first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        tags = [f'staff:{user.pk}', f'notifications:user:{user.pk}', f'pos:cashier:{user.pk}',
+                f'appointments:doctor:{doctor.pk}', 'staff']
+        before = TagCache.get_versions(tags)
+        CacheManager.clear_user_cache(user.pk)
+        after = TagCache.get_versions(tags)
+
+        self.assertTrue(all(after[tag] > before[tag] for tag in tags[:-1]))
+        # Entries shared by every user are left alone
+        self.assertEqual(after['staff'], before['staff'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TieredCacheTests(TestCase):
+
+    def setUp(self):
+        TieredCache.clear_local()
+        self.calls = []
+
+    def compute(self, value='fresh'):
+        def func():
+            self.calls.append(value)
+            return value
+        return func
+
+    def test_hits_are_served_until_a_tag_is_bumped(self):
+        self.assertEqual(TieredCache.get_or_set('stats', self.compute('a'), tags=['appointments']), 'a')
+        TieredCache.clear_local()
+        # Shared tier hit
+        self.assertEqual(TieredCache.get_or_set('stats', self.compute('b'), tags=['appointments']), 'a')
+        TagCache.invalidate('appointments')
+        self.assertEqual(TieredCache.get_or_set('stats', self.compute('c'), tags=['appointments']), 'c')
+        self.assertEqual(self.calls, ['a', 'c'])
+
+    def test_stale_value_is_served_while_it_refreshes(self):
+        TieredCache.get_or_set('board', self.compute('old'), timeout=1)
+        later = SimpleNamespace(time=lambda: time.time() + 5, sleep=time.sleep)
+        with mock.patch('apps.core.tiered_cache.time', later), \
+                mock.patch('apps.core.tiered_cache.close_old_connections'), \
+                mock.patch.object(TieredCache, '_executor', SimpleNamespace(submit=lambda job: job())):
+            self.assertEqual(TieredCache.get_or_set('board', self.compute('new'), timeout=60), 'old')
+        self.assertEqual(TieredCache.get_or_set('board', self.compute('never'), timeout=60), 'new')
+        self.assertEqual(self.calls, ['old', 'new'])
+
+    def test_a_miss_waits_for_the_worker_holding_the_lock(self):
+        full_key = TieredCache._full_key('report', [])
+        cache.add(TieredCache._lock_key(full_key), 1)
+
+        def other_worker():
+            time.sleep(0.1)
+            TieredCache._store(full_key, TieredCache._envelope('theirs', 60, 0.0), 60)
+            TieredCache.clear_local()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        self.assertEqual(TieredCache.get_or_set('report', self.compute('mine')), 'theirs')
+        thread.join()
+        self.assertEqual(self.calls, [])
+
+    def test_local_tier_is_bounded(self):
+        local = LocalLRUCache(max_entries=2, ttl=30)
+        for key in 'abc':
+            local.set(key, {'value': key})
+        self.assertIsNone(local.get('a'))
+        self.assertEqual(local.get('c'), {'value': 'c'})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EventBrokerTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_subscription_filters_by_role_and_user(self):
+        nurse = Subscription(7, 'NURSE', 10)
+        self.assertTrue(nurse.wants({'roles': None, 'users': None}))
+        self.assertTrue(nurse.wants({'roles': ['NURSE', 'DOCTOR'], 'users': None}))
+        self.assertTrue(nurse.wants({'roles': ['ADMIN'], 'users': [7]}))
+        self.assertFalse(nurse.wants({'roles': ['ADMIN'], 'users': None}))
+        self.assertFalse(nurse.wants({'roles': None, 'users': [8]}))
+
+    def test_lagging_subscriber_gets_a_resync_marker(self):
+        async def fill():
+            subscription = Subscription(1, 'ADMIN', 2)
+            for index in range(3):
+                subscription.offer({'type': 'appointment', 'data': {'n': index}})
+            return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+
+        self.assertEqual(asyncio.run(fill()), [{'type': 'resync', 'data': {}}])
+
+    def test_other_workers_read_the_log_in_order(self):
+        producer, consumer = EventBroker(), EventBroker()
+        producer.publish('before', {})
+        # The first poll starts from now
+        self.assertEqual(consumer._read_new(), [])
+
+        producer.publish('appointment', {'id': 1}, roles=['DOCTOR'])
+        producer.publish('bed', {'id': 2}, users=[5])
+        events = consumer._read_new()
+        self.assertEqual([event['type'] for event in events], ['appointment', 'bed'])
+        self.assertEqual((events[0]['roles'], events[1]['users']), (['DOCTOR'], [5]))
+        self.assertEqual(consumer._read_new(), [])
+        # A worker does not deliver its own events twice
+        self.assertEqual(producer._read_new(), [])
+        producer.publish('lab', {})
+        self.assertEqual(producer._read_new(), [])
+
+
+class LabelServiceTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_repeated_labels_render_once(self):
+        with mock.patch.object(label_render, 'render', wraps=label_render.render) as render:
+            first = LabelService.render_many([LabelService.barcode_request('LAB-0001')] * 3)
+            self.assertEqual(render.call_count, 1)
+            self.assertTrue(first[0].startswith(b'\x89PNG') and first[0] == first[2])
+
+            # A second batch is served from the image cache
+            again = LabelService.render_one(LabelService.barcode_request('LAB-0001'))
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(again, first[0])
+
+    def test_qr_cache_key_ignores_the_random_iv(self):
+        generator = SimpleNamespace(encryption_key='k1', encrypt_data=mock.Mock(return_value='cipher'))
+        request = LabelService.qr_request({'type': 'patient', 'id': '1'}, 'small', generator)
+        self.assertEqual(request.digest, LabelService.qr_request({'type': 'patient', 'id': '1'}, 'small',
+                                                                 generator).digest)
+        generator.encrypt_data.assert_not_called()
+
+        rotated = SimpleNamespace(encryption_key='k2', encrypt_data=generator.encrypt_data)
+        self.assertNotEqual(request.digest, LabelService.qr_request({'type': 'patient', 'id': '1'}, 'small',
+                                                                    rotated).digest)
+
+    def test_failed_render_is_not_cached(self):
+        request = LabelService.barcode_request('BAD')
+        with mock.patch.object(label_render, 'render', side_effect=ValueError('bad data')):
+            self.assertIsNone(LabelService.render_one(request))
+        self.assertIsNone(LabelImageCache.get(request.digest))
+
+
+class AuditWriterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='auditor', password='x')
+
+    def setUp(self):
+        spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_dir, ignore_errors=True)
+        with override_settings(AUDIT_ASYNC=True, AUDIT_SPILL_PATH=Path(spill_dir) / 'audit_spill.jsonl',
+                               AUDIT_FLUSH_INTERVAL=60):
+            self.writer = AuditWriter()
+        # Batches are flushed by the test itself, in the test transaction
+        worker = mock.patch.object(self.writer, '_run', lambda: None)
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.addCleanup(self.writer.shutdown)
+
+    def submit(self, **fields):
+        values = dict(user_id=self.user.pk, action='VIEW', model_name='PHI', object_repr='/patients/',
+                      ip_address='10.0.0.1', user_agent='test')
+        values.update(fields)
+        self.writer.submit('core.ActivityLog', **values)
+
+    def test_submitted_rows_are_written_in_one_batch(self):
+        for _ in range(3):
+            self.submit()
+        self.assertFalse(ActivityLog.objects.exists())
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.writer.flush()
+        self.assertEqual(sum(query['sql'].startswith('INSERT') for query in queries), 1)
+        self.assertEqual(ActivityLog.objects.count(), 3)
+
+    def test_failed_batch_is_spilled_and_replayed_with_its_event_time(self):
+        accessed = timezone.now() - timedelta(hours=3)
+        self.submit(timestamp=accessed)
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=OperationalError('locked')):
+            self.writer.flush()
+        self.assertFalse(ActivityLog.objects.exists())
+        self.assertTrue(self.writer.spill_path.exists())
+
+        self.assertEqual(self.writer.replay_spill(), 1)
+        self.assertFalse(self.writer.spill_path.exists())
+        self.assertEqual(ActivityLog.objects.get().timestamp, accessed)
+
+    def test_a_bad_row_does_not_sink_the_batch(self):
+        self.submit()
+        self.submit(ip_address=None)
+        self.writer.flush()
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        with open(self.writer.spill_path, encoding='utf-8') as handle:
+            self.assertEqual(len(handle.readlines()), 1)
+
+
+class AuditRetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='auditor', password='x')
+        cls.other = get_user_model().objects.create_user(username='clerk', password='x')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(AUDIT_ARCHIVE_ROOT=Path(root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.now = timezone.now()
+
+    def log(self, days_ago, user=None):
+        return ActivityLog.objects.create(
+            user=user or self.user, action='VIEW', model_name='PHI', object_repr='/patients/',
+            ip_address='10.0.0.1', user_agent='test', timestamp=self.now - timedelta(days=days_ago),
+        )
+
+    def test_old_rows_are_archived_per_day_then_purged(self):
+        self.log(40)
+        self.log(40, self.other)
+        self.log(35)
+        recent = self.log(5)
+        self.assertEqual(AuditRetention.run(['core.ActivityLog'], days=30), {'core.ActivityLog': 3})
+
+        self.assertEqual(list(ActivityLog.objects.values_list('pk', flat=True)), [recent.pk])
+        manifests = AuditArchive.objects.order_by('partition_date')
+        self.assertEqual([manifest.row_count for manifest in manifests], [2, 1])
+        self.assertTrue(all(manifest.purged_at for manifest in manifests))
+
+        rows = list(AuditArchiveReader.query('core.ActivityLog', self.now - timedelta(days=60), self.now,
+                                             user_id=self.other.pk))
+        self.assertEqual(len(rows), 1)
+
+    def test_dry_run_only_counts(self):
+        self.log(40)
+        self.assertEqual(AuditRetention.run(['core.ActivityLog'], days=30, dry_run=True), {'core.ActivityLog': 1})
+        self.assertEqual(ActivityLog.objects.count(), 1)
+        self.assertFalse(AuditArchive.objects.exists())
+
+    def test_interrupted_purge_is_finished_by_the_next_run(self):
+        self.log(40)
+        with mock.patch.object(AuditRetention, 'purge', return_value=0):
+            AuditRetention.run(['core.ActivityLog'], days=30)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+        # The rows are not archived a second time
+        self.assertEqual(AuditRetention.run(['core.ActivityLog'], days=30), {'core.ActivityLog': 0})
+        self.assertFalse(ActivityLog.objects.exists())
+        self.assertEqual(AuditArchive.objects.count(), 1)
+
+    def test_cleanup_logs_honours_days_for_activity_logs(self):
+        self.log(40)
+        recent = self.log(5)
+        with override_settings(BASE_DIR=Path(settings.AUDIT_ARCHIVE_ROOT)):
+            call_command('cleanup_logs', '--activity-logs', '--days', '3', stdout=io.StringIO())
+        self.assertFalse(ActivityLog.objects.filter(pk=recent.pk).exists())
+
+        # Without --days each table keeps its AUDIT_RETENTION_DAYS
+        recent = self.log(5)
+        with override_settings(BASE_DIR=Path(settings.AUDIT_ARCHIVE_ROOT)):
+            call_command('cleanup_logs', '--activity-logs', stdout=io.StringIO())
+        self.assertTrue(ActivityLog.objects.filter(pk=recent.pk).exists())
+
+    def test_tampered_archive_is_refused(self):
+        self.log(40)
+        AuditRetention.run(['core.ActivityLog'], days=30)
+        manifest = AuditArchive.objects.get()
+        with open(Path(settings.AUDIT_ARCHIVE_ROOT) / manifest.path, 'ab') as handle:
+            handle.write(b'x')
+        with self.assertRaises(ArchiveIntegrityError):
+            list(AuditArchiveReader.query('core.ActivityLog', self.now - timedelta(days=60), self.now))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SessionActivityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        SessionActivity._local.clear()
+        self.session = SessionStore()
+        self.session.create()
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore(self.session.session_key)
+        return request
+
+    def test_session_is_only_saved_once_per_flush_interval(self):
+        start = time.time()
+        first = self.request()
+        SessionActivity.touch(first, now=start)
+        self.assertTrue(first.session.modified)
+        first.session.save()
+
+        later = self.request()
+        SessionActivity.touch(later, now=start + SessionActivity.FLUSH_INTERVAL - 1)
+        self.assertFalse(later.session.modified)
+        # The cache still has the exact time
+        self.assertEqual(SessionActivity.last_seen(self.request()), (start + SessionActivity.FLUSH_INTERVAL - 1, True))
+
+        due = self.request()
+        SessionActivity.touch(due, now=start + SessionActivity.FLUSH_INTERVAL)
+        self.assertTrue(due.session.modified)
+
+    def test_checks_use_the_time_before_the_request(self):
+        start = time.time() - 10
+        SessionActivity.touch(self.request(), now=start)
+        request = self.request()
+        SessionActivity.touch(request)
+        self.assertEqual(SessionActivity.last_seen(request), (start, True))
+
+    def test_stored_time_gets_grace_when_the_cache_lost_it(self):
+        now = time.time()
+        self.session[SessionActivity.SESSION_FIELD] = now - SessionActivity.TIMEOUT - 30
+        self.session.save()
+        self.assertFalse(SessionActivity.is_expired(self.request(), now=now))
+        self.assertTrue(SessionActivity.is_expired(self.request(), now=now + SessionActivity.FLUSH_INTERVAL))
+
+    def test_forget_drops_the_cached_time(self):
+        request = self.request()
+        SessionActivity.touch(request)
+        SessionActivity.forget(request)
+        self.assertEqual(SessionActivity.last_seen(self.request()), (None, True))
+
+
+class SQLiteProductionModeTests(SimpleTestCase):
+    """The configured connection options against a real database file"""
+
+    ALIAS = 'sqlite_file'
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'clinic.sqlite3')
+        settings.DATABASES[cls.ALIAS] = {**connections['default'].settings_dict, 'NAME': cls.path}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.ALIAS].close()
+        del connections[cls.ALIAS]
+        del settings.DATABASES[cls.ALIAS]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        self.assertEqual(pragma('journal_mode', self.ALIAS), 'wal')
+        self.assertEqual(pragma('synchronous', self.ALIAS), 1)  # NORMAL
+        self.assertEqual(pragma('busy_timeout', self.ALIAS), settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_serialized_write_takes_the_write_lock_up_front(self):
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with serialized_write(self.ALIAS):
+            self.assertTrue(_write_lock(self.ALIAS).locked())
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                other.execute('BEGIN IMMEDIATE')
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+    def test_nested_write_does_not_queue_on_the_process_lock(self):
+        with transaction.atomic(using=self.ALIAS):
+            with serialized_write(self.ALIAS):
+                self.assertFalse(_write_lock(self.ALIAS).locked())
+
+    def test_maintenance_checkpoints_the_wal(self):
+        with connections[self.ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS visits (id INTEGER PRIMARY KEY)')
+            cursor.execute('INSERT INTO visits DEFAULT VALUES')
+        result = run_maintenance(self.ALIAS)
+        self.assertEqual((result['journal_mode'], result['busy']), ('wal', False))
+        self.assertEqual(result['wal_pages'], 0)  # TRUNCATE leaves an empty WAL
@@ -0,0 +1,249 @@
+# ZAIN HMS Two-Tier Cache
+"""
+Two-tier cache with stampede protection for expensive computations.
+
+Tier 1 is a process-local LRU bounded by size and TTL, tier 2 the shared
+Django cache. On top of that:
+
+* single-flight: a shared lock (``cache.add``) plus a per-process lock make
+  sure only one worker recomputes a given key at a time;
+* probabilistic early refresh (XFetch): a value is recomputed slightly
+  before it expires, with a probability that grows as expiry approaches and
+  scales with how long the computation takes;
+* stale-while-revalidate: once a value is past its TTL but still within the
+  stale window it is served immediately while a background thread refreshes.
+
+Keys are bound to cache tags (see apps.core.cache_tags), so model signals
+invalidate both tiers with a single version bump.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+import logging
+import math
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from .cache_tags import TagCache
+
+logger = logging.getLogger('zain_hms.performance')
+
+
+class LocalLRUCache:
+    """Thread-safe, size and TTL bounded in-process LRU"""
+
+    def __init__(self, max_entries: int = 512, ttl: int = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored envelope or None if missing or past the local TTL"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, envelope = item
+            if time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return envelope
+
+    def set(self, key, envelope):
+        with self._lock:
+            self._data[key] = (time.time(), envelope)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """Local LRU in front of the shared cache, with single-flight recomputation"""
+
+    LOCAL_MAX_ENTRIES = getattr(settings, 'TIERED_CACHE_LOCAL_MAX_ENTRIES', 512)
+    LOCAL_TTL = getattr(settings, 'TIERED_CACHE_LOCAL_TTL', 30)          # seconds
+    STALE_TTL = getattr(settings, 'TIERED_CACHE_STALE_TTL', 120)         # seconds
+    LOCK_TIMEOUT = getattr(settings, 'TIERED_CACHE_LOCK_TIMEOUT', 30)    # seconds
+    WAIT_TIMEOUT = 5.0          # max seconds a miss waits for another worker
+    EARLY_REFRESH_BETA = 1.0    # XFetch aggressiveness
+
+    LOCK_STRIPES = 64
+
+    _local = LocalLRUCache(LOCAL_MAX_ENTRIES, LOCAL_TTL)
+    # Striped locks keep memory bounded while tag-versioned keys keep changing
+    _stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+    _refreshing_guard = threading.Lock()
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='tiered-cache')
+    _refreshing = set()
+
+    # -- envelope helpers -------------------------------------------------
+
+    @staticmethod
+    def _envelope(value, timeout: int, delta: float) -> dict:
+        return {'value': value, 'expires': time.time() + timeout, 'delta': delta}
+
+    @classmethod
+    def _is_fresh(cls, envelope: dict) -> bool:
+        """XFetch: treat the value as expired early with rising probability"""
+        delta = envelope.get('delta') or 0.0
+        jitter = delta * cls.EARLY_REFRESH_BETA * -math.log(max(random.random(), 1e-12))
+        return time.time() + jitter < envelope['expires']
+
+    @staticmethod
+    def _is_servable_stale(envelope: dict, stale_ttl: int) -> bool:
+        return time.time() < envelope['expires'] + stale_ttl
+
+    @classmethod
+    def _process_lock(cls, key: str) -> threading.Lock:
+        return cls._stripes[hash(key) % cls.LOCK_STRIPES]
+
+    # -- shared-cache helpers ---------------------------------------------
+
+    @classmethod
+    def _read_shared(cls, key: str) -> Optional[dict]:
+        try:
+            envelope = cache.get(key)
+        except Exception as e:
+            logger.error(f"Shared cache read failed for {key}: {e}")
+            return None
+        if isinstance(envelope, dict) and 'expires' in envelope:
+            return envelope
+        return None
+
+    @classmethod
+    def _store(cls, key: str, envelope: dict, stale_ttl: int):
+        cls._local.set(key, envelope)
+        shared_timeout = max(1, int(envelope['expires'] - time.time()) + stale_ttl)
+        try:
+            cache.set(key, envelope, shared_timeout)
+        except Exception as e:
+            # Unserializable values still benefit from the local tier
+            logger.warning(f"Shared cache write failed for {key}: {e}")
+
+    @classmethod
+    def _compute(cls, key: str, func: Callable, timeout: int, stale_ttl: int) -> dict:
+        started = time.time()
+        value = func()
+        envelope = cls._envelope(value, timeout, time.time() - started)
+        cls._store(key, envelope, stale_ttl)
+        return envelope
+
+    @staticmethod
+    def _full_key(key: str, tags: Iterable[str]) -> str:
+        tags = list(tags)
+        return TagCache.make_key('tiered', tags, key) if tags else f"zain_hms:tiered:{key}"
+
+    @classmethod
+    def _lock_key(cls, key: str) -> str:
+        return f"{key}:lock"
+
+    # -- refresh paths -----------------------------------------------------
+
+    @classmethod
+    def _refresh_in_background(cls, key: str, func: Callable, timeout: int, stale_ttl: int):
+        """Schedule a single background recomputation of ``key``"""
+        with cls._refreshing_guard:
+            if key in cls._refreshing:
+                return
+            cls._refreshing.add(key)
+
+        if not cache.add(cls._lock_key(key), 1, cls.LOCK_TIMEOUT):
+            # Another worker already refreshing
+            with cls._refreshing_guard:
+                cls._refreshing.discard(key)
+            return
+
+        def job():
+            try:
+                cls._compute(key, func, timeout, stale_ttl)
+            except Exception as e:
+                logger.error(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                cache.delete(cls._lock_key(key))
+                with cls._refreshing_guard:
+                    cls._refreshing.discard(key)
+                close_old_connections()
+
+        cls._executor.submit(job)
+
+    @classmethod
+    def _compute_single_flight(cls, key: str, func: Callable, timeout: int, stale_ttl: int):
+        """Compute on a miss, letting only one worker across the cluster do the work"""
+        with cls._process_lock(key):
+            # Another thread in this process may have filled it meanwhile
+            envelope = cls._local.get(key)
+            if envelope is not None and time.time() < envelope['expires']:
+                return envelope['value']
+
+            lock_key = cls._lock_key(key)
+            if cache.add(lock_key, 1, cls.LOCK_TIMEOUT):
+                try:
+                    return cls._compute(key, func, timeout, stale_ttl)['value']
+                finally:
+                    cache.delete(lock_key)
+
+            # Someone else holds the lock: wait for their result, then give up and compute
+            deadline = time.time() + cls.WAIT_TIMEOUT
+            while time.time() < deadline:
+                time.sleep(0.05)
+                envelope = cls._read_shared(key)
+                if envelope is not None:
+                    cls._local.set(key, envelope)
+                    return envelope['value']
+            logger.warning(f"Timed out waiting for cache fill of {key}; computing locally")
+            return cls._compute(key, func, timeout, stale_ttl)['value']
+
+    # -- public API --------------------------------------------------------
+
+    @classmethod
+    def get_or_set(cls, key: str, func: Callable, timeout: int = 300,
+                   tags: Iterable[str] = (), stale_ttl: Optional[int] = None):
+        """
+        Return the cached value for ``key``, computing it with ``func`` on a miss.
+        ``tags`` bind the entry to cache tag versions for invalidation.
+        """
+        stale_ttl = cls.STALE_TTL if stale_ttl is None else stale_ttl
+        full_key = cls._full_key(key, tags)
+
+        envelope = cls._local.get(full_key)
+        if envelope is None:
+            envelope = cls._read_shared(full_key)
+            if envelope is not None:
+                cls._local.set(full_key, envelope)
+
+        if envelope is not None:
+            if cls._is_fresh(envelope):
+                return envelope['value']
+            if cls._is_servable_stale(envelope, stale_ttl):
+                cls._refresh_in_background(full_key, func, timeout, stale_ttl)
+                return envelope['value']
+
+        return cls._compute_single_flight(full_key, func, timeout, stale_ttl)
+
+    @classmethod
+    def refresh(cls, key: str, func: Callable, timeout: int = 300,
+                tags: Iterable[str] = (), stale_ttl: Optional[int] = None):
+        """Recompute ``key`` unconditionally and store it in both tiers (cache warming)"""
+        stale_ttl = cls.STALE_TTL if stale_ttl is None else stale_ttl
+        full_key = cls._full_key(key, tags)
+        return cls._compute(full_key, func, timeout, stale_ttl)['value']
+
+    @classmethod
+    def clear_local(cls):
+        """Drop every entry from this process's local tier"""
+        cls._local.clear()
@@ -3,7 +3,7 @@ from django.urls import path
 from . import views
 from . import two_factor as two_factor_views
 from .qr_views import QRScannerView, QRSearchView
-from .barcode_views import BarcodeScannerView, barcode_search, manual_search, generate_barcode
+from .barcode_views import BarcodeScannerView, barcode_search, manual_search, generate_barcode, batch_labels
 from .admin_views import admin_logout_view
 
 app_name = 'core'
@@ -23,6 +23,7 @@ urlpatterns = [
     path('barcode-scanner/', BarcodeScannerView.as_view(), name='barcode_scanner'),
     path('barcode-search/', barcode_search, name='barcode_search'),
     path('generate-barcode/', generate_barcode, name='generate_barcode'),
+    path('labels/batch/', batch_labels, name='batch_labels'),
     path('manual-search/', manual_search, name='manual_search'),
     
     # Notifications
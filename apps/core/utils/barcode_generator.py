@@ -11,6 +11,9 @@ from cryptography.fernet import Fernet
 from datetime import datetime
 import uuid
 
+from .label_render import BARCODE_WRITER_OPTIONS
+from .label_service import LabelService
+
 class BarcodeGenerator:
     """
     Modern hospital barcode generation system
@@ -61,31 +64,15 @@ class BarcodeGenerator:
                 
             barcode_class = self.BARCODE_FORMATS[format_type]
             
-            # Create barcode with image writer
-            barcode = barcode_class(data, writer=ImageWriter())
-            # Standard writer options for consistent size (monochrome, no text)
-            writer_options = {
-                'module_width': 0.22,   # bar width in mm
-                'module_height': 12.0,  # bar height in mm
-                'quiet_zone': 2.0,      # side padding in mm
-                'font_size': 0,         # disable font when write_text=False
-                'text_distance': 1.0,
-                'write_text': False,    # omit human-readable text in image
-            }
-            
             if save_path:
-                # Save to file
-                barcode.save(save_path, options=writer_options)
+                # Create barcode with image writer and save to file
+                barcode = barcode_class(data, writer=ImageWriter())
+                barcode.save(save_path, options=BARCODE_WRITER_OPTIONS)
                 return save_path
             else:
-                # Return as base64 for embedding
-                buffer = io.BytesIO()
-                barcode.write(buffer, options=writer_options)
-                buffer.seek(0)
-                
-                # Convert to base64
-                barcode_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-                return f"data:image/png;base64,{barcode_base64}"
+                # Return as base64 for embedding, served from the label image cache
+                png = LabelService.render_one(LabelService.barcode_request(data, format_type))
+                return LabelService.data_uri(png)
                 
         except Exception as e:
             print(f"Barcode generation error: {e}")
@@ -119,56 +106,39 @@ class DocumentBarcodeGenerator:
     def __init__(self):
         self.generator = BarcodeGenerator()
     
+    def document_barcode_value(self, document, prefix, use_serial=True):
+        """Barcode value for a document: its serial number if it has one, else a generated code"""
+        if use_serial and getattr(document, 'serial_number', None):
+            return document.serial_number.replace('-', '')
+        return self.generator.generate_barcode_data(prefix, document.id)
+    
     def generate_patient_barcode(self, patient):
         """Generate barcode for patient records"""
-        data = self.generator.generate_barcode_data('PAT', patient.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(patient, 'PAT', use_serial=False))
     
     def generate_doctor_barcode(self, doctor):
         """Generate barcode for doctor records"""
-        data = self.generator.generate_barcode_data('DOC', doctor.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(doctor, 'DOC', use_serial=False))
     
     def generate_appointment_barcode(self, appointment):
         """Generate barcode for appointment records"""
-        # Use serial number if available
-        if hasattr(appointment, 'serial_number') and appointment.serial_number:
-            data = appointment.serial_number.replace('-', '')
-        else:
-            data = self.generator.generate_barcode_data('APT', appointment.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(appointment, 'APT'))
     
     def generate_lab_order_barcode(self, lab_order):
         """Generate barcode for laboratory orders"""
-        if hasattr(lab_order, 'serial_number') and lab_order.serial_number:
-            data = lab_order.serial_number.replace('-', '')
-        else:
-            data = self.generator.generate_barcode_data('LAB', lab_order.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(lab_order, 'LAB'))
     
     def generate_radiology_order_barcode(self, radiology_order):
         """Generate barcode for radiology orders"""
-        if hasattr(radiology_order, 'serial_number') and radiology_order.serial_number:
-            data = radiology_order.serial_number.replace('-', '')
-        else:
-            data = self.generator.generate_barcode_data('RAD', radiology_order.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(radiology_order, 'RAD'))
     
     def generate_invoice_barcode(self, invoice):
         """Generate barcode for invoices/bills"""
-        if hasattr(invoice, 'serial_number') and invoice.serial_number:
-            data = invoice.serial_number.replace('-', '')
-        else:
-            data = self.generator.generate_barcode_data('BIL', invoice.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(invoice, 'BIL'))
     
     def generate_prescription_barcode(self, prescription):
         """Generate barcode for prescriptions"""
-        if hasattr(prescription, 'serial_number') and prescription.serial_number:
-            data = prescription.serial_number.replace('-', '')
-        else:
-            data = self.generator.generate_barcode_data('PRE', prescription.id)
-        return self.generator.generate_barcode(data)
+        return self.generator.generate_barcode(self.document_barcode_value(prescription, 'PRE'))
 
 
 # Hospital barcode scanner data parser
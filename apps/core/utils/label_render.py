@@ -0,0 +1,76 @@
+# apps/core/utils/label_render.py
+"""
+Pure barcode / QR rasterisers used by the label service.
+
+Kept free of Django imports so label worker processes (spawned, not forked)
+can import it cheaply. Every function takes plain values and returns PNG bytes.
+"""
+import io
+
+# Bump when rendering changes so the content-addressed cache stops matching old images
+RENDER_VERSION = 1
+
+BARCODE_FORMATS = ('CODE128', 'CODE39', 'EAN13', 'EAN8', 'UPCA')
+
+BARCODE_WRITER_OPTIONS = {
+    'module_width': 0.22,   # bar width in mm
+    'module_height': 12.0,  # bar height in mm
+    'quiet_zone': 2.0,      # side padding in mm
+    'font_size': 0,         # disable font when write_text=False
+    'text_distance': 1.0,
+    'write_text': False,    # omit human-readable text in image
+}
+
+QR_SIZES = {
+    'small': {'box_size': 8, 'border': 2},
+    'medium': {'box_size': 10, 'border': 4},
+    'large': {'box_size': 15, 'border': 6},
+}
+
+
+def render_barcode_png(data, format_type='CODE128'):
+    """Render a linear barcode to PNG bytes"""
+    from barcode import Code128, Code39, EAN13, EAN8, UPCA
+    from barcode.writer import ImageWriter
+
+    formats = {
+        'CODE128': Code128,
+        'CODE39': Code39,
+        'EAN13': EAN13,
+        'EAN8': EAN8,
+        'UPCA': UPCA,
+    }
+    barcode_class = formats.get(format_type, Code128)
+    buffer = io.BytesIO()
+    barcode_class(data, writer=ImageWriter()).write(buffer, options=BARCODE_WRITER_OPTIONS)
+    return buffer.getvalue()
+
+
+def render_qr_png(text, size='medium'):
+    """Render a QR code to PNG bytes"""
+    import qrcode
+
+    config = QR_SIZES.get(size, QR_SIZES['medium'])
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=config['box_size'],
+        border=config['border'],
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'barcode': render_barcode_png,
+    'qr': render_qr_png,
+}
+
+
+def render(job):
+    """Process-pool entry point: ``job`` is ``(kind, args)``"""
+    kind, args = job
+    return RENDERERS[kind](*args)
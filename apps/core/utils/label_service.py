@@ -0,0 +1,318 @@
+# apps/core/utils/label_service.py
+"""
+Bulk barcode/QR label rendering with a content-addressed image cache.
+
+Every rendered PNG is stored in the media storage under the SHA-256 of what
+it depicts (kind, encoded value, render options), so printing the same
+specimen or wristband label again is a file read instead of a rasterisation.
+Cache misses in a batch are rendered in a process pool; single images and
+small batches render inline.
+
+QR payloads are encrypted with a random IV, so the hash covers the plaintext
+payload plus a fingerprint of the encryption key - the ciphertext is only
+produced when the image actually has to be rendered.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+import base64
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+
+from . import label_render
+
+logger = logging.getLogger(__name__)
+
+
+class LabelImageCache:
+    """PNG store in the default (media) storage, keyed by content hash"""
+
+    PREFIX = getattr(settings, 'LABEL_CACHE_DIR', 'labels')
+
+    @staticmethod
+    def digest(kind, content, options=()):
+        raw = json.dumps([kind, content, list(options), label_render.RENDER_VERSION], sort_keys=True,
+                         default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @classmethod
+    def path(cls, digest):
+        return f"{cls.PREFIX}/{digest[:2]}/{digest}.png"
+
+    @classmethod
+    def get(cls, digest):
+        path = cls.path(digest)
+        try:
+            if not default_storage.exists(path):
+                return None
+            with default_storage.open(path, 'rb') as handle:
+                return handle.read()
+        except Exception as e:
+            logger.warning(f"Label cache read failed for {digest}: {e}")
+            return None
+
+    @classmethod
+    def put(cls, digest, png):
+        path = cls.path(digest)
+        try:
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(png))
+        except Exception as e:
+            # A concurrent writer may have won the race; the image is still returned
+            logger.warning(f"Label cache write failed for {digest}: {e}")
+
+
+class ImageRequest:
+    """One barcode or QR image to produce; ``args`` is only called on a cache miss"""
+
+    def __init__(self, kind, content, options, args):
+        self.kind = kind
+        self.content = content
+        self.options = options
+        self.args = args
+        self.digest = LabelImageCache.digest(kind, content, options)
+
+
+class LabelService:
+    """Render label images in bulk through the content-addressed cache"""
+
+    WORKERS = getattr(settings, 'LABEL_RENDER_WORKERS', min(4, os.cpu_count() or 1))
+    POOL_MIN_BATCH = getattr(settings, 'LABEL_POOL_MIN_BATCH', 8)
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    # -- image requests ----------------------------------------------------
+
+    @staticmethod
+    def barcode_request(data, format_type='CODE128'):
+        if format_type not in label_render.BARCODE_FORMATS:
+            format_type = 'CODE128'
+        return ImageRequest('barcode', data, [format_type], lambda: (data, format_type))
+
+    @staticmethod
+    def qr_request(payload, size='medium', generator=None):
+        """``generator`` is the QRCodeGenerator whose key encrypts the payload"""
+        if generator is None:
+            from .qr_code import qr_generator as generator
+        key = generator.encryption_key
+        key_id = hashlib.sha256(key.encode() if isinstance(key, str) else key).hexdigest()[:16]
+        return ImageRequest('qr', payload, [size, key_id],
+                            lambda: (generator.encrypt_data(payload), size))
+
+    # -- rendering -----------------------------------------------------------
+
+    @classmethod
+    def _get_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Spawned workers never inherit DB connections or server threads
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=cls.WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return cls._pool
+
+    @classmethod
+    def _reset_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    @staticmethod
+    def _render_inline(job):
+        try:
+            return label_render.render(job)
+        except Exception as e:
+            logger.error(f"Label render failed for {job[0]} {job[1][0]!r}: {e}")
+            return None
+
+    @classmethod
+    def _render_jobs(cls, jobs):
+        if len(jobs) < cls.POOL_MIN_BATCH or cls.WORKERS < 2:
+            return [cls._render_inline(job) for job in jobs]
+        try:
+            futures = [cls._get_pool().submit(label_render.render, job) for job in jobs]
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            logger.error(f"Label process pool unavailable, rendering inline: {e}")
+            cls._reset_pool()
+            return [cls._render_inline(job) for job in jobs]
+
+        results = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                cls._reset_pool()
+                results.append(cls._render_inline(job))
+            except Exception as e:
+                logger.error(f"Label render failed for {job[0]} {job[1][0]!r}: {e}")
+                results.append(None)
+        return results
+
+    @classmethod
+    def render_many(cls, requests):
+        """Return PNG bytes (or None on failure) for each request, in order"""
+        images = {}
+        missing = {}
+        for request in requests:
+            if request.digest in images or request.digest in missing:
+                continue
+            png = LabelImageCache.get(request.digest)
+            if png is None:
+                missing[request.digest] = request
+            else:
+                images[request.digest] = png
+
+        if missing:
+            pending = list(missing.values())
+            rendered = cls._render_jobs([(request.kind, request.args()) for request in pending])
+            for request, png in zip(pending, rendered):
+                if png is not None:
+                    LabelImageCache.put(request.digest, png)
+                images[request.digest] = png
+            logger.info(f"Labels: {len(requests)} requested, {len(pending)} rendered")
+
+        return [images.get(request.digest) for request in requests]
+
+    @classmethod
+    def render_one(cls, request):
+        return cls.render_many([request])[0]
+
+    @staticmethod
+    def data_uri(png):
+        if png is None:
+            return None
+        return f"data:image/png;base64,{base64.b64encode(png).decode('utf-8')}"
+
+
+# -- printable documents -------------------------------------------------------
+
+class Label:
+    """Text and codes printed on one label"""
+
+    def __init__(self, slug, title, lines, barcode_value, qr_payload):
+        self.slug = slug
+        self.title = title
+        self.lines = [line for line in lines if line]
+        self.barcode_value = barcode_value
+        self.qr_payload = qr_payload
+
+
+def _patient_label(patient, barcodes):
+    return Label(
+        slug=patient.patient_id or str(patient.pk),
+        title=patient.get_full_name(),
+        lines=[patient.patient_id, f"DOB {patient.date_of_birth:%Y-%m-%d}" if patient.date_of_birth else None],
+        barcode_value=barcodes.document_barcode_value(patient, 'PAT', use_serial=False),
+        qr_payload={'type': 'patient', 'id': str(patient.pk), 'number': patient.patient_id},
+    )
+
+
+def _appointment_label(appointment, barcodes):
+    when = ' '.join(
+        value.isoformat(timespec='minutes') if hasattr(value, 'hour') else value.isoformat()
+        for value in (appointment.appointment_date, appointment.appointment_time) if value
+    )
+    return Label(
+        slug=appointment.appointment_number or str(appointment.pk),
+        title=appointment.patient.get_full_name(),
+        lines=[appointment.appointment_number, when, f"Dr. {appointment.doctor.get_full_name()}"],
+        barcode_value=barcodes.document_barcode_value(appointment, 'APT'),
+        qr_payload={'type': 'appointment', 'id': str(appointment.pk), 'number': appointment.appointment_number},
+    )
+
+
+def _lab_order_label(lab_order, barcodes):
+    return Label(
+        slug=lab_order.order_number or str(lab_order.pk),
+        title=lab_order.patient.get_full_name(),
+        lines=[lab_order.order_number, f"{lab_order.order_date:%Y-%m-%d %H:%M}"],
+        barcode_value=barcodes.document_barcode_value(lab_order, 'LAB'),
+        qr_payload={'type': 'lab_order', 'id': str(lab_order.pk), 'number': lab_order.order_number},
+    )
+
+
+# object_type (as used by the barcode endpoints) -> (model label, related fields, label builder)
+LABEL_SOURCES = {
+    'patient': ('patients.Patient', (), _patient_label),
+    'appointment': ('appointments.Appointment', ('patient', 'doctor'), _appointment_label),
+    'laborder': ('laboratory.LabOrder', ('patient',), _lab_order_label),
+}
+
+
+def build_labels(object_type, ids):
+    """Label descriptions for the given objects, in the order of ``ids``"""
+    from .barcode_generator import DocumentBarcodeGenerator
+
+    model_label, related, builder = LABEL_SOURCES[object_type]
+    model = apps.get_model(model_label)
+    pks = [model._meta.pk.to_python(value) for value in ids]
+    objects = model.objects.select_related(*related).in_bulk(pks)
+    barcodes = DocumentBarcodeGenerator()
+    return [builder(objects[pk], barcodes) for pk in dict.fromkeys(pks) if pk in objects]
+
+
+def render_label_images(labels):
+    """``[(barcode_png, qr_png)]`` for each label, rendered as one batch"""
+    requests = []
+    for label in labels:
+        requests.append(LabelService.barcode_request(label.barcode_value))
+        requests.append(LabelService.qr_request(label.qr_payload, size='small'))
+    images = LabelService.render_many(requests)
+    return list(zip(images[0::2], images[1::2]))
+
+
+def labels_pdf(labels):
+    """One label per page, page size ``LABEL_PAGE_SIZE_MM`` (width, height)"""
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    width_mm, height_mm = getattr(settings, 'LABEL_PAGE_SIZE_MM', (62, 29))
+    width, height = width_mm * mm, height_mm * mm
+    margin = 1.5 * mm
+    qr_side = height - 2 * margin
+    text_width = width - qr_side - 3 * margin
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(width, height))
+    for label, (barcode_png, qr_png) in zip(labels, render_label_images(labels)):
+        y = height - margin - 7
+        pdf.setFont('Helvetica-Bold', 7)
+        pdf.drawString(margin, y, label.title[:40])
+        pdf.setFont('Helvetica', 5.5)
+        for line in label.lines[:3]:
+            y -= 6.5
+            pdf.drawString(margin, y, str(line)[:48])
+        if barcode_png:
+            pdf.drawImage(ImageReader(io.BytesIO(barcode_png)), margin, margin,
+                          width=text_width, height=height * 0.35, preserveAspectRatio=False)
+        if qr_png:
+            pdf.drawImage(ImageReader(io.BytesIO(qr_png)), width - margin - qr_side, margin,
+                          width=qr_side, height=qr_side)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def labels_zip(labels):
+    """Barcode and QR PNGs for each label, stored (not deflated - PNG is compressed)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for label, (barcode_png, qr_png) in zip(labels, render_label_images(labels)):
+            if barcode_png:
+                archive.writestr(f"{label.slug}_barcode.png", barcode_png)
+            if qr_png:
+                archive.writestr(f"{label.slug}_qr.png", qr_png)
+    return buffer.getvalue()
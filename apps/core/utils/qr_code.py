@@ -9,6 +9,8 @@ from django.urls import reverse
 from cryptography.fernet import Fernet
 import logging
 
+from .label_service import LabelService
+
 logger = logging.getLogger(__name__)
 
 class QRCodeGenerator:
@@ -32,38 +34,9 @@ class QRCodeGenerator:
             str: Base64 encoded image data
         """
         try:
-            # Encrypt the data
-            encrypted_data = self.encrypt_data(data)
-            
-            # Configure QR code based on size
-            size_config = {
-                'small': {'box_size': 8, 'border': 2},
-                'medium': {'box_size': 10, 'border': 4},
-                'large': {'box_size': 15, 'border': 6}
-            }
-            
-            config = size_config.get(size, size_config['medium'])
-            
-            # Create QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=config['box_size'],
-                border=config['border'],
-            )
-            
-            qr.add_data(encrypted_data)
-            qr.make(fit=True)
-            
-            # Create image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to base64
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
+            # Served from the label image cache; encryption only happens on a miss
+            png = LabelService.render_one(LabelService.qr_request(data, size, generator=self))
+            return LabelService.data_uri(png)
             
         except Exception as e:
             logger.error(f"Error generating QR code: {e}")
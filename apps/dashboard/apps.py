@@ -4,6 +4,7 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dashboard'
+    label = 'apps_dashboard'  # Unique label to avoid conflict with jet.dashboard
     verbose_name = 'Dashboard'
     
     def ready(self):
@@ -12,9 +13,3 @@ class DashboardConfig(AppConfig):
             import apps.dashboard.signals  # noqa
         except ImportError:
             pass
-
-
-class DashboardConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.dashboard'
-    label = 'apps_dashboard'  # Unique label to avoid conflict with jet.dashboard
@@ -153,7 +153,8 @@ class ActivityLog(models.Model):
     metadata = models.JSONField(default=dict)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Event time from the producer; rows are written by apps.core.audit in batches
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
 
     class Meta:
         ordering = ['-timestamp']
@@ -171,9 +172,11 @@ class ActivityLog(models.Model):
     def log_activity(cls, user, action, description, activity_type='user_action', 
                     object_type=None, object_id=None, priority='normal', 
                     metadata=None, request=None):
-        """Create an activity log entry"""
+        """Queue an activity log entry for the buffered audit writer (apps.core.audit)"""
+        from apps.core.audit import audit_writer
+
         data = {
-            'user': user,
+            'user_id': getattr(user, 'pk', None),
             'action': action,
             'description': description,
             'activity_type': activity_type,
@@ -187,7 +190,7 @@ class ActivityLog(models.Model):
             data['ip_address'] = cls._get_client_ip(request)
             data['user_agent'] = request.META.get('HTTP_USER_AGENT', '')[:500]
         
-        return cls.objects.create(**data)
+        audit_writer.submit(cls._meta.label, **data)
 
     @staticmethod
     def _get_client_ip(request):
@@ -265,23 +268,55 @@ class DashboardCache(models.Model):
             models.Index(fields=['expires_at']),
         ]
 
+    @staticmethod
+    def _tags_for(key, tags=None):
+        """Caller tags (or the key namespace) plus the table-wide tag"""
+        return list(tags or [key.split(':', 1)[0]]) + ['dashboard_cache']
+
+    @classmethod
+    def _versioned_key(cls, key, tags=None):
+        """
+        Bind ``key`` to the current version of its cache tags.
+        Tags default to the key's namespace (the part before the first ':').
+        """
+        from apps.core.cache_tags import TagCache
+        tags = sorted(set(cls._tags_for(key, tags)))
+        versions = TagCache.get_versions(tags)
+        suffix = '.'.join(str(versions[tag]) for tag in tags)
+        return f"{key}@{suffix}"[:255]
+
     @classmethod
-    def get_or_set(cls, key, data_func, timeout=300):
-        """Get cached data or set it if not exists/expired"""
+    def get_or_set(cls, key, data_func, timeout=300, tags=None):
+        """
+        Get cached data or set it if not exists/expired.
+        Reads go through the two-tier cache first, so a hit costs no DB round-trip;
+        the table remains the durable backing store.
+        """
+        from apps.core.tiered_cache import TieredCache
+        tags = cls._tags_for(key, tags)
+        return TieredCache.get_or_set(
+            key, lambda: cls._db_get_or_set(key, data_func, timeout, tags),
+            timeout=timeout, tags=tags
+        )
+
+    @classmethod
+    def _db_get_or_set(cls, key, data_func, timeout, tags):
+        """Table-backed lookup used when both cache tiers miss"""
+        versioned_key = cls._versioned_key(key, tags)
         try:
             cache_obj = cls.objects.get(
-                cache_key=key,
+                cache_key=versioned_key,
                 expires_at__gt=timezone.now()
             )
             return cache_obj.cache_data
         except cls.DoesNotExist:
-            # Cache miss or expired, get fresh data
+            # Cache miss, expired or invalidated, get fresh data
             data = data_func()
             expires_at = timezone.now() + timedelta(seconds=timeout)
             
             # Update or create cache entry
             cls.objects.update_or_create(
-                cache_key=key,
+                cache_key=versioned_key,
                 defaults={
                     'cache_data': data,
                     'expires_at': expires_at
@@ -291,12 +326,24 @@ class DashboardCache(models.Model):
 
     @classmethod
     def invalidate(cls, key_pattern=None):
-        """Invalidate cache entries"""
+        """
+        Invalidate cache entries.
+        With a tag/namespace this is a version bump - superseded rows are
+        never read again and are removed by ``purge_expired`` once they
+        expire (apps.dashboard.tasks.purge_dashboard_cache, on beat).
+        """
+        from apps.core.cache_tags import TagCache
         if key_pattern:
-            cls.objects.filter(cache_key__contains=key_pattern).delete()
+            TagCache.invalidate(key_pattern)
         else:
+            TagCache.invalidate('dashboard_cache')
             cls.objects.all().delete()
 
+    @classmethod
+    def purge_expired(cls):
+        """Delete expired rows using the expires_at index"""
+        return cls.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
 
 class DashboardAnalytics(models.Model):
     """Track dashboard usage analytics"""
@@ -11,6 +11,8 @@ import json
 import logging
 
 from .models import DashboardMetric, DashboardCache, ActivityLog
+from apps.core.tiered_cache import TieredCache
+from apps.core.db_routing import reporting_db
 from apps.patients.models import Patient
 from apps.appointments.models import Appointment
 from apps.billing.models import Bill
@@ -20,18 +22,15 @@ logger = logging.getLogger(__name__)
 
 
 class DashboardMetricsService:
-    """Service for calculating and caching dashboard metrics"""
+    """Service for calculating and caching dashboard metrics (computed on the reporting replica)"""
     
     @classmethod
     def get_patient_metrics(cls, user=None):
         """Get comprehensive patient metrics"""
         cache_key = "dashboard_metrics:patients"
-        cached_data = cache.get(cache_key)
         
-        if cached_data:
-            return cached_data
-        
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             
             # Total patients
@@ -72,9 +71,11 @@ class DashboardMetricsService:
                 'growth_rate': cls._calculate_growth_rate('patients', new_this_month)
             }
             
-            cache.set(cache_key, data, 300)  # Cache for 5 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['patients', 'appointments'])
+        
         except Exception as e:
             logger.error(f"Error calculating patient metrics: {e}")
             return {
@@ -86,12 +87,9 @@ class DashboardMetricsService:
     def get_appointment_metrics(cls, user=None):
         """Get comprehensive appointment metrics"""
         cache_key = "dashboard_metrics:appointments"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
         
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             
             # Today's appointments
@@ -140,9 +138,11 @@ class DashboardMetricsService:
                 'completion_rate': round(completion_rate, 1)
             }
             
-            cache.set(cache_key, data, 180)  # Cache for 3 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=180, tags=['appointments'])
+        
         except Exception as e:
             logger.error(f"Error calculating appointment metrics: {e}")
             return {
@@ -154,12 +154,9 @@ class DashboardMetricsService:
     def get_revenue_metrics(cls, user=None):
         """Get comprehensive revenue metrics"""
         cache_key = "dashboard_metrics:revenue"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
         
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             
             # Today's revenue
@@ -201,9 +198,11 @@ class DashboardMetricsService:
                 'growth_rate': cls._calculate_growth_rate('revenue', month_revenue)
             }
             
-            cache.set(cache_key, data, 300)  # Cache for 5 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['billing'])
+        
         except Exception as e:
             logger.error(f"Error calculating revenue metrics: {e}")
             return {
@@ -215,12 +214,9 @@ class DashboardMetricsService:
     def get_staff_metrics(cls, user=None):
         """Get comprehensive staff metrics"""
         cache_key = "dashboard_metrics:staff"
-        cached_data = cache.get(cache_key)
         
-        if cached_data:
-            return cached_data
-        
-        try:
+        @reporting_db
+        def compute():
             # Count by role
             role_counts = CustomUser.objects.exclude(
                 role='PATIENT'
@@ -251,9 +247,11 @@ class DashboardMetricsService:
                 'by_role': role_data
             }
             
-            cache.set(cache_key, data, 600)  # Cache for 10 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=600, tags=['staff'])
+        
         except Exception as e:
             logger.error(f"Error calculating staff metrics: {e}")
             return {
@@ -261,6 +259,30 @@ class DashboardMetricsService:
                 'admins': 0, 'support': 0, 'by_role': {}
             }
     
+    @classmethod
+    def get_kpi_context(cls, user=None):
+        """Context for the admin KPI cards partial (nested metrics plus legacy flat keys)"""
+        patient_metrics = cls.get_patient_metrics(user)
+        appointment_metrics = cls.get_appointment_metrics(user)
+        revenue_metrics = cls.get_revenue_metrics(user)
+        staff_metrics = cls.get_staff_metrics(user)
+        return {
+            'patient_metrics': patient_metrics,
+            'appointment_metrics': appointment_metrics,
+            'revenue_metrics': revenue_metrics,
+            'staff_metrics': staff_metrics,
+            # flat keys used by legacy snippets within the partial
+            'total_patients': patient_metrics.get('total', 0),
+            'new_patients_today': patient_metrics.get('new_today', 0),
+            'total_doctors': staff_metrics.get('doctors', 0),
+            'total_nurses': staff_metrics.get('nurses', 0),
+            'today_appointments': appointment_metrics.get('today_total', 0),
+            'pending_appointments': appointment_metrics.get('today_pending', 0),
+            'revenue_today': revenue_metrics.get('today', 0),
+            'revenue_month': revenue_metrics.get('month', 0),
+            'total_staff': staff_metrics.get('total', 0),
+        }
+    
     @classmethod
     def _calculate_growth_rate(cls, metric_type, current_value):
         """Calculate growth rate compared to previous period"""
@@ -300,12 +322,9 @@ class DashboardChartService:
     def get_revenue_chart_data(cls, days=7):
         """Get revenue chart data for specified days"""
         cache_key = f"dashboard_charts:revenue:{days}"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
         
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             data = []
             
@@ -323,9 +342,11 @@ class DashboardChartService:
                     'value': float(daily_revenue)
                 })
             
-            cache.set(cache_key, data, 300)  # Cache for 5 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['billing'])
+        
         except Exception as e:
             logger.error(f"Error generating revenue chart data: {e}")
             return []
@@ -334,12 +355,9 @@ class DashboardChartService:
     def get_appointments_chart_data(cls, days=7):
         """Get appointments chart data for specified days"""
         cache_key = f"dashboard_charts:appointments:{days}"
-        cached_data = cache.get(cache_key)
         
-        if cached_data:
-            return cached_data
-        
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             data = []
             
@@ -356,9 +374,11 @@ class DashboardChartService:
                     'value': daily_count
                 })
             
-            cache.set(cache_key, data, 300)  # Cache for 5 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['appointments'])
+        
         except Exception as e:
             logger.error(f"Error generating appointments chart data: {e}")
             return []
@@ -367,12 +387,9 @@ class DashboardChartService:
     def get_patient_registration_chart_data(cls, days=7):
         """Get patient registration chart data"""
         cache_key = f"dashboard_charts:patients:{days}"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
         
-        try:
+        @reporting_db
+        def compute():
             today = timezone.now().date()
             data = []
             
@@ -390,9 +407,11 @@ class DashboardChartService:
                     'value': daily_count
                 })
             
-            cache.set(cache_key, data, 300)  # Cache for 5 minutes
             return data
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['patients'])
+        
         except Exception as e:
             logger.error(f"Error generating patient chart data: {e}")
             return []
@@ -405,12 +424,8 @@ class DashboardActivityService:
     def get_recent_activities(cls, user=None, limit=10):
         """Get recent activities for dashboard"""
         cache_key = f"dashboard_activities:recent:{limit}"
-        cached_data = cache.get(cache_key)
         
-        if cached_data:
-            return cached_data
-        
-        try:
+        def compute():
             activities = []
             
             # Recent patient registrations
@@ -512,9 +527,11 @@ class DashboardActivityService:
             activities.sort(key=lambda x: x['timestamp'], reverse=True)
             activities = activities[:limit]
             
-            cache.set(cache_key, activities, 180)  # Cache for 3 minutes
             return activities
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=180, tags=['patients', 'appointments', 'billing'])
+        
         except Exception as e:
             logger.error(f"Error getting recent activities: {e}")
             return []
@@ -523,12 +540,8 @@ class DashboardActivityService:
     def get_pending_tasks(cls, user=None):
         """Get pending tasks for user role"""
         cache_key = f"dashboard_tasks:pending:{user.role if user else 'all'}"
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
         
-        try:
+        def compute():
             tasks = []
             
             # Pending bills
@@ -585,9 +598,11 @@ class DashboardActivityService:
                     'link': '/dashboard/settings/'
                 })
             
-            cache.set(cache_key, tasks, 300)  # Cache for 5 minutes
             return tasks
-            
+        
+        try:
+            return TieredCache.get_or_set(cache_key, compute, timeout=300, tags=['appointments', 'billing'])
+        
         except Exception as e:
             logger.error(f"Error getting pending tasks: {e}")
             return []
@@ -0,0 +1,117 @@
+"""
+Dashboard signal handlers for ZAIN HMS
+Publish compact model-change events to the server-push stream.
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+import logging
+
+from apps.core.events import event_broker
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ROLES = ['ADMIN', 'SUPERADMIN']
+FRONT_DESK_ROLES = ADMIN_ROLES + ['RECEPTIONIST', 'NURSE']
+FINANCE_ROLES = ADMIN_ROLES + ['ACCOUNTANT']
+
+
+def _remember_status(sender, instance, **kwargs):
+    """Keep the loaded status so post_save can tell a transition from a plain save"""
+    instance._stream_initial_status = instance.__dict__.get('status')
+
+
+def _publish_on_commit(*args, **kwargs):
+    transaction.on_commit(lambda: event_broker.publish(*args, **kwargs))
+
+
+@receiver(post_init, sender='appointments.Appointment')
+def remember_appointment_status(sender, instance, **kwargs):
+    _remember_status(sender, instance)
+
+
+@receiver(post_init, sender='billing.Invoice')
+def remember_invoice_status(sender, instance, **kwargs):
+    _remember_status(sender, instance)
+
+
+@receiver(post_save, sender='appointments.Appointment')
+def publish_appointment_status(sender, instance, created, **kwargs):
+    """Push appointment creation and status transitions"""
+    previous = getattr(instance, '_stream_initial_status', None)
+    if not created and previous == instance.status:
+        return
+    instance._stream_initial_status = instance.status
+
+    try:
+        doctor_user_id = instance.doctor.user_id if instance.doctor_id else None
+    except Exception:
+        doctor_user_id = None
+
+    _publish_on_commit(
+        'appointment.status',
+        {
+            'id': str(instance.pk),
+            'status': instance.status,
+            'previous': None if created else previous,
+            'doctor_id': instance.doctor_id,
+            'date': instance.appointment_date.isoformat() if instance.appointment_date else None,
+        },
+        roles=FRONT_DESK_ROLES,
+        users=[doctor_user_id] if doctor_user_id else None,
+    )
+
+
+@receiver(post_save, sender='billing.Invoice')
+def publish_invoice_paid(sender, instance, created, **kwargs):
+    """Push invoices that just became fully paid"""
+    previous = getattr(instance, '_stream_initial_status', None)
+    instance._stream_initial_status = instance.status
+    if instance.status != 'PAID' or previous == 'PAID':
+        return
+
+    _publish_on_commit(
+        'invoice.paid',
+        {
+            'id': str(instance.pk),
+            'invoice_number': instance.invoice_number,
+            'total_amount': str(instance.total_amount),
+        },
+        roles=FINANCE_ROLES,
+    )
+
+
+@receiver(post_save, sender='notifications.Notification')
+def publish_new_notification(sender, instance, created, **kwargs):
+    """Push new notifications to their recipient only"""
+    if not created:
+        return
+
+    _publish_on_commit(
+        'notification.new',
+        {
+            'id': instance.pk,
+            'title': instance.title,
+            'level': instance.level,
+            'action_url': instance.action_url,
+        },
+        users=[instance.recipient_id],
+    )
+
+
+def render_admin_kpis(event):
+    """
+    Enricher: render the admin KPI cards once per worker after a change,
+    instead of every open admin dashboard re-requesting them.
+    """
+    from .services import DashboardMetricsService
+
+    html = render_to_string(
+        'dashboard/partials/kpi_cards.html',
+        DashboardMetricsService.get_kpi_context()
+    )
+    return [{'type': 'dashboard.stats', 'data': {'html': html}, 'roles': ADMIN_ROLES, 'users': None}]
+
+
+event_broker.register_enricher(['appointment.status', 'invoice.paid'], render_admin_kpis)
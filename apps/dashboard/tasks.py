@@ -0,0 +1,19 @@
+# apps/dashboard/tasks.py
+"""
+Periodic dashboard tasks; scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+import logging
+
+from .models import DashboardCache
+
+logger = logging.getLogger('zain_hms.performance')
+
+
+@shared_task(ignore_result=True)
+def purge_dashboard_cache():
+    """Delete expired DashboardCache rows, including those superseded by a tag bump"""
+    purged = DashboardCache.purge_expired()
+    logger.info(f"Dashboard cache purge: {purged} rows deleted")
+    return purged
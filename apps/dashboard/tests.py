@@ -1,3 +1,37 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from .models import DashboardCache
+from .tasks import purge_dashboard_cache
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_rows_are_recomputed_then_purged(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'total': len(calls)}
+
+        self.assertEqual(DashboardCache.get_or_set('stats:today', compute, timeout=60), {'total': 1})
+        self.assertEqual(DashboardCache.get_or_set('stats:today', compute, timeout=60), {'total': 1})
+        DashboardCache.invalidate('stats')
+        self.assertEqual(DashboardCache.get_or_set('stats:today', compute, timeout=60), {'total': 2})
+        # The superseded row stays until it expires
+        self.assertEqual(DashboardCache.objects.count(), 2)
+
+        DashboardCache.objects.filter(cache_data={'total': 1}).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_dashboard_cache(), 1)
+        self.assertEqual(list(DashboardCache.objects.values_list('cache_data', flat=True)), [{'total': 2}])
+
+    def test_purge_is_scheduled(self):
+        self.assertEqual(settings.CELERY_BEAT_SCHEDULE['dashboard-cache-purge']['task'],
+                         'apps.dashboard.tasks.purge_dashboard_cache')
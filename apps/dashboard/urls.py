@@ -7,7 +7,7 @@ from . import views
 
 # Import core functionality for integrated dashboard tools
 try:
-    from apps.core.barcode_views import BarcodeScannerView, barcode_search, manual_search, generate_barcode
+    from apps.core.barcode_views import BarcodeScannerView, barcode_search, manual_search, generate_barcode, batch_labels
     from apps.core.qr_views import QRScannerView, QRSearchView
     from apps.core.admin_views import admin_logout_view
     from apps.core.two_factor import setup_2fa, verify_2fa_setup, disable_2fa, regenerate_backup_codes
@@ -45,6 +45,11 @@ htmx_patterns = [
     path('charts/', views.htmx_chart_data, name='htmx_charts'),
 ]
 
+# Server-push stream (SSE) for live dashboard updates
+stream_patterns = [
+    path('events/', views.dashboard_event_stream, name='event_stream'),
+]
+
 # Tools and utilities
 tools_patterns = [
     # Search and Export
@@ -66,6 +71,7 @@ if CORE_IMPORTS_AVAILABLE:
         path('barcode-scanner/', BarcodeScannerView.as_view(), name='barcode_scanner'),
         path('barcode-search/', barcode_search, name='barcode_search'),
         path('generate-barcode/', generate_barcode, name='generate_barcode'),
+        path('labels/batch/', batch_labels, name='batch_labels'),
         path('manual-search/', manual_search, name='manual_search'),
         
         # QR Code Scanner functionality
@@ -110,6 +116,9 @@ urlpatterns = [
     path('htmx/tasks/', views.htmx_pending_tasks, name='htmx_tasks'),
     path('htmx/charts/', views.htmx_chart_data, name='htmx_charts'),
     
+    # Live updates stream
+    *stream_patterns,
+    
     # Direct API endpoints for template compatibility
     path('api/stats/', views.DashboardStatsAPIView.as_view(), name='api_stats'),
     path('api/activities/', views.DashboardActivitiesAPIView.as_view(), name='api_activities'),
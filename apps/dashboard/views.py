@@ -6,7 +6,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import TemplateView, View
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -16,6 +18,7 @@ from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Q, Count
 from django.contrib import messages
+import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
@@ -29,9 +32,13 @@ from .services import (
     DashboardActivityService, DashboardSecurityService
 )
 from apps.accounts.models import CustomUser
+from apps.core.events import event_broker
 
 logger = logging.getLogger(__name__)
 
+EVENT_STREAM_HEARTBEAT = 20      # seconds between keepalive comments
+EVENT_STREAM_RETRY_MS = 5000     # client reconnect delay
+
 
 # Utility functions
 def is_admin_user(user):
@@ -374,37 +381,18 @@ class DashboardStatsAPIView(DashboardAPIView):
         try:
             if user.role in ['ADMIN', 'SUPERADMIN']:
                 # Get admin metrics
-                patient_metrics = DashboardMetricsService.get_patient_metrics(user)
-                appointment_metrics = DashboardMetricsService.get_appointment_metrics(user)
-                revenue_metrics = DashboardMetricsService.get_revenue_metrics(user)
-                staff_metrics = DashboardMetricsService.get_staff_metrics(user)
+                kpi_context = DashboardMetricsService.get_kpi_context(user)
                 
                 data = {
-                    'patients': patient_metrics,
-                    'appointments': appointment_metrics,
-                    'revenue': revenue_metrics,
-                    'staff': staff_metrics
+                    'patients': kpi_context['patient_metrics'],
+                    'appointments': kpi_context['appointment_metrics'],
+                    'revenue': kpi_context['revenue_metrics'],
+                    'staff': kpi_context['staff_metrics']
                 }
                 
                 # Return HTML for HTMX or JSON for AJAX
                 if request.headers.get('HX-Request'):
-                    # Provide both nested metrics and flat keys for backward compatibility
-                    html = render_to_string('dashboard/partials/kpi_cards.html', {
-                        'patient_metrics': patient_metrics,
-                        'appointment_metrics': appointment_metrics,
-                        'revenue_metrics': revenue_metrics,
-                        'staff_metrics': staff_metrics,
-                        # flat keys used by legacy snippets within the partial
-                        'total_patients': patient_metrics.get('total', 0),
-                        'new_patients_today': patient_metrics.get('new_today', 0),
-                        'total_doctors': staff_metrics.get('doctors', 0),
-                        'total_nurses': staff_metrics.get('nurses', 0),
-                        'today_appointments': appointment_metrics.get('today_total', 0),
-                        'pending_appointments': appointment_metrics.get('today_pending', 0),
-                        'revenue_today': revenue_metrics.get('today', 0),
-                        'revenue_month': revenue_metrics.get('month', 0),
-                        'total_staff': staff_metrics.get('total', 0),
-                    })
+                    html = render_to_string('dashboard/partials/kpi_cards.html', kpi_context)
                     return HttpResponse(html)
                 else:
                     return JsonResponse(data)
@@ -647,6 +635,39 @@ def htmx_chart_data(request):
     return view.dispatch(request)
 
 
+# Server-push stream (replaces timer polling when served over ASGI)
+@login_required
+async def dashboard_event_stream(request):
+    """
+    Server-Sent Events stream of dashboard deltas for the current user.
+    Under WSGI there is no event loop to hold connections open, so it answers
+    204 and the client keeps its polling fallback.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    
+    async def stream():
+        yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n"
+        async with event_broker.subscribe(user) as subscription:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=EVENT_STREAM_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                payload = json.dumps(event['data'], cls=DjangoJSONEncoder)
+                yield f"event: {event['type']}\ndata: {payload}\n\n"
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
 # Additional Dashboard Views
 
 class DashboardActivityView(LoginRequiredMixin, TemplateView):
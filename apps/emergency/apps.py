@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmergencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.emergency'
+
+    def ready(self):
+        # Import signal handlers when app is ready
+        import apps.emergency.signals  # noqa
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:40
+
+from django.db import migrations, models
+
+
+PRIORITY_RANKS = {'critical': 1, 'urgent': 2, 'semi_urgent': 3, 'non_urgent': 4}
+
+
+def fill_priority_rank(apps, schema_editor):
+    EmergencyCase = apps.get_model('emergency', 'EmergencyCase')
+    for priority, rank in PRIORITY_RANKS.items():
+        EmergencyCase.objects.filter(priority=priority).update(priority_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergency', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='emergencycase',
+            options={'ordering': ['priority_rank', 'arrival_time']},
+        ),
+        migrations.AddField(
+            model_name='emergencycase',
+            name='escalation_level',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='emergencycase',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=4, editable=False),
+        ),
+        migrations.AddField(
+            model_name='emergencycase',
+            name='treatment_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='emergencycase',
+            index=models.Index(fields=['status', 'priority_rank', 'arrival_time'], name='emergency_e_status_87ed3d_idx'),
+        ),
+        migrations.RunPython(fill_priority_rank, migrations.RunPython.noop),
+    ]
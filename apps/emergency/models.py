@@ -21,19 +21,46 @@ class EmergencyCase(models.Model):
         ('non_urgent', 'Non-Urgent'),
     ]
     
+    # Numeric triage rank per priority (1 is seen first)
+    PRIORITY_RANKS = {
+        'critical': 1,
+        'urgent': 2,
+        'semi_urgent': 3,
+        'non_urgent': 4,
+    }
+    
     case_number = models.CharField(max_length=100, unique=True)
     patient_name = models.CharField(max_length=200, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='non_urgent')
+    priority_rank = models.PositiveSmallIntegerField(default=4, editable=False)
+    # Levels gained by waiting past triage target times (apps.emergency.triage_queue)
+    escalation_level = models.PositiveSmallIntegerField(default=0, editable=False)
     arrival_time = models.DateTimeField(default=timezone.now)
+    treatment_started_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['priority', '-arrival_time']
+        ordering = ['priority_rank', 'arrival_time']
+        indexes = [
+            models.Index(fields=['status', 'priority_rank', 'arrival_time']),
+        ]
 
     def __str__(self):
         return self.case_number
 
+    def save(self, *args, **kwargs):
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, 4)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'priority_rank'}
+        super().save(*args, **kwargs)
+
+    @property
+    def effective_rank(self):
+        """Triage rank after waiting-time escalation"""
+        return max(1, self.priority_rank - self.escalation_level)
+
 
 class EmergencyVitalSigns(models.Model):
     case = models.ForeignKey('emergency.EmergencyCase', on_delete=models.CASCADE, related_name='vital_signs')
@@ -0,0 +1,41 @@
+# apps/emergency/signals.py
+"""
+Emergency signal handlers: keep the triage queue (apps.emergency.triage_queue)
+in step with case saves and deletes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+QUEUE_FIELDS = ('status', 'priority', 'escalation_level', 'arrival_time', 'case_number', 'patient_name')
+
+
+def _queue_state(instance):
+    return tuple(instance.__dict__.get(field) for field in QUEUE_FIELDS)
+
+
+@receiver(post_init, sender='emergency.EmergencyCase')
+def remember_queue_state(sender, instance, **kwargs):
+    """Keep the loaded queue fields so post_save can skip saves the queue does not care about"""
+    instance._triage_state = _queue_state(instance)
+
+
+@receiver(post_save, sender='emergency.EmergencyCase')
+def update_triage_queue(sender, instance, created, **kwargs):
+    state = _queue_state(instance)
+    previous = getattr(instance, '_triage_state', None)
+    if not created and state == previous:
+        return
+    instance._triage_state = state
+    if not created and previous and previous[0] != 'waiting' and instance.status != 'waiting':
+        return
+
+    from .triage_queue import triage_queue
+    transaction.on_commit(lambda: triage_queue.apply(instance))
+
+
+@receiver(post_delete, sender='emergency.EmergencyCase')
+def drop_from_triage_queue(sender, instance, **kwargs):
+    from .triage_queue import triage_queue
+    case_id = instance.pk
+    transaction.on_commit(lambda: triage_queue.remove(case_id))
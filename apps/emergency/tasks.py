@@ -0,0 +1,14 @@
+# apps/emergency/tasks.py
+"""
+Periodic emergency department tasks; scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+
+from .triage_queue import triage_queue
+
+
+@shared_task(ignore_result=True)
+def escalate_triage_queue():
+    """Move waiting cases up a triage level once they pass their target time"""
+    triage_queue.escalate()
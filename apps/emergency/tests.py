@@ -1,3 +1,87 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest import mock
 
-# Create your tests here.
+from .models import EmergencyCase
+from .triage_queue import DEFAULT_TARGET_MINUTES, TriageQueue, _targets, escalation_level
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   EMERGENCY_TRIAGE_CHECK_INTERVAL=0)
+class TriageQueueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        publish = mock.patch('apps.emergency.triage_queue.event_broker.publish')
+        self.publish = publish.start()
+        self.addCleanup(publish.stop)
+
+    def arrive(self, number, priority, minutes_ago=0):
+        return EmergencyCase.objects.create(
+            case_number=f'ED-{number}', patient_name=f'Patient {number}', priority=priority,
+            arrival_time=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+
+    def numbers(self, queue):
+        return [row['case_number'] for row in queue.waiting()]
+
+    def test_most_urgent_then_longest_waiting_is_seen_first(self):
+        self.arrive(1, 'non_urgent', minutes_ago=30)
+        self.arrive(2, 'urgent', minutes_ago=5)
+        self.arrive(3, 'urgent', minutes_ago=10)
+        self.arrive(4, 'critical')
+        queue = TriageQueue()
+        self.assertEqual(self.numbers(queue), ['ED-4', 'ED-3', 'ED-2', 'ED-1'])
+
+        case = queue.take_next()
+        self.assertEqual((case.case_number, case.status), ('ED-4', 'in_treatment'))
+        self.assertIsNotNone(case.treatment_started_at)
+        self.assertEqual(len(queue), 3)
+
+    def test_take_next_skips_a_case_taken_elsewhere(self):
+        taken = self.arrive(1, 'critical')
+        self.arrive(2, 'urgent')
+        queue = TriageQueue()
+        queue.waiting()
+        EmergencyCase.objects.filter(pk=taken.pk).update(status='in_treatment')
+        self.assertEqual(queue.take_next().case_number, 'ED-2')
+        self.assertIsNone(queue.take_next())
+
+    def test_escalation_levels_add_up_level_by_level(self):
+        targets = _targets()
+        self.assertEqual(escalation_level(1, 500, targets), 0)
+        self.assertEqual(escalation_level(2, DEFAULT_TARGET_MINUTES['urgent'] - 1, targets), 0)
+        self.assertEqual(escalation_level(2, DEFAULT_TARGET_MINUTES['urgent'], targets), 1)
+        self.assertEqual(escalation_level(4, 130, targets), 1)
+        self.assertEqual(escalation_level(4, 180, targets), 2)
+        self.assertEqual(escalation_level(4, 195, targets), 3)
+
+    def test_long_waits_are_escalated_past_newer_arrivals(self):
+        old = self.arrive(1, 'non_urgent', minutes_ago=190)
+        self.arrive(2, 'semi_urgent')
+        queue = TriageQueue()
+        self.assertEqual(self.numbers(queue), ['ED-2', 'ED-1'])
+
+        self.assertEqual(queue.escalate(), 1)
+        self.assertEqual(self.numbers(queue), ['ED-1', 'ED-2'])
+        old.refresh_from_db()
+        self.assertEqual(old.escalation_level, 2)
+        self.assertEqual(queue.escalate(), 0)
+
+    def test_changes_reach_other_workers_and_screens(self):
+        first, second = TriageQueue(), TriageQueue()
+        self.assertEqual(len(second), 0)
+
+        case = self.arrive(1, 'urgent')
+        first.apply(case)
+        self.assertEqual(self.publish.call_args.args[1]['op'], 'upsert')
+        with self.assertNumQueries(0):
+            # Loaded from the snapshot the first worker cached
+            self.assertEqual(self.numbers(second), ['ED-1'])
+
+        case.status = 'discharged'
+        second.apply(case)
+        self.assertEqual(self.publish.call_args.args[1], {'op': 'remove', 'case_id': case.pk, 'status': 'discharged'})
+        self.assertEqual(len(first), 0)
@@ -0,0 +1,268 @@
+# apps/emergency/triage_queue.py
+"""
+Emergency department triage queue.
+
+Waiting cases sit in a per-process binary heap keyed by (effective triage
+rank, arrival time), so enqueueing a case and taking the next one are
+O(log n). The effective rank is the priority rank (critical = 1 ...
+non-urgent = 4) raised one level each time the case waits past the target
+time of its current level (``EMERGENCY_TRIAGE_TARGET_MINUTES``);
+``escalate()`` recomputes that on a timer (Celery beat).
+
+Workers stay in step through the ``emergency:triage`` cache tag: every change
+bumps it, and a worker that sees a version it did not produce reloads the
+queue - from the snapshot cached under that version, or one indexed query
+over waiting cases (also how the queue is rebuilt after a restart). Each
+change is pushed to ED screens as a ``triage.queue`` delta on the event
+stream (apps.core.events), so boards update without reloading the list.
+"""
+
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from apps.core.cache_tags import TagCache
+from apps.core.events import event_broker
+from apps.core.sqlite import serialized_write
+from .models import EmergencyCase
+
+logger = logging.getLogger('zain_hms.performance')
+
+QUEUE_TAG = 'emergency:triage'
+SNAPSHOT_KEY = 'zain_hms:emergency:triage'
+ED_ROLES = ['ADMIN', 'SUPERADMIN', 'DOCTOR', 'NURSE']
+ROW_FIELDS = ['id', 'case_number', 'patient_name', 'priority', 'priority_rank', 'escalation_level', 'arrival_time']
+
+DEFAULT_TARGET_MINUTES = {
+    'urgent': 15,
+    'semi_urgent': 60,
+    'non_urgent': 120,
+}
+
+
+def _targets():
+    """Minutes a case may wait at each rank before moving up one"""
+    minutes = {**DEFAULT_TARGET_MINUTES, **getattr(settings, 'EMERGENCY_TRIAGE_TARGET_MINUTES', {})}
+    return {EmergencyCase.PRIORITY_RANKS[priority]: value for priority, value in minutes.items()}
+
+
+def escalation_level(priority_rank, waited_minutes, targets):
+    """Levels gained after waiting ``waited_minutes`` from ``priority_rank`` (targets add up level by level)"""
+    level, rank, deadline = 0, priority_rank, 0
+    while rank > 1 and rank in targets:
+        deadline += targets[rank]
+        if waited_minutes < deadline:
+            break
+        level, rank = level + 1, rank - 1
+    return level
+
+
+def _row(values):
+    """JSON-ready queue row from a case's field values"""
+    arrival = values['arrival_time']
+    return {
+        'id': values['id'],
+        'case_number': values['case_number'],
+        'patient_name': values['patient_name'],
+        'priority': values['priority'],
+        'priority_rank': values['priority_rank'],
+        'escalation_level': values['escalation_level'],
+        'effective_rank': max(1, values['priority_rank'] - values['escalation_level']),
+        'arrival_time': arrival.isoformat() if isinstance(arrival, datetime) else arrival,
+    }
+
+
+class TriageQueue:
+    """Heap of waiting cases, synced across workers through a cache tag"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._heap = []
+        self._entries = {}            # case id -> live heap entry
+        self._sequence = itertools.count()
+        self._version = None
+        self._checked_at = 0.0
+
+    # Heap
+
+    def _push(self, row):
+        self._discard(row['id'])
+        arrival = datetime.fromisoformat(row['arrival_time']).timestamp()
+        # The sequence number keeps entries comparable when rank and arrival tie
+        entry = [row['effective_rank'], arrival, next(self._sequence), row]
+        self._entries[row['id']] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _discard(self, case_id):
+        entry = self._entries.pop(case_id, None)
+        if entry is not None:
+            entry[3] = None  # Lazily dropped when it reaches the top
+
+    def _pop(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[3] is not None:
+                del self._entries[entry[3]['id']]
+                return entry[3]
+        return None
+
+    def _replace(self, rows):
+        self._heap, self._entries = [], {}
+        for row in rows:
+            arrival = datetime.fromisoformat(row['arrival_time']).timestamp()
+            entry = [row['effective_rank'], arrival, next(self._sequence), row]
+            self._entries[row['id']] = entry
+            self._heap.append(entry)
+        heapq.heapify(self._heap)
+
+    def _rows(self):
+        return [entry[3] for entry in sorted(self._entries.values())]
+
+    # Cross-worker sync
+
+    @staticmethod
+    def _load_rows():
+        """Waiting cases from the (status, priority_rank, arrival_time) index"""
+        return [
+            _row(values) for values in
+            EmergencyCase.objects.filter(status='waiting').order_by('priority_rank', 'arrival_time').values(*ROW_FIELDS)
+        ]
+
+    def _sync(self, force=False, check=False):
+        """Reload if the tag moved: checked at most every interval for reads, always before a change (``check``)"""
+        now = time.monotonic()
+        interval = getattr(settings, 'EMERGENCY_TRIAGE_CHECK_INTERVAL', 1.0)
+        if not (force or check) and self._version is not None and now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        version = TagCache.get_versions([QUEUE_TAG])[QUEUE_TAG]
+        if version == self._version and not force:
+            return
+        rows = cache.get(f"{SNAPSHOT_KEY}:{version}")
+        if rows is None:
+            rows = self._load_rows()
+            cache.set(f"{SNAPSHOT_KEY}:{version}", rows, TagCache.DEFAULT_TIMEOUT)
+        self._replace(rows)
+        self._version = version
+
+    def _changed(self):
+        """Bump the tag after a local change; keep the heap if no other worker changed it meanwhile"""
+        before = self._version
+        TagCache.invalidate(QUEUE_TAG)
+        after = TagCache.get_versions([QUEUE_TAG])[QUEUE_TAG]
+        if before is not None and after == before + 1:
+            self._version = after
+            cache.set(f"{SNAPSHOT_KEY}:{after}", self._rows(), TagCache.DEFAULT_TIMEOUT)
+        else:
+            self._version = None  # Reload on the next read
+
+    # Public API
+
+    def apply(self, case):
+        """Enqueue, re-rank or drop one case after its save committed; pushes the delta"""
+        values = {field: getattr(case, field) for field in ROW_FIELDS}
+        with self._lock:
+            self._sync(check=True)
+            if case.status == 'waiting':
+                row = _row(values)
+                self._push(row)
+                delta = {'op': 'upsert', 'case': row}
+            else:
+                if case.pk not in self._entries:
+                    return
+                self._discard(case.pk)
+                delta = {'op': 'remove', 'case_id': case.pk, 'status': case.status}
+            self._changed()
+        event_broker.publish('triage.queue', delta, roles=ED_ROLES)
+
+    def remove(self, case_id):
+        with self._lock:
+            self._sync(check=True)
+            if case_id not in self._entries:
+                return
+            self._discard(case_id)
+            self._changed()
+        event_broker.publish('triage.queue', {'op': 'remove', 'case_id': case_id}, roles=ED_ROLES)
+
+    def waiting(self, limit=None):
+        """Waiting cases in the order they will be seen, with waiting minutes"""
+        with self._lock:
+            self._sync()
+            entries = heapq.nsmallest(limit, self._entries.values()) if limit else sorted(self._entries.values())
+        now = timezone.now().timestamp()
+        return [
+            {**entry[3], 'position': position, 'waiting_minutes': int((now - entry[1]) // 60)}
+            for position, entry in enumerate(entries, start=1)
+        ]
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._entries)
+
+    def take_next(self):
+        """
+        Move the most urgent waiting case into treatment and return it (None
+        when the queue is empty). The status change is conditional, so a case
+        another worker already took is skipped.
+        """
+        with self._lock:
+            self._sync(check=True)
+            while True:
+                row = self._pop()
+                if row is None:
+                    return None
+                with serialized_write():
+                    taken = EmergencyCase.objects.filter(pk=row['id'], status='waiting').update(
+                        status='in_treatment', treatment_started_at=timezone.now(),
+                    )
+                if taken:
+                    break
+            self._changed()
+        event_broker.publish('triage.queue', {'op': 'remove', 'case_id': row['id'], 'status': 'in_treatment'},
+                             roles=ED_ROLES)
+        return EmergencyCase.objects.get(pk=row['id'])
+
+    def escalate(self, now=None):
+        """Raise cases that waited past their target; returns how many moved up"""
+        now = now or timezone.now()
+        targets = _targets()
+        with self._lock:
+            self._sync(force=True)
+            changed = {}
+            for case_id, entry in self._entries.items():
+                row = entry[3]
+                waited = (now.timestamp() - entry[1]) / 60
+                level = escalation_level(row['priority_rank'], waited, targets)
+                if level != row['escalation_level']:
+                    changed[case_id] = level
+            if not changed:
+                return 0
+
+            by_level = {}
+            for case_id, level in changed.items():
+                by_level.setdefault(level, []).append(case_id)
+            with serialized_write():
+                for level, ids in by_level.items():
+                    EmergencyCase.objects.filter(pk__in=ids, status='waiting').update(escalation_level=level)
+
+            rows = []
+            for case_id, level in changed.items():
+                row = dict(self._entries[case_id][3], escalation_level=level)
+                row['effective_rank'] = max(1, row['priority_rank'] - level)
+                self._push(row)
+                rows.append(row)
+            self._changed()
+
+        event_broker.publish('triage.queue', {'op': 'escalate', 'cases': rows}, roles=ED_ROLES)
+        logger.info(f"Triage queue: escalated {len(rows)} waiting cases")
+        return len(rows)
+
+
+triage_queue = TriageQueue()
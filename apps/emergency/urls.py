@@ -2,7 +2,8 @@
 from django.urls import path
 from .views import (
     EmergencyDashboardView, EmergencyCaseCreateView, 
-    EmergencyCaseUpdateView, EmergencyCaseDetailView, add_treatment
+    EmergencyCaseUpdateView, EmergencyCaseDetailView, add_treatment,
+    triage_queue_api, take_next_case
 )
 
 app_name = 'emergency'  # This is the namespace used in templates
@@ -14,6 +15,10 @@ urlpatterns = [
     path('case/<int:pk>/', EmergencyCaseDetailView.as_view(), name='case_detail'),  # Case detail
     path('case/<int:case_id>/add_treatment/', add_treatment, name='add_treatment'),  # Add treatment
 
+    # Triage queue (apps.emergency.triage_queue)
+    path('api/queue/', triage_queue_api, name='triage_queue_api'),
+    path('api/queue/next/', take_next_case, name='take_next_case'),
+
     # Filter cases with HTMX (optional feature based on your dashboard)
     path('cases_filter/', EmergencyDashboardView.as_view(), name='cases_filter'),
 ]
@@ -1,12 +1,16 @@
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from apps.core.mixins import UnifiedSystemMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.http import JsonResponse
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
+from django.views.decorators.http import require_GET, require_POST
 from .models import EmergencyCase, EmergencyMedication
+from .triage_queue import triage_queue
 from apps.core.mixins import SafeMixin, UnifiedSystemMixin
 from .forms import EmergencyCaseForm, EmergencyTreatmentForm
 # 
@@ -23,14 +27,16 @@ class EmergencyDashboardView(LoginRequiredMixin, ListView):
         
         # For now, since EmergencyCase doesn't have tenant field, return all cases
         # TODO: Add tenant field to EmergencyCase model in future migration
-        return EmergencyCase.objects.exclude(status='discharged').order_by('priority', '-arrival_time')
+        return EmergencyCase.objects.exclude(status='discharged').order_by('priority_rank', 'arrival_time')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        queryset = self.get_queryset()
-        context['critical_count'] = queryset.filter(priority='critical').count()
-        context['waiting_count'] = queryset.filter(status='waiting').count()
-        context['in_treatment_count'] = queryset.filter(status='in_treatment').count()
+        counts = self.get_queryset().aggregate(
+            critical_count=Count('id', filter=Q(priority='critical')),
+            waiting_count=Count('id', filter=Q(status='waiting')),
+            in_treatment_count=Count('id', filter=Q(status='in_treatment')),
+        )
+        context.update(counts)
         return context
 
 class EmergencyCaseCreateView(UnifiedSystemMixin, LoginRequiredMixin, CreateView):
@@ -99,4 +105,34 @@ def add_treatment(request, case_id):
             'message': 'Treatment added successfully'
         })
     
-    return JsonResponse({'error': form.errors}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': form.errors}, status=400)
+
+
+@login_required
+@require_GET
+def triage_queue_api(request):
+    """Waiting cases in triage order (served from the in-process queue)"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 50)), 500))
+    except ValueError:
+        limit = 50
+    waiting = triage_queue.waiting(limit)
+    return JsonResponse({'count': len(triage_queue), 'waiting': waiting})
+
+
+@login_required
+@require_POST
+def take_next_case(request):
+    """Start treating the most urgent waiting case"""
+    case = triage_queue.take_next()
+    if case is None:
+        return JsonResponse({'case': None, 'message': 'No waiting cases'})
+    return JsonResponse({
+        'case': {
+            'id': case.pk,
+            'case_number': case.case_number,
+            'patient_name': case.patient_name,
+            'priority': case.priority,
+            'url': reverse('emergency:case_detail', kwargs={'pk': case.pk}),
+        },
+    })
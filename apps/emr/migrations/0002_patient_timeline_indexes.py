@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+        ('doctors', '0001_initial'),
+        ('emr', '0001_initial'),
+        ('patients', '0004_master_patient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labresult',
+            index=models.Index(fields=['patient', 'ordered_date', 'id'], name='emr_labresu_patient_d129a1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', 'record_date', 'id'], name='emr_medical_patient_a89cf3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', 'start_date', 'id'], name='emr_medicat_patient_83ccc5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalsigns',
+            index=models.Index(fields=['patient', 'recorded_at', 'id'], name='emr_vitalsi_patient_0e8afa_idx'),
+        ),
+    ]
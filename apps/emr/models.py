@@ -72,6 +72,8 @@ class MedicalRecord(models.Model):
             models.Index(fields=['patient', 'record_date']),
             models.Index(fields=['doctor', 'record_date']),
             models.Index(fields=['record_type']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'record_date', 'id']),
         ]
     
     def __str__(self):
@@ -171,6 +173,8 @@ class VitalSigns(models.Model):
         indexes = [
             models.Index(fields=['patient', 'recorded_at']),
             models.Index(fields=['recorded_at']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'recorded_at', 'id']),
         ]
     
     def __str__(self):
@@ -274,6 +278,8 @@ class Medication(models.Model):
             models.Index(fields=['patient', 'status']),
             models.Index(fields=['prescribed_by']),
             models.Index(fields=['start_date']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'start_date', 'id']),
         ]
     
     def __str__(self):
@@ -347,6 +353,8 @@ class LabResult(models.Model):
             models.Index(fields=['patient', 'result_date']),
             models.Index(fields=['test_name', 'status']),
             models.Index(fields=['ordered_date']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'ordered_date', 'id']),
         ]
     
     def __str__(self):
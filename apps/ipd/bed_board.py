@@ -0,0 +1,294 @@
+# apps/ipd/bed_board.py
+"""
+Hospital bed board and lock-safe bed allocation.
+
+The board is two kinds of cache entries:
+
+* the layout - wards, their rooms and beds in a fixed order, and a
+  ``bed id -> (ward slot, bit)`` map - built from one query and versioned with the
+  ``ipd:beds`` tag, so adding, renumbering or deleting rooms/beds (which fire
+  save signals, see ``CACHE_TAG_RULES``) rebuilds it;
+* one occupancy bitmap per ward (an int, bit set = bed taken), flipped in
+  place after each admission, transfer and discharge commits. The bitmaps
+  also expire after ``IPD_BED_BOARD_OCCUPANCY_TTL`` seconds, which bounds how
+  long a flip lost to a concurrent worker can show.
+
+Beds change hands only through ``BedBoard``: taking a bed is a conditional
+``UPDATE ... WHERE available`` that exactly one admission can win, so two
+admissions can never share a bed, whatever the board shows.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Exists, OuterRef, When
+from django.utils import timezone
+import logging
+import threading
+
+from apps.core.cache_tags import TagCache
+from apps.core.events import event_broker
+from apps.core.sqlite import serialized_write
+from .models import Bed, IPDRecord, Room
+
+logger = logging.getLogger('zain_hms.performance')
+
+LAYOUT_TAG = 'ipd:beds'
+OCCUPANCY_KEY = 'zain_hms:ipd:occupancy'
+BOARD_ROLES = ['ADMIN', 'SUPERADMIN', 'NURSE', 'RECEPTIONIST', 'DOCTOR']
+
+# Candidate beds tried per allocation before giving up on a busy ward
+ALLOCATION_ATTEMPTS = 20
+
+
+class BedUnavailable(ValueError):
+    """Raised when no bed matching the request could be taken"""
+
+
+def _occupancy_ttl():
+    return getattr(settings, 'IPD_BED_BOARD_OCCUPANCY_TTL', 60)
+
+
+class BedBoard:
+    """Read the hospital bed board; take, move and free beds"""
+
+    _flip_lock = threading.Lock()
+
+    # Board
+
+    @staticmethod
+    def _load():
+        """``(layout, {ward slot: bitmap})`` from one query over beds and their rooms"""
+        rows = Bed.objects.order_by('room__ward', 'room__floor', 'room__number', 'room_id', 'number', 'id').values_list(
+            'id', 'number', 'available', 'room_id', 'room__number', 'room__floor', 'room__ward',
+            'room__room_type', 'room__gender', 'room__is_isolation',
+        )
+        wards, positions, bitmaps = {}, {}, {}
+        for bed_id, number, available, room_id, room_number, floor, ward, room_type, gender, isolation in rows:
+            ward = ward or f"Floor {floor}"
+            entry = wards.setdefault(ward, {'ward': ward, 'slot': len(wards), 'rooms': [], 'beds': 0})
+            if not entry['rooms'] or entry['rooms'][-1]['id'] != room_id:
+                entry['rooms'].append({
+                    'id': room_id, 'number': room_number, 'floor': floor, 'room_type': room_type,
+                    'gender': gender, 'isolation': isolation, 'beds': [],
+                })
+            bit = entry['beds']
+            entry['rooms'][-1]['beds'].append((bed_id, number, bit))
+            entry['beds'] += 1
+            positions[str(bed_id)] = (entry['slot'], bit)  # String keys survive the JSON cache serializer
+            if not available:
+                bitmaps[entry['slot']] = bitmaps.get(entry['slot'], 0) | (1 << bit)
+        layout = {'wards': list(wards.values()), 'positions': positions}
+        return layout, {entry['slot']: bitmaps.get(entry['slot'], 0) for entry in wards.values()}
+
+    @classmethod
+    def _layout_key(cls):
+        return TagCache.make_key('ipd_bed_layout', [LAYOUT_TAG])
+
+    @staticmethod
+    def _bitmap_key(layout_key, slot):
+        return f"{OCCUPANCY_KEY}:{layout_key.rsplit(':', 1)[-1]}:{slot}"
+
+    @classmethod
+    def _cached(cls):
+        """Layout and ``{ward slot: bitmap}`` from the cache, reloading whatever is missing (one query)"""
+        layout_key = cls._layout_key()
+        layout = cache.get(layout_key)
+        if layout is not None:
+            keys = {cls._bitmap_key(layout_key, ward['slot']): ward['slot'] for ward in layout['wards']}
+            found = cache.get_many(list(keys))
+            if len(found) == len(keys):
+                return layout, {keys[key]: value for key, value in found.items()}
+
+        layout, bitmaps = cls._load()
+        cache.set(layout_key, layout, TagCache.DEFAULT_TIMEOUT)
+        cache.set_many({cls._bitmap_key(layout_key, slot): bitmap for slot, bitmap in bitmaps.items()},
+                       _occupancy_ttl())
+        return layout, bitmaps
+
+    @classmethod
+    def board(cls):
+        """
+        The whole hospital's beds by ward and room, with occupancy counts:
+        served from the cache, or one query when it is cold.
+        """
+        layout, bitmaps = cls._cached()
+        wards, total, occupied = [], 0, 0
+        for ward in layout['wards']:
+            bitmap = bitmaps.get(ward['slot'], 0)
+            taken = bin(bitmap).count('1')
+            wards.append({
+                'ward': ward['ward'],
+                'total': ward['beds'],
+                'occupied': taken,
+                'available': ward['beds'] - taken,
+                'rooms': [
+                    {
+                        'id': room['id'],
+                        'number': room['number'],
+                        'floor': room['floor'],
+                        'room_type': room['room_type'],
+                        'gender': room['gender'],
+                        'isolation': room['isolation'],
+                        'beds': [
+                            {'id': bed_id, 'number': number, 'available': not (bitmap >> bit) & 1}
+                            for bed_id, number, bit in room['beds']
+                        ],
+                    }
+                    for room in ward['rooms']
+                ],
+            })
+            total += ward['beds']
+            occupied += taken
+        return {
+            'wards': wards,
+            'total': total,
+            'occupied': occupied,
+            'available': total - occupied,
+            'generated_at': timezone.now().isoformat(),
+        }
+
+    @classmethod
+    def available_beds(cls, room_id):
+        """``[(bed_id, number), ...]`` free in one room, from the board"""
+        layout, bitmaps = cls._cached()
+        for ward in layout['wards']:
+            for room in ward['rooms']:
+                if str(room['id']) == str(room_id):
+                    bitmap = bitmaps.get(ward['slot'], 0)
+                    return [(bed_id, number) for bed_id, number, bit in room['beds'] if not (bitmap >> bit) & 1]
+        return []
+
+    @classmethod
+    def _flip(cls, bed_id, occupied):
+        """Set one bed's bit in its ward bitmap (after commit)"""
+        layout_key = cls._layout_key()
+        layout = cache.get(layout_key)
+        position = layout and layout['positions'].get(str(bed_id))
+        if position is None:
+            return  # Rebuilt from the database on the next read
+        slot, bit = position
+        key = cls._bitmap_key(layout_key, slot)
+        with cls._flip_lock:
+            bitmap = cache.get(key)
+            if bitmap is not None:
+                bitmap = bitmap | (1 << bit) if occupied else bitmap & ~(1 << bit)
+                cache.set(key, bitmap, _occupancy_ttl())
+
+    @classmethod
+    def _changed(cls, bed_id, room_id, occupied):
+        """Sync the room flag now; flip the board bit and notify screens once committed"""
+        Room.objects.filter(pk=room_id).update(
+            is_occupied=~Exists(Bed.objects.filter(room=OuterRef('pk'), available=True))
+        )
+
+        def after_commit():
+            cls._flip(bed_id, occupied)
+            event_broker.publish('bed.status', {'bed_id': bed_id, 'room_id': room_id, 'occupied': occupied},
+                                 roles=BOARD_ROLES)
+        transaction.on_commit(after_commit)
+
+    # Allocation
+
+    @classmethod
+    def claim(cls, bed):
+        """Take one specific bed; False if someone else holds it"""
+        with serialized_write():
+            if not Bed.objects.filter(pk=bed.pk, available=True).update(available=False):
+                return False
+            bed.available = False
+            cls._changed(bed.pk, bed.room_id, True)
+        return True
+
+    @classmethod
+    def release(cls, bed):
+        """Free a bed (discharge, transfer out, deleted stay)"""
+        with serialized_write():
+            if Bed.objects.filter(pk=bed.pk, available=False).update(available=True):
+                bed.available = True
+                cls._changed(bed.pk, bed.room_id, False)
+
+    @classmethod
+    def allocate(cls, room_type=None, gender=None, isolation=False, ward=None):
+        """
+        Take the first free bed matching the preferences and return it.
+        ``gender`` ('M'/'F') admits to rooms for that gender or mixed rooms;
+        isolation rooms are used only when ``isolation`` is asked for.
+        Raises ``BedUnavailable`` when nothing matching is free.
+        """
+        candidates = Bed.objects.filter(available=True, room__is_isolation=bool(isolation))
+        if room_type:
+            candidates = candidates.filter(room__room_type=room_type)
+        if gender in ('M', 'F'):
+            candidates = candidates.filter(room__gender__in=['ANY', gender])
+        if ward:
+            candidates = candidates.filter(room__ward=ward)
+        # Same-gender rooms first, keeping mixed rooms for whoever needs them
+        candidates = candidates.select_related('room').order_by(
+            Case(When(room__gender=gender, then=0), default=1), 'room__ward', 'room__floor', 'room__number', 'number'
+        )
+
+        with serialized_write():
+            for bed in candidates[:ALLOCATION_ATTEMPTS]:
+                if cls.claim(bed):
+                    return bed
+        raise BedUnavailable('No free bed matches the requested room type, gender and isolation')
+
+    # Stays
+
+    @classmethod
+    def admit(cls, record, **preferences):
+        """
+        Save a new admission holding its bed: ``record.bed`` if chosen,
+        else one allocated by ``preferences``. Raises ``BedUnavailable``.
+        """
+        with serialized_write():
+            if record.bed_id:
+                if not cls.claim(record.bed):
+                    raise BedUnavailable(f'{record.bed} is already taken')
+            else:
+                gender = preferences.pop('gender', None) or getattr(record.patient, 'gender', None)
+                record.bed = cls.allocate(gender=gender, **preferences)
+            record.room_id = record.bed.room_id
+            if record.status == 'Discharged':
+                record.discharge_date = record.discharge_date or timezone.now()
+            record.save()
+            if record.status == 'Discharged':
+                cls.release(record.bed)
+        return record
+
+    @classmethod
+    def update_stay(cls, record):
+        """Save an edited admission, moving its bed on a transfer and freeing it on discharge"""
+        with serialized_write():
+            previous = IPDRecord.objects.select_related('bed').get(pk=record.pk)
+            held = previous.status != 'Discharged'
+            holds = record.status != 'Discharged'
+            moved = previous.bed_id != record.bed_id
+
+            if holds and (moved or not held) and not cls.claim(record.bed):
+                raise BedUnavailable(f'{record.bed} is already taken')
+            if held and (moved or not holds):
+                cls.release(previous.bed)
+            record.room_id = record.bed.room_id
+            if not holds and held:
+                record.discharge_date = record.discharge_date or timezone.now()
+            record.save()
+        return record
+
+    @classmethod
+    def discharge(cls, record):
+        with serialized_write():
+            record.status = 'Discharged'
+            record.discharge_date = record.discharge_date or timezone.now()
+            record.save(update_fields=['status', 'discharge_date'])
+            cls.release(record.bed)
+        return record
+
+    @classmethod
+    def remove_stay(cls, record):
+        """Delete an admission, freeing its bed if it still held one"""
+        with serialized_write():
+            if record.status != 'Discharged':
+                cls.release(record.bed)
+            record.delete()
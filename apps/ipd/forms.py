@@ -1,5 +1,6 @@
 # ipd/forms.py
 from django import forms
+from django.db.models import Q
 from .models import IPDRecord, Bed
 
 class IPDRecordForm(forms.ModelForm):
@@ -18,5 +19,5 @@ class IPDRecordForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Only show available beds
-        self.fields['bed'].queryset = Bed.objects.filter(available=True)
\ No newline at end of file
+        # Only show available beds (and the bed an existing stay already holds)
+        self.fields['bed'].queryset = Bed.objects.filter(Q(available=True) | Q(pk=self.instance.bed_id))
\ No newline at end of file
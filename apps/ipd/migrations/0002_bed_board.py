@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipd', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='gender',
+            field=models.CharField(choices=[('ANY', 'Any'), ('M', 'Male'), ('F', 'Female')], default='ANY', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='is_isolation',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='ward',
+            field=models.CharField(blank=True, help_text='Ward shown on the bed board (defaults to the floor)', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='bed',
+            index=models.Index(fields=['available', 'room'], name='ipd_bed_availab_b5402f_idx'),
+        ),
+    ]
@@ -5,16 +5,29 @@ from apps.patients.models import Patient
 from apps.doctors.models import Doctor
 
 class Room(models.Model):
+    GENDER_CHOICES = [('ANY', 'Any'), ('M', 'Male'), ('F', 'Female')]
+
     number = models.CharField(max_length=10)
     floor = models.IntegerField()
     room_type = models.CharField(max_length=20, choices=[('General', 'General'), ('Private', 'Private')])
+    ward = models.CharField(max_length=50, blank=True, help_text='Ward shown on the bed board (defaults to the floor)')
+    gender = models.CharField(max_length=3, choices=GENDER_CHOICES, default='ANY')
+    is_isolation = models.BooleanField(default=False)
     is_occupied = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Room {self.number}, {self.room_type}"
     
+    @property
+    def ward_name(self):
+        return self.ward or f"Floor {self.floor}"
+
     @property
     def available_beds_count(self):
+        # Use prefetched beds (room lists) instead of a COUNT per room
+        beds = getattr(self, '_prefetched_objects_cache', {}).get('beds')
+        if beds is not None:
+            return sum(1 for bed in beds if bed.available)
         return self.beds.filter(available=True).count()
     
 class Bed(models.Model):
@@ -22,6 +35,11 @@ class Bed(models.Model):
     number = models.CharField(max_length=10)
     available = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['available', 'room']),
+        ]
+
     def __str__(self):
         return f"Bed {self.number} in {self.room}"
 
@@ -5,6 +5,7 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from django.shortcuts import redirect
 from .models import Room, Bed
+from .bed_board import BedBoard
 
 
 class RoomManagementMixin(UserPassesTestMixin):
@@ -34,17 +35,18 @@ class RoomListView(LoginRequiredMixin, RoomManagementMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        board = BedBoard.board()
         context['total_rooms'] = Room.objects.count()
         context['occupied_rooms'] = Room.objects.filter(is_occupied=True).count()
-        context['total_beds'] = Bed.objects.count()
-        context['available_beds'] = Bed.objects.filter(available=True).count()
+        context['total_beds'] = board['total']
+        context['available_beds'] = board['available']
         return context
 
 
 class RoomCreateView(LoginRequiredMixin, RoomManagementMixin, CreateView):
     model = Room
     template_name = 'ipd/room_management/room_form.html'
-    fields = ['number', 'floor', 'room_type']
+    fields = ['number', 'floor', 'room_type', 'ward', 'gender', 'is_isolation']
     success_url = reverse_lazy('ipd:room_list')
 
     def form_valid(self, form):
@@ -56,7 +58,7 @@ class RoomCreateView(LoginRequiredMixin, RoomManagementMixin, CreateView):
 class RoomUpdateView(LoginRequiredMixin, RoomManagementMixin, UpdateView):
     model = Room
     template_name = 'ipd/room_management/room_form.html'
-    fields = ['number', 'floor', 'room_type']
+    fields = ['number', 'floor', 'room_type', 'ward', 'gender', 'is_isolation']
     success_url = reverse_lazy('ipd:room_list')
 
     def form_valid(self, form):
@@ -104,9 +106,10 @@ class BedListView(LoginRequiredMixin, RoomManagementMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['rooms'] = Room.objects.all().order_by('number')
         context['selected_room'] = self.request.GET.get('room', '')
-        context['total_beds'] = Bed.objects.count()
-        context['available_beds'] = Bed.objects.filter(available=True).count()
-        context['occupied_beds'] = Bed.objects.filter(available=False).count()
+        board = BedBoard.board()
+        context['total_beds'] = board['total']
+        context['available_beds'] = board['available']
+        context['occupied_beds'] = board['occupied']
         return context
 
 
@@ -1,3 +1,93 @@
-from django.test import TestCase
+from datetime import date
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from unittest import mock
 
-# Create your tests here.
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+from .bed_board import BedBoard, BedUnavailable
+from .models import Bed, IPDRecord, Room
+
+
+# The board is cached the way production stores it: as JSON
+@override_settings(CACHES={'default': {'BACKEND': 'apps.core.tests.JSONRoundTripCache'}})
+class BedBoardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F', phone='0501234567',
+        )
+        cls.doctor = Doctor.objects.create(
+            first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        cls.mixed = Room.objects.create(number='101', floor=1, room_type='General', ward='Medical')
+        cls.female = Room.objects.create(number='102', floor=1, room_type='General', ward='Medical', gender='F')
+        cls.isolation = Room.objects.create(number='103', floor=1, room_type='Private', ward='Medical',
+                                            is_isolation=True)
+        cls.mixed_bed = Bed.objects.create(room=cls.mixed, number='A')
+        cls.female_beds = [Bed.objects.create(room=cls.female, number=number) for number in 'AB']
+        cls.isolation_bed = Bed.objects.create(room=cls.isolation, number='A')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_only_one_claim_wins_a_bed(self):
+        first, second = Bed.objects.get(pk=self.mixed_bed.pk), Bed.objects.get(pk=self.mixed_bed.pk)
+        self.assertTrue(BedBoard.claim(first))
+        self.assertFalse(BedBoard.claim(second))
+        self.mixed.refresh_from_db()
+        self.assertTrue(self.mixed.is_occupied)
+
+        BedBoard.release(first)
+        self.mixed.refresh_from_db()
+        self.assertFalse(self.mixed.is_occupied)
+
+    def test_allocate_prefers_same_gender_rooms_and_skips_isolation(self):
+        self.assertEqual(BedBoard.allocate(gender='F').room_id, self.female.pk)
+        self.assertEqual(BedBoard.allocate(gender='M'), self.mixed_bed)
+        with self.assertRaises(BedUnavailable):
+            BedBoard.allocate(gender='M')
+        self.assertEqual(BedBoard.allocate(isolation=True), self.isolation_bed)
+
+    def test_board_flips_occupancy_after_commit(self):
+        self.assertEqual(BedBoard.board()['available'], 4)
+        with mock.patch('apps.ipd.bed_board.event_broker.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                BedBoard.claim(self.female_beds[1])
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args.args[1], {'bed_id': self.female_beds[1].pk, 'room_id': self.female.pk,
+                                                     'occupied': True})
+
+        with self.assertNumQueries(0):
+            board = BedBoard.board()
+            free = BedBoard.available_beds(self.female.pk)
+        self.assertEqual((board['occupied'], board['available']), (1, 3))
+        self.assertEqual(free, [(self.female_beds[0].pk, 'A')])
+
+    def test_new_beds_rebuild_the_layout(self):
+        self.assertEqual(BedBoard.board()['total'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Bed.objects.create(room=self.mixed, number='B')
+        self.assertEqual(BedBoard.board()['total'], 5)
+
+    def test_admission_transfer_and_discharge_move_the_bed(self):
+        record = BedBoard.admit(IPDRecord(patient=self.patient, attending_doctor=self.doctor, status='Admitted'))
+        self.assertEqual(record.bed.room_id, self.female.pk)
+        self.assertEqual(record.room_id, self.female.pk)
+        with self.assertRaises(BedUnavailable):
+            BedBoard.admit(IPDRecord(patient=self.patient, attending_doctor=self.doctor, status='Admitted',
+                                     bed=Bed.objects.get(pk=record.bed_id)))
+
+        held = record.bed_id
+        record.bed = self.mixed_bed
+        BedBoard.update_stay(record)
+        self.assertEqual(record.room_id, self.mixed.pk)
+        self.assertTrue(Bed.objects.get(pk=held).available)
+        self.assertFalse(Bed.objects.get(pk=self.mixed_bed.pk).available)
+
+        BedBoard.discharge(record)
+        self.assertIsNotNone(record.discharge_date)
+        self.assertTrue(Bed.objects.get(pk=self.mixed_bed.pk).available)
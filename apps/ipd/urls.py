@@ -29,4 +29,5 @@ urlpatterns = [
     path('ajax/search-patients/', views.ajax_search_patients, name='ajax_search_patients'),
     path('ajax/search-doctors/', views.ajax_search_doctors, name='ajax_search_doctors'),
     path('ajax/get-available-beds/', views.ajax_get_available_beds, name='ajax_get_available_beds'),
+    path('api/bed-board/', views.bed_board_api, name='bed_board_api'),
 ]
\ No newline at end of file
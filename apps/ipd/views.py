@@ -3,10 +3,11 @@ from django.views.generic import ListView, CreateView, DetailView, UpdateView, D
 from django.contrib.auth.mixins import LoginRequiredMixin
 from apps.core.mixins import UnifiedSystemMixin
 from django.urls import reverse_lazy
-from django.http import JsonResponse
+from django.http import HttpResponseRedirect, JsonResponse
 from django.db.models import Q
 from .models import IPDRecord
 from .forms import IPDRecordForm
+from .bed_board import BedBoard, BedUnavailable
 
 class IPDListView(LoginRequiredMixin, ListView):
     model = IPDRecord
@@ -28,6 +29,15 @@ class IPDCreateView(UnifiedSystemMixin, LoginRequiredMixin, CreateView):
     template_name = 'ipd/ipd_form.html'
     success_url = reverse_lazy('ipd:ipd_list')
 
+    def form_valid(self, form):
+        # Take the bed atomically; a concurrent admission may have won it
+        try:
+            self.object = BedBoard.admit(form.instance)
+        except BedUnavailable as e:
+            form.add_error('bed', str(e))
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
 class IPDDetailView(LoginRequiredMixin, DetailView):
     model = IPDRecord
     template_name = 'ipd/ipd_detail.html'
@@ -39,11 +49,31 @@ class IPDUpdateView(LoginRequiredMixin, UpdateView):
     template_name = 'ipd/ipd_form.html'
     success_url = reverse_lazy('ipd:ipd_list')
 
+    def form_valid(self, form):
+        # Bed transfer / discharge moves the bed with the record
+        try:
+            self.object = BedBoard.update_stay(form.instance)
+        except BedUnavailable as e:
+            form.add_error('bed', str(e))
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
 class IPDDeleteView(LoginRequiredMixin, DeleteView):
     model = IPDRecord
     template_name = 'ipd/ipd_confirm_delete.html'
     success_url = reverse_lazy('ipd:ipd_list')
 
+    def form_valid(self, form):
+        BedBoard.remove_stay(self.object)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+def bed_board_api(request):
+    """Whole-hospital bed board: wards, rooms and beds with occupancy (cache read)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    return JsonResponse(BedBoard.board())
+
 
 def ajax_search_patients(request):
     """AJAX view to search patients for IPD form"""
@@ -185,23 +215,12 @@ def ajax_get_available_beds(request):
         return JsonResponse({'results': []})
     
     try:
-        from .models import Bed
-        
-        # Get available beds for the selected room
-        beds = Bed.objects.filter(
-            room_id=room_id,
-            available=True
-        ).order_by('number')
-        
-        results = []
-        for bed in beds:
-            results.append({
-                'id': bed.id,
-                'text': f"Bed {bed.number}",
-                'number': bed.number
-            })
-        
+        # Free beds of the room from the bed board cache
+        results = [
+            {'id': bed_id, 'text': f"Bed {number}", 'number': number}
+            for bed_id, number in BedBoard.available_beds(room_id)
+        ]
         return JsonResponse({'results': results})
         
     except Exception as e:
-        return JsonResponse({'results': [], 'error': str(e)})
+        return JsonResponse({'results': [], 'error': str(e)})
\ No newline at end of file
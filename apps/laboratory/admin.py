@@ -5,7 +5,7 @@ from django.db.models import Count, Avg
 from .models import (
     LabSection, LabTest, LabOrder, LabOrderItem, 
     LabReport, LabEquipment, LabQualityControl, 
-    LabSupply, LabSupplyBatch
+    LabSupply, LabSupplyBatch, LabReferenceRange
 )
 
 
@@ -20,12 +20,19 @@ class LabSectionAdmin(admin.ModelAdmin):
     test_count.short_description = 'Tests'
 
 
+class LabReferenceRangeInline(admin.TabularInline):
+    model = LabReferenceRange
+    extra = 0
+    fields = ('gender', 'age_min_years', 'age_max_years', 'low', 'high', 'critical_low', 'critical_high', 'display_text')
+
+
 @admin.register(LabTest)
 class LabTestAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'section', 'selling_price', 'is_active')
     list_filter = ('section', 'is_active', 'requires_fasting')
     search_fields = ('name', 'code', 'description')
     list_editable = ('selling_price',)
+    inlines = [LabReferenceRangeInline]
 
 
 @admin.register(LabOrder)
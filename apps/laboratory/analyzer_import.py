@@ -0,0 +1,474 @@
+# apps/laboratory/analyzer_import.py
+"""
+Bulk import of analyzer result files into ``LabOrderItem``.
+
+Analyzer exports (CSV, or ASTM E1394-style H/P/O/R records) are streamed
+record by record and handled in chunks of ``LAB_IMPORT_CHUNK`` results:
+
+1. the chunk's sample barcodes are resolved to orders with one ``in_bulk``
+   on ``LabOrder.serial_number`` (the value printed on the sample label),
+   and those orders' items are loaded with one more query;
+2. reference and critical limits come from ``ReferenceRangeTable`` - one
+   row per (test, age band, gender), precomputed from ``LabReferenceRange``
+   and the tests' free-text ranges and kept in the tag-versioned cache;
+3. abnormal/critical flags are computed for the whole chunk in one columnar
+   pass (``flag_results``), merged with the analyzer's own flags;
+4. items and their orders are written with ``bulk_update``.
+
+Critical results are collected across the whole file and raised as one
+batch of notifications plus a single server-push event.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+import csv
+import io
+import itertools
+import logging
+import math
+import re
+
+from apps.core.cache_tags import TagCache
+from apps.core.events import event_broker
+from apps.core.sqlite import serialized_write
+from apps.notifications.models import Notification
+from apps.patients.timeline import timeline_tag
+from .models import LabOrder, LabOrderItem, LabReferenceRange, LabTest
+
+logger = logging.getLogger(__name__)
+
+AnalyzerResult = namedtuple('AnalyzerResult', ['line', 'barcode', 'test_code', 'value', 'unit', 'flag', 'resulted_at'])
+RangeRow = namedtuple('RangeRow', ['low', 'high', 'critical_low', 'critical_high', 'text'])
+
+REFERENCE_RANGE_TAG = 'lab_reference_ranges'
+MAX_AGE_YEARS = 150
+ADULT_AGE_YEARS = 18
+
+# Analyzer abnormal flags (ASTM field 8 / a CSV "flag" column)
+CRITICAL_FLAGS = {'HH', 'LL', 'AA', 'C', 'CRIT'}
+NORMAL_FLAGS = {'', 'N'}
+
+CSV_COLUMNS = {
+    'barcode': ('barcode', 'sample_id', 'specimen_id', 'sample', 'accession'),
+    'test_code': ('test_code', 'test', 'assay', 'code'),
+    'value': ('result', 'value', 'result_value'),
+    'unit': ('unit', 'units'),
+    'flag': ('flag', 'flags', 'abnormal_flag'),
+    'resulted_at': ('resulted_at', 'result_time', 'timestamp', 'date'),
+}
+
+_RANGE_BETWEEN = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+_RANGE_BELOW = re.compile(r'^\s*(?:<=?|≤|up to)\s*(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+_RANGE_ABOVE = re.compile(r'^\s*(?:>=?|≥)\s*(-?\d+(?:\.\d+)?)')
+_NUMBER = re.compile(r'^\s*[<>]?=?\s*(-?\d+(?:\.\d+)?)\s*$')
+_SERIAL_BARCODE = re.compile(r'^(.*?)([A-Z]{3})(\d{4})(\d{6})$')
+_ASTM_CONTROL = str.maketrans('', '', '\x02\x03\x04\x05\x17')
+
+
+def serial_from_barcode(barcode):
+    """Sample labels print ``serial_number`` without dashes (DocumentBarcodeGenerator); put them back"""
+    code = barcode.strip().upper()
+    if '-' in code:
+        return code
+    match = _SERIAL_BARCODE.match(code)
+    if not match:
+        return code
+    return '-'.join(part for part in match.groups() if part)
+
+
+def parse_number(value):
+    match = _NUMBER.match(value or '')
+    return float(match.group(1)) if match else None
+
+
+def parse_range_text(text):
+    """``(low, high)`` from a free-text range such as ``70-110 mg/dL`` or ``< 5.0``"""
+    text = text or ''
+    match = _RANGE_BETWEEN.match(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    match = _RANGE_BELOW.match(text)
+    if match:
+        return None, float(match.group(1))
+    match = _RANGE_ABOVE.match(text)
+    if match:
+        return float(match.group(1)), None
+    return None, None
+
+
+def _parse_time(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in ('%Y%m%d%H%M%S', '%Y%m%d%H%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return timezone.make_aware(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+# -- analyzer file parsers: text lines -> AnalyzerResult ------------------------
+
+def parse_csv(lines):
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        return
+    # "Sample ID", "sample_id" and "SampleID" are the same column
+    normalise = lambda name: re.sub(r'[^a-z0-9]', '', name.lower())
+    headers = {normalise(name): name for name in reader.fieldnames if name}
+    columns = {
+        field: next((headers[normalise(alias)] for alias in aliases if normalise(alias) in headers), None)
+        for field, aliases in CSV_COLUMNS.items()
+    }
+    for row in reader:
+        get = lambda field: (row.get(columns[field]) or '').strip() if columns[field] else ''
+        yield AnalyzerResult(reader.line_num, get('barcode'), get('test_code').upper(), get('value'),
+                             get('unit'), get('flag').upper(), _parse_time(get('resulted_at')))
+
+
+def parse_astm(lines):
+    """ASTM E1394 records; the specimen id comes from the preceding O (order) record"""
+    field_sep, component_sep = '|', '^'
+    specimen = ''
+    for number, line in enumerate(lines, start=1):
+        record = line.translate(_ASTM_CONTROL).strip()
+        if len(record) > 2 and record[0].isdigit() and record[2] == '|':
+            record = record[1:]  # low-level frame number
+        if len(record) < 2:
+            continue
+        kind = record[0].upper()
+        if kind == 'H':
+            field_sep, component_sep = record[1], record[3] if len(record) > 3 else '^'
+            continue
+        fields = record.split(field_sep)
+        if kind == 'O':
+            # Specimen id (field 3), else the instrument's own specimen id (field 4)
+            ids = [field.split(component_sep)[0].strip() for field in fields[2:4]]
+            specimen = next((value for value in ids if value), '')
+        elif kind == 'R' and len(fields) > 3:
+            status = fields[8].strip().upper() if len(fields) > 8 else 'F'
+            if status == 'X':  # test could not be performed
+                continue
+            components = fields[2].split(component_sep)
+            test_code = next((part for part in reversed(components[:4]) if part), '')
+            yield AnalyzerResult(
+                number, specimen, test_code.strip().upper(), fields[3].strip(),
+                fields[4].strip() if len(fields) > 4 else '',
+                fields[6].strip().upper() if len(fields) > 6 else '',
+                _parse_time(fields[12] if len(fields) > 12 else ''),
+            )
+        elif kind == 'L':
+            specimen = ''
+
+
+PARSERS = {'csv': parse_csv, 'astm': parse_astm}
+
+
+def detect_format(first_line):
+    """ASTM transmissions open with a header record: ``H`` then the field delimiter"""
+    record = first_line.translate(_ASTM_CONTROL).lstrip()
+    if record[:1].isdigit():
+        record = record[1:]
+    return 'astm' if len(record) > 1 and record[0] == 'H' and record[1] in '|!;' else 'csv'
+
+
+# -- reference ranges ------------------------------------------------------------
+
+class ReferenceRangeTable:
+    """Reference/critical limits resolved per (test, age band, gender), cached across requests"""
+
+    GENDERS = ('M', 'F', '')
+
+    def __init__(self, tests):
+        # test_id -> (age band boundaries, {(band index, gender): RangeRow})
+        self._tests = tests
+
+    @classmethod
+    def load(cls):
+        cached = TagCache.get_or_set('lab_reference_ranges', [REFERENCE_RANGE_TAG], cls.build_cached, timeout=3600)
+        tests = {}
+        for test_id, entry in cached.items():
+            table = {}
+            for key, row in entry['rows'].items():
+                band, gender = key.split(':', 1)
+                table[(int(band), gender)] = RangeRow(*row)
+            tests[int(test_id)] = (tuple(entry['boundaries']), table)
+        return cls(tests)
+
+    @classmethod
+    def build_cached(cls):
+        """``build()`` in a shape any cache serializer keeps (the production cache stores JSON)"""
+        return {
+            str(test_id): {
+                'boundaries': list(boundaries),
+                'rows': {f"{band}:{gender}": list(row) for (band, gender), row in table.items()},
+            }
+            for test_id, (boundaries, table) in cls.build().items()
+        }
+
+    @classmethod
+    def build(cls):
+        specs = {}  # test_id -> [(priority, gender, age_min, age_max, RangeRow)]
+        for test_id, normal_range, normal_range_child in LabTest.objects.values_list(
+            'id', 'normal_range', 'normal_range_child'
+        ):
+            test_specs = specs.setdefault(test_id, [])
+            adult_from = 0
+            if normal_range_child:
+                test_specs.append((2, '', 0, ADULT_AGE_YEARS, cls._text_row(normal_range_child)))
+                adult_from = ADULT_AGE_YEARS
+            if normal_range:
+                test_specs.append((2, '', adult_from, MAX_AGE_YEARS, cls._text_row(normal_range)))
+
+        for ref in LabReferenceRange.objects.all():
+            text = ref.display_text or cls._format_range(ref.low, ref.high)
+            row = RangeRow(*(float(v) if v is not None else None
+                             for v in (ref.low, ref.high, ref.critical_low, ref.critical_high)), text)
+            specs.setdefault(ref.test_id, []).append(
+                (0 if ref.gender else 1, ref.gender, ref.age_min_years, ref.age_max_years, row)
+            )
+
+        tests = {}
+        for test_id, test_specs in specs.items():
+            test_specs.sort(key=lambda spec: spec[0])
+            boundaries = sorted({0, MAX_AGE_YEARS} | {spec[2] for spec in test_specs} | {spec[3] for spec in test_specs})
+            table = {}
+            for band, start in enumerate(boundaries[:-1]):
+                for gender in cls.GENDERS:
+                    for _, spec_gender, age_min, age_max, row in test_specs:
+                        if age_min <= start < age_max and spec_gender in (gender, ''):
+                            table[(band, gender)] = row
+                            break
+            if table:
+                tests[test_id] = (tuple(boundaries), table)
+        return tests
+
+    @staticmethod
+    def _text_row(text):
+        low, high = parse_range_text(text)
+        return RangeRow(low, high, None, None, text)
+
+    @staticmethod
+    def _format_range(low, high):
+        if low is not None and high is not None:
+            return f"{low.normalize()}-{high.normalize()}"
+        if high is not None:
+            return f"< {high.normalize()}"
+        if low is not None:
+            return f"> {low.normalize()}"
+        return ''
+
+    def lookup(self, test_id, age_years, gender):
+        entry = self._tests.get(test_id)
+        if entry is None:
+            return None
+        boundaries, table = entry
+        age = min(max(age_years if age_years is not None else ADULT_AGE_YEARS, 0), MAX_AGE_YEARS - 1)
+        band = bisect_right(boundaries, age) - 1
+        gender = gender if gender in ('M', 'F') else ''
+        return table.get((band, gender)) or table.get((band, ''))
+
+
+def _age_years(date_of_birth, on):
+    if not date_of_birth:
+        return None
+    return on.year - date_of_birth.year - ((on.month, on.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def flag_results(values, ranges, analyzer_flags):
+    """
+    Columnar abnormal/critical pass over parallel lists: numeric values (None
+    when not numeric), RangeRows (None when unknown) and analyzer flags.
+    Returns ``(abnormal, critical)`` lists.
+    """
+    nan = math.nan
+    column = lambda field: [nan if r is None or getattr(r, field) is None else getattr(r, field) for r in ranges]
+    numbers = [nan if v is None else v for v in values]
+    lows, highs = column('low'), column('high')
+    critical_lows, critical_highs = column('critical_low'), column('critical_high')
+
+    # NaN compares False, so a missing value or limit never raises a flag on its own
+    out_of_range = [v < lo or v > hi for v, lo, hi in zip(numbers, lows, highs)]
+    out_of_critical = [v <= lo or v >= hi for v, lo, hi in zip(numbers, critical_lows, critical_highs)]
+
+    critical = [c or flag in CRITICAL_FLAGS for c, flag in zip(out_of_critical, analyzer_flags)]
+    abnormal = [a or c or flag not in NORMAL_FLAGS for a, c, flag in zip(out_of_range, critical, analyzer_flags)]
+    return abnormal, critical
+
+
+class AnalyzerResultImporter:
+    """Stream an analyzer result file into LabOrderItem rows in bulk"""
+
+    CHUNK = getattr(settings, 'LAB_IMPORT_CHUNK', 500)
+    ALERT_ROLES = ['ADMIN', 'SUPERADMIN', 'LAB_TECHNICIAN']
+    ERROR_SAMPLE = 50
+
+    def __init__(self, user=None, overwrite_verified=False):
+        self.user = user
+        self.overwrite_verified = overwrite_verified
+        self.summary = {
+            'records': 0, 'updated': 0, 'unmatched': 0, 'skipped_verified': 0,
+            'abnormal': 0, 'critical': 0, 'alerts': 0, 'errors': [],
+        }
+        self._critical = []
+        self._ranges = None
+
+    def run(self, stream, fmt=None):
+        """Import from a text or binary file object (e.g. an upload); returns the summary dict"""
+        if not isinstance(stream, io.TextIOBase):
+            # newline='' keeps ASTM's bare-CR record separators splitting lines
+            stream = io.TextIOWrapper(getattr(stream, 'file', stream), encoding='utf-8-sig',
+                                      errors='replace', newline='')
+        lines = iter(stream)
+        first = next(lines, '')
+        fmt = fmt or detect_format(first)
+        results = PARSERS[fmt](itertools.chain([first], lines))
+
+        self._ranges = ReferenceRangeTable.load()
+        while True:
+            chunk = list(itertools.islice(results, self.CHUNK))
+            if not chunk:
+                break
+            self.summary['records'] += len(chunk)
+            with serialized_write():
+                self._import_chunk(chunk)
+
+        self._send_critical_alerts()
+        logger.info(f"Analyzer import ({fmt}): {self.summary}")
+        return self.summary
+
+    def _error(self, result, message):
+        if len(self.summary['errors']) < self.ERROR_SAMPLE:
+            self.summary['errors'].append(f"line {result.line}: {message}")
+
+    def _import_chunk(self, chunk):
+        serials = {serial_from_barcode(result.barcode) for result in chunk if result.barcode}
+        orders = (
+            LabOrder.objects
+            .select_related('patient', 'doctor')
+            .only('id', 'serial_number', 'status', 'completed_at',
+                  'patient__first_name', 'patient__last_name', 'patient__date_of_birth', 'patient__gender',
+                  'doctor__user_id')
+            .in_bulk(serials, field_name='serial_number')
+        )
+        items = {}
+        items_by_order = {}
+        for item in (LabOrderItem.objects
+                     .filter(order_id__in=[order.pk for order in orders.values()])
+                     .select_related('test', 'test__section')):
+            items[(item.order_id, item.test.code.upper())] = item
+            items_by_order.setdefault(item.order_id, []).append(item)
+
+        # Match: the last result in the file for an item wins (analyzer reruns)
+        matched = {}
+        for result in chunk:
+            order = orders.get(serial_from_barcode(result.barcode)) if result.barcode else None
+            item = items.get((order.pk, result.test_code)) if order else None
+            if item is None:
+                self.summary['unmatched'] += 1
+                self._error(result, f"no order item for sample {result.barcode!r} test {result.test_code!r}")
+                continue
+            if item.verified_at and not self.overwrite_verified:
+                self.summary['skipped_verified'] += 1
+                self._error(result, f"{result.test_code} on {order.serial_number} is already verified")
+                continue
+            matched[item.pk] = (item, order, result)
+        if not matched:
+            return
+
+        now = timezone.now()
+        rows = list(matched.values())
+        ranges = [
+            self._ranges.lookup(item.test_id, _age_years(order.patient.date_of_birth, (result.resulted_at or now).date()),
+                                order.patient.gender)
+            for item, order, result in rows
+        ]
+        abnormal, critical = flag_results(
+            [parse_number(result.value) for _, _, result in rows], ranges, [result.flag for _, _, result in rows]
+        )
+
+        for (item, order, result), row, is_abnormal, is_critical in zip(rows, ranges, abnormal, critical):
+            item.result_value = result.value[:200]
+            item.result_unit = (result.unit or item.test.unit)[:50]
+            if row is not None and row.text:
+                item.normal_range = row.text[:200]
+            item.is_abnormal = is_abnormal
+            item.is_critical = is_critical
+            item.processed_at = result.resulted_at or now
+            item.processed_by = self.user
+            if is_critical:
+                self._critical.append((item, order))
+        LabOrderItem.objects.bulk_update(
+            [item for item, _, _ in rows],
+            ['result_value', 'result_unit', 'normal_range', 'is_abnormal', 'is_critical', 'processed_at', 'processed_by'],
+            batch_size=self.CHUNK,
+        )
+        self.summary['updated'] += len(rows)
+        self.summary['abnormal'] += sum(abnormal)
+        self.summary['critical'] += sum(critical)
+
+        self._advance_orders({order.pk: order for _, order, _ in rows}, items_by_order, now)
+
+    @staticmethod
+    def _advance_orders(orders, items_by_order, now):
+        changed = []
+        for order_id, order in orders.items():
+            if order.status not in ('pending', 'sample_collected', 'in_progress'):
+                continue
+            if all(item.result_value for item in items_by_order.get(order_id, [])):
+                order.status, order.completed_at = 'completed', now
+            elif order.status != 'in_progress':
+                order.status = 'in_progress'
+            else:
+                continue
+            order.updated_at = now
+            changed.append(order)
+        if changed:
+            LabOrder.objects.bulk_update(changed, ['status', 'completed_at', 'updated_at'])
+            # bulk_update skips the save signals that refresh the patients' timelines
+            tags = {timeline_tag(order.patient_id) for order in changed}
+            transaction.on_commit(lambda: TagCache.invalidate(*tags))
+
+    def _send_critical_alerts(self):
+        """One bulk insert of notifications and one push event for every critical value in the file"""
+        if not self._critical:
+            return
+        content_type = ContentType.objects.get_for_model(LabOrderItem)
+        notifications = []
+        recipients = set()
+        for item, order in self._critical:
+            patient = order.patient
+            title = f"Critical result: {item.test.name} {item.result_value} {item.result_unit}".strip()
+            message = (
+                f"{patient.first_name} {patient.last_name} - order {order.serial_number}: "
+                f"{item.test.name} = {item.result_value} {item.result_unit} (ref {item.normal_range or 'n/a'})"
+            )
+            for user_id in {order.doctor.user_id if order.doctor else None, item.test.section.head_of_section_id}:
+                if user_id:
+                    recipients.add(user_id)
+                    notifications.append(Notification(
+                        recipient_id=user_id, level='error', title=title[:250], message=message,
+                        content_type=content_type, object_id=item.pk,
+                        action_url=f'/laboratory/orders/{order.pk}/',
+                    ))
+
+        with serialized_write():
+            Notification.objects.bulk_create(notifications, batch_size=self.CHUNK)
+            payload = {
+                'count': len(self._critical),
+                'results': [
+                    {'order': order.serial_number, 'test': item.test.code, 'value': item.result_value}
+                    for item, order in self._critical[:50]
+                ],
+            }
+            transaction.on_commit(lambda: event_broker.publish(
+                'lab.critical_results', payload, roles=self.ALERT_ROLES, users=sorted(recipients),
+            ))
+        self.summary['alerts'] = len(notifications)
+        logger.warning(f"Analyzer import: {len(self._critical)} critical results, {len(notifications)} alerts sent")
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_keyset_pagination_indexes'),
+        ('doctors', '0001_initial'),
+        ('laboratory', '0001_initial'),
+        ('patients', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laborder',
+            index=models.Index(fields=['created_at', 'id'], name='laboratory__created_e4f4f4_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabReferenceRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gender', models.CharField(blank=True, choices=[('', 'Any'), ('M', 'Male'), ('F', 'Female')], max_length=1)),
+                ('age_min_years', models.PositiveSmallIntegerField(default=0)),
+                ('age_max_years', models.PositiveSmallIntegerField(default=150, help_text='Exclusive upper bound')),
+                ('low', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('high', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('critical_low', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('critical_high', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True)),
+                ('display_text', models.CharField(blank=True, help_text='Shown on reports; built from low/high if blank', max_length=200)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reference_ranges', to='laboratory.labtest')),
+            ],
+            options={
+                'db_table': 'laboratory_reference_range',
+                'ordering': ['test', 'gender', 'age_min_years'],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+        ('doctors', '0001_initial'),
+        ('laboratory', '0003_reference_ranges'),
+        ('patients', '0004_master_patient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laborder',
+            index=models.Index(fields=['patient', 'order_date', 'id'], name='laboratory__patient_a28cdc_idx'),
+        ),
+    ]
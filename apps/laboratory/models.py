@@ -87,6 +87,33 @@ class LabTest(models.Model):
         return self.normal_range
 
 
+class LabReferenceRange(models.Model):
+    """Numeric reference and critical limits for a test, per age band and gender"""
+    GENDER_CHOICES = [
+        ('', _('Any')),
+        ('M', _('Male')),
+        ('F', _('Female')),
+    ]
+
+    test = models.ForeignKey(LabTest, on_delete=models.CASCADE, related_name='reference_ranges')
+    gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True)
+    age_min_years = models.PositiveSmallIntegerField(default=0)
+    age_max_years = models.PositiveSmallIntegerField(default=150, help_text="Exclusive upper bound")
+
+    low = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    high = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    critical_low = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    critical_high = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    display_text = models.CharField(max_length=200, blank=True, help_text="Shown on reports; built from low/high if blank")
+
+    class Meta:
+        db_table = 'laboratory_reference_range'
+        ordering = ['test', 'gender', 'age_min_years']
+
+    def __str__(self):
+        return f"{self.test.code} {self.gender or 'any'} {self.age_min_years}-{self.age_max_years}y"
+
+
 class LabOrder(SerialNumberMixin):
     """Laboratory test orders"""
     SERIAL_TYPE = 'lab_order'  # For automatic serial number generation
@@ -144,6 +171,11 @@ class LabOrder(SerialNumberMixin):
     class Meta:
         db_table = 'laboratory_laborder'
         ordering = ['-order_date']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'order_date', 'id']),
+        ]
 
     def __str__(self):
         return f"Lab Order {self.order_number} - {self.patient.full_name}"
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import io
 
-# Create your tests here.
+from apps.doctors.models import Doctor
+from apps.notifications.models import Notification
+from apps.patients.models import Patient
+from .analyzer_import import AnalyzerResultImporter, ReferenceRangeTable, flag_results, RangeRow
+from .models import LabOrder, LabOrderItem, LabReferenceRange, LabSection, LabTest
+
+
+# Reference ranges go through the cache the way production stores them: as JSON
+@override_settings(CACHES={'default': {'BACKEND': 'apps.core.tests.JSONRoundTripCache'}})
+class AnalyzerImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.head = User.objects.create_user(username='labhead', password='x')
+        doctor_user = User.objects.create_user(username='drsaleh', password='x')
+        cls.doctor = Doctor.objects.create(
+            user=doctor_user, first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        cls.patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F', phone='0501234567',
+        )
+        section = LabSection.objects.create(name='Chemistry', code='CHEM', head_of_section=cls.head)
+        # bulk_create: the notifications app's LabTest post_save handler expects a patient
+        cls.glucose, cls.potassium = LabTest.objects.bulk_create([
+            LabTest(section=section, name='Glucose', code='GLU', unit='mg/dL', normal_range='70-110 mg/dL'),
+            LabTest(section=section, name='Potassium', code='K', unit='mmol/L'),
+        ])
+        LabReferenceRange.objects.create(test=cls.potassium, low=Decimal('3.5'), high=Decimal('5.1'),
+                                         critical_low=Decimal('2.5'), critical_high=Decimal('6.5'))
+        cls.order = LabOrder.objects.create(
+            patient=cls.patient, doctor=cls.doctor, created_by=cls.head,
+            order_number='LO-1', serial_number='LAB-2026-000001', status='sample_collected',
+        )
+        for test in (cls.glucose, cls.potassium):
+            LabOrderItem.objects.create(order=cls.order, test=test, unit_price=Decimal('10.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, text, **options):
+        return AnalyzerResultImporter(user=self.head, **options).run(io.BytesIO(text.encode()))
+
+    def test_csv_results_are_flagged_and_complete_the_order(self):
+        summary = self.run_import(
+            'Sample ID,Test,Result,Units\n'
+            'LAB2026000001,GLU,130,mg/dL\n'
+            'LAB2026000001,K,6.8,mmol/L\n'
+            'LAB2026000099,GLU,90,mg/dL\n'
+        )
+        self.assertEqual((summary['records'], summary['updated'], summary['unmatched']), (3, 2, 1))
+        self.assertEqual((summary['abnormal'], summary['critical']), (2, 1))
+
+        glucose = self.order.items.get(test=self.glucose)
+        potassium = self.order.items.get(test=self.potassium)
+        self.assertEqual((glucose.result_value, glucose.is_abnormal, glucose.is_critical), ('130', True, False))
+        self.assertEqual((potassium.is_critical, potassium.normal_range), (True, '3.5-5.1'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+
+        # One alert each for the ordering doctor and the section head
+        self.assertEqual(set(Notification.objects.values_list('recipient_id', flat=True)),
+                         {self.doctor.user_id, self.head.pk})
+
+    def test_astm_transmission_and_verified_results(self):
+        LabOrderItem.objects.filter(test=self.potassium).update(result_value='4.0', verified_at=timezone.now())
+        transmission = (
+            'H|\\^&|||Analyzer\r'
+            'P|1\r'
+            'O|1|LAB2026000001||^^^GLU\r'
+            'R|1|^^^GLU|95|mg/dL||N||F\r'
+            'R|2|^^^K|7.0|mmol/L||HH||F\r'
+            'L|1|N\r'
+        )
+        summary = self.run_import(transmission)
+        self.assertEqual((summary['updated'], summary['skipped_verified'], summary['critical']), (1, 1, 0))
+        self.assertEqual(self.order.items.get(test=self.potassium).result_value, '4.0')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+
+        summary = self.run_import(transmission, overwrite_verified=True)
+        self.assertEqual((summary['updated'], summary['critical']), (2, 1))
+
+    def test_reference_ranges_by_age_and_gender(self):
+        LabTest.objects.filter(pk=self.glucose.pk).update(normal_range_child='60-100')
+        LabReferenceRange.objects.create(test=self.potassium, gender='M', low=Decimal('3.7'), high=Decimal('5.3'))
+        ReferenceRangeTable.load()
+        table = ReferenceRangeTable.load()  # From the cache
+
+        self.assertEqual(table.lookup(self.glucose.pk, 10, 'F')[:2], (60.0, 100.0))
+        self.assertEqual(table.lookup(self.glucose.pk, 40, 'F')[:2], (70.0, 110.0))
+        self.assertEqual(table.lookup(self.potassium.pk, 40, 'M')[:2], (3.7, 5.3))
+        self.assertEqual(table.lookup(self.potassium.pk, 40, 'F')[:2], (3.5, 5.1))
+
+    def test_flags_ignore_missing_values_and_limits(self):
+        row = RangeRow(3.5, 5.1, 2.5, 6.5, '3.5-5.1')
+        abnormal, critical = flag_results([4.0, 5.5, 2.5, None, 9.0], [row, row, row, row, None],
+                                          ['', '', '', 'H', ''])
+        self.assertEqual(abnormal, [False, True, True, True, False])
+        self.assertEqual(critical, [False, False, True, False, False])
@@ -29,6 +29,7 @@ urlpatterns = [
     
     # Results
     path('results/create/<uuid:order_item_id>/', views.LabResultCreateView.as_view(), name='lab_result_create'),
+    path('results/import/', views.analyzer_result_import, name='analyzer_result_import'),
     
     # Legacy redirects
     path('diagnostic-list/', views.diagnostic_list, name='diagnostic_list'),
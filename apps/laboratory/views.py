@@ -10,11 +10,14 @@ from django.db import transaction
 from django.db import models
 from django.http import JsonResponse
 from django.core.paginator import Paginator
+from django.views.decorators.http import require_POST
 
 # from apps.accounts.services import UserManagementService
 from apps.core.mixins import UnifiedSystemMixin
+from apps.core.pagination import KeysetPaginationMixin
 
 from .models import LabTest, LabOrder, LabOrderItem, LabReport, LabSection
+from .analyzer_import import PARSERS, AnalyzerResultImporter
 from .forms import (
     LabTestForm, LabOrderForm, LabOrderItemForm, LabResultForm, 
     LabSectionForm, SampleCollectionForm
@@ -136,12 +139,14 @@ class LabSectionCreateView(UnifiedSystemMixin, CreateView):
 
 
 # Lab Order Views
-class LabOrderListView(ListView):  # TenantFilterMixin temporarily commented:
+class LabOrderListView(KeysetPaginationMixin, ListView):  # TenantFilterMixin temporarily commented:
     model = LabOrder
     template_name = 'laboratory/lab_order_list.html'
     context_object_name = 'lab_orders'
     paginate_by = 20
     required_permissions = ['laboratory.view_laborder']
+    keyset_ordering = ('-created_at', '-id')
+    keyset_count_tags = ['laboratory']
     # tenant_filter_field removed for unified single-DB mode
 
     def get_queryset(self):
@@ -161,7 +166,8 @@ class LabOrderListView(ListView):  # TenantFilterMixin temporarily commented:
         if date_to:
             queryset = queryset.filter(order_date__lte=date_to)
             
-        return queryset.order_by('-created_at')
+        # Ordering is applied by the keyset paginator
+        return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -330,6 +336,29 @@ class SampleCollectionView(UpdateView):  # TenantFilterMixin temporarily comment
         return super().form_valid(form)
 
 
+# Analyzer Import
+@login_required
+@require_POST
+def analyzer_result_import(request):
+    """Bulk-import an uploaded analyzer result file (CSV or ASTM); returns the import summary"""
+    if not request.user.has_perm('laboratory.change_laborderitem'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'No result file uploaded'}, status=400)
+
+    fmt = request.POST.get('format') or None
+    if fmt not in (None, *PARSERS):
+        return JsonResponse({'success': False, 'error': f'Unknown format: {fmt}'}, status=400)
+
+    summary = AnalyzerResultImporter(
+        user=request.user,
+        overwrite_verified=request.POST.get('overwrite_verified') == '1',
+    ).run(upload, fmt=fmt)
+    return JsonResponse({'success': True, **summary})
+
+
 # Dashboard/Home view
 @login_required
 def laboratory_dashboard(request):
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliverylog',
+            index=models.Index(fields=['timestamp'], name='notificatio_timesta_0cd622_idx'),
+        ),
+    ]
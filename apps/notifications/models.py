@@ -32,6 +32,9 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.recipient.username} - {self.title}"
@@ -204,6 +207,9 @@ class DeliveryLog(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp']),  # Retention scans (apps.core.retention)
+        ]
     
     def __str__(self):
         return f"Attempt {self.attempt_number} - {'Success' if self.success else 'Failed'}"
@@ -9,6 +9,9 @@ from django.utils import timezone
 from .models import Notification
 from .forms import NotificationForm, BulkNotificationForm
 from apps.patients.models import Patient
+from apps.core.pagination import keyset_paginate
+
+NOTIFICATIONS_PER_PAGE = 25
 
 def get_hospital_context(request):
     """Helper function to get hospital context for database routing"""
@@ -99,15 +102,21 @@ def mark_as_read(request, notification_id):
 
 
 def all_notifications(request):
+    page_obj = None
     try:
         # Check if user is authenticated
         if not request.user.is_authenticated:
             notifications = []
         else:
-            # Use default DB in unified mode
-            notifications = Notification.objects.filter(
-                recipient=request.user
-            ).order_by('-created_at')
+            # Use default DB in unified mode; keyset pages over (recipient, created_at, id)
+            page_obj = keyset_paginate(
+                request,
+                Notification.objects.filter(recipient=request.user),
+                NOTIFICATIONS_PER_PAGE,
+                ('-created_at', '-id'),
+                count_tags=[f'notifications:user:{request.user.pk}'],
+            )
+            notifications = page_obj.object_list
     except Exception as e:
         # Log the error for debugging
         print(f"Notification database error: {e}")
@@ -116,6 +125,8 @@ def all_notifications(request):
     
     return render(request, 'notifications/all.html', {
         'notifications': notifications,
+        'page_obj': page_obj,
+        'is_paginated': bool(page_obj and page_obj.has_other_pages()),
         'hospital_context': {'selected_hospital_code': 'zango'}
     })
 
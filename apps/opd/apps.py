@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OpdConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.opd'
+
+    def ready(self):
+        # Import signal handlers when app is ready
+        import apps.opd.signals  # noqa
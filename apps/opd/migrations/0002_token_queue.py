@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_keyset_pagination_indexes'),
+        ('opd', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opd',
+            name='appointment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='opd_visit', to='appointments.appointment'),
+        ),
+        migrations.AddField(
+            model_name='opd',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opd',
+            name='consultation_ended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opd',
+            name='consultation_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opd',
+            name='queue_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opd',
+            name='token_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='opd',
+            index=models.Index(fields=['doctor', 'consultation_ended_at'], name='opd_opd_doctor__d87585_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='opd',
+            constraint=models.UniqueConstraint(fields=('queue_date', 'doctor', 'token_number'), name='opd_unique_daily_token'),
+        ),
+    ]
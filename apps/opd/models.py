@@ -1,6 +1,7 @@
 # opd/models.py
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class OPD(models.Model):
     STATUS_CHOICES = (
@@ -38,6 +39,14 @@ class OPD(models.Model):
     fee = models.DecimalField(max_digits=10, decimal_places=2)
     is_paid = models.BooleanField(default=False)
 
+    # Token Queue (apps.opd.token_queue)
+    appointment = models.OneToOneField('appointments.Appointment', on_delete=models.SET_NULL, null=True, blank=True, related_name='opd_visit')
+    queue_date = models.DateField(blank=True, null=True)
+    token_number = models.PositiveIntegerField(blank=True, null=True)
+    checked_in_at = models.DateTimeField(blank=True, null=True)
+    consultation_started_at = models.DateTimeField(blank=True, null=True)
+    consultation_ended_at = models.DateTimeField(blank=True, null=True)
+
     # Follow-up
     follow_up_date = models.DateField(blank=True, null=True)
     follow_up_notes = models.TextField(blank=True, null=True)
@@ -50,10 +59,25 @@ class OPD(models.Model):
         ordering = ['-visit_date']
         verbose_name = 'OPD'
         verbose_name_plural = 'OPD Records'
+        constraints = [
+            # Also the index behind a doctor's queue for the day
+            models.UniqueConstraint(fields=['queue_date', 'doctor', 'token_number'], name='opd_unique_daily_token'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'consultation_ended_at']),
+        ]
 
     def __str__(self):
         return f"{self.patient_name} - {self.visit_date.strftime('%Y-%m-%d')}"
 
+    def save(self, *args, **kwargs):
+        # Consultation times feed the rolling wait estimate
+        if self.status == 'in_progress' and not self.consultation_started_at:
+            self.consultation_started_at = timezone.now()
+        if self.status == 'completed' and not self.consultation_ended_at:
+            self.consultation_ended_at = timezone.now()
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('opd:opd-detail', kwargs={'pk': self.pk})
\ No newline at end of file
@@ -0,0 +1,46 @@
+# apps/opd/signals.py
+"""
+OPD signal handlers: rebuild the doctor's token queue (apps.opd.token_queue)
+after a visit's queue state changes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+QUEUE_FIELDS = ('queue_date', 'doctor_id', 'status', 'token_number')
+
+
+def _queue_state(instance):
+    return tuple(instance.__dict__.get(field) for field in QUEUE_FIELDS)
+
+
+def _refresh(queues):
+    from .token_queue import TokenQueue
+    for day, doctor_id in queues:
+        if day is not None:
+            transaction.on_commit(lambda day=day, doctor_id=doctor_id: TokenQueue.refresh(doctor_id, day))
+
+
+@receiver(post_init, sender='opd.OPD')
+def remember_queue_state(sender, instance, **kwargs):
+    """Keep the loaded queue fields so post_save can skip saves the queue does not care about"""
+    instance._queue_state = _queue_state(instance)
+
+
+@receiver(post_save, sender='opd.OPD')
+def update_token_queue(sender, instance, created, **kwargs):
+    state = _queue_state(instance)
+    previous = getattr(instance, '_queue_state', None)
+    if not created and state == previous:
+        return
+    instance._queue_state = state
+    # A visit moved to another doctor or day leaves its old queue too
+    queues = {state[:2]}
+    if previous and not created:
+        queues.add(previous[:2])
+    _refresh(queues)
+
+
+@receiver(post_delete, sender='opd.OPD')
+def drop_from_token_queue(sender, instance, **kwargs):
+    _refresh({_queue_state(instance)[:2]})
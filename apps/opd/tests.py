@@ -1,3 +1,69 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from unittest import mock
 
-# Create your tests here.
+from .models import OPD
+from .token_queue import TokenQueue
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CallNextTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.doctor = User.objects.create_user(username='dr_a', password='x', role='DOCTOR')
+        cls.other_doctor = User.objects.create_user(username='dr_b', password='x', role='DOCTOR')
+        cls.receptionist = User.objects.create_user(username='desk', password='x', role='RECEPTIONIST')
+        cls.nurse = User.objects.create_user(username='nurse', password='x', role='NURSE')
+
+    def setUp(self):
+        cache.clear()
+        publish = mock.patch('apps.opd.token_queue.event_broker.publish')
+        publish.start()
+        self.addCleanup(publish.stop)
+        for name in ('First', 'Second', 'Third'):
+            with self.captureOnCommitCallbacks(execute=True):
+                TokenQueue.issue(OPD(
+                    patient_name=name, patient_age=40, patient_gender='F', patient_phone='0500000000',
+                    symptoms='Fever', doctor=self.doctor, department='General', fee=Decimal('10.00'),
+                ))
+
+    def call_next(self, user, doctor=None):
+        self.client.force_login(user)
+        data = {} if doctor is None else {'doctor': doctor.pk}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('opd:call_next_token'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_doctor_calls_their_own_queue(self):
+        response = self.call_next(self.doctor)
+        self.assertEqual(response.json()['visit']['token'], 1)
+        response = self.call_next(self.doctor)
+        self.assertEqual(response.json()['visit']['token'], 2)
+        self.assertEqual(OPD.objects.get(token_number=1).status, 'completed')
+        self.assertEqual([row['token'] for row in TokenQueue.queue(self.doctor.pk)['waiting']], [3])
+
+    def test_stale_cached_queue_does_not_leave_visits_in_consultation(self):
+        TokenQueue.queue(self.doctor.pk)
+        # Neither call's after-commit refresh runs: the cached entry still shows everyone waiting
+        self.assertEqual(TokenQueue.call_next(self.doctor.pk).token_number, 1)
+        self.assertEqual(TokenQueue.call_next(self.doctor.pk).token_number, 2)
+        self.assertEqual(list(OPD.objects.order_by('token_number').values_list('status', flat=True)),
+                         ['completed', 'in_progress', 'pending'])
+
+    def test_front_desk_calls_any_doctors_queue(self):
+        response = self.call_next(self.receptionist, self.doctor)
+        self.assertEqual(response.json()['visit']['patient_name'], 'First')
+
+    def test_another_doctor_cannot_advance_the_queue(self):
+        response = self.call_next(self.other_doctor, self.doctor)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(OPD.objects.exclude(status='pending').exists())
+
+    def test_other_roles_are_refused(self):
+        response = self.call_next(self.nurse, self.doctor)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(OPD.objects.exclude(status='pending').exists())
@@ -0,0 +1,280 @@
+# apps/opd/token_queue.py
+"""
+OPD token queue.
+
+Checking in - an appointment through ``check_in_appointment``, or a walk-in
+OPD record - gives the visit the next token of its doctor's queue for the
+day. Each doctor's day is one cache entry: waiting tokens in order, who is in
+consultation, waiting / in-progress / completed / cancelled counters and the
+doctor's last ``OPD_QUEUE_DURATION_SAMPLES`` consultation durations. Another
+entry lists the day's doctors.
+
+Entries are rebuilt after every state transition commits (signal handlers in
+apps.opd.signals) from the (queue_date, doctor, token_number) index - one
+doctor's day, never the whole table - and each rebuild is pushed to lobby
+screens as an ``opd.queue`` event. Reads (``queue()``, ``board()``) only touch
+the cache; an entry that expired (``OPD_QUEUE_TTL``) is rebuilt the same way.
+
+A waiting patient's estimate is the rolling mean consultation time for each
+patient ahead, less however long the current consultation has run.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from datetime import datetime
+import logging
+import threading
+
+from apps.core.events import event_broker
+from apps.core.sqlite import serialized_write
+from .models import OPD
+
+logger = logging.getLogger('zain_hms.performance')
+
+QUEUE_KEY = 'zain_hms:opd:queue'
+LOBBY_ROLES = ['ADMIN', 'SUPERADMIN', 'DOCTOR', 'NURSE', 'RECEPTIONIST']
+# Roles that may call the next token of any doctor's queue; a doctor calls their own
+DESK_ROLES = ['ADMIN', 'SUPERADMIN', 'HOSPITAL_ADMIN', 'RECEPTIONIST']
+
+# Appointment priority -> OPD priority
+PRIORITIES = {'LOW': 'low', 'NORMAL': 'medium', 'HIGH': 'high', 'URGENT': 'emergency'}
+
+# Retries when two desks issue the same doctor's next token at once
+TOKEN_ATTEMPTS = 5
+
+
+def _ttl():
+    return getattr(settings, 'OPD_QUEUE_TTL', 300)
+
+
+def _default_seconds():
+    return getattr(settings, 'OPD_QUEUE_DEFAULT_CONSULT_MINUTES', 10) * 60
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def screen(queue, now=None):
+    """Lobby view of one doctor's queue: counters, tokens being seen, waiting tokens with estimates"""
+    now = (now or timezone.now()).timestamp()
+    durations = queue['durations']
+    average = sum(durations) / len(durations) if durations else _default_seconds()
+    # Time left in the current consultation (the shortest one, if several are open)
+    current = min(
+        (max(average - (now - _timestamp(row['started_at'])), 0) if row['started_at'] else average
+         for row in queue['in_progress']),
+        default=0,
+    )
+    waiting = [
+        {'token': row['token'], 'position': position,
+         'estimated_wait_minutes': round((current + (position - 1) * average) / 60)}
+        for position, row in enumerate(queue['waiting'], start=1)
+    ]
+    return {
+        'doctor_id': queue['doctor_id'],
+        'doctor_name': queue['doctor_name'],
+        'date': queue['date'],
+        'now_serving': [row['token'] for row in queue['in_progress']],
+        'waiting': waiting,
+        'waiting_count': len(queue['waiting']),
+        'in_progress_count': len(queue['in_progress']),
+        'completed_count': queue['completed'],
+        'cancelled_count': queue['cancelled'],
+        'last_token': queue['last_token'],
+        'average_consultation_minutes': round(average / 60, 1),
+        'next_wait_minutes': round((current + len(queue['waiting']) * average) / 60),
+    }
+
+
+class TokenQueue:
+    """Issue OPD tokens; read and advance the per-doctor queues"""
+
+    _index_lock = threading.Lock()
+
+    @staticmethod
+    def _key(day, doctor_id):
+        return f"{QUEUE_KEY}:{day.isoformat()}:{doctor_id or 0}"
+
+    @staticmethod
+    def _index_key(day):
+        return f"{QUEUE_KEY}:{day.isoformat()}"
+
+    # Tokens
+
+    @classmethod
+    def issue(cls, visit, day=None):
+        """Save ``visit`` holding the next token of its doctor's queue for ``day`` (default today)"""
+        visit.queue_date = day or timezone.localdate()
+        visit.checked_in_at = visit.checked_in_at or timezone.now()
+        with serialized_write():
+            for attempt in range(TOKEN_ATTEMPTS):
+                last = OPD.objects.filter(queue_date=visit.queue_date, doctor_id=visit.doctor_id).aggregate(
+                    last=Max('token_number'))['last']
+                visit.token_number = (last or 0) + 1
+                try:
+                    with transaction.atomic():
+                        visit.save()
+                    return visit
+                except IntegrityError:
+                    # Another desk took that token first
+                    if attempt == TOKEN_ATTEMPTS - 1:
+                        raise
+
+    @classmethod
+    def check_in(cls, appointment):
+        """The appointment's OPD visit, created with a token on its first check-in"""
+        visit = OPD.objects.filter(appointment=appointment).first()
+        if visit is not None:
+            return visit
+        patient, doctor = appointment.patient, appointment.doctor
+        visit = OPD(
+            appointment=appointment,
+            patient_name=patient.get_full_name()[:100],
+            patient_age=patient.age,
+            patient_gender=patient.gender,
+            patient_phone=patient.phone[:15],
+            patient_email=patient.email or None,
+            symptoms=appointment.symptoms or appointment.chief_complaint,
+            priority=PRIORITIES.get(appointment.priority, 'medium'),
+            doctor_id=doctor.user_id,
+            department=(appointment.department or doctor.get_specialization_display())[:50],
+            fee=appointment.consultation_fee,
+            checked_in_at=appointment.checked_in_at,
+        )
+        return cls.issue(visit)
+
+    @classmethod
+    def call_next(cls, doctor_id, day=None, complete_current=True):
+        """
+        Start the consultation of the doctor's lowest waiting token and return
+        its visit (None when nobody is waiting), first completing the visit(s)
+        still in consultation unless ``complete_current`` is False. The rows
+        are read from the database under the write lock - the cached queue is
+        only rebuilt after commit - and status changes are conditional, so a
+        token another desk already called is skipped.
+        """
+        day = day or timezone.localdate()
+        now = timezone.now()
+        visits = OPD.objects.filter(queue_date=day, doctor_id=doctor_id)
+        with serialized_write():
+            rows = list(visits.select_for_update().filter(status__in=['pending', 'in_progress'])
+                        .order_by('token_number').values_list('pk', 'status'))
+            current = [pk for pk, status in rows if status == 'in_progress']
+            if complete_current and current:
+                visits.filter(pk__in=current, status='in_progress').update(
+                    status='completed', consultation_ended_at=now, updated_at=now,
+                )
+            called = None
+            for pk in (pk for pk, status in rows if status == 'pending'):
+                if visits.filter(pk=pk, status='pending').update(
+                    status='in_progress', consultation_started_at=now, updated_at=now,
+                ):
+                    called = pk
+                    break
+            # Queryset updates skip the save signals
+            transaction.on_commit(lambda: cls.refresh(doctor_id, day))
+        return OPD.objects.get(pk=called) if called else None
+
+    # Queues
+
+    @staticmethod
+    def _load(doctor_id, day):
+        """One doctor's queue for a day, from the token index plus the latest consultation times"""
+        queue = {
+            'doctor_id': doctor_id, 'doctor_name': None, 'date': day.isoformat(),
+            'waiting': [], 'in_progress': [], 'completed': 0, 'cancelled': 0, 'last_token': 0, 'durations': [],
+        }
+        rows = OPD.objects.filter(queue_date=day, doctor_id=doctor_id).order_by('token_number').values(
+            'id', 'token_number', 'status', 'checked_in_at', 'consultation_started_at',
+            'doctor__first_name', 'doctor__last_name', 'doctor__username',
+        )
+        for row in rows:
+            if queue['doctor_name'] is None and doctor_id:
+                full_name = f"{row['doctor__first_name']} {row['doctor__last_name']}".strip()
+                queue['doctor_name'] = full_name or row['doctor__username']
+            queue['last_token'] = max(queue['last_token'], row['token_number'] or 0)
+            if row['status'] == 'pending':
+                queue['waiting'].append({'id': row['id'], 'token': row['token_number'],
+                                         'checked_in_at': _iso(row['checked_in_at'])})
+            elif row['status'] == 'in_progress':
+                queue['in_progress'].append({'id': row['id'], 'token': row['token_number'],
+                                             'started_at': _iso(row['consultation_started_at'])})
+            else:
+                queue[row['status']] += 1
+        queue['doctor_name'] = queue['doctor_name'] or 'Unassigned'
+
+        samples = getattr(settings, 'OPD_QUEUE_DURATION_SAMPLES', 10)
+        if doctor_id and samples:
+            recent = OPD.objects.filter(
+                doctor_id=doctor_id, consultation_ended_at__isnull=False, consultation_started_at__isnull=False,
+            ).order_by('-consultation_ended_at').values_list('consultation_started_at', 'consultation_ended_at')
+            queue['durations'] = [
+                seconds for seconds in ((ended - started).total_seconds() for started, ended in recent[:samples])
+                if seconds > 0
+            ]
+        return queue
+
+    @classmethod
+    def queue(cls, doctor_id, day=None):
+        """One doctor's queue entry for ``day`` (default today), rebuilt if it is not cached"""
+        day = day or timezone.localdate()
+        key = cls._key(day, doctor_id)
+        queue = cache.get(key)
+        if queue is None:
+            queue = cls._load(doctor_id, day)
+            cache.set(key, queue, _ttl())
+        return queue
+
+    @classmethod
+    def doctors(cls, day=None):
+        """Ids of the doctors with tokens on ``day`` (None for unassigned visits)"""
+        day = day or timezone.localdate()
+        key = cls._index_key(day)
+        doctor_ids = cache.get(key)
+        if doctor_ids is None:
+            doctor_ids = list(
+                OPD.objects.filter(queue_date=day).order_by('doctor_id').values_list('doctor_id', flat=True).distinct()
+            )
+            cache.set(key, doctor_ids, _ttl())
+        return doctor_ids
+
+    @classmethod
+    def board(cls, day=None):
+        """Every doctor's queue for the lobby screens, with day totals (cache reads only when warm)"""
+        day = day or timezone.localdate()
+        doctor_ids = cls.doctors(day)
+        keys = {cls._key(day, doctor_id): doctor_id for doctor_id in doctor_ids}
+        found = cache.get_many(list(keys))
+        now = timezone.now()
+        queues = [
+            screen(found[key] if key in found else cls.queue(doctor_id, day), now)
+            for key, doctor_id in keys.items()
+        ]
+        totals = {
+            name: sum(queue[name] for queue in queues)
+            for name in ('waiting_count', 'in_progress_count', 'completed_count', 'cancelled_count')
+        }
+        return {'date': day.isoformat(), 'doctors': queues, 'totals': totals, 'generated_at': now.isoformat()}
+
+    @classmethod
+    def refresh(cls, doctor_id, day):
+        """Rebuild one doctor's queue after a transition committed and push it to lobby screens"""
+        queue = cls._load(doctor_id, day)
+        cache.set(cls._key(day, doctor_id), queue, _ttl())
+
+        index_key = cls._index_key(day)
+        with cls._index_lock:
+            doctor_ids = cache.get(index_key)
+            if doctor_ids is not None and doctor_id not in doctor_ids:
+                cache.set(index_key, doctor_ids + [doctor_id], _ttl())
+
+        event_broker.publish('opd.queue', screen(queue), roles=LOBBY_ROLES)
+        return queue
@@ -18,4 +18,9 @@ urlpatterns = [
     # HTMX URLs
     path('search/', views.opd_search, name='opd-search'),
     path('<int:pk>/toggle_payment/', views.toggle_payment_status, name='toggle_payment'),
+    
+    # Token queue API (lobby screens)
+    path('api/queue/', views.token_queue_api, name='token_queue_api'),
+    path('api/queue/stream/', views.token_queue_stream, name='token_queue_stream'),
+    path('api/queue/next/', views.call_next_token, name='call_next_token'),
 ]
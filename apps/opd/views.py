@@ -3,21 +3,37 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from apps.core.mixins import UnifiedSystemMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db.models import Q, Count
 from django.contrib import messages
 from django.shortcuts import redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+from apps.core.events import event_broker
+from apps.core.permissions import role_required
 from .models import OPD
 from .forms import OPDForm
+from .token_queue import DESK_ROLES, TokenQueue, screen
+
+EVENT_STREAM_HEARTBEAT = 20      # seconds between keepalive comments
+EVENT_STREAM_RETRY_MS = 5000     # client reconnect delay
 
 @login_required
 def opd_dashboard(request):
     """OPD Dashboard view with statistics"""
-    # Get statistics
-    total_records = OPD.objects.count()
-    waiting_records = OPD.objects.filter(status='pending').count()
-    in_progress_records = OPD.objects.filter(status='in_progress').count()
-    completed_records = OPD.objects.filter(status='completed').count()
+    # Get statistics (one pass over the table)
+    stats = OPD.objects.aggregate(
+        total=Count('id'),
+        waiting=Count('id', filter=Q(status='pending')),
+        in_progress=Count('id', filter=Q(status='in_progress')),
+        completed=Count('id', filter=Q(status='completed')),
+    )
     
     # Get recent records
     recent_records = OPD.objects.select_related('doctor')[:5]
@@ -25,11 +41,12 @@ def opd_dashboard(request):
     context = {
         'title': 'Out-Patient Department',
         'page_title': 'OPD Dashboard',
-        'total_records': total_records,
-        'waiting_records': waiting_records,
-        'in_progress_records': in_progress_records,
-        'completed_records': completed_records,
+        'total_records': stats['total'],
+        'waiting_records': stats['waiting'],
+        'in_progress_records': stats['in_progress'],
+        'completed_records': stats['completed'],
         'recent_records': recent_records,
+        'token_board': TokenQueue.board(),
     }
     return render(request, 'opd/dashboard.html', context)
 
@@ -76,8 +93,10 @@ class OPDCreateView(UnifiedSystemMixin, LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.doctor = self.request.user
-        messages.success(self.request, 'OPD record created successfully.')
-        return super().form_valid(form)
+        # Walk-ins join the doctor's token queue like checked-in appointments
+        self.object = TokenQueue.issue(form.instance)
+        messages.success(self.request, f'OPD record created successfully. Token #{self.object.token_number}.')
+        return redirect(self.get_success_url())
 
 class OPDUpdateView(LoginRequiredMixin, UpdateView):
     model = OPD
@@ -149,4 +168,91 @@ def toggle_payment_status(request, pk):
         f'<span class="px-2 py-1 rounded-full text-sm '
         f'{"bg-green-100 text-green-800" if opd.is_paid else "bg-red-100 text-red-800"}">'
         f'{"Paid" if opd.is_paid else "Unpaid"}</span>'
-    )
\ No newline at end of file
+    )
+
+
+# Token queue API (lobby display screens)
+
+def _queue_params(request):
+    day = parse_date(request.GET.get('date', '') or '') or None
+    doctor = request.GET.get('doctor', '')
+    return day, (int(doctor) if doctor.isdigit() else None)
+
+
+@login_required
+def token_queue_api(request):
+    """Today's token queues with counters and wait estimates, from the cache; ``?doctor=`` for one"""
+    day, doctor = _queue_params(request)
+    if doctor is not None:
+        return JsonResponse(screen(TokenQueue.queue(doctor, day)))
+    return JsonResponse(TokenQueue.board(day))
+
+
+@login_required
+async def token_queue_stream(request):
+    """
+    Server-Sent Events for lobby screens: the whole board on connect (and on
+    resync), then each doctor's queue as it changes. Under WSGI it answers
+    204 and the screen polls ``token_queue_api`` instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    day, doctor = _queue_params(request)
+
+    async def snapshot():
+        if doctor is not None:
+            data = await sync_to_async(lambda: screen(TokenQueue.queue(doctor, day)))()
+        else:
+            data = await sync_to_async(TokenQueue.board)(day)
+        return f"event: opd.board\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+    async def stream():
+        yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n"
+        async with event_broker.subscribe(user) as subscription:
+            yield await snapshot()
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=EVENT_STREAM_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event['type'] == 'resync':
+                    yield await snapshot()
+                    continue
+                data = event['data']
+                if event['type'] != 'opd.queue' or (doctor is not None and data['doctor_id'] != doctor):
+                    continue
+                if day is not None and data['date'] != day.isoformat():
+                    continue
+                yield f"event: opd.queue\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+@role_required('DOCTOR', *DESK_ROLES)
+@require_POST
+def call_next_token(request):
+    """Finish the current consultation and call the doctor's next token (default: the signed-in doctor)"""
+    doctor = request.POST.get('doctor', '')
+    doctor = int(doctor) if doctor.isdigit() else request.user.pk
+    if doctor != request.user.pk and request.user.role not in DESK_ROLES:
+        return JsonResponse({'error': "Only the doctor or the front desk can call this queue's next token"},
+                            status=403)
+    visit = TokenQueue.call_next(doctor)
+    if visit is None:
+        return JsonResponse({'visit': None, 'message': 'No waiting tokens'})
+    return JsonResponse({
+        'visit': {
+            'id': visit.pk,
+            'token': visit.token_number,
+            'patient_name': visit.patient_name,
+            'url': reverse('opd:opd_detail', kwargs={'pk': visit.pk}),
+        },
+    })
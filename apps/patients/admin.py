@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Patient
+from .models import DuplicateCandidate, Patient
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
@@ -11,4 +11,13 @@ class PatientAdmin(admin.ModelAdmin):
     
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
-    get_full_name.short_description = 'Name'
\ No newline at end of file
+    get_full_name.short_description = 'Name'
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'other', 'score', 'matched_on', 'status', 'found_at')
+    list_filter = ('status',)
+    search_fields = ('patient__patient_id', 'other__patient_id')
+    raw_id_fields = ('patient', 'other', 'reviewed_by')
+    readonly_fields = ['score', 'matched_on', 'found_at']
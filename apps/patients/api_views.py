@@ -1,15 +1,15 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 
+from apps.core.pagination import KeysetPagination
 from .models import Patient
 from .serializers import PatientSerializer, AppointmentSerializer
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(KeysetPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -19,6 +19,8 @@ class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all().order_by('last_name', 'first_name')
     serializer_class = PatientSerializer
     pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('-registration_date', '-id')
+    keyset_count_tags = ['patients']
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['gender', 'blood_type']
     search_fields = ['first_name', 'last_name', 'email', 'phone_number']
@@ -0,0 +1,328 @@
+# apps/patients/bulk_import.py
+"""
+Bulk import of patient registries (CSV or XLSX).
+
+Rows are streamed from the file and handled in chunks of
+``PATIENT_IMPORT_CHUNK``:
+
+1. every row is validated with ``PatientImportForm`` - the registration
+   form's field rules, without its per-row uniqueness queries;
+2. the chunk is checked for duplicates with one query over existing patients'
+   phone, email and ``identity_hash`` (name + date of birth), and against its
+   own earlier rows (earlier chunks are already in the table). The same name
+   and date of birth is a duplicate; a shared phone or email only with the
+   same first name, since families often share one;
+3. the new patients get a block of consecutive patient IDs and are written
+   with one ``bulk_create`` in a transaction, together with their master
+   patient index keys (apps.patients.mpi).
+
+Rejected rows are written to a CSV report in row order as each chunk
+finishes: the row number, the reasons, then the row as it was in the file.
+
+Uploads from the registration desk are queued as ``PatientImport`` jobs and
+imported by a Celery task (``import_registry``). The upload and its report
+hold full patient rows, so both are kept in ``PATIENT_IMPORT_ROOT`` - never
+under MEDIA_ROOT - and the report is only served through a permission-checked
+view.
+"""
+
+from datetime import date, datetime
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from pathlib import Path
+import csv
+import io
+import itertools
+import logging
+import openpyxl
+import re
+import tempfile
+
+from apps.core.cache_tags import TagCache
+from apps.core.sqlite import serialized_write
+from .forms import PatientImportForm
+from .models import Patient, PatientImport, identity_hash, normalize_name, normalize_phone
+from .mpi import PatientIndex
+
+logger = logging.getLogger(__name__)
+
+# Same format as Patient.generate_patient_id
+ID_PREFIX = 'ZAIN-PAT-'
+
+# Column names registries use for the form's fields, besides the field name itself
+COLUMN_ALIASES = {
+    'first_name': ('firstname', 'given_name', 'forename'),
+    'middle_name': ('middlename',),
+    'last_name': ('lastname', 'surname', 'family_name'),
+    'date_of_birth': ('dob', 'birth_date', 'birthdate'),
+    'gender': ('sex',),
+    'phone': ('phone_number', 'mobile', 'mobile_number', 'telephone'),
+    'alternate_phone': ('phone2', 'secondary_phone'),
+    'email': ('email_address', 'e_mail'),
+    'address_line1': ('address', 'address1', 'street'),
+    'address_line2': ('address2',),
+    'postal_code': ('zip', 'zip_code', 'postcode'),
+    'blood_group': ('blood_type',),
+    'national_id': ('national_id_number', 'id_number', 'passport', 'passport_number'),
+}
+
+# Choice fields also accept their labels ("Male", "O Positive")
+CHOICES = {
+    name: {key.lower(): value for value, label in choices for key in (value, str(label))}
+    for name, choices in (
+        ('gender', Patient.GENDER_CHOICES),
+        ('blood_group', Patient.BLOOD_GROUP_CHOICES),
+        ('marital_status', Patient.MARITAL_STATUS_CHOICES),
+    )
+}
+
+
+def _normalise_header(name):
+    # "Date of Birth", "date_of_birth" and "DateOfBirth" are the same column
+    return re.sub(r'[^a-z0-9]', '', str(name or '').lower())
+
+
+def _cell(value):
+    """Spreadsheet cell -> form input text"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Phone numbers stored as numbers
+    return str(value).strip()
+
+
+# -- file readers: stream -> (headers, iterator of (row number, {header: value})) ---
+
+def read_csv(stream):
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(getattr(stream, 'file', stream), encoding='utf-8-sig',
+                                  errors='replace', newline='')
+    reader = csv.DictReader(stream)
+    headers = reader.fieldnames or []
+    return headers, ((reader.line_num, row) for row in reader)
+
+
+def read_xlsx(stream):
+    workbook = openpyxl.load_workbook(getattr(stream, 'file', stream), read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    headers = [_cell(value) for value in next(rows, ())]
+
+    def records():
+        try:
+            for number, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield number, dict(zip(headers, values))
+        finally:
+            workbook.close()
+    return headers, records()
+
+
+READERS = {'csv': read_csv, 'xlsx': read_xlsx}
+
+
+def detect_format(filename):
+    return 'xlsx' if str(filename or '').lower().endswith(('.xlsx', '.xlsm')) else 'csv'
+
+
+def import_storage():
+    """Private storage for queued uploads and rejected-rows reports (not served as media)"""
+    return FileSystemStorage(location=getattr(
+        settings, 'PATIENT_IMPORT_ROOT', Path(settings.BASE_DIR) / 'private' / 'patient_imports'
+    ))
+
+
+def queue_import(upload, fmt, user):
+    """Store ``upload`` privately and create its QUEUED ``PatientImport``"""
+    source = import_storage().save(f"uploads/{timezone.now():%Y%m%d-%H%M%S}.{fmt}", upload)
+    return PatientImport.objects.create(uploaded_by=user, filename=upload.name[:255], format=fmt, source=source)
+
+
+def import_registry(job):
+    """Run a claimed ``PatientImport``: import the upload, keep the rejected-rows report, drop the upload"""
+    storage = import_storage()
+    try:
+        with storage.open(job.source, 'rb') as upload, \
+                tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as rejects:
+            job.summary = PatientImporter(job.uploaded_by, rejects).run(upload, job.format)
+            if job.summary['rejected']:
+                rejects.seek(0)
+                job.report = storage.save(f"reports/{job.pk}-rejected.csv", File(rejects))
+        job.status = 'DONE'
+    except Exception as e:
+        logger.exception(f"Patient import {job.pk} ({job.filename}) failed")
+        job.status, job.error = 'FAILED', str(e)
+    storage.delete(job.source)
+    job.source = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'summary', 'report', 'error', 'source', 'finished_at'])
+    return job
+
+
+class PatientImporter:
+    """Stream a patient registry file into Patient rows in bulk"""
+
+    CHUNK = getattr(settings, 'PATIENT_IMPORT_CHUNK', 1000)
+    ERROR_SAMPLE = 50
+
+    def __init__(self, user=None, rejects=None):
+        """``rejects``: optional text file the rejected-rows CSV report is written to"""
+        self.user = user
+        self.summary = {'rows': 0, 'imported': 0, 'rejected': 0, 'duplicates': 0, 'errors': []}
+        self._rejects = csv.writer(rejects) if rejects is not None else None
+        self._headers = []
+        self._columns = {}
+        self._next_number = 0
+        self._pending = []
+
+    def run(self, stream, fmt='csv'):
+        """Import from a text or binary file object (e.g. an upload); returns the summary dict"""
+        self._headers, rows = READERS[fmt](stream)
+        self._columns = self._map_columns(self._headers)
+        if self._rejects is not None:
+            self._rejects.writerow(['row', 'errors', *self._headers])
+
+        while True:
+            chunk = list(itertools.islice(rows, self.CHUNK))
+            if not chunk:
+                break
+            self.summary['rows'] += len(chunk)
+            self._import_chunk(chunk)
+            self._report()
+
+        if self.summary['imported']:
+            TagCache.invalidate('patients')
+        logger.info(f"Patient import ({fmt}): {self.summary}")
+        return self.summary
+
+    @staticmethod
+    def _map_columns(headers):
+        """``{form field: file header}`` for the form fields the file has"""
+        present = {_normalise_header(header): header for header in headers if header}
+        columns = {}
+        for field in PatientImportForm.Meta.fields:
+            for alias in (field, *COLUMN_ALIASES.get(field, ())):
+                if _normalise_header(alias) in present:
+                    columns[field] = present[_normalise_header(alias)]
+                    break
+        return columns
+
+    def _reject(self, number, row, reasons, duplicate=False):
+        # Validation, duplicate and save rejects come from separate passes; _report puts them in row order
+        self._pending.append((number, row, '; '.join(reasons), duplicate))
+
+    def _report(self):
+        """Count and write the chunk's rejected rows, in row order"""
+        for number, row, message, duplicate in sorted(self._pending, key=lambda reject: reject[0]):
+            self.summary['rejected'] += 1
+            if duplicate:
+                self.summary['duplicates'] += 1
+            if len(self.summary['errors']) < self.ERROR_SAMPLE:
+                self.summary['errors'].append(f"row {number}: {message}")
+            if self._rejects is not None:
+                self._rejects.writerow([number, message, *(_cell(row.get(header)) for header in self._headers)])
+        self._pending = []
+
+    # Chunks
+
+    def _validate(self, number, row):
+        """Cleaned Patient (unsaved) for one row, or None after rejecting it"""
+        data = {}
+        for field, header in self._columns.items():
+            value = _cell(row.get(header))
+            if value:  # Empty cells fall back to the model defaults
+                data[field] = CHOICES.get(field, {}).get(value.lower(), value)
+        form = PatientImportForm(data)
+        if not form.is_valid():
+            self._reject(number, row, [
+                f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()
+            ])
+            return None
+        patient = form.instance
+        patient.identity_hash = identity_hash(patient.first_name, patient.last_name, patient.date_of_birth)
+        return patient
+
+    def _import_chunk(self, chunk):
+        valid = []
+        for number, row in chunk:
+            patient = self._validate(number, row)
+            if patient is not None:
+                valid.append((number, row, patient))
+        if not valid:
+            return
+
+        phones = set()
+        for _, _, patient in valid:
+            digits = normalize_phone(patient.phone)
+            phones.update((patient.phone, digits, f"+{digits}"))
+        emails = {patient.email for _, _, patient in valid if patient.email}
+        hashes = {patient.identity_hash for _, _, patient in valid}
+        by_phone, by_email, by_hash = {}, {}, {}
+        for patient_id, first_name, phone, email, hashed in Patient.objects.filter(
+            Q(phone__in=phones) | Q(email__in=emails) | Q(identity_hash__in=hashes)
+        ).values_list('patient_id', 'first_name', 'phone', 'email', 'identity_hash'):
+            by_phone.setdefault((normalize_phone(phone), normalize_name(first_name)), patient_id)
+            if email:
+                by_email.setdefault((email.lower(), normalize_name(first_name)), patient_id)
+            if hashed:
+                by_hash.setdefault(hashed, patient_id)
+
+        new = []
+        for number, row, patient in valid:
+            first_name = normalize_name(patient.first_name)
+            keys = (
+                (by_hash, patient.identity_hash, 'same name and date of birth'),
+                (by_phone, (normalize_phone(patient.phone), first_name), 'same phone and first name'),
+                (by_email, (patient.email, first_name) if patient.email else None, 'same email and first name'),
+            )
+            match = next(((index[key], reason) for index, key, reason in keys if key in index), None)
+            if match:
+                self._reject(number, row, [f"Duplicate of {match[0]} ({match[1]})"], duplicate=True)
+                continue
+            for index, key, _ in keys:
+                if key is not None:
+                    index[key] = f"row {number}"
+            new.append((number, row, patient))
+        if new:
+            self._create(new)
+
+    def _allocate_ids(self, count):
+        """A block of ``count`` consecutive patient IDs after the newest patient's (one indexed query)"""
+        last = Patient.objects.order_by('-registration_date').values_list('patient_id', flat=True).first()
+        try:
+            last_number = int((last or '').rsplit('-', 1)[-1])
+        except ValueError:
+            last_number = 0
+        start = max(self._next_number, last_number + 1)
+        self._next_number = start + count
+        return [f"{ID_PREFIX}{number:06d}" for number in range(start, start + count)]
+
+    def _create(self, new):
+        patients = [patient for _, _, patient in new]
+        for patient in patients:
+            patient.registered_by = patient.created_by = patient.updated_by = self.user
+        for attempt in range(2):
+            try:
+                with serialized_write(), transaction.atomic():
+                    for patient, patient_id in zip(patients, self._allocate_ids(len(patients))):
+                        patient.patient_id = patient_id
+                    Patient.objects.bulk_create(patients, batch_size=self.CHUNK)
+                    # bulk_create skips the save signals that maintain the index
+                    PatientIndex.index(patients)
+            except IntegrityError as e:
+                # A registration took one of the block's IDs meanwhile; take a fresh block once
+                if attempt:
+                    logger.error(f"Patient import: chunk of {len(new)} rows failed: {e}")
+                    for number, row, _ in new:
+                        self._reject(number, row, [f"Could not be saved: {e}"])
+                    return
+            else:
+                break
+        self.summary['imported'] += len(patients)
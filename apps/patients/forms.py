@@ -38,7 +38,7 @@ class PatientForm(forms.ModelForm):
         model = Patient
         fields = [
             'patient_id', 'first_name', 'middle_name', 'last_name', 'date_of_birth',
-            'gender', 'blood_group', 'marital_status', 'phone', 'alternate_phone',
+            'gender', 'blood_group', 'marital_status', 'national_id', 'phone', 'alternate_phone',
             'email', 'address_line1', 'address_line2', 'city', 'state',
             'postal_code', 'country', 'emergency_contact_name',
             'emergency_contact_relationship', 'emergency_contact_phone',
@@ -196,6 +196,25 @@ class QuickPatientForm(forms.ModelForm):
         return date_of_birth
 
 
+class PatientImportForm(PatientForm):
+    """Registration rules for one row of a bulk import (apps.patients.bulk_import)"""
+    
+    # What quick registration asks for; the rest of the registry row is optional
+    REQUIRED_FIELDS = ['first_name', 'last_name', 'date_of_birth', 'gender', 'phone', 'address_line1', 'city', 'state']
+    
+    class Meta(PatientForm.Meta):
+        fields = [name for name in PatientForm.Meta.fields if name not in ('patient_id', 'profile_picture')]
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name, field in self.fields.items():
+            field.required = field_name in self.REQUIRED_FIELDS
+    
+    def clean_email(self):
+        # Duplicates are checked for the whole chunk at once, not row by row
+        return (self.cleaned_data.get('email') or '').strip().lower()
+
+
 class PatientSearchForm(forms.Form):
     """Patient search form"""
     search = forms.CharField(
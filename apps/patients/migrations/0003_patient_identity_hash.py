@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_identity_hash(apps, schema_editor):
+    from apps.patients.models import identity_hash
+
+    Patient = apps.get_model('patients', 'Patient')
+    batch = []
+    for patient in Patient.objects.only('id', 'first_name', 'last_name', 'date_of_birth').iterator(chunk_size=2000):
+        patient.identity_hash = identity_hash(patient.first_name, patient.last_name, patient.date_of_birth)
+        batch.append(patient)
+        if len(batch) == 2000:
+            Patient.objects.bulk_update(batch, ['identity_hash'])
+            batch = []
+    Patient.objects.bulk_update(batch, ['identity_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='identity_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Name + date of birth key for duplicate checks', max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['email'], name='patients_pa_email_bb026d_idx'),
+        ),
+        migrations.RunPython(fill_identity_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_blocking_keys(apps, schema_editor):
+    from apps.patients.mpi import IDENTITY_FIELDS, blocking_keys
+
+    Patient = apps.get_model('patients', 'Patient')
+    PatientBlockingKey = apps.get_model('patients', 'PatientBlockingKey')
+    keys = []
+    for patient in Patient.objects.only(*IDENTITY_FIELDS).iterator(chunk_size=2000):
+        keys.extend(
+            PatientBlockingKey(patient_id=patient.pk, kind=kind, value=value[:64])
+            for kind, value in blocking_keys(patient)
+        )
+        if len(keys) >= 5000:
+            PatientBlockingKey.objects.bulk_create(keys, batch_size=1000)
+            keys = []
+    PatientBlockingKey.objects.bulk_create(keys, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_patient_identity_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='national_id',
+            field=models.CharField(blank=True, help_text='National ID or passport number', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Similarity from 0 to 1')),
+                ('matched_on', models.CharField(help_text='Blocking keys the pair shares', max_length=100)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending review'), ('CONFIRMED', 'Confirmed duplicate'), ('DISMISSED', 'Not a duplicate')], default='PENDING', max_length=10)),
+                ('found_at', models.DateTimeField(auto_now_add=True)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patients.patient')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates', to='patients.patient')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['status', '-score'], name='patients_du_status_d3bc34_idx')],
+                'constraints': [models.UniqueConstraint(fields=('patient', 'other'), name='patients_duplicate_pair_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PatientBlockingKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('NAME', 'Phonetic name'), ('DOB', 'Date of birth + phonetic surname'), ('PHONE', 'Phone number'), ('NATIONAL_ID', 'National ID')], max_length=12)),
+                ('value', models.CharField(max_length=64)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocking_keys', to='patients.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'value', 'patient'], name='patients_pa_kind_16da37_idx')],
+            },
+        ),
+        migrations.RunPython(build_blocking_keys, migrations.RunPython.noop),
+    ]
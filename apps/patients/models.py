@@ -4,9 +4,32 @@ from django.core.validators import RegexValidator
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.accounts.models import CustomUser as User
+import hashlib
+import re
+import unicodedata
 import uuid
 from datetime import date
 
+
+def normalize_name(value):
+    """Casefolded letters and digits only, accents stripped ("José-María" -> "josemaria")"""
+    value = unicodedata.normalize('NFKD', value or '')
+    return re.sub(r'[^a-z0-9]', '', ''.join(c for c in value if not unicodedata.combining(c)).casefold())
+
+
+def normalize_phone(value):
+    """Digits only ("+1 (555) 010-2030" -> "15550102030")"""
+    return re.sub(r'\D', '', value or '')
+
+
+def identity_hash(first_name, last_name, date_of_birth):
+    """Exact-match key for name + date of birth, used to spot duplicate registrations"""
+    if not date_of_birth:
+        return ''
+    key = f"{normalize_name(first_name)}|{normalize_name(last_name)}|{date_of_birth}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
 class Patient(models.Model):
     """Patient model with complete medical information"""
     GENDER_CHOICES = [
@@ -37,6 +60,8 @@ class Patient(models.Model):
     # Basic Information
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     patient_id = models.CharField(max_length=20, unique=True, blank=True)
+    identity_hash = models.CharField(max_length=40, blank=True, editable=False, db_index=True,
+                                     help_text="Name + date of birth key for duplicate checks")
     
     # Personal Details
     first_name = models.CharField(max_length=100)
@@ -46,6 +71,7 @@ class Patient(models.Model):
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     blood_group = models.CharField(max_length=10, choices=BLOOD_GROUP_CHOICES, default='UNKNOWN')
     marital_status = models.CharField(max_length=10, choices=MARITAL_STATUS_CHOICES, default='SINGLE')
+    national_id = models.CharField(max_length=50, blank=True, help_text="National ID or passport number")
     
     # Contact Information
     phone_regex = RegexValidator(regex=r'^\+?1?\d{9,15}$')
@@ -79,6 +105,8 @@ class Patient(models.Model):
     insurance_group_number = models.CharField(max_length=100, blank=True)
     
     # Profile
+    # Patient portal account (patient dashboard, telemedicine rooms)
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='patient_profile')
     profile_picture = models.ImageField(upload_to='patients/photos/', null=True, blank=True)
     
     # Status
@@ -107,7 +135,10 @@ class Patient(models.Model):
             models.Index(fields=['patient_id']),
             models.Index(fields=['last_name', 'first_name']),
             models.Index(fields=['phone']),
-            models.Index(fields=['registration_date']),
+            # Keyset pagination order for the patient list
+            models.Index(fields=['registration_date', 'id']),
+            # Duplicate checks on import (apps.patients.bulk_import)
+            models.Index(fields=['email']),
         ]
     
     def __str__(self):
@@ -119,6 +150,7 @@ class Patient(models.Model):
 
         if not self.patient_id:
             self.patient_id = self.generate_patient_id(using_database=using)
+        self.identity_hash = identity_hash(self.first_name, self.last_name, self.date_of_birth)
 
         # Ensure datetime fields are timezone-aware
         from django.utils import timezone
@@ -190,6 +222,88 @@ class Patient(models.Model):
         return ', '.join(filter(None, parts))
 
 
+class PatientBlockingKey(models.Model):
+    """Master patient index key; only patients sharing one are compared for duplicates (apps.patients.mpi)"""
+    KIND_CHOICES = [
+        ('NAME', 'Phonetic name'),
+        ('DOB', 'Date of birth + phonetic surname'),
+        ('PHONE', 'Phone number'),
+        ('NATIONAL_ID', 'National ID'),
+    ]
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='blocking_keys')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    value = models.CharField(max_length=64)
+    
+    class Meta:
+        indexes = [
+            # Candidate lookups and the batch walk over blocks
+            models.Index(fields=['kind', 'value', 'patient']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind}:{self.value}"
+
+
+class DuplicateCandidate(models.Model):
+    """A pair of patients the master patient index scored as a likely duplicate, for review"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending review'),
+        ('CONFIRMED', 'Confirmed duplicate'),
+        ('DISMISSED', 'Not a duplicate'),
+    ]
+    
+    # The pair is stored once: ``patient`` is the one whose id sorts first
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='duplicate_candidates')
+    other = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(help_text="Similarity from 0 to 1")
+    matched_on = models.CharField(max_length=100, help_text="Blocking keys the pair shares")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    found_at = models.DateTimeField(auto_now_add=True)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'other'], name='patients_duplicate_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} ~ {self.other} ({self.score:.2f})"
+
+
+class PatientImport(models.Model):
+    """A registry upload imported in the background (apps.patients.tasks.import_patient_registry)"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    filename = models.CharField(max_length=255, help_text="Name of the uploaded file")
+    format = models.CharField(max_length=4)
+    # Both files live in PATIENT_IMPORT_ROOT, outside MEDIA_ROOT: they hold full patient rows
+    source = models.CharField(max_length=255, blank=True, help_text="Stored upload; removed once imported")
+    report = models.CharField(max_length=255, blank=True, help_text="Rejected-rows CSV report")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    summary = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+
 class PatientDocument(models.Model):
     """Patient documents and files"""
     DOCUMENT_TYPES = [
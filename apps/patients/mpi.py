@@ -0,0 +1,280 @@
+# apps/patients/mpi.py
+"""
+Master patient index.
+
+Every patient has a handful of blocking keys (``PatientBlockingKey``, indexed
+on (kind, value)), rebuilt when a registration's identifying fields change
+(apps.patients.signals) and written by the bulk import:
+
+* NAME - phonetic codes of the first and last name (Soundex, so "Mohammed
+  Ali" and "Muhammad Aly" share one);
+* DOB - date of birth with the surname's phonetic code;
+* PHONE - the last nine digits of each phone number, so local and
+  international forms agree;
+* NATIONAL_ID - the national ID, upper-cased without separators.
+
+Only patients sharing a key are ever compared; ``similarity()`` scores a
+pair from 0 to 1. ``PatientIndex.possible_duplicates()`` checks a
+registration with two indexed queries. ``PatientIndex.find_duplicates()``
+(Celery beat) walks the key index in (kind, value) order, scores the pairs
+inside each block and keeps those over ``MPI_DUPLICATE_THRESHOLD`` as
+``DuplicateCandidate`` rows for review. Blocks larger than
+``MPI_MAX_BLOCK_SIZE`` (very common names) are compared within a window of
+``MPI_BLOCK_WINDOW`` neighbours by date of birth instead of pair by pair.
+"""
+
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from itertools import combinations, groupby
+import logging
+import re
+
+from apps.core.sqlite import serialized_write
+from .models import DuplicateCandidate, Patient, PatientBlockingKey, normalize_name, normalize_phone
+
+logger = logging.getLogger('zain_hms.performance')
+
+LOCK_KEY = 'zain_hms:patients:mpi'
+
+# Fields the keys and the score read; a save that changes none of them keeps the keys
+IDENTITY_FIELDS = ('first_name', 'last_name', 'date_of_birth', 'gender', 'phone', 'alternate_phone', 'national_id')
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+
+# Pairs scored per query when walking the index
+PAIR_BATCH = 5000
+
+
+def soundex(name):
+    """American Soundex of a name ("Mohammed", "Muhammad" -> "M530"); '' without letters"""
+    letters = re.sub(r'[^a-z]', '', normalize_name(name))
+    if not letters:
+        return ''
+    code, previous = [letters[0].upper()], SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        if letter in 'hw':  # Do not separate equal codes
+            continue
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code.append(digit)
+        previous = digit
+    return ''.join(code).ljust(4, '0')[:4]
+
+
+def jaro_winkler(a, b):
+    """Jaro-Winkler similarity of two strings, 0 to 1"""
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+    reach = max(len(a), len(b)) // 2 - 1
+    taken = [False] * len(b)
+    matched = []
+    for i, char in enumerate(a):
+        for j in range(max(0, i - reach), min(len(b), i + reach + 1)):
+            if not taken[j] and b[j] == char:
+                taken[j] = True
+                matched.append(char)
+                break
+    if not matched:
+        return 0.0
+    other = [b[j] for j in range(len(b)) if taken[j]]
+    transpositions = sum(x != y for x, y in zip(matched, other)) / 2
+    m = len(matched)
+    jaro = (m / len(a) + m / len(b) + (m - transpositions) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def _date(value):
+    if isinstance(value, date) or not value:
+        return value or None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _phones(patient):
+    return {digits[-9:] for digits in map(normalize_phone, (patient.phone, patient.alternate_phone)) if len(digits) >= 7}
+
+
+def _national_id(patient):
+    value = re.sub(r'[^A-Z0-9]', '', (patient.national_id or '').upper())
+    return value if len(value) >= 4 else ''
+
+
+def blocking_keys(patient):
+    """``{(kind, value)}`` for one patient (saved or not)"""
+    first, last = soundex(patient.first_name), soundex(patient.last_name)
+    born = _date(patient.date_of_birth)
+    keys = {('PHONE', phone) for phone in _phones(patient)}
+    if first and last:
+        keys.add(('NAME', first + last))
+    if born and last:
+        keys.add(('DOB', f"{born.isoformat()}:{last}"))
+    if _national_id(patient):
+        keys.add(('NATIONAL_ID', _national_id(patient)))
+    return keys
+
+
+def _name_score(a, b):
+    score = jaro_winkler(normalize_name(a), normalize_name(b))
+    return max(score, 0.95) if score and soundex(a) == soundex(b) else score
+
+
+def similarity(a, b):
+    """
+    How likely two registrations are the same person, 0 to 1: names (Jaro-
+    Winkler, phonetic matches count as close), date of birth (a one-field
+    typo or swapped day/month counts half), a shared phone and the national
+    ID. Different national IDs or genders count against.
+    """
+    score = 0.25 * _name_score(a.first_name, b.first_name) + 0.3 * _name_score(a.last_name, b.last_name)
+
+    born_a, born_b = _date(a.date_of_birth), _date(b.date_of_birth)
+    if born_a and born_b:
+        if born_a == born_b:
+            score += 0.3
+        elif (born_a.year == born_b.year and (born_a.month, born_a.day) == (born_b.day, born_b.month)) or \
+                sum(x != y for x, y in zip(born_a.timetuple()[:3], born_b.timetuple()[:3])) == 1:
+            score += 0.15
+
+    if _phones(a) & _phones(b):
+        score += 0.15
+
+    id_a, id_b = _national_id(a), _national_id(b)
+    if id_a and id_b:
+        score += 0.2 if id_a == id_b else -0.4
+    if a.gender in ('M', 'F') and b.gender in ('M', 'F') and a.gender != b.gender:
+        score -= 0.15
+    return round(min(max(score, 0.0), 1.0), 3)
+
+
+class PatientIndex:
+    """Maintain blocking keys; find possible duplicates of one patient or across the registry"""
+
+    @staticmethod
+    def _threshold():
+        return getattr(settings, 'MPI_DUPLICATE_THRESHOLD', 0.8)
+
+    @staticmethod
+    def index(patients):
+        """Replace the blocking keys of ``patients`` (one delete, one bulk_create)"""
+        with serialized_write():
+            PatientBlockingKey.objects.filter(patient__in=[patient.pk for patient in patients]).delete()
+            PatientBlockingKey.objects.bulk_create([
+                PatientBlockingKey(patient_id=patient.pk, kind=kind, value=value[:64])
+                for patient in patients
+                for kind, value in blocking_keys(patient)
+            ], batch_size=1000)
+
+    @classmethod
+    def reindex(cls, batch_size=2000):
+        """Rebuild every patient's keys; returns how many patients were indexed"""
+        count, batch = 0, []
+        for patient in Patient.objects.only(*IDENTITY_FIELDS).order_by().iterator(chunk_size=batch_size):
+            batch.append(patient)
+            if len(batch) == batch_size:
+                cls.index(batch)
+                count, batch = count + len(batch), []
+        if batch:
+            cls.index(batch)
+        return count + len(batch)
+
+    @classmethod
+    def possible_duplicates(cls, patient, limit=5):
+        """
+        ``[(score, patient), ...]`` of registered patients that may be
+        ``patient`` (saved or not), best first: the patients sharing a
+        blocking key (one indexed query), then their details (one query).
+        """
+        keys = blocking_keys(patient)
+        if not keys:
+            return []
+        shared = Q()
+        for kind, value in keys:
+            shared |= Q(kind=kind, value=value[:64])
+        ids = list(
+            PatientBlockingKey.objects.filter(shared).exclude(patient_id=patient.pk).order_by()
+            .values_list('patient_id', flat=True).distinct()[:getattr(settings, 'MPI_CANDIDATE_LIMIT', 200)]
+        )
+        candidates = Patient.objects.filter(pk__in=ids, is_active=True).only('patient_id', *IDENTITY_FIELDS)
+        scored = [(similarity(patient, candidate), candidate) for candidate in candidates]
+        threshold = cls._threshold()
+        return sorted((pair for pair in scored if pair[0] >= threshold), key=lambda pair: -pair[0])[:limit]
+
+    # Batch job
+
+    @classmethod
+    def _store(cls, pairs):
+        """Score a batch of ``{(id, id): {kinds}}`` pairs and upsert the likely ones; returns how many"""
+        ids = {patient_id for pair in pairs for patient_id in pair}
+        patients = Patient.objects.only(*IDENTITY_FIELDS).in_bulk(ids)
+        threshold = cls._threshold()
+        found = []
+        for (a, b), kinds in pairs.items():
+            if a in patients and b in patients:
+                score = similarity(patients[a], patients[b])
+                if score >= threshold:
+                    found.append(DuplicateCandidate(
+                        patient_id=a, other_id=b, score=score, matched_on=', '.join(sorted(kinds)),
+                    ))
+        with serialized_write():
+            # Keeps the review status of pairs found before
+            DuplicateCandidate.objects.bulk_create(
+                found, batch_size=500, update_conflicts=True,
+                unique_fields=['patient', 'other'], update_fields=['score', 'matched_on'],
+            )
+        return len(found)
+
+    @classmethod
+    def find_duplicates(cls):
+        """Compare patients within each block of the key index; returns how many likely pairs were stored"""
+        if not cache.add(LOCK_KEY, 1, getattr(settings, 'MPI_LOCK_TIMEOUT', 3600)):
+            return 0
+        max_block = getattr(settings, 'MPI_MAX_BLOCK_SIZE', 200)
+        window = getattr(settings, 'MPI_BLOCK_WINDOW', 20)
+        blocks = compared = stored = 0
+        pairs = {}
+        try:
+            rows = PatientBlockingKey.objects.order_by('kind', 'value').values_list(
+                'kind', 'value', 'patient_id').iterator(chunk_size=5000)
+            for (kind, value), group in groupby(rows, key=lambda row: row[:2]):
+                members = list(dict.fromkeys(row[2] for row in group))
+                if len(members) < 2:
+                    continue
+                blocks += 1
+                if len(members) <= max_block:
+                    candidates = combinations(members, 2)
+                else:
+                    # Sorted neighbourhood: only patients born close together are compared
+                    ordered = list(
+                        Patient.objects.filter(blocking_keys__kind=kind, blocking_keys__value=value)
+                        .order_by('date_of_birth', 'pk').values_list('pk', flat=True).distinct()
+                    )
+                    candidates = (
+                        (a, b) for i, a in enumerate(ordered) for b in ordered[i + 1:i + window]
+                    )
+                for a, b in candidates:
+                    pairs.setdefault((a, b) if str(a) < str(b) else (b, a), set()).add(kind)
+                if len(pairs) >= PAIR_BATCH:
+                    compared += len(pairs)
+                    stored += cls._store(pairs)
+                    pairs = {}
+            if pairs:
+                compared += len(pairs)
+                stored += cls._store(pairs)
+        finally:
+            cache.delete(LOCK_KEY)
+        logger.info(f"Patient index: {blocks} blocks, {compared} pairs compared, {stored} likely duplicates")
+        return stored
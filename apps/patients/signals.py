@@ -0,0 +1,29 @@
+# apps/patients/signals.py
+"""
+Patient signal handlers: keep the master patient index (apps.patients.mpi)
+blocking keys in step with registrations.
+"""
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .mpi import IDENTITY_FIELDS, PatientIndex
+
+
+def _identity(instance):
+    return tuple(instance.__dict__.get(field) for field in IDENTITY_FIELDS)
+
+
+@receiver(post_init, sender='patients.Patient')
+def remember_identity(sender, instance, **kwargs):
+    """Keep the loaded identifying fields so post_save can skip saves that do not touch them"""
+    instance._identity = _identity(instance)
+
+
+@receiver(post_save, sender='patients.Patient')
+def update_blocking_keys(sender, instance, created, **kwargs):
+    identity = _identity(instance)
+    if not created and identity == getattr(instance, '_identity', None):
+        return
+    instance._identity = identity
+    # Same transaction as the save, so the keys never describe a rolled-back registration
+    PatientIndex.index([instance])
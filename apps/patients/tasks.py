@@ -0,0 +1,24 @@
+# apps/patients/tasks.py
+"""
+Patient tasks: periodic ones are scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+
+from .bulk_import import import_registry
+from .models import PatientImport
+from .mpi import PatientIndex
+
+
+@shared_task(ignore_result=True)
+def find_duplicate_patients():
+    """Score patients sharing a blocking key and store the likely duplicates for review"""
+    PatientIndex.find_duplicates()
+
+
+@shared_task(ignore_result=True)
+def import_patient_registry(import_id):
+    """Import a registry upload queued by the patient import view"""
+    # Claimed with a conditional update, so a redelivered task does not import twice
+    if PatientImport.objects.filter(pk=import_id, status='QUEUED').update(status='RUNNING'):
+        import_registry(PatientImport.objects.select_related('uploaded_by').get(pk=import_id))
@@ -1,3 +1,203 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from pathlib import Path
+from unittest import mock
+import csv
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from apps.doctors.models import Doctor
+from apps.emr.models import Medication, VitalSigns
+from .bulk_import import PatientImporter
+from .models import Patient, PatientImport
+from .mpi import PatientIndex, similarity, soundex
+from .tasks import import_patient_registry
+from .timeline import PatientTimeline
+
+
+def make_patient(**fields):
+    values = dict(first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F',
+                  phone='0501234567')
+    values.update(fields)
+    return Patient.objects.create(**values)
+
+
+class PatientImportTests(TestCase):
+
+    HEADER = 'First Name,Surname,DOB,Sex,Mobile,Address,City,State\n'
+
+    def run_import(self, rows, chunk=None):
+        report = io.StringIO()
+        importer = PatientImporter(rejects=report)
+        if chunk:
+            importer.CHUNK = chunk
+        summary = importer.run(io.StringIO(self.HEADER + rows))
+        return summary, list(csv.reader(io.StringIO(report.getvalue())))[1:]
+
+    def test_rejects_are_reported_in_row_order(self):
+        summary, report = self.run_import(
+            'Amina,Khan,1985-03-02,Female,0501234567,1 Main St,Dubai,Dubai\n'
+            'Amina,Khan,1985-03-02,F,0501234567,1 Main St,Dubai,Dubai\n'     # Duplicate of row 2
+            'Omar,,1990-01-01,M,0507654321,2 Main St,Dubai,Dubai\n'           # No last name
+            'Sara,Ali,1992-05-06,F,0509876543,3 Main St,Dubai,Dubai\n'
+        )
+        self.assertEqual((summary['imported'], summary['rejected'], summary['duplicates']), (2, 2, 1))
+        self.assertEqual([row[0] for row in report], ['3', '4'])
+        self.assertIn('Duplicate of row 2', report[0][1])
+        self.assertIn('last_name', report[1][1])
+        self.assertEqual([error.split(':')[0] for error in summary['errors']], ['row 3', 'row 4'])
+
+    def test_duplicates_of_registered_patients_across_chunks(self):
+        existing = make_patient()
+        summary, report = self.run_import(
+            'Sara,Ali,1992-05-06,F,0509876543,3 Main St,Dubai,Dubai\n'
+            'AMINA,khan,1985-03-02,F,0555555555,1 Main St,Dubai,Dubai\n'
+            'Sara,Ali,1992-05-06,F,0509876543,3 Main St,Dubai,Dubai\n',
+            chunk=1,
+        )
+        self.assertEqual(summary['imported'], 1)
+        self.assertEqual([row[0] for row in report], ['3', '4'])
+        self.assertIn(existing.patient_id, report[0][1])
+        self.assertEqual(Patient.objects.filter(first_name='Sara').count(), 1)
+
+
+class QueuedPatientImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        cls.clerk = User.objects.create_user(username='clerk', password='x', role='RECEPTIONIST')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(PATIENT_IMPORT_ROOT=Path(root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = Path(root)
+        # The worker runs the task as soon as the upload commits
+        worker = mock.patch.object(import_patient_registry, 'delay', side_effect=import_patient_registry)
+        worker.start()
+        self.addCleanup(worker.stop)
+
+    def upload(self, user):
+        self.client.force_login(user)
+        registry = SimpleUploadedFile('registry.csv', (
+            PatientImportTests.HEADER
+            + 'Amina,Khan,1985-03-02,F,0501234567,1 Main St,Dubai,Dubai\n'
+            + 'Omar,,1990-01-01,M,0507654321,2 Main St,Dubai,Dubai\n'
+        ).encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('patients:import'), {'file': registry})
+
+    def test_upload_is_imported_in_the_background_with_a_private_report(self):
+        response = self.upload(self.admin)
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((status['status'], status['imported'], status['rejected']), ('DONE', 1, 1))
+
+        report_url = status['rejected_report']
+        self.assertFalse(report_url.startswith(settings.MEDIA_URL))
+        report = self.client.get(report_url)
+        self.assertEqual(report['Cache-Control'], 'private, no-store')
+        rows = list(csv.reader(io.StringIO(b''.join(report.streaming_content).decode())))
+        self.assertEqual((rows[1][0], rows[1][2]), ('3', 'Omar'))
+
+        job = PatientImport.objects.get()
+        self.assertTrue((self.root / job.report).exists())
+        self.assertEqual(job.source, '')
+        self.assertEqual(list((self.root / 'uploads').iterdir()), [])
+
+    def test_report_needs_the_import_permission(self):
+        job = PatientImport.objects.get(pk=self.upload(self.admin).json()['import_id'])
+        self.assertEqual(self.upload(self.clerk).status_code, 403)
+
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.get(reverse('patients:import_report', args=[job.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('patients:import_status', args=[job.pk])).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('patients:import_report', args=[job.pk])).status_code, 302)
+
+
+class PatientIndexTests(TestCase):
+
+    def test_phonetic_names_and_typos_score_high(self):
+        a = Patient(first_name='Mohammed', last_name='Ali', date_of_birth=date(1980, 4, 12), gender='M',
+                    phone='+971501234567')
+        b = Patient(first_name='Muhammad', last_name='Aly', date_of_birth=date(1980, 12, 4), gender='M',
+                    phone='0501234567')
+        self.assertEqual(soundex('Mohammed'), soundex('Muhammad'))
+        self.assertGreaterEqual(similarity(a, b), 0.8)
+
+    def test_conflicting_identity_scores_low(self):
+        a = Patient(first_name='Sara', last_name='Ali', date_of_birth=date(1992, 5, 6), gender='F',
+                    national_id='784-1992-1234567-1')
+        b = Patient(first_name='Sara', last_name='Ali', date_of_birth=date(1992, 5, 6), gender='M',
+                    national_id='784-1992-7654321-1')
+        self.assertLess(similarity(a, b), 0.8)
+
+    def test_possible_duplicates_uses_the_key_index(self):
+        registered = make_patient(first_name='Mohammed', last_name='Ali', gender='M')
+        make_patient(first_name='John', last_name='Smith', gender='M', phone='0509999999')
+        candidate = Patient(first_name='Muhammad', last_name='Aly', date_of_birth=registered.date_of_birth,
+                            gender='M', phone='0500000001')
+        matches = PatientIndex.possible_duplicates(candidate)
+        self.assertEqual([patient.pk for _, patient in matches], [registered.pk])
+
+    def test_find_duplicates_stores_likely_pairs(self):
+        make_patient(first_name='Mohammed', last_name='Ali', gender='M')
+        make_patient(first_name='Muhammad', last_name='Aly', gender='M', phone='0500000001')
+        make_patient(first_name='John', last_name='Smith', gender='M', phone='0509999999')
+        self.assertEqual(PatientIndex.find_duplicates(), 1)
+
+
+class PatientTimelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+        doctor = Doctor.objects.create(
+            first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        start = timezone.make_aware(datetime(2026, 1, 10, 9, 0))
+        for day in range(5):
+            VitalSigns.objects.create(patient=cls.patient, recorded_at=start + timedelta(days=day), heart_rate=70 + day)
+        # Same instant as a vitals entry (dates sort at midnight): ties break by source
+        VitalSigns.objects.create(patient=cls.patient, recorded_at=timezone.make_aware(datetime(2026, 1, 12)),
+                                  heart_rate=90)
+        for day in (11, 12, 15):
+            Medication.objects.create(patient=cls.patient, prescribed_by=doctor, medication_name=f'Drug {day}',
+                                      dosage='10mg', start_date=date(2026, 1, day))
+
+    def walk(self, size):
+        pages, cursor = [], None
+        while True:
+            page = PatientTimeline.page(self.patient.pk, cursor=cursor, size=size)
+            pages.append(page['entries'])
+            cursor = page['next_cursor']
+            if not cursor:
+                return pages
+
+    def test_cursor_pages_merge_sources_without_gaps_or_repeats(self):
+        everything = [entry for page in self.walk(size=100) for entry in page]
+        self.assertEqual(len(everything), 9)
+        keys = [(entry['at'], entry['source'], entry['id']) for entry in everything]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+        pages = self.walk(size=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2, 1])
+        self.assertEqual([entry for page in pages for entry in page], everything)
+
+    def test_sources_filter_the_first_page(self):
+        page = PatientTimeline.page(self.patient.pk, size=10, sources=['medication'])
+        self.assertEqual([entry['title'] for entry in page['entries']], ['Drug 15', 'Drug 12', 'Drug 11'])
+        self.assertIsNone(page['next_cursor'])
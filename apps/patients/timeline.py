@@ -0,0 +1,278 @@
+# apps/patients/timeline.py
+"""
+Patient timeline: one newest-first stream of everything recorded about a
+patient across the EMR, laboratory, radiology, billing and pharmacy apps.
+
+Each source in ``SOURCES`` is read on its own with a keyset query,
+``patient = X AND (time, id) < position ORDER BY time DESC, id DESC LIMIT
+page size + 1``, answered by a (patient, time, id) index, and only the
+columns the entry shows. The sources are k-way merged in Python
+(``heapq.merge``) and the page is cut from the merged stream.
+
+The cursor is the position of every source after the page: the last entry
+of that source shown, or "exhausted" once a source has nothing left, so the
+next page costs one small indexed query per remaining source however deep
+it is. Entries at the same instant are ordered by source, then id, so pages
+never overlap or skip.
+
+The first page is what the patient screens show; it is cached per patient
+under the ``patient_timeline:<patient id>`` tag, which the sources' save and
+delete signals bump (apps.core.signals).
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+import heapq
+import itertools
+import json
+import logging
+
+from apps.core.cache_tags import TagCache
+from apps.core.pagination import InvalidCursor
+
+logger = logging.getLogger('zain_hms.performance')
+
+# Cursor marker for a source with nothing left (null means it has not started)
+EXHAUSTED = 0
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part not in (None, ''))
+
+
+def _vitals(row):
+    readings = []
+    if row['blood_pressure_systolic'] and row['blood_pressure_diastolic']:
+        readings.append(f"BP {row['blood_pressure_systolic']}/{row['blood_pressure_diastolic']}")
+    for label, field, unit in (('HR', 'heart_rate', ''), ('T', 'temperature', ''),
+                               ('SpO2', 'oxygen_saturation', '%')):
+        if row[field] is not None:
+            readings.append(f"{label} {row[field]}{unit}")
+    return ', '.join(readings)
+
+
+class TimelineSource:
+    """One model feeding the timeline: its time column, the columns read and how an entry reads"""
+
+    def __init__(self, name, model, time_field, fields, title, detail):
+        self.name = name
+        self.label = model
+        self.time_field = time_field
+        self.fields = fields
+        self.title = title
+        self.detail = detail
+
+    @property
+    def model(self):
+        return apps.get_model(self.label)
+
+    def entries(self, patient_id, position, limit, fetched):
+        """
+        Lazily yield up to ``limit`` entries after ``position`` (one query,
+        run on first use); how many rows it read goes in ``fetched[name]``.
+        """
+        model = self.model
+        queryset = model.objects.filter(patient_id=patient_id)
+        if position is not None:
+            at, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.time_field}__lt': at}) | Q(**{self.time_field: at, 'pk__lt': pk})
+            )
+        rows = list(queryset.order_by(f'-{self.time_field}', '-pk').values(
+            'pk', self.time_field, *self.fields)[:limit])
+        fetched[self.name] = len(rows)
+        statuses = self._labels(model, 'status')
+        for row in rows:
+            value = row[self.time_field]
+            at = _as_datetime(value)
+            yield {
+                'source': self.name,
+                'id': str(row['pk']),
+                'at': at.isoformat(),
+                'title': self.title(row),
+                'detail': self.detail(row),
+                'status': statuses.get(row.get('status'), row.get('status') or ''),
+                # Merge and cursor keys, dropped before the entry is returned
+                '_key': (at, self.name, row['pk']),
+                '_position': (value, row['pk']),
+            }
+
+    @staticmethod
+    def _labels(model, field):
+        try:
+            return {value: str(label) for value, label in model._meta.get_field(field).flatchoices}
+        except Exception:
+            return {}
+
+    def encode_position(self, position):
+        if position is None:
+            return None
+        at, pk = position
+        return [at.isoformat(), str(pk)]
+
+    def decode_position(self, value):
+        """Cursor entry -> ``(time, pk)`` or None (from the newest); raises InvalidCursor"""
+        if value is None:
+            return None
+        model = self.model
+        try:
+            at, pk = value
+            return (model._meta.get_field(self.time_field).to_python(at),
+                    model._meta.pk.to_python(pk))
+        except Exception as e:
+            raise InvalidCursor(f"Invalid timeline cursor for {self.name}: {e}")
+
+
+def _as_datetime(value):
+    """Date-only sources (invoices, medications) sort at the start of their day"""
+    if isinstance(value, datetime):
+        return value
+    moment = datetime.combine(value, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+SOURCES = {source.name: source for source in (
+    TimelineSource(
+        'encounter', 'emr.MedicalRecord', 'record_date',
+        ('record_type', 'chief_complaint', 'doctor__first_name', 'doctor__last_name'),
+        title=lambda row: row['record_type'].replace('_', ' ').title(),
+        detail=lambda row: _join(row['chief_complaint'][:200],
+                                 f"- Dr. {_join(row['doctor__first_name'], row['doctor__last_name'])}"),
+    ),
+    TimelineSource(
+        'vitals', 'emr.VitalSigns', 'recorded_at',
+        ('blood_pressure_systolic', 'blood_pressure_diastolic', 'heart_rate', 'temperature',
+         'oxygen_saturation'),
+        title=lambda row: 'Vital signs',
+        detail=_vitals,
+    ),
+    TimelineSource(
+        'medication', 'emr.Medication', 'start_date',
+        ('medication_name', 'dosage', 'route', 'status'),
+        title=lambda row: row['medication_name'],
+        detail=lambda row: _join(row['dosage'], row['route']),
+    ),
+    TimelineSource(
+        'lab_result', 'emr.LabResult', 'ordered_date',
+        ('test_name', 'result_value', 'result_unit', 'status'),
+        title=lambda row: row['test_name'],
+        detail=lambda row: _join(row['result_value'], row['result_unit']),
+    ),
+    TimelineSource(
+        'lab_order', 'laboratory.LabOrder', 'order_date',
+        ('order_number', 'priority', 'status'),
+        title=lambda row: f"Lab order {row['order_number']}",
+        detail=lambda row: row['priority'].title(),
+    ),
+    TimelineSource(
+        'radiology_order', 'radiology.RadiologyOrder', 'order_date',
+        ('order_number', 'priority', 'status'),
+        title=lambda row: f"Radiology order {row['order_number']}",
+        detail=lambda row: row['priority'].title(),
+    ),
+    TimelineSource(
+        'invoice', 'billing.Invoice', 'invoice_date',
+        ('invoice_number', 'total_amount', 'status'),
+        title=lambda row: f"Invoice {row['invoice_number']}",
+        detail=lambda row: f"Total {row['total_amount']}",
+    ),
+    TimelineSource(
+        'prescription', 'pharmacy.Prescription', 'prescription_date',
+        ('prescription_number', 'diagnosis', 'status'),
+        title=lambda row: f"Prescription {row['prescription_number']}",
+        detail=lambda row: row['diagnosis'][:200],
+    ),
+)}
+
+
+def timeline_tag(patient_id):
+    return f'patient_timeline:{patient_id}'
+
+
+class PatientTimeline:
+    """Merged, cursor-paginated timeline pages for one patient"""
+
+    @staticmethod
+    def page_size(requested=None):
+        default = getattr(settings, 'PATIENT_TIMELINE_PAGE_SIZE', 25)
+        try:
+            size = int(requested) if requested else default
+        except (TypeError, ValueError):
+            size = default
+        return max(1, min(size, getattr(settings, 'PATIENT_TIMELINE_MAX_PAGE_SIZE', 100)))
+
+    @staticmethod
+    def encode_cursor(positions):
+        payload = json.dumps({
+            name: EXHAUSTED if position is EXHAUSTED else SOURCES[name].encode_position(position)
+            for name, position in positions.items()
+        }, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """``{source: (time, pk), None or EXHAUSTED}``; raises InvalidCursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()).decode())
+        except Exception as e:
+            raise InvalidCursor(f"Invalid timeline cursor: {e}")
+        if not isinstance(payload, dict) or not payload or set(payload) - set(SOURCES):
+            raise InvalidCursor("Invalid timeline cursor: unknown sources")
+        return {
+            name: EXHAUSTED if value == EXHAUSTED else SOURCES[name].decode_position(value)
+            for name, value in payload.items()
+        }
+
+    @classmethod
+    def page(cls, patient_id, cursor=None, size=None, sources=None):
+        """
+        ``{'entries': [...], 'next_cursor': str or None}``, newest first.
+        ``sources`` limits the page to some of ``SOURCES`` (ignored with a
+        cursor, which carries its own); raises InvalidCursor.
+        """
+        size = cls.page_size(size)
+        if cursor:
+            return cls._build(patient_id, cls.decode_cursor(cursor), size)
+        names = [name for name in SOURCES if not sources or name in sources]
+        if not names:
+            return {'entries': [], 'next_cursor': None}
+        # The first page is shown on every visit to the patient; later pages are not cached
+        return TagCache.get_or_set(
+            'patient_timeline', [timeline_tag(patient_id)],
+            lambda: cls._build(patient_id, dict.fromkeys(names), size),
+            timeout=getattr(settings, 'PATIENT_TIMELINE_CACHE_TIMEOUT', 300),
+            key_parts=(str(patient_id), size, tuple(names)),
+        )
+
+    @classmethod
+    def _build(cls, patient_id, positions, size):
+        # One more row than a page per source tells whether the source has more after it
+        fetched = {}
+        streams = [
+            SOURCES[name].entries(patient_id, position, size + 1, fetched)
+            for name, position in positions.items() if position is not EXHAUSTED
+        ]
+        entries = list(itertools.islice(
+            heapq.merge(*streams, key=lambda entry: entry['_key'], reverse=True), size))
+
+        shown = {}
+        for entry in entries:
+            shown.setdefault(entry['source'], []).append(entry['_position'])
+        next_positions = {}
+        for name, position in positions.items():
+            taken = shown.get(name, [])
+            if position is EXHAUSTED or fetched.get(name, 0) <= len(taken):
+                next_positions[name] = EXHAUSTED
+            else:
+                # Resume after the last entry shown, or where this page started if none was
+                next_positions[name] = taken[-1] if taken else position
+        for entry in entries:
+            del entry['_key'], entry['_position']
+
+        more = any(position is not EXHAUSTED for position in next_positions.values())
+        return {'entries': entries, 'next_cursor': cls.encode_cursor(next_positions) if more else None}
@@ -13,7 +13,12 @@ urlpatterns = [
     path('<uuid:pk>/print/', views.PatientPrintView.as_view(), name='print'),
     path('bulk-action/', views.PatientBulkActionView.as_view(), name='patient_bulk_action'),
     path('quick-register/', views.quick_patient_register, name='quick_register'),
+    path('import/', views.patient_import, name='import'),
+    path('import/<int:pk>/', views.patient_import_status, name='import_status'),
+    path('import/<int:pk>/rejected.csv', views.patient_import_report, name='import_report'),
     path('search/', views.patient_search_api, name='search_api'),
+    path('duplicates/check/', views.patient_duplicate_check, name='duplicate_check'),
+    path('<uuid:pk>/timeline/', views.patient_timeline, name='timeline'),
     path('<uuid:patient_id>/documents/add/', views.add_patient_document, name='add_document'),
     path('<uuid:patient_id>/notes/add/', views.add_patient_note, name='add_note'),
     path('<uuid:patient_id>/vitals/add/', views.add_patient_vitals, name='add_vitals'),
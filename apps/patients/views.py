@@ -6,16 +6,25 @@ from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.urls import reverse_lazy, reverse
 from django.db.models import Q, Count
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.views.decorators.http import require_POST
+from django.db import transaction
+from datetime import datetime
 import logging
-from .models import Patient, PatientDocument, PatientNote, PatientVitals
+import uuid
+from .bulk_import import READERS, detect_format, import_storage, queue_import
+from .mpi import PatientIndex
+from .timeline import SOURCES as TIMELINE_SOURCES, PatientTimeline
+from .models import Patient, PatientDocument, PatientImport, PatientNote, PatientVitals
+from .tasks import import_patient_registry
 from .forms import (
     PatientForm, QuickPatientForm, PatientSearchForm,
     PatientDocumentForm, PatientNoteForm, PatientVitalsForm
 )
 from apps.core.mixins import SafeMixin, UnifiedSystemMixin
+from apps.core.pagination import InvalidCursor, KeysetPaginationMixin, approximate_count
 from apps.core.permissions import (
     PatientAccessMixin, SecureViewMixin, audit_action, 
     patient_access_required, get_client_ip
@@ -25,13 +34,16 @@ logger = logging.getLogger(__name__)
 security_logger = logging.getLogger('security')  # For audit trail
 
 
-class PatientListView(SecureViewMixin, PatientAccessMixin, SafeMixin, ListView):
+class PatientListView(KeysetPaginationMixin, SecureViewMixin, PatientAccessMixin, SafeMixin, ListView):
     """List all patients with search and filtering - SECURE"""
     model = Patient
     template_name = 'patients/patient_list.html'  # Standard template name
     context_object_name = 'patients'
     paginate_by = 25  # Increased for better enterprise experience
     required_roles = ['admin', 'doctor', 'nurse', 'receptionist']
+    # Newest first; matches the (registration_date, id) index
+    keyset_ordering = ('-registration_date', '-id')
+    keyset_count_tags = ['patients']
         # tenant_filter_field removed for unified single-DB mode
     
     def get_queryset(self):
@@ -65,7 +77,8 @@ class PatientListView(SecureViewMixin, PatientAccessMixin, SafeMixin, ListView):
         if is_vip:
             queryset = queryset.filter(is_vip=True)
             
-        return queryset.order_by('-registration_date')
+        # Ordering is applied by the keyset paginator
+        return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -74,24 +87,22 @@ class PatientListView(SecureViewMixin, PatientAccessMixin, SafeMixin, ListView):
         # ZAIN HMS unified system - all patients in single database
         patient_queryset = Patient.objects.filter(is_active=True)
         
-        context['total_patients'] = patient_queryset.count()
-        context['vip_patients'] = patient_queryset.filter(is_vip=True).count()
+        # Header totals come from cached rollups, not a COUNT(*) per page
+        context['total_patients'] = approximate_count(patient_queryset, tags=self.keyset_count_tags)
+        context['vip_patients'] = approximate_count(
+            patient_queryset.filter(is_vip=True), tags=self.keyset_count_tags
+        )
         
         # ZAIN HMS unified system - no hospital selection needed
         context['no_hospital_selected'] = False
         
         return context
     
-    def get(self, request, *args, **kwargs):
-        """Handle HTMX and regular GET requests"""
-        response = super().get(request, *args, **kwargs)
-        
-        # For HTMX requests, return only the table container
-        if request.headers.get('HX-Request'):
-            context = self.get_context_data()
-            return render(request, 'patients/partials/patient_table.html', context)
-            
-        return response
+    def get_template_names(self):
+        """HTMX requests only need the table container"""
+        if self.request.headers.get('HX-Request'):
+            return ['patients/partials/patient_table.html']
+        return super().get_template_names()
 
 
 class PatientDetailView(UnifiedSystemMixin, LoginRequiredMixin, DetailView):
@@ -152,6 +163,7 @@ class PatientCreateView(UnifiedSystemMixin, CreateView):  # CreateView): # Tempo
             # Save the patient to ZAIN HMS unified database
             patient.save()
             self.object = patient
+            self._warn_possible_duplicates(patient)
             
             if patient.email and 'user_error' not in locals():
                 messages.success(
@@ -172,6 +184,12 @@ class PatientCreateView(UnifiedSystemMixin, CreateView):  # CreateView): # Tempo
             )
             return self.form_invalid(form)
     
+    def _warn_possible_duplicates(self, patient):
+        duplicates = PatientIndex.possible_duplicates(patient)
+        if duplicates:
+            listed = ', '.join(f"{match.get_full_name()} ({match.patient_id})" for _, match in duplicates)
+            messages.warning(self.request, f'Possible duplicate registration of: {listed}. Please review.')
+
     def get_success_url(self):
         return reverse('patients:detail', kwargs={'pk': self.object.pk})
 
@@ -213,7 +231,10 @@ def quick_patient_register(request):
                     'success': True,
                     'message': 'Patient registered successfully!',
                     'patient_id': str(patient.id),
-                    'patient_name': patient.get_full_name()
+                    'patient_name': patient.get_full_name(),
+                    'possible_duplicates': [
+                        _duplicate_data(score, match) for score, match in PatientIndex.possible_duplicates(patient)
+                    ],
                 })
             else:
                 messages.success(request, 'Patient registered successfully!')
@@ -224,6 +245,132 @@ def quick_patient_register(request):
     return render(request, 'patients/quick_register.html', {'form': form})
 
 
+def _duplicate_data(score, patient):
+    return {
+        'id': str(patient.pk),
+        'patient_id': patient.patient_id,
+        'name': patient.get_full_name(),
+        'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
+        'phone': patient.phone,
+        'score': score,
+        'url': reverse('patients:detail', kwargs={'pk': patient.pk}),
+    }
+
+
+@login_required
+def patient_duplicate_check(request):
+    """Possible duplicates of a registration being typed in (master patient index lookup)"""
+    params = request.GET
+    date_of_birth = None
+    for date_format in ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%m/%d/%Y'):  # As PatientForm accepts
+        try:
+            date_of_birth = datetime.strptime(params.get('date_of_birth', '').strip(), date_format).date()
+            break
+        except ValueError:
+            continue
+
+    candidate = Patient(
+        first_name=params.get('first_name', '').strip(),
+        last_name=params.get('last_name', '').strip(),
+        date_of_birth=date_of_birth,
+        gender=params.get('gender', ''),
+        phone=params.get('phone', '').strip(),
+        alternate_phone=params.get('alternate_phone', '').strip(),
+        national_id=params.get('national_id', '').strip(),
+    )
+    if params.get('exclude'):  # The patient being edited
+        try:
+            candidate.pk = uuid.UUID(params['exclude'])
+        except ValueError:
+            pass
+    duplicates = PatientIndex.possible_duplicates(candidate)
+    return JsonResponse({'duplicates': [_duplicate_data(score, match) for score, match in duplicates]})
+
+
+@login_required
+def patient_timeline(request, pk):
+    """
+    One page of the patient's timeline across EMR, lab, radiology, billing
+    and pharmacy records, newest first; ``?cursor=`` is the previous page's
+    ``next_cursor``, ``?sources=lab_order,invoice`` narrows the first page.
+    """
+    patient = get_object_or_404(Patient.objects.only('pk'), pk=pk, is_active=True)
+    sources = [name for name in request.GET.get('sources', '').split(',') if name]
+    unknown = set(sources) - set(TIMELINE_SOURCES)
+    if unknown:
+        return JsonResponse({'error': f"Unknown sources: {', '.join(sorted(unknown))}"}, status=400)
+    try:
+        page = PatientTimeline.page(patient.pk, cursor=request.GET.get('cursor'),
+                                    size=request.GET.get('limit'), sources=sources)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(page)
+
+
+@login_required
+@require_POST
+def patient_import(request):
+    """Queue an uploaded patient registry (CSV or XLSX) for import; poll ``patient_import_status`` for the result"""
+    if not request.user.has_perm('patients.add_patient'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'No registry file uploaded'}, status=400)
+
+    fmt = request.POST.get('format') or detect_format(upload.name)
+    if fmt not in READERS:
+        return JsonResponse({'success': False, 'error': f'Unknown format: {fmt}'}, status=400)
+
+    job = queue_import(upload, fmt, request.user)
+    transaction.on_commit(lambda: import_patient_registry.delay(job.pk))
+
+    security_logger.info(f"PATIENT_IMPORT: {request.user.username} queued {upload.name} (import {job.pk})")
+    return JsonResponse({
+        'success': True, 'import_id': job.pk, 'status': job.status,
+        'status_url': reverse('patients:import_status', args=[job.pk]),
+    }, status=202)
+
+
+def _import_for(request, pk):
+    """The import, if ``request.user`` may see it: whoever uploaded it, or an administrator"""
+    job = get_object_or_404(PatientImport, pk=pk)
+    user = request.user
+    if not user.has_perm('patients.add_patient'):
+        return None
+    is_admin = user.is_superuser or getattr(user, 'role', None) in ['ADMIN', 'SUPERADMIN']
+    return job if job.uploaded_by_id == user.pk or is_admin else None
+
+
+@login_required
+def patient_import_status(request, pk):
+    """Status and summary of a queued patient import"""
+    job = _import_for(request, pk)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    return JsonResponse({
+        'success': True, 'import_id': job.pk, 'filename': job.filename, 'status': job.status,
+        **job.summary, 'error': job.error or None,
+        'rejected_report': reverse('patients:import_report', args=[job.pk]) if job.report else None,
+    })
+
+
+@login_required
+def patient_import_report(request, pk):
+    """Download an import's rejected-rows CSV (full patient rows, so never a public media URL)"""
+    job = _import_for(request, pk)
+    if job is None:
+        return HttpResponseForbidden('Permission denied')
+    if not job.report:
+        raise Http404('No rejected-rows report for this import')
+
+    security_logger.info(f"PATIENT_IMPORT_REPORT: {request.user.username} downloaded the report of import {job.pk}")
+    response = FileResponse(import_storage().open(job.report, 'rb'), as_attachment=True,
+                            filename=f"patient-import-{job.pk}-rejected.csv", content_type='text/csv')
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 @login_required
 def patient_search_api(request):
     """API endpoint for patient search (for autocomplete)"""
@@ -1,12 +1,14 @@
 from django.contrib import admin
 from django.db.models import Sum, F
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.contrib import messages
 
+from .inventory import BatchInventory
 from .models import (
-    DrugCategory, Manufacturer, Medicine, MedicineStock, 
+    DrugCategory, Manufacturer, Medicine, MedicineStock, MedicineBatch, MedicineStockSnapshot, MedicineForecast,
     PharmacySale, PharmacySaleItem, Prescription, PrescriptionItem
 )
 
@@ -25,12 +27,26 @@ class ManufacturerAdmin(admin.ModelAdmin):
     search_fields = ('name', 'code', 'contact_person')
 
 
+class MedicineBatchInline(admin.TabularInline):
+    model = MedicineBatch
+    extra = 0
+    fields = ('batch_number', 'expiry_date', 'received_quantity', 'quantity', 'unit_cost', 'received_at')
+    readonly_fields = ('received_quantity', 'quantity', 'received_at')
+    ordering = ('expiry_date', 'id')
+    
+    def has_add_permission(self, request, obj=None):
+        # Stock is received through BatchInventory so the ledger stays complete
+        return False
+
+
 @admin.register(Medicine)
 class MedicineAdmin(admin.ModelAdmin):
     list_display = ('generic_name', 'brand_name', 'category', 'manufacturer', 'dosage_form', 'strength', 'selling_price', 'stock_status', 'is_active')
     list_filter = ('category', 'manufacturer', 'dosage_form', 'is_active')
     search_fields = ('generic_name', 'brand_name', 'medicine_code')
-    readonly_fields = ('medicine_code',)
+    # Stock, next batch and its expiry follow the batches (BatchInventory); receive stock as a batch
+    readonly_fields = ('medicine_code', 'current_stock', 'batch_number', 'expiry_date')
+    inlines = [MedicineBatchInline]
     
     def stock_status(self, obj):
         stock = MedicineStock.objects.filter(medicine=obj).aggregate(
@@ -54,6 +70,68 @@ class MedicineStockAdmin(admin.ModelAdmin):
     search_fields = ('medicine__generic_name', 'medicine__brand_name', 'reference_number')
 
 
+@admin.register(MedicineBatch)
+class MedicineBatchAdmin(admin.ModelAdmin):
+    list_display = ('medicine', 'batch_number', 'expiry_date', 'quantity', 'received_quantity', 'unit_cost', 'received_at')
+    list_filter = ('expiry_date', 'medicine__category')
+    search_fields = ('batch_number', 'medicine__name', 'medicine__generic_name')
+    raw_id_fields = ('medicine',)
+    date_hierarchy = 'expiry_date'
+    actions = ['write_off_expired']
+    
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ('medicine', 'batch_number', 'manufacturing_date', 'expiry_date', 'received_quantity', 'unit_cost')
+        return ('medicine', 'batch_number', 'manufacturing_date', 'expiry_date', 'received_quantity', 'quantity',
+                'unit_cost', 'received_at', 'created_by')
+    
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return ('medicine', 'batch_number', 'received_quantity', 'quantity', 'unit_cost', 'received_at', 'created_by')
+    
+    def save_model(self, request, obj, form, change):
+        if change:
+            super().save_model(request, obj, form, change)
+            return
+        # Receipts go through the inventory service: ledger entry + Medicine totals
+        batch = BatchInventory.receive(
+            obj.medicine, obj.received_quantity, obj.batch_number, obj.expiry_date, obj.unit_cost,
+            user=request.user, reference='Admin receipt', manufacturing_date=obj.manufacturing_date,
+        )
+        obj.pk = batch.pk
+    
+    def write_off_expired(self, request, queryset):
+        today = timezone.now().date()
+        total = sum(
+            BatchInventory.write_off(batch, user=request.user, reference='Admin write-off')
+            for batch in queryset.filter(expiry_date__lt=today, quantity__gt=0)
+        )
+        messages.success(request, f'Wrote off {total} expired units.')
+    write_off_expired.short_description = 'Write off remaining stock of expired batches'
+
+
+@admin.register(MedicineStockSnapshot)
+class MedicineStockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('medicine', 'taken_at', 'quantity', 'value')
+    list_filter = ('taken_at',)
+    search_fields = ('medicine__name', 'medicine__generic_name')
+    date_hierarchy = 'taken_at'
+
+
+@admin.register(MedicineForecast)
+class MedicineForecastAdmin(admin.ModelAdmin):
+    list_display = ('medicine', 'smoothed_demand', 'on_hand', 'reorder_point', 'suggested_order_quantity', 'days_of_cover', 'needs_reorder', 'projected_expiry_waste', 'computed_at')
+    list_filter = ('needs_reorder',)
+    search_fields = ('medicine__name', 'medicine__generic_name')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(PharmacySale)
 class PharmacySaleAdmin(admin.ModelAdmin):
     list_display = ('sale_number', 'customer_name', 'customer_phone', 'total_amount', 'discount_amount', 'net_amount', 'payment_method', 'created_at')
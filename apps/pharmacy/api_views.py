@@ -1,7 +1,7 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import F
+from .inventory import InsufficientStock
 from .models import Medicine, PharmacySale, PharmacySaleItem
 from .serializers import MedicineSerializer, PharmacySaleSerializer, PharmacySaleItemSerializer
 
@@ -32,10 +32,8 @@ class PharmacySaleViewSet(viewsets.ModelViewSet):
 
         try:
             medicine = Medicine.objects.get(id=medicine_id)
-            if medicine.quantity_in_stock < quantity:
-                return Response({"error": "Insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create PharmacySaleItem
+            # Create PharmacySaleItem; its save draws the stock from batches (FEFO)
             PharmacySaleItem.objects.create(
                 sale=bill,
                 medicine=medicine,
@@ -44,12 +42,10 @@ class PharmacySaleViewSet(viewsets.ModelViewSet):
                 total_amount=medicine.selling_price * quantity
             )
 
-            # Reduce stock
-            medicine.quantity_in_stock = F('quantity_in_stock') - quantity
-            medicine.save()
-
             return Response({"success": "Item added to bill"}, status=status.HTTP_201_CREATED)
 
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Medicine.DoesNotExist:
             return Response({"error": "Medicine not found"}, status=status.HTTP_404_NOT_FOUND)
 
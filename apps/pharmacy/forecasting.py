@@ -0,0 +1,239 @@
+# apps/pharmacy/forecasting.py
+"""
+Formulary-wide demand forecasting and reorder advice.
+
+``FormularyForecaster.run()`` loads the daily sales of every active medicine
+from the ``MedicineStock`` ledger in one grouped query into a
+medicines x days NumPy matrix, together with the unexpired batch stock, and
+computes for all medicines at once:
+
+* moving-average and exponentially smoothed daily demand;
+* a lead-time reorder point with safety stock (z x sigma x sqrt(lead time));
+* a suggested order quantity covering lead time plus the review period;
+* days of cover;
+* units (and cost) projected to expire unsold when batches are used
+  first-expiry-first-out at the forecast demand.
+
+Results are upserted into ``MedicineForecast`` for the dashboard and the
+purchase-suggestion API. ``compute_forecast`` is pure NumPy so it can be
+benchmarked without a database (``manage.py forecast_inventory --benchmark``).
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import logging
+import time
+
+import numpy as np
+
+from apps.core.sqlite import serialized_write
+from .models import Medicine, MedicineBatch, MedicineForecast, MedicineStock
+
+logger = logging.getLogger('zain_hms.performance')
+
+FORECAST_FIELDS = [
+    'moving_average_demand', 'smoothed_demand', 'demand_std', 'on_hand', 'reorder_point',
+    'suggested_order_quantity', 'days_of_cover', 'needs_reorder', 'projected_expiry_waste',
+    'projected_waste_value', 'computed_at',
+]
+
+
+def _setting(name, default):
+    return getattr(settings, f'PHARMACY_FORECAST_{name}', default)
+
+
+class _SaleDay(TruncDate):
+    """``TruncDate`` using SQLite's native ``date()`` for UTC days instead of a Python callback per row"""
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        if self.get_tzname() not in (None, 'UTC'):
+            return self.as_sql(compiler, connection, **extra_context)
+        sql, params = compiler.compile(self.lhs)
+        return f'date({sql})', params
+
+
+def compute_forecast(sales, reorder_level, maximum_stock, batch_row, batch_days, batch_qty, batch_cost,
+                     lead_time_days=7, review_days=30, service_z=1.65, window=28, alpha=0.3):
+    """
+    ``sales``: (medicines, days) units sold per day, oldest column first.
+    ``reorder_level`` / ``maximum_stock``: per-medicine static settings.
+    ``batch_*``: one entry per batch with stock - medicine row, days until
+    expiry (negative when expired), quantity and unit cost.
+    Returns a dict of per-medicine arrays named like ``MedicineForecast`` fields.
+    """
+    count, days = sales.shape
+    window = max(1, min(window, days))
+    recent = sales[:, -window:]
+
+    moving_average = recent.mean(axis=1)
+    demand_std = recent.std(axis=1)
+
+    # Exponential smoothing as one weighted sum: newest day weighs alpha, then
+    # alpha(1-alpha), ...; the history mean seeds the level
+    decay = (1.0 - alpha) ** np.arange(days)
+    smoothed = sales[:, ::-1] @ (alpha * decay) + (1.0 - alpha) ** days * sales.mean(axis=1)
+    has_history = sales.any(axis=1)
+
+    # Batch stock, consumed first-expiry-first-out at the smoothed demand
+    order = np.lexsort((batch_days, batch_row))
+    batch_row, batch_days = batch_row[order], batch_days[order]
+    batch_qty, batch_cost = batch_qty[order].astype(np.float64), batch_cost[order].astype(np.float64)
+    sellable = np.where(batch_days >= 0, batch_qty, 0.0)
+    on_hand = np.bincount(batch_row, weights=sellable, minlength=count)
+
+    running = np.cumsum(sellable)
+    group_start = np.r_[True, batch_row[1:] != batch_row[:-1]] if len(batch_row) else np.zeros(0, dtype=bool)
+    offsets = np.maximum.accumulate(np.where(group_start, running - sellable, 0.0)) if len(batch_row) else running
+    ahead = running - sellable - offsets  # Sellable units in earlier-expiring batches of the same medicine
+    demand_to_expiry = smoothed[batch_row] * np.maximum(batch_days, 0)
+    sold = np.clip(demand_to_expiry - ahead, 0.0, sellable)
+    waste = batch_qty - sold  # Expired batches are waste in full
+    projected_waste = np.bincount(batch_row, weights=waste, minlength=count)
+    projected_waste_value = np.bincount(batch_row, weights=waste * batch_cost, minlength=count)
+
+    # Reorder point and order quantity; medicines with no sales keep their static reorder level
+    safety = service_z * demand_std * np.sqrt(lead_time_days)
+    reorder_point = np.where(has_history, np.ceil(smoothed * lead_time_days + safety), reorder_level)
+    needs_reorder = on_hand <= reorder_point
+    target = np.where(has_history, np.ceil(smoothed * (lead_time_days + review_days) + safety), maximum_stock)
+    headroom = np.maximum(maximum_stock - on_hand, 0)
+    suggested = np.where(needs_reorder, np.minimum(np.maximum(target - on_hand, 0), headroom), 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(smoothed > 0, on_hand / smoothed, np.nan)
+
+    return {
+        'moving_average_demand': moving_average,
+        'smoothed_demand': smoothed,
+        'demand_std': demand_std,
+        'on_hand': on_hand,
+        'reorder_point': reorder_point,
+        'suggested_order_quantity': suggested,
+        'days_of_cover': days_of_cover,
+        'needs_reorder': needs_reorder,
+        'projected_expiry_waste': projected_waste,
+        'projected_waste_value': projected_waste_value,
+    }
+
+
+class FormularyForecaster:
+    """Load ledger history and batch stock, forecast, and store ``MedicineForecast`` rows"""
+
+    HISTORY_DAYS = _setting('HISTORY_DAYS', 90)
+
+    @classmethod
+    def load(cls, today=None):
+        """``(medicine_ids, arrays for compute_forecast)`` for all active medicines"""
+        today = today or timezone.localdate()
+        start = today - timedelta(days=cls.HISTORY_DAYS)
+
+        medicines = list(Medicine.objects.filter(is_active=True).values_list('id', 'reorder_level', 'maximum_stock'))
+        ids = [row[0] for row in medicines]
+        index = {medicine_id: i for i, medicine_id in enumerate(ids)}
+        reorder_level = np.array([row[1] for row in medicines], dtype=np.float64)
+        maximum_stock = np.array([row[2] for row in medicines], dtype=np.float64)
+
+        # Daily units sold per medicine over the history window (today is partial and left out)
+        daily = (
+            MedicineStock.objects.filter(
+                transaction_type='SALE',
+                created_at__gte=timezone.make_aware(datetime.combine(start, datetime.min.time())),
+                created_at__lt=timezone.make_aware(datetime.combine(today, datetime.min.time())),
+            )
+            .annotate(day=_SaleDay('created_at'))
+            .values_list('medicine_id', 'day')
+            .annotate(units=Sum('quantity'))
+            .order_by()
+        )
+        sales = np.zeros((len(ids), cls.HISTORY_DAYS), dtype=np.float64)
+        rows, cols, units = [], [], []
+        for medicine_id, day, total in daily:
+            row = index.get(medicine_id)
+            if row is not None:
+                rows.append(row)
+                cols.append((day - start).days)
+                units.append(-total)  # Sales are negative ledger rows
+        if rows:
+            np.add.at(sales, (np.array(rows), np.array(cols)), np.array(units, dtype=np.float64))
+
+        batch_row, batch_days, batch_qty, batch_cost = [], [], [], []
+        for medicine_id, expiry_date, quantity, unit_cost in MedicineBatch.objects.filter(
+            quantity__gt=0, medicine__is_active=True,
+        ).values_list('medicine_id', 'expiry_date', 'quantity', 'unit_cost').order_by():
+            batch_row.append(index[medicine_id])
+            batch_days.append((expiry_date - today).days)
+            batch_qty.append(quantity)
+            batch_cost.append(float(unit_cost))
+
+        return ids, {
+            'sales': sales,
+            'reorder_level': reorder_level,
+            'maximum_stock': maximum_stock,
+            'batch_row': np.array(batch_row, dtype=np.int64),
+            'batch_days': np.array(batch_days, dtype=np.int64),
+            'batch_qty': np.array(batch_qty, dtype=np.int64),
+            'batch_cost': np.array(batch_cost, dtype=np.float64),
+        }
+
+    @staticmethod
+    def parameters():
+        return {
+            'lead_time_days': _setting('LEAD_TIME_DAYS', 7),
+            'review_days': _setting('REVIEW_DAYS', 30),
+            'service_z': _setting('SERVICE_Z', 1.65),
+            'window': _setting('WINDOW_DAYS', 28),
+            'alpha': _setting('SMOOTHING_ALPHA', 0.3),
+        }
+
+    @classmethod
+    def run(cls, today=None):
+        """Forecast every active medicine; returns ``{'medicines', 'reorder', 'seconds'}``"""
+        started = time.monotonic()
+        ids, arrays = cls.load(today)
+        loaded = time.monotonic()
+        result = compute_forecast(**arrays, **cls.parameters())
+        computed = time.monotonic()
+
+        now = timezone.now()
+        columns = {name: values.tolist() for name, values in result.items()}
+        forecasts = [
+            MedicineForecast(
+                medicine_id=medicine_id,
+                moving_average_demand=round(columns['moving_average_demand'][i], 4),
+                smoothed_demand=round(columns['smoothed_demand'][i], 4),
+                demand_std=round(columns['demand_std'][i], 4),
+                on_hand=int(columns['on_hand'][i]),
+                reorder_point=int(columns['reorder_point'][i]),
+                suggested_order_quantity=int(columns['suggested_order_quantity'][i]),
+                days_of_cover=None if columns['days_of_cover'][i] != columns['days_of_cover'][i]
+                else round(columns['days_of_cover'][i], 1),
+                needs_reorder=columns['needs_reorder'][i],
+                projected_expiry_waste=int(round(columns['projected_expiry_waste'][i])),
+                projected_waste_value=Decimal(f"{columns['projected_waste_value'][i]:.2f}"),
+                computed_at=now,
+            )
+            for i, medicine_id in enumerate(ids)
+        ]
+
+        with serialized_write():
+            MedicineForecast.objects.bulk_create(
+                forecasts, batch_size=1000,
+                update_conflicts=True, unique_fields=['medicine'], update_fields=FORECAST_FIELDS,
+            )
+            MedicineForecast.objects.filter(medicine__is_active=False).delete()
+
+        summary = {
+            'medicines': len(ids),
+            'reorder': int(result['needs_reorder'].sum()),
+            'seconds': time.monotonic() - started,
+        }
+        logger.info(
+            f"Pharmacy forecast: {summary['medicines']} medicines, {summary['reorder']} to reorder "
+            f"(load {loaded - started:.2f}s, compute {computed - loaded:.2f}s, "
+            f"write {summary['seconds'] - (computed - started):.2f}s)"
+        )
+        return summary
@@ -7,17 +7,35 @@ from .models import (
     Medicine, PharmacySale, PharmacySaleItem, MedicineStock, 
     DrugCategory, Manufacturer, Prescription
 )
+from .inventory import BatchInventory
 
 
 class MedicineForm(forms.ModelForm):
-    """Form for adding/editing medicines."""
+    """
+    Form for adding/editing medicines. Stock is not typed in: a new medicine
+    can bring its opening stock as a first batch (BatchInventory.receive),
+    later stock arrives as batch receipts.
+    """
+    
+    opening_stock = forms.IntegerField(
+        min_value=0, required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    opening_batch_number = forms.CharField(
+        max_length=50, required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+    opening_expiry_date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
     
     class Meta:
         model = Medicine
         fields = [
             'generic_name', 'brand_name', 'category', 'manufacturer',
             'dosage_form', 'strength', 'cost_price', 'selling_price', 'mrp',
-            'current_stock', 'reorder_level', 'maximum_stock', 'is_active'
+            'reorder_level', 'maximum_stock', 'is_active'
         ]
         widgets = {
             'generic_name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -29,11 +47,36 @@ class MedicineForm(forms.ModelForm):
             'cost_price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'selling_price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'mrp': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
-            'current_stock': forms.NumberInput(attrs={'class': 'form-control'}),
             'reorder_level': forms.NumberInput(attrs={'class': 'form-control'}),
             'maximum_stock': forms.NumberInput(attrs={'class': 'form-control'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+    
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if not self.instance._state.adding:  # The UUID pk is set before the first save
+            for name in ('opening_stock', 'opening_batch_number', 'opening_expiry_date'):
+                del self.fields[name]
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('opening_stock'):
+            for name in ('opening_batch_number', 'opening_expiry_date'):
+                if not cleaned_data.get(name):
+                    self.add_error(name, 'Required for opening stock.')
+        return cleaned_data
+    
+    def save(self, commit=True):
+        medicine = super().save(commit=commit)
+        quantity = self.cleaned_data.get('opening_stock')
+        if commit and quantity:
+            BatchInventory.receive(
+                medicine, quantity, self.cleaned_data['opening_batch_number'],
+                self.cleaned_data['opening_expiry_date'], medicine.cost_price,
+                user=self.user, reference='Opening stock',
+            )
+        return medicine
 
 
 class MedicineSearchForm(forms.Form):
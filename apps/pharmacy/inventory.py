@@ -0,0 +1,296 @@
+# apps/pharmacy/inventory.py
+"""
+Batch-level pharmacy stock.
+
+``MedicineBatch`` rows hold what is on hand per received batch, indexed by
+(medicine, expiry). Every change goes through ``BatchInventory`` so that
+
+* sales draw first-expiry-first-out from unexpired batches, with the batch
+  rows locked for the duration of the checkout;
+* each draw, receipt or write-off adds a ``MedicineStock`` ledger row
+  pointing at its batch;
+* ``Medicine.current_stock`` / ``batch_number`` / ``expiry_date`` stay in
+  step (total on hand, next batch to sell) for the existing screens.
+
+``take_snapshots()`` (Celery beat, or ``manage.py stock_snapshot``) records
+each medicine's on-hand quantity and value, so "stock on date X" reads the
+latest snapshot before X plus the ledger rows after it instead of summing
+the whole ledger.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+import logging
+
+from apps.core.cache_tags import TagCache
+from apps.core.sqlite import serialized_write
+from .models import Medicine, MedicineBatch, MedicineStock, MedicineStockSnapshot
+
+logger = logging.getLogger('zain_hms.performance')
+
+
+def _catalog_changed():
+    # Queryset updates skip save signals; tell the PoS catalog index (apps.pharmacy.pos_catalog)
+    transaction.on_commit(lambda: TagCache.invalidate('pos_catalog:medicines'))
+
+
+class InsufficientStock(ValueError):
+    """Raised when unexpired batches cannot cover a requested quantity"""
+
+    def __init__(self, medicine, requested, available):
+        self.medicine = medicine
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Insufficient stock for {medicine.name}: requested {requested}, available {available}")
+
+
+class BatchInventory:
+    """Receive, allocate (FEFO), write off and report on batch stock"""
+
+    @classmethod
+    def receive(cls, medicine, quantity, batch_number, expiry_date, unit_cost,
+                user=None, reference='', manufacturing_date=None, notes=''):
+        """Add ``quantity`` to a batch (created on first receipt); returns the batch"""
+        if quantity <= 0:
+            raise ValueError('Received quantity must be positive')
+
+        with serialized_write():
+            batch, created = MedicineBatch.objects.select_for_update().get_or_create(
+                medicine=medicine,
+                batch_number=batch_number,
+                defaults={
+                    'expiry_date': expiry_date,
+                    'manufacturing_date': manufacturing_date,
+                    'unit_cost': unit_cost,
+                    'received_quantity': quantity,
+                    'quantity': quantity,
+                    'created_by': user,
+                },
+            )
+            if not created:
+                MedicineBatch.objects.filter(pk=batch.pk).update(
+                    received_quantity=F('received_quantity') + quantity,
+                    quantity=F('quantity') + quantity,
+                )
+                batch.refresh_from_db(fields=['received_quantity', 'quantity'])
+
+            MedicineStock.objects.create(
+                medicine=medicine,
+                batch=batch,
+                transaction_type='PURCHASE',
+                quantity=quantity,
+                unit_cost=batch.unit_cost,
+                reference_number=reference,
+                notes=notes,
+                created_by=user,
+            )
+            cls.sync_medicines([medicine.pk])
+        return batch
+
+    @classmethod
+    def allocate(cls, lines, user=None, reference='', transaction_type='SALE', notes=''):
+        """
+        Draw ``lines`` (``(medicine_id, quantity)`` pairs) from unexpired
+        batches, earliest expiry first. Returns ``{str(medicine_id): [(batch,
+        quantity), ...]}``. Raises ``InsufficientStock`` without changing
+        anything if any medicine is short; call it inside the checkout's
+        transaction so the whole sale rolls back with it.
+        """
+        wanted = defaultdict(int)
+        for medicine_id, quantity in lines:
+            if quantity <= 0:
+                raise ValueError('Allocated quantity must be positive')
+            wanted[str(medicine_id)] += quantity
+        if not wanted:
+            return {}
+
+        with serialized_write():
+            # One locked read for every medicine in the sale, already in FEFO order
+            batches = MedicineBatch.objects.select_for_update().filter(
+                medicine_id__in=list(wanted),
+                quantity__gt=0,
+                expiry_date__gte=timezone.localdate(),
+            ).order_by('medicine_id', 'expiry_date', 'id')
+            by_medicine = defaultdict(list)
+            for batch in batches:
+                by_medicine[str(batch.medicine_id)].append(batch)
+
+            allocations, touched, ledger = {}, [], []
+            for medicine_id, quantity in wanted.items():
+                available = sum(batch.quantity for batch in by_medicine[medicine_id])
+                if available < quantity:
+                    raise InsufficientStock(Medicine.objects.get(pk=medicine_id), quantity, available)
+
+                remaining, drawn = quantity, []
+                for batch in by_medicine[medicine_id]:
+                    if not remaining:
+                        break
+                    take = min(batch.quantity, remaining)
+                    batch.quantity -= take
+                    remaining -= take
+                    drawn.append((batch, take))
+                    touched.append(batch)
+                    ledger.append(MedicineStock(
+                        medicine_id=batch.medicine_id,
+                        batch=batch,
+                        transaction_type=transaction_type,
+                        quantity=-take,
+                        unit_cost=batch.unit_cost,
+                        reference_number=reference,
+                        notes=notes,
+                        created_by=user,
+                    ))
+                allocations[medicine_id] = drawn
+
+            MedicineBatch.objects.bulk_update(touched, ['quantity'])
+            MedicineStock.objects.bulk_create(ledger)
+
+            for medicine_id, quantity in wanted.items():
+                following = next((b for b in by_medicine[medicine_id] if b.quantity), None)
+                fields = {'current_stock': Greatest(F('current_stock') - quantity, 0), 'updated_at': timezone.now()}
+                if following is not None:
+                    fields.update(batch_number=following.batch_number, expiry_date=following.expiry_date)
+                Medicine.objects.filter(pk=medicine_id).update(**fields)
+            _catalog_changed()
+        return allocations
+
+    @classmethod
+    def write_off(cls, batch, quantity=None, transaction_type='EXPIRED', user=None, reference='', notes=''):
+        """Remove ``quantity`` (default: all remaining) from a batch as expired/damaged/adjusted"""
+        with serialized_write():
+            batch = MedicineBatch.objects.select_for_update().get(pk=batch.pk)
+            quantity = batch.quantity if quantity is None else min(quantity, batch.quantity)
+            if not quantity:
+                return 0
+            MedicineBatch.objects.filter(pk=batch.pk).update(quantity=F('quantity') - quantity)
+            MedicineStock.objects.create(
+                medicine_id=batch.medicine_id,
+                batch=batch,
+                transaction_type=transaction_type,
+                quantity=-quantity,
+                unit_cost=batch.unit_cost,
+                reference_number=reference,
+                notes=notes,
+                created_by=user,
+            )
+            cls.sync_medicines([batch.medicine_id])
+        return quantity
+
+    @staticmethod
+    def sync_medicines(medicine_ids):
+        """Recompute the legacy Medicine stock/batch/expiry fields from batches"""
+        today = timezone.localdate()
+        totals = dict(
+            MedicineBatch.objects.filter(medicine_id__in=medicine_ids)
+            .values_list('medicine_id').annotate(total=Sum('quantity')).order_by()
+        )
+        next_batches = {}
+        for batch in MedicineBatch.objects.filter(
+            medicine_id__in=medicine_ids, quantity__gt=0, expiry_date__gte=today
+        ).order_by('medicine_id', 'expiry_date', 'id').only('medicine_id', 'batch_number', 'expiry_date'):
+            next_batches.setdefault(batch.medicine_id, batch)
+
+        now = timezone.now()
+        medicines = list(Medicine.objects.filter(pk__in=medicine_ids).only('id'))
+        for medicine in medicines:
+            medicine.current_stock = totals.get(medicine.pk) or 0
+            medicine.updated_at = now
+            following = next_batches.get(medicine.pk)
+            if following is not None:
+                medicine.batch_number, medicine.expiry_date = following.batch_number, following.expiry_date
+        Medicine.objects.bulk_update(
+            [m for m in medicines if m.pk not in next_batches], ['current_stock', 'updated_at']
+        )
+        Medicine.objects.bulk_update(
+            [m for m in medicines if m.pk in next_batches], ['current_stock', 'batch_number', 'expiry_date', 'updated_at']
+        )
+        _catalog_changed()
+
+    # Reporting
+
+    @staticmethod
+    def expiring(within_days=30, as_of=None):
+        """Batches with stock that expire in the next ``within_days`` days (index range scan)"""
+        start = as_of or timezone.localdate()
+        return MedicineBatch.objects.filter(
+            expiry_date__gte=start,
+            expiry_date__lte=start + timedelta(days=within_days),
+            quantity__gt=0,
+        ).select_related('medicine').order_by('expiry_date', 'id')
+
+    @staticmethod
+    def expired(as_of=None):
+        """Batches past expiry that still hold stock (candidates for write-off)"""
+        return MedicineBatch.objects.filter(
+            expiry_date__lt=as_of or timezone.localdate(), quantity__gt=0,
+        ).select_related('medicine').order_by('expiry_date', 'id')
+
+    @staticmethod
+    def on_hand_by_expiry(medicine):
+        """``[(expiry_date, quantity), ...]`` for one medicine, earliest first"""
+        return list(
+            MedicineBatch.objects.filter(medicine=medicine, quantity__gt=0)
+            .values_list('expiry_date').annotate(total=Sum('quantity')).order_by('expiry_date')
+        )
+
+    # Snapshots
+
+    @staticmethod
+    def take_snapshots():
+        """Record on-hand quantity and value per medicine; returns the number of snapshots"""
+        with serialized_write():
+            # Locking the batch rows waits out in-flight allocations, so every
+            # ledger row dated before ``taken_at`` is reflected in the totals
+            rows = list(MedicineBatch.objects.select_for_update().values_list('medicine_id', 'quantity', 'unit_cost'))
+            taken_at = timezone.now()
+            totals = defaultdict(lambda: [0, Decimal('0.00')])
+            for medicine_id, quantity, unit_cost in rows:
+                totals[medicine_id][0] += quantity
+                totals[medicine_id][1] += quantity * unit_cost
+            MedicineStockSnapshot.objects.bulk_create([
+                MedicineStockSnapshot(medicine_id=medicine_id, taken_at=taken_at, quantity=quantity, value=value)
+                for medicine_id, (quantity, value) in totals.items()
+            ], batch_size=500)
+        logger.info(f"Pharmacy stock snapshot: {len(totals)} medicines at {taken_at:%Y-%m-%d %H:%M}")
+        return len(totals)
+
+    @staticmethod
+    def prune_snapshots(keep_days):
+        """Drop snapshots older than ``keep_days``, always keeping the latest run"""
+        latest = MedicineStockSnapshot.objects.aggregate(latest=Max('taken_at'))['latest']
+        if latest is None:
+            return 0
+        cutoff = min(latest, timezone.now() - timedelta(days=keep_days))
+        deleted, _ = MedicineStockSnapshot.objects.filter(taken_at__lt=cutoff).delete()
+        return deleted
+
+    @classmethod
+    def on_hand_at(cls, when, medicine_ids=None):
+        """
+        ``{medicine_id: quantity}`` on hand at ``when`` (a datetime, or a date
+        meaning end of that day): the latest snapshot run at or before it plus
+        the ledger rows in between. Without an earlier snapshot, falls back to
+        summing the ledger.
+        """
+        if not isinstance(when, datetime):
+            when = timezone.make_aware(datetime.combine(when, time.max))
+
+        ledger = MedicineStock.objects.filter(created_at__lte=when)
+        snapshots = MedicineStockSnapshot.objects.none()
+        taken_at = MedicineStockSnapshot.objects.filter(taken_at__lte=when).aggregate(latest=Max('taken_at'))['latest']
+        if taken_at is not None:
+            ledger = ledger.filter(created_at__gt=taken_at)
+            snapshots = MedicineStockSnapshot.objects.filter(taken_at=taken_at)
+        if medicine_ids is not None:
+            ledger = ledger.filter(medicine_id__in=medicine_ids)
+            snapshots = snapshots.filter(medicine_id__in=medicine_ids)
+
+        result = defaultdict(int, snapshots.values_list('medicine_id', 'quantity'))
+        for medicine_id, delta in ledger.values_list('medicine_id').annotate(delta=Sum('quantity')).order_by():
+            result[medicine_id] += delta or 0
+        return dict(result)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_keyset_pagination_indexes'),
+        ('pharmacy', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pharmacypostransaction',
+            index=models.Index(fields=['cashier', 'created_at', 'id'], name='pharmacy_ph_cashier_17fd54_idx'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:17
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_batches(apps, schema_editor):
+    """One opening batch per stocked medicine, from its legacy batch/expiry/cost fields"""
+    Medicine = apps.get_model('pharmacy', 'Medicine')
+    MedicineBatch = apps.get_model('pharmacy', 'MedicineBatch')
+    MedicineBatch.objects.bulk_create([
+        MedicineBatch(
+            medicine_id=medicine.pk,
+            batch_number=medicine.batch_number or 'OPENING',
+            manufacturing_date=medicine.manufacturing_date,
+            expiry_date=medicine.expiry_date,
+            received_quantity=medicine.current_stock,
+            quantity=medicine.current_stock,
+            unit_cost=medicine.cost_price,
+        )
+        for medicine in Medicine.objects.filter(current_stock__gt=0).iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Medicine Stock Snapshot',
+                'verbose_name_plural': 'Medicine Stock Snapshots',
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicineBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_number', models.CharField(max_length=50)),
+                ('manufacturing_date', models.DateField(blank=True, null=True)),
+                ('expiry_date', models.DateField()),
+                ('received_quantity', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))])),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='pharmacy.medicine')),
+            ],
+            options={
+                'verbose_name': 'Medicine Batch',
+                'verbose_name_plural': 'Medicine Batches',
+                'ordering': ['medicine', 'expiry_date', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='medicinestock',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_transactions', to='pharmacy.medicinebatch'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinestock',
+            index=models.Index(fields=['medicine', 'created_at'], name='pharmacy_me_medicin_11a409_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinestock',
+            index=models.Index(fields=['created_at'], name='pharmacy_me_created_9d311a_idx'),
+        ),
+        migrations.AddField(
+            model_name='medicinestocksnapshot',
+            name='medicine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='pharmacy.medicine'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinebatch',
+            index=models.Index(fields=['medicine', 'expiry_date', 'id'], name='pharmacy_me_medicin_fa9e93_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinebatch',
+            index=models.Index(fields=['expiry_date', 'quantity'], name='pharmacy_me_expiry__582edc_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='medicinebatch',
+            unique_together={('medicine', 'batch_number')},
+        ),
+        migrations.AddIndex(
+            model_name='medicinestocksnapshot',
+            index=models.Index(fields=['taken_at'], name='pharmacy_me_taken_a_7757d6_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='medicinestocksnapshot',
+            unique_together={('medicine', 'taken_at')},
+        ),
+        migrations.RunPython(opening_batches, migrations.RunPython.noop),
+    ]
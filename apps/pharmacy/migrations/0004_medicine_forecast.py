@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:21
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0003_medicine_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moving_average_demand', models.FloatField(default=0)),
+                ('smoothed_demand', models.FloatField(default=0)),
+                ('demand_std', models.FloatField(default=0)),
+                ('on_hand', models.IntegerField(default=0)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('suggested_order_quantity', models.PositiveIntegerField(default=0)),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('needs_reorder', models.BooleanField(default=False)),
+                ('projected_expiry_waste', models.PositiveIntegerField(default=0)),
+                ('projected_waste_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('computed_at', models.DateTimeField()),
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='pharmacy.medicine')),
+            ],
+            options={
+                'verbose_name': 'Medicine Forecast',
+                'verbose_name_plural': 'Medicine Forecasts',
+                'indexes': [models.Index(fields=['needs_reorder', 'days_of_cover'], name='pharmacy_me_needs_r_d0c769_idx'), models.Index(fields=['projected_waste_value'], name='pharmacy_me_project_a9e847_idx')],
+            },
+        ),
+    ]
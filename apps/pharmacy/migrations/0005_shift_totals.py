@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_medicine_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pharmacyposdayclose',
+            name='totals_snapshot',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+        ('doctors', '0001_initial'),
+        ('patients', '0004_master_patient_index'),
+        ('pharmacy', '0005_shift_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'prescription_date', 'id'], name='pharmacy_pr_patient_c91734_idx'),
+        ),
+    ]
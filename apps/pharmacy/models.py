@@ -1,5 +1,5 @@
 # apps/pharmacy/models.py
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -205,6 +205,8 @@ class Prescription(models.Model):
             models.Index(fields=['patient']),
             models.Index(fields=['doctor']),
             models.Index(fields=['status']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'prescription_date', 'id']),
         ]
     
     def __str__(self):
@@ -361,12 +363,19 @@ class PharmacySaleItem(models.Model):
         ordering = ['id']
     
     def save(self, *args, **kwargs):
+        from .inventory import BatchInventory  # inventory imports these models
+
         self.total_amount = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
-        
-        # Update medicine stock
-        self.medicine.current_stock -= self.quantity
-        self.medicine.save(update_fields=['current_stock'])
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # Draw from batches (FEFO) so the ledger and Medicine.current_stock stay in step;
+                # InsufficientStock rolls the item back
+                BatchInventory.allocate(
+                    [(self.medicine_id, self.quantity)], user=self.sale.sold_by,
+                    reference=self.sale.sale_number,
+                )
     
     def __str__(self):
         return f"{self.medicine.name} x {self.quantity}"
@@ -384,6 +393,7 @@ class MedicineStock(models.Model):
     ]
     
     medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_transactions')
+    batch = models.ForeignKey('MedicineBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_transactions')
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     quantity = models.IntegerField()  # Can be negative for outgoing stock
     unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
@@ -398,11 +408,108 @@ class MedicineStock(models.Model):
         ordering = ['-created_at']
         verbose_name = _('Medicine Stock')
         verbose_name_plural = _('Medicine Stocks')
+        indexes = [
+            # Snapshot + delta reads: ledger rows for one medicine after a point in time
+            models.Index(fields=['medicine', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.medicine.name} - {self.transaction_type} - {self.quantity}"
 
 
+class MedicineBatch(models.Model):
+    """Stock on hand for one received batch of a medicine; sales draw first-expiry-first-out"""
+    
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='batches')
+    batch_number = models.CharField(max_length=50)
+    manufacturing_date = models.DateField(null=True, blank=True)
+    expiry_date = models.DateField()
+    
+    # Inventory
+    received_quantity = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)  # Remaining on hand
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
+    
+    # Tracking
+    received_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        ordering = ['medicine', 'expiry_date', 'id']
+        verbose_name = _('Medicine Batch')
+        verbose_name_plural = _('Medicine Batches')
+        unique_together = ['medicine', 'batch_number']
+        indexes = [
+            # FEFO allocation and per-medicine stock by expiry
+            models.Index(fields=['medicine', 'expiry_date', 'id']),
+            # "What expires this month" across the pharmacy
+            models.Index(fields=['expiry_date', 'quantity']),
+        ]
+    
+    def __str__(self):
+        return f"{self.medicine.name} - {self.batch_number} (exp {self.expiry_date}) x {self.quantity}"
+    
+    def is_expired(self):
+        return self.expiry_date < timezone.now().date()
+
+
+class MedicineStockSnapshot(models.Model):
+    """On-hand quantity and value of a medicine at a point in time, taken periodically"""
+    
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        ordering = ['-taken_at']
+        verbose_name = _('Medicine Stock Snapshot')
+        verbose_name_plural = _('Medicine Stock Snapshots')
+        unique_together = ['medicine', 'taken_at']
+        indexes = [
+            models.Index(fields=['taken_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.medicine.name} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.quantity}"
+
+
+class MedicineForecast(models.Model):
+    """Latest demand forecast and reorder advice for a medicine, written by the forecasting job"""
+    
+    medicine = models.OneToOneField(Medicine, on_delete=models.CASCADE, related_name='forecast')
+    
+    # Demand (units/day)
+    moving_average_demand = models.FloatField(default=0)
+    smoothed_demand = models.FloatField(default=0)  # Exponential smoothing
+    demand_std = models.FloatField(default=0)
+    
+    # Stock position
+    on_hand = models.IntegerField(default=0)  # Unexpired batch stock
+    reorder_point = models.PositiveIntegerField(default=0)
+    suggested_order_quantity = models.PositiveIntegerField(default=0)
+    days_of_cover = models.FloatField(null=True, blank=True)  # None: no demand
+    needs_reorder = models.BooleanField(default=False)
+    
+    # Expiry
+    projected_expiry_waste = models.PositiveIntegerField(default=0)  # Units expected to expire unsold
+    projected_waste_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = _('Medicine Forecast')
+        verbose_name_plural = _('Medicine Forecasts')
+        indexes = [
+            models.Index(fields=['needs_reorder', 'days_of_cover']),
+            models.Index(fields=['projected_waste_value']),
+        ]
+    
+    def __str__(self):
+        return f"{self.medicine.name}: {self.smoothed_demand:.2f}/day, reorder at {self.reorder_point}"
+
+
 # Pharmacy PoS System Models
 
 class PharmacyPoSTransaction(models.Model):
@@ -465,6 +572,9 @@ class PharmacyPoSTransaction(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name = _('Pharmacy PoS Transaction')
+        indexes = [
+            models.Index(fields=['cashier', 'created_at', 'id']),
+        ]
         verbose_name_plural = _('Pharmacy PoS Transactions')
     
     def save(self, *args, **kwargs):
@@ -597,6 +707,8 @@ class PharmacyPoSDayClose(models.Model):
     
     notes = models.TextField(blank=True)
     is_closed = models.BooleanField(default=False)
+    # billing.PoSShiftTotals rows at close (see apps.billing.shift_totals)
+    totals_snapshot = models.JSONField(default=list, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     closed_at = models.DateTimeField(null=True, blank=True)
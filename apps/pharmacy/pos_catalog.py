@@ -0,0 +1,20 @@
+# apps/pharmacy/pos_catalog.py
+"""
+In-memory index of the pharmacy PoS catalog; see apps.core.catalog_index.
+"""
+
+from apps.core.catalog_index import CatalogIndex
+from .models import Medicine
+
+
+class MedicineIndex(CatalogIndex):
+    model = Medicine
+    tag = 'pos_catalog:medicines'
+    search_fields = ('name', 'generic_name', 'brand_name', 'medicine_code', 'batch_number')
+    exact_fields = ('medicine_code', 'batch_number')
+    display_fields = ('name', 'generic_name', 'strength', 'dosage_form', 'batch_number', 'expiry_date')
+    price_field = 'selling_price'
+    stock_field = 'current_stock'
+
+
+medicine_index = MedicineIndex()
@@ -18,6 +18,11 @@ from .models import (
     Prescription, Patient
 )
 from apps.patients.models import Patient
+from apps.core.pagination import keyset_paginate
+from apps.core.sqlite import serialized_write
+from .inventory import BatchInventory
+from .pos_catalog import medicine_index
+from apps.billing.shift_totals import ShiftTotals
 
 
 @login_required
@@ -110,26 +115,21 @@ def api_search_medicines(request):
         if len(query) < 2:
             return JsonResponse({'medicines': []})
         
-        medicines = Medicine.objects.filter(
-            Q(name__icontains=query) |
-            Q(generic_name__icontains=query) |
-            Q(batch_number__icontains=query),
-            is_active=True,
-            current_stock__gt=0
-        )[:20]
+        # Served from the per-process catalog index; code/batch matches come first
+        medicines = medicine_index.search(query, limit=20)
         
         medicine_data = []
         for medicine in medicines:
             medicine_data.append({
-                'id': medicine.id,
-                'name': medicine.name,
-                'generic_name': medicine.generic_name,
-                'strength': medicine.strength,
-                'unit': medicine.unit,
-                'price': float(medicine.unit_price),
-                'stock': medicine.current_stock,
-                'batch_number': medicine.batch_number,
-                'expiry_date': medicine.expiry_date.strftime('%Y-%m-%d') if medicine.expiry_date else None,
+                'id': medicine['pk'],
+                'name': medicine['name'],
+                'generic_name': medicine['generic_name'],
+                'strength': medicine['strength'],
+                'unit': medicine['dosage_form'],
+                'price': medicine['price'],
+                'stock': medicine['stock'],
+                'batch_number': medicine['batch_number'],
+                'expiry_date': medicine['expiry_date'].strftime('%Y-%m-%d') if medicine['expiry_date'] else None,
             })
         
         return JsonResponse({'medicines': medicine_data})
@@ -221,7 +221,7 @@ def api_process_checkout(request):
         try:
             data = json.loads(request.body)
             
-            with transaction.atomic():
+            with serialized_write():
                 # Create transaction
                 pos_transaction = PharmacyPoSTransaction.objects.create(
                     cashier=request.user,
@@ -241,38 +241,23 @@ def api_process_checkout(request):
                 )
                 
                 # Process cart items
-                for item_data in data.get('cart_items', []):
-                    medicine = Medicine.objects.get(id=item_data['medicine_id'])
-                    quantity = int(item_data['quantity'])
-                    
-                    # Check stock availability
-                    if medicine.current_stock < quantity:
-                        raise ValueError(f"Insufficient stock for {medicine.name}")
-                    
-                    # Create transaction item
+                cart_items = data.get('cart_items', [])
+                for item_data in cart_items:
                     PharmacyPoSTransactionItem.objects.create(
                         transaction=pos_transaction,
-                        medicine=medicine,
-                        quantity=quantity,
+                        medicine_id=item_data['medicine_id'],
+                        quantity=int(item_data['quantity']),
                         unit_price=Decimal(str(item_data['unit_price'])),
                         discount_percentage=Decimal(str(item_data.get('discount_percentage', '0.00'))),
                     )
-                    
-                    # Update stock
-                    medicine.current_stock -= quantity
-                    medicine.save()
-                    
-                    # Create stock transaction record
-                    from .models import MedicineStock
-                    MedicineStock.objects.create(
-                        medicine=medicine,
-                        transaction_type='SALE',
-                        quantity=-quantity,
-                        unit_cost=medicine.unit_price,
-                        reference_number=pos_transaction.receipt_number,
-                        notes=f"PoS Sale - {pos_transaction.receipt_number}",
-                        created_by=request.user
-                    )
+                
+                # Draw stock first-expiry-first-out; a short line rolls back the whole sale
+                BatchInventory.allocate(
+                    [(item_data['medicine_id'], int(item_data['quantity'])) for item_data in cart_items],
+                    user=request.user,
+                    reference=pos_transaction.receipt_number,
+                    notes=f"PoS Sale - {pos_transaction.receipt_number}",
+                )
                 
                 # Handle split payments if needed
                 if data.get('split_payments'):
@@ -326,7 +311,7 @@ def transaction_history(request):
     """View transaction history"""
     transactions = PharmacyPoSTransaction.objects.filter(
         cashier=request.user
-    ).order_by('-created_at')
+    )
     
     # Date filtering
     date_from = request.GET.get('date_from')
@@ -347,12 +332,14 @@ def transaction_history(request):
     if payment_method:
         transactions = transactions.filter(payment_method=payment_method)
     
-    paginator = Paginator(transactions, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pages over the (cashier, created_at, id) index
+    page_obj = keyset_paginate(request, transactions, 25, ('-created_at', '-id'),
+                               count_tags=[f'pos:cashier:{request.user.pk}'])
     
     context = {
         'transactions': page_obj,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
         'total_amount': transactions.aggregate(
             total=Sum('total_amount')
         )['total'] or Decimal('0.00'),
@@ -391,7 +378,7 @@ def print_receipt(request, transaction_id):
 @login_required
 def day_close(request):
     """Daily closing procedures"""
-    today = timezone.now().date()
+    today = timezone.localdate()
     
     # Check if day is already closed
     existing_close = PharmacyPoSDayClose.objects.filter(
@@ -405,30 +392,27 @@ def day_close(request):
         return redirect('pharmacy:pos_dashboard')
     
     if request.method == 'POST':
-        with transaction.atomic():
-            # Calculate daily totals
-            today_transactions = PharmacyPoSTransaction.objects.filter(
-                date__date=today,
-                cashier=request.user
-            )
-            
-            completed_transactions = today_transactions.filter(status='COMPLETED')
+        with serialized_write():
+            # Snapshot the cashier's shift counters (apps.billing.shift_totals)
+            totals = ShiftTotals.summary('PHARMACY', today, request.user)
+            by_method, by_status = totals['by_method'], totals['by_status']
             
             day_close_data = {
                 'date': today,
                 'cashier': request.user,
-                'total_transactions': today_transactions.count(),
-                'completed_transactions': completed_transactions.count(),
-                'cancelled_transactions': today_transactions.filter(status='CANCELLED').count(),
-                'refunded_transactions': today_transactions.filter(status='REFUNDED').count(),
-                'gross_sales': completed_transactions.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-                'total_discounts': completed_transactions.aggregate(total=Sum('discount_amount'))['total'] or Decimal('0.00'),
-                'total_tax': completed_transactions.aggregate(total=Sum('tax_amount'))['total'] or Decimal('0.00'),
-                'cash_sales': completed_transactions.filter(payment_method='CASH').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-                'card_sales': completed_transactions.filter(payment_method='CARD').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-                'mobile_money_sales': completed_transactions.filter(payment_method='MOBILE_MONEY').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-                'insurance_sales': completed_transactions.filter(payment_method='INSURANCE').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-                'credit_sales': completed_transactions.filter(payment_method='CREDIT').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
+                'total_transactions': sum(by_status.values()),
+                'completed_transactions': by_status['COMPLETED'],
+                'cancelled_transactions': by_status['CANCELLED'],
+                'refunded_transactions': by_status['REFUNDED'],
+                'gross_sales': totals['total_sales'],
+                'total_discounts': totals['total_discount'],
+                'total_tax': totals['total_tax'],
+                'cash_sales': by_method['CASH'],
+                'card_sales': by_method['CARD'],
+                'mobile_money_sales': by_method['MOBILE_MONEY'],
+                'insurance_sales': by_method['INSURANCE'],
+                'credit_sales': by_method['CREDIT'],
+                'totals_snapshot': ShiftTotals.snapshot('PHARMACY', today, request.user),
                 'opening_cash': Decimal(request.POST.get('opening_cash', '0.00')),
                 'closing_cash_actual': Decimal(request.POST.get('closing_cash', '0.00')),
                 'notes': request.POST.get('notes', ''),
@@ -447,18 +431,13 @@ def day_close(request):
             return redirect('pharmacy:pos_dashboard')
     
     # Calculate summary for display
-    today_transactions = PharmacyPoSTransaction.objects.filter(
-        date__date=today,
-        cashier=request.user,
-        status='COMPLETED'
-    )
-    
+    totals = ShiftTotals.summary('PHARMACY', today, request.user)
     summary = {
-        'total_transactions': today_transactions.count(),
-        'gross_sales': today_transactions.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-        'cash_sales': today_transactions.filter(payment_method='CASH').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-        'card_sales': today_transactions.filter(payment_method='CARD').aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00'),
-        'total_discounts': today_transactions.aggregate(total=Sum('discount_amount'))['total'] or Decimal('0.00'),
+        'total_transactions': totals['transaction_count'],
+        'gross_sales': totals['total_sales'],
+        'cash_sales': totals['by_method']['CASH'],
+        'card_sales': totals['by_method']['CARD'],
+        'total_discounts': totals['total_discount'],
     }
     
     context = {
@@ -5,6 +5,8 @@ class MedicineSerializer(serializers.ModelSerializer):
     class Meta:
         model = Medicine
         fields = '__all__'
+        # Kept in step with the batches by BatchInventory; stock is received into batches
+        read_only_fields = ('current_stock', 'batch_number', 'expiry_date')
 
 class PharmacySaleItemSerializer(serializers.ModelSerializer):
     medicine_name = serializers.ReadOnlyField(source='medicine.name')
@@ -0,0 +1,23 @@
+# apps/pharmacy/tasks.py
+"""
+Periodic pharmacy inventory tasks; scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+from django.conf import settings
+
+from .forecasting import FormularyForecaster
+from .inventory import BatchInventory
+
+
+@shared_task(ignore_result=True)
+def take_stock_snapshots():
+    """Snapshot on-hand stock per medicine and drop snapshots past retention"""
+    BatchInventory.take_snapshots()
+    BatchInventory.prune_snapshots(getattr(settings, 'PHARMACY_SNAPSHOT_RETENTION_DAYS', 400))
+
+
+@shared_task(ignore_result=True)
+def forecast_formulary():
+    """Recompute demand, reorder points and expiry waste for every active medicine"""
+    FormularyForecaster.run()
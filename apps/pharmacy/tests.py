@@ -1,3 +1,266 @@
-from django.test import TestCase
-
-# Create your tests here.
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from .forecasting import FormularyForecaster, compute_forecast
+from .forms import MedicineForm
+from .inventory import BatchInventory, InsufficientStock
+from .models import (
+    DrugCategory, Manufacturer, Medicine, MedicineBatch, MedicineForecast, MedicineStock, PharmacySale,
+    PharmacySaleItem,
+)
+from .pos_catalog import MedicineIndex
+
+
+class BatchInventoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = DrugCategory.objects.create(name='Analgesics')
+        cls.manufacturer = Manufacturer.objects.create(name='Acme', code='ACM')
+        cls.medicine = Medicine.objects.create(
+            name='Paracetamol', dosage_form='TABLET', strength='500mg', category=cls.category,
+            manufacturer=cls.manufacturer, cost_price=Decimal('1.00'), selling_price=Decimal('2.00'),
+            mrp=Decimal('2.50'),
+        )
+
+    def receive(self, batch_number, quantity, days):
+        return BatchInventory.receive(
+            self.medicine, quantity, batch_number, timezone.localdate() + timedelta(days=days), Decimal('1.00'),
+        )
+
+    def test_allocate_draws_first_expiry_first(self):
+        late = self.receive('LATE', 10, 300)
+        early = self.receive('EARLY', 5, 30)
+        allocations = BatchInventory.allocate([(self.medicine.pk, 7)])
+
+        self.assertEqual(
+            [(batch.batch_number, quantity) for batch, quantity in allocations[str(self.medicine.pk)]],
+            [('EARLY', 5), ('LATE', 2)],
+        )
+        early.refresh_from_db()
+        late.refresh_from_db()
+        self.assertEqual((early.quantity, late.quantity), (0, 8))
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.current_stock, 8)
+        self.assertEqual(self.medicine.batch_number, 'LATE')
+
+    def test_allocate_skips_expired_batches(self):
+        MedicineBatch.objects.create(
+            medicine=self.medicine, batch_number='OLD', expiry_date=timezone.localdate() - timedelta(days=1),
+            received_quantity=50, quantity=50, unit_cost=Decimal('1.00'),
+        )
+        self.receive('NEW', 3, 60)
+        with self.assertRaises(InsufficientStock) as raised:
+            BatchInventory.allocate([(self.medicine.pk, 4)])
+        self.assertEqual(raised.exception.available, 3)
+        # Nothing changed
+        self.assertEqual(MedicineBatch.objects.get(batch_number='NEW').quantity, 3)
+        self.assertFalse(MedicineStock.objects.filter(transaction_type='SALE').exists())
+
+    def test_sale_item_draws_from_batches_and_survives_sync(self):
+        self.receive('B1', 10, 90)
+        sale = PharmacySale.objects.create()
+        PharmacySaleItem.objects.create(sale=sale, medicine=self.medicine, quantity=4, unit_price=Decimal('2.00'))
+
+        self.assertEqual(MedicineBatch.objects.get(batch_number='B1').quantity, 6)
+        BatchInventory.sync_medicines([self.medicine.pk])
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.current_stock, 6)
+
+        # Saving the item again (e.g. an edit) does not draw a second time
+        item = sale.items.get()
+        item.save()
+        self.assertEqual(MedicineBatch.objects.get(batch_number='B1').quantity, 6)
+
+    def test_short_sale_item_is_rolled_back(self):
+        self.receive('B1', 2, 90)
+        sale = PharmacySale.objects.create()
+        with self.assertRaises(InsufficientStock):
+            PharmacySaleItem.objects.create(sale=sale, medicine=self.medicine, quantity=3, unit_price=Decimal('2.00'))
+        self.assertFalse(sale.items.exists())
+        self.assertEqual(MedicineBatch.objects.get(batch_number='B1').quantity, 2)
+
+    def test_medicine_form_receives_opening_stock_as_a_batch(self):
+        form = MedicineForm(data={
+            'generic_name': 'Ibuprofen', 'category': self.category.pk, 'manufacturer': self.manufacturer.pk,
+            'dosage_form': 'TABLET', 'strength': '200mg', 'cost_price': '1.00', 'selling_price': '2.00',
+            'mrp': '2.50', 'reorder_level': 5, 'maximum_stock': 100, 'is_active': True,
+            'opening_stock': 20, 'opening_batch_number': 'OPEN-1',
+            'opening_expiry_date': (timezone.localdate() + timedelta(days=365)).isoformat(),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        medicine = form.save()
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.current_stock, 20)
+        self.assertEqual(medicine.batches.get().batch_number, 'OPEN-1')
+        self.assertNotIn('current_stock', MedicineForm(instance=medicine).fields)
+        self.assertNotIn('opening_stock', MedicineForm(instance=medicine).fields)
+
+    def test_opening_stock_needs_a_batch(self):
+        form = MedicineForm(data={
+            'generic_name': 'Ibuprofen', 'category': self.category.pk, 'manufacturer': self.manufacturer.pk,
+            'dosage_form': 'TABLET', 'strength': '200mg', 'cost_price': '1.00', 'selling_price': '2.00',
+            'mrp': '2.50', 'reorder_level': 5, 'maximum_stock': 100, 'opening_stock': 20,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('opening_batch_number', form.errors)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MedicineIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = DrugCategory.objects.create(name='Analgesics')
+        cls.manufacturer = Manufacturer.objects.create(name='Acme', code='ACM')
+
+    def setUp(self):
+        cache.clear()
+
+    def medicine(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Medicine.objects.create(
+                name=name, dosage_form='TABLET', strength='500mg', category=self.category,
+                manufacturer=self.manufacturer, cost_price=Decimal('1.00'), selling_price=Decimal('2.00'),
+                mrp=Decimal('2.50'),
+            )
+
+    def names(self, index, query):
+        return [hit['name'] for hit in index.search(query, in_stock=False)]
+
+    def test_delete_and_insert_between_refreshes(self):
+        index = MedicineIndex()
+        old = self.medicine('Aspirin')
+        self.medicine('Paracetamol')
+        index.refresh()
+
+        # One row gone, and one committed late (saved before the watermark window): the count adds up
+        with self.captureOnCommitCallbacks(execute=True):
+            old.delete()
+        late = self.medicine('Amoxicillin')
+        Medicine.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(index.refresh())
+        self.assertEqual(self.names(index, 'a'), ['Amoxicillin'])
+        self.assertEqual(index.stats()['rows'], 2)
+
+    def test_sale_updates_indexed_stock(self):
+        index = MedicineIndex()
+        medicine = self.medicine('Paracetamol')
+        with self.captureOnCommitCallbacks(execute=True):
+            BatchInventory.receive(medicine, 10, 'B1', timezone.localdate() + timedelta(days=90), Decimal('1.00'))
+        index.refresh()
+        self.assertEqual(index.search('para')[0]['stock'], 10)
+
+        sale = PharmacySale.objects.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            PharmacySaleItem.objects.create(sale=sale, medicine=medicine, quantity=4, unit_price=Decimal('2.00'))
+        self.assertTrue(index.refresh())
+        self.assertEqual(index.search('para')[0]['stock'], 6)
+
+    def test_update_without_delete_reads_only_changed_rows(self):
+        index = MedicineIndex()
+        medicine = self.medicine('Paracetamol')
+        self.medicine('Aspirin')
+        index.refresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            medicine.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(index.refresh())
+        # Just the updated_at window: no scan of every pk to spot deletes
+        self.assertEqual(len(queries), 1)
+        self.assertIn('updated_at', queries[0]['sql'])
+
+    def test_search_matches_part_of_a_code(self):
+        index = MedicineIndex()
+        medicine = self.medicine('Paracetamol')
+        fragment = medicine.medicine_code[-4:]
+        self.assertEqual(self.names(index, fragment), ['Paracetamol'])
+        self.assertEqual(self.names(index, fragment[-2:]), [])
+
+
+class ForecastTests(TestCase):
+
+    def forecast(self, sales, batches, reorder_level=(10, 10), maximum_stock=(200, 200)):
+        rows, days, quantities, costs = zip(*batches) if batches else ((), (), (), ())
+        return compute_forecast(
+            np.array(sales, dtype=np.float64), np.array(reorder_level, dtype=np.float64),
+            np.array(maximum_stock, dtype=np.float64), np.array(rows, dtype=np.int64),
+            np.array(days, dtype=np.int64), np.array(quantities, dtype=np.int64),
+            np.array(costs, dtype=np.float64), lead_time_days=7, review_days=30,
+        )
+
+    def test_steady_demand_and_first_expiry_first_waste(self):
+        # Two units a day; 20 units expire in 5 days (10 sold first), 50 last well beyond
+        result = self.forecast([[2] * 28, [0] * 28], [(0, 100, 50, 1.0), (0, 5, 20, 2.0), (0, -1, 4, 1.0)])
+        self.assertAlmostEqual(result['smoothed_demand'][0], 2.0)
+        self.assertEqual(result['on_hand'][0], 70)
+        self.assertEqual(result['projected_expiry_waste'][0], 14)  # 10 unsold + 4 already expired
+        self.assertAlmostEqual(result['projected_waste_value'][0], 24.0)
+        self.assertEqual(result['reorder_point'][0], 14)
+        self.assertFalse(result['needs_reorder'][0])
+        self.assertAlmostEqual(result['days_of_cover'][0], 35.0)
+
+    def test_medicine_without_history_keeps_its_static_levels(self):
+        result = self.forecast([[2] * 28, [0] * 28], [(0, 100, 5, 1.0)])
+        self.assertEqual((result['reorder_point'][1], result['on_hand'][1]), (10, 0))
+        self.assertTrue(result['needs_reorder'][1])
+        self.assertEqual(result['suggested_order_quantity'][1], 200)
+        self.assertTrue(np.isnan(result['days_of_cover'][1]))
+        # Demand outruns the stock: order enough for lead time plus the review period
+        self.assertEqual(result['suggested_order_quantity'][0], 2 * 37 - 5)
+
+    def test_run_reads_the_sales_ledger(self):
+        category = DrugCategory.objects.create(name='Analgesics')
+        manufacturer = Manufacturer.objects.create(name='Acme', code='ACM')
+        medicine = Medicine.objects.create(
+            name='Paracetamol', dosage_form='TABLET', strength='500mg', category=category,
+            manufacturer=manufacturer, cost_price=Decimal('1.00'), selling_price=Decimal('2.00'),
+            mrp=Decimal('2.50'), reorder_level=5, maximum_stock=100,
+        )
+        BatchInventory.receive(medicine, 40, 'B1', timezone.localdate() + timedelta(days=365), Decimal('1.00'))
+        for _ in range(2):
+            sale = PharmacySale.objects.create()
+            PharmacySaleItem.objects.create(sale=sale, medicine=medicine, quantity=3, unit_price=Decimal('2.00'))
+        MedicineStock.objects.filter(transaction_type='SALE').update(created_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(FormularyForecaster.run()['medicines'], 1)
+        forecast = MedicineForecast.objects.get(medicine=medicine)
+        self.assertEqual(forecast.on_hand, 34)
+        self.assertGreater(forecast.smoothed_demand, 0)
+        self.assertAlmostEqual(forecast.moving_average_demand, 6 / 28, places=4)
+
+        # A second run updates the row in place
+        FormularyForecaster.run()
+        self.assertEqual(MedicineForecast.objects.count(), 1)
+
+    def test_dashboard_and_stock_report_show_the_forecast(self):
+        category = DrugCategory.objects.create(name='Analgesics')
+        manufacturer = Manufacturer.objects.create(name='Acme', code='ACM')
+        medicine = Medicine.objects.create(
+            name='Paracetamol', dosage_form='TABLET', strength='500mg', category=category,
+            manufacturer=manufacturer, cost_price=Decimal('1.00'), selling_price=Decimal('2.00'),
+            mrp=Decimal('2.50'), reorder_level=5, maximum_stock=100,
+        )
+        BatchInventory.receive(medicine, 3, 'SOON-1', timezone.localdate() + timedelta(days=10), Decimal('1.00'))
+        FormularyForecaster.run()
+        self.assertTrue(MedicineForecast.objects.get(medicine=medicine).needs_reorder)
+        self.client.force_login(get_user_model().objects.create_superuser(
+            username='pharmacist', password='x', email='p@example.com'))
+
+        dashboard = self.client.get(reverse('pharmacy:dashboard'))
+        self.assertEqual(dashboard.context['reorder_suggestions'], 1)
+        self.assertContains(dashboard, 'Reorder Suggestions')
+        self.assertContains(dashboard, 'Projected Expiry Waste')
+
+        report = self.client.get(reverse('pharmacy:stock_report'))
+        self.assertContains(report, 'SOON-1')
+        self.assertContains(report, 'Suggested Order')
@@ -11,6 +11,7 @@ urlpatterns = [
     # Medicines
     path('medicines/', views.medicine_list_view, name='medicine_list'),
     path('api/medicine-search/', views.medicine_search_api, name='medicine_search_api'),
+    path('api/purchase-suggestions/', views.purchase_suggestions_api, name='purchase_suggestions_api'),
     
     # Sales/Bills
     path('bills/', views.bill_list_view, name='bill_list'),
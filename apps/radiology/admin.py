@@ -147,7 +147,10 @@ class RadiologyEquipmentAdmin(admin.ModelAdmin):
 
 @admin.register(ImagingImage)
 class ImagingImageAdmin(admin.ModelAdmin):
-    list_display = ['study', 'description', 'series_number', 'instance_number', 'created_at']
-    list_filter = ['study__modality', 'created_at']
-    search_fields = ['study__id', 'description']
-    readonly_fields = ['created_at']
+    list_display = ['study', 'description', 'series_number', 'instance_number', 'ingest_status', 'created_at']
+    list_filter = ['study__modality', 'ingest_status', 'created_at']
+    search_fields = ['study__id', 'description', 'sop_instance_uid']
+    readonly_fields = [
+        'created_at', 'ingest_status', 'ingest_error', 'series_instance_uid', 'sop_instance_uid',
+        'rows', 'columns', 'source_sha256',
+    ]
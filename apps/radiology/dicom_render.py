@@ -0,0 +1,136 @@
+# apps/radiology/dicom_render.py
+"""
+Pure DICOM header parsing and thumbnail / preview rendering.
+
+Kept free of Django imports so render worker processes (spawned, not forked)
+can import it cheaply, like apps.core.utils.label_render. Every function
+takes plain values (bytes, numbers) and returns plain values.
+"""
+import io
+
+# Bump when rendering changes so the content-addressed cache stops matching old images
+RENDER_VERSION = 1
+
+# Longest edge in pixels for each rendition
+VARIANT_SIZES = {
+    'thumb': 128,
+    'preview': 512,
+}
+
+FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+# Tags read for ingest; everything else (and the pixel data) stays on disk
+HEADER_TAGS = [
+    'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID',
+    'SeriesNumber', 'InstanceNumber', 'SeriesDescription', 'ViewPosition',
+    'SliceThickness', 'WindowCenter', 'WindowWidth', 'Rows', 'Columns', 'NumberOfFrames',
+]
+
+
+def _first(value):
+    """Multi-valued DICOM elements (e.g. several window presets): take the first"""
+    if value is None or value == '':
+        return None
+    try:
+        return value[0] if not isinstance(value, (str, bytes)) else value
+    except (TypeError, IndexError):
+        return value
+
+
+def _number(value, cast=float):
+    value = _first(value)
+    try:
+        return cast(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def read_header(data):
+    """Header fields from DICOM bytes, parsed lazily: pixel data is never decoded"""
+    import pydicom
+
+    ds = pydicom.dcmread(io.BytesIO(data), stop_before_pixels=True, specific_tags=HEADER_TAGS, force=True)
+    get = lambda name: getattr(ds, name, None)
+    return {
+        'study_instance_uid': str(get('StudyInstanceUID') or ''),
+        'series_instance_uid': str(get('SeriesInstanceUID') or ''),
+        'sop_instance_uid': str(get('SOPInstanceUID') or ''),
+        'series_number': _number(get('SeriesNumber'), int),
+        'instance_number': _number(get('InstanceNumber'), int),
+        'series_description': str(get('SeriesDescription') or ''),
+        'view_position': str(get('ViewPosition') or ''),
+        'slice_thickness': _number(get('SliceThickness')),
+        'window_center': _number(get('WindowCenter'), round),
+        'window_width': _number(get('WindowWidth'), round),
+        'rows': _number(get('Rows'), int),
+        'columns': _number(get('Columns'), int),
+        'frames': _number(get('NumberOfFrames'), int) or 1,
+    }
+
+
+def _dicom_image(data, window_center, window_width):
+    """Decode the (first frame's) pixels, apply the modality LUT and a window to 8-bit"""
+    import numpy as np
+    import pydicom
+    from PIL import Image
+
+    ds = pydicom.dcmread(io.BytesIO(data), force=True)
+    pixels = ds.pixel_array
+    if int(getattr(ds, 'NumberOfFrames', 1) or 1) > 1:
+        pixels = pixels[0]
+
+    photometric = str(getattr(ds, 'PhotometricInterpretation', 'MONOCHROME2'))
+    if pixels.ndim == 3:  # RGB / YBR: already display-ready
+        return Image.fromarray(pixels.astype(np.uint8)).convert('RGB')
+
+    values = pixels.astype(np.float32) * float(getattr(ds, 'RescaleSlope', 1) or 1) \
+        + float(getattr(ds, 'RescaleIntercept', 0) or 0)
+
+    if window_width is None or window_center is None or window_width <= 0:
+        # No window stored: stretch the 1st-99th percentile range
+        low, high = np.percentile(values, (1, 99))
+    else:
+        low, high = window_center - window_width / 2.0, window_center + window_width / 2.0
+    if high <= low:
+        high = low + 1
+
+    scaled = np.clip((values - low) / (high - low), 0.0, 1.0) * 255.0
+    if photometric == 'MONOCHROME1':  # 0 = white
+        scaled = 255.0 - scaled
+    return Image.fromarray(scaled.astype(np.uint8), mode='L')
+
+
+def _plain_image(data):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image.convert('RGB') if image.mode not in ('L', 'RGB') else image
+
+
+def render(job):
+    """
+    ``job = (source_kind, data, variant, fmt, window_center, window_width)``;
+    ``source_kind`` is ``dicom`` or ``image``. Returns encoded image bytes.
+    """
+    from PIL import Image
+
+    source_kind, data, variant, fmt, window_center, window_width = job
+    if source_kind == 'dicom':
+        image = _dicom_image(data, window_center, window_width)
+    else:
+        image = _plain_image(data)
+
+    size = VARIANT_SIZES[variant]
+    image.thumbnail((size, size), Image.LANCZOS)
+
+    pil_format, _ = FORMATS[fmt]
+    buffer = io.BytesIO()
+    if pil_format == 'WEBP':
+        image.save(buffer, format=pil_format, quality=80, method=4)
+    else:
+        image.save(buffer, format=pil_format, optimize=True)
+    return buffer.getvalue()
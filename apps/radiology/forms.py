@@ -308,6 +308,12 @@ class ImagingImageForm(forms.ModelForm):
             }),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('dicom_file') and not cleaned_data.get('image_file'):
+            raise forms.ValidationError('Upload a DICOM file or an image file.')
+        return cleaned_data
+
 
 # Inline formset for imaging images
 ImagingImageFormSet = inlineformset_factory(
@@ -0,0 +1,288 @@
+# apps/radiology/imaging.py
+"""
+Background ingest of imaging uploads, and cached thumbnails / previews.
+
+Saving an ``ImagingImage`` queues its id with ``imaging_ingestor``
+(apps.core.batching); the request returns straight away. The worker then,
+per batch:
+
+1. reads each source file once, hashing it and - for DICOM - parsing only
+   the header (``stop_before_pixels``) to fill series/instance numbers, the
+   stored window and the UIDs;
+2. renders a thumbnail and a windowed preview of every image in a process
+   pool (apps.radiology.dicom_render), storing them in ``PreviewCache``
+   under the hash of (source content, rendition, window);
+3. writes the header fields with one ``bulk_update`` and refreshes the
+   studies' image counts.
+
+The viewer pages through a series with the series API and loads only the
+thumbnails and previews in view; full DICOM files are never sent to it.
+Renditions missing from the cache (e.g. a custom window) are rendered on
+request and cached the same way.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from pathlib import Path
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from apps.core.batching import SpillingBatchQueue
+from apps.core.sqlite import serialized_write
+from . import dicom_render
+from .models import ImagingImage, ImagingStudy
+
+logger = logging.getLogger(__name__)
+
+# Renditions produced at ingest; anything else is rendered on first request
+INGEST_VARIANTS = ('thumb', 'preview')
+
+
+def default_format():
+    return getattr(settings, 'IMAGING_PREVIEW_FORMAT', 'webp')
+
+
+def source_of(image):
+    """``(source_kind, file field)`` - the DICOM file when there is one, else the plain image"""
+    if image.dicom_file:
+        return 'dicom', image.dicom_file
+    return 'image', image.image_file
+
+
+def read_source(image):
+    kind, field = source_of(image)
+    if not field:
+        raise ValueError('no DICOM or image file')
+    field.open('rb')
+    try:
+        return kind, field.read()
+    finally:
+        field.close()
+
+
+class PreviewCache:
+    """Rendered images in the default (media) storage, keyed by content hash"""
+
+    PREFIX = getattr(settings, 'IMAGING_PREVIEW_CACHE_DIR', 'imaging')
+
+    @staticmethod
+    def digest(source_sha256, variant, fmt, window_center=None, window_width=None):
+        raw = json.dumps([source_sha256, variant, fmt, window_center, window_width, dicom_render.RENDER_VERSION])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @classmethod
+    def path(cls, digest, fmt):
+        return f"{cls.PREFIX}/{digest[:2]}/{digest}.{fmt}"
+
+    @classmethod
+    def get(cls, digest, fmt):
+        path = cls.path(digest, fmt)
+        try:
+            if not default_storage.exists(path):
+                return None
+            with default_storage.open(path, 'rb') as handle:
+                return handle.read()
+        except Exception as e:
+            logger.warning(f"Preview cache read failed for {digest}: {e}")
+            return None
+
+    @classmethod
+    def put(cls, digest, fmt, data):
+        path = cls.path(digest, fmt)
+        try:
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(data))
+        except Exception as e:
+            # A concurrent writer may have won the race; the image is still returned
+            logger.warning(f"Preview cache write failed for {digest}: {e}")
+
+
+class PreviewRenderer:
+    """Render jobs in a spawned process pool; small batches render inline"""
+
+    WORKERS = getattr(settings, 'IMAGING_RENDER_WORKERS', min(4, os.cpu_count() or 1))
+    POOL_MIN_BATCH = getattr(settings, 'IMAGING_POOL_MIN_BATCH', 4)
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def _get_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Spawned workers never inherit DB connections or server threads
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=cls.WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return cls._pool
+
+    @classmethod
+    def _reset_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    @staticmethod
+    def _render_inline(job):
+        try:
+            return dicom_render.render(job)
+        except Exception as e:
+            logger.error(f"Imaging render failed ({job[0]} {job[2]}): {e}")
+            return None
+
+    @classmethod
+    def render_many(cls, jobs):
+        """Encoded image bytes (or None on failure) for each job, in order"""
+        if len(jobs) < cls.POOL_MIN_BATCH or cls.WORKERS < 2:
+            return [cls._render_inline(job) for job in jobs]
+        try:
+            futures = [cls._get_pool().submit(dicom_render.render, job) for job in jobs]
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            logger.error(f"Imaging process pool unavailable, rendering inline: {e}")
+            cls._reset_pool()
+            return [cls._render_inline(job) for job in jobs]
+
+        results = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                cls._reset_pool()
+                results.append(cls._render_inline(job))
+            except Exception as e:
+                logger.error(f"Imaging render failed ({job[0]} {job[2]}): {e}")
+                results.append(None)
+        return results
+
+
+def rendition(image, variant, fmt=None, window_center=None, window_width=None):
+    """
+    ``(digest, bytes)`` for one rendition of an ingested image, rendering it on
+    a cache miss. A window only applies to DICOM previews; it defaults to the
+    window stored in the file.
+    """
+    fmt = fmt or default_format()
+    if image.dicom_file and variant == 'preview':
+        window_center = image.window_center if window_center is None else window_center
+        window_width = image.window_width if window_width is None else window_width
+    else:
+        window_center = window_width = None
+
+    digest = PreviewCache.digest(image.source_sha256, variant, fmt, window_center, window_width)
+    data = PreviewCache.get(digest, fmt)
+    if data is None:
+        kind, source = read_source(image)
+        data = PreviewRenderer._render_inline((kind, source, variant, fmt, window_center, window_width))
+        if data is not None:
+            PreviewCache.put(digest, fmt, data)
+    return digest, data
+
+
+class ImagingIngestor(SpillingBatchQueue):
+    """Queue saved ImagingImage ids; parse headers and pre-render previews in batches"""
+
+    name = 'imaging-ingest'
+
+    HEADER_FIELDS = ['series_number', 'instance_number', 'slice_thickness', 'window_center', 'window_width',
+                     'series_instance_uid', 'sop_instance_uid', 'rows', 'columns']
+
+    def __init__(self):
+        super().__init__(
+            spill_path=Path(getattr(
+                settings, 'IMAGING_SPILL_PATH', Path(settings.BASE_DIR) / 'logs' / 'imaging_spill.jsonl'
+            )),
+            enabled=getattr(settings, 'IMAGING_INGEST_ASYNC', True),
+            queue_size=getattr(settings, 'IMAGING_QUEUE_SIZE', 10000),
+            flush_interval=getattr(settings, 'IMAGING_FLUSH_INTERVAL', 2.0),
+            batch_size=getattr(settings, 'IMAGING_INGEST_BATCH', 16),
+            log=logger,
+        )
+
+    def submit(self, image_id):
+        self.put({'image_id': image_id})
+
+    def process(self, records):
+        ids = list(dict.fromkeys(record['image_id'] for record in records))
+        images = ImagingImage.objects.in_bulk(ids)
+        if images:
+            self.ingest(list(images.values()))
+        return []
+
+    def ingest(self, images):
+        """Ingest ``images`` in the calling thread; returns the number that became READY"""
+        fmt = default_format()
+        jobs, targets = [], []
+        for image in images:
+            try:
+                kind, data = read_source(image)
+                image.source_sha256 = hashlib.sha256(data).hexdigest()
+                if kind == 'dicom':
+                    self._apply_header(image, dicom_render.read_header(data))
+            except Exception as e:
+                image.ingest_status, image.ingest_error = 'FAILED', f"Unreadable source: {e}"
+                continue
+
+            for variant in INGEST_VARIANTS:
+                window = (image.window_center, image.window_width) if kind == 'dicom' and variant == 'preview' \
+                    else (None, None)
+                digest = PreviewCache.digest(image.source_sha256, variant, fmt, *window)
+                if default_storage.exists(PreviewCache.path(digest, fmt)):
+                    continue  # same file uploaded before
+                jobs.append((kind, data, variant, fmt, *window))
+                targets.append((image, digest))
+            image.ingest_status, image.ingest_error = 'READY', ''
+
+        for (image, digest), rendered in zip(targets, PreviewRenderer.render_many(jobs)):
+            if rendered is None:
+                image.ingest_status, image.ingest_error = 'FAILED', 'Preview rendering failed'
+            else:
+                PreviewCache.put(digest, fmt, rendered)
+
+        with serialized_write():
+            ImagingImage.objects.bulk_update(
+                images,
+                self.HEADER_FIELDS + ['description', 'view_position', 'source_sha256', 'ingest_status', 'ingest_error'],
+                batch_size=200,
+            )
+            self._refresh_studies({image.study_id for image in images})
+
+        ready = sum(image.ingest_status == 'READY' for image in images)
+        logger.info(f"Imaging ingest: {len(images)} images, {ready} ready, {len(jobs)} renditions rendered")
+        return ready
+
+    @staticmethod
+    def _apply_header(image, header):
+        for field in ('series_number', 'instance_number', 'slice_thickness', 'window_center', 'window_width',
+                      'rows', 'columns'):
+            if header[field] is not None:
+                setattr(image, field, header[field])
+        image.series_number = max(image.series_number, 0)  # PositiveIntegerField; headers may say -1
+        image.instance_number = max(image.instance_number, 0)
+        image.series_instance_uid = header['series_instance_uid'][:64]
+        image.sop_instance_uid = header['sop_instance_uid'][:64]
+        image.description = image.description or header['series_description'][:200]
+        image.view_position = image.view_position or header['view_position'][:50]
+
+    @staticmethod
+    def _refresh_studies(study_ids):
+        counts = dict(
+            ImagingImage.objects.filter(study_id__in=study_ids)
+            .values_list('study_id').annotate(total=Count('id'))
+        )
+        studies = list(ImagingStudy.objects.filter(pk__in=study_ids).only('id', 'image_count'))
+        for study in studies:
+            study.image_count = counts.get(study.pk, 0)
+        ImagingStudy.objects.bulk_update(studies, ['image_count'])
+
+
+imaging_ingestor = ImagingIngestor()
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('radiology', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagingimage',
+            name='columns',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='ingest_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='ingest_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='rows',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='series_instance_uid',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='sop_instance_uid',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imagingimage',
+            name='source_sha256',
+            field=models.CharField(blank=True, help_text='Content hash of the source file; keys the preview cache', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='imagingimage',
+            name='image_file',
+            field=models.ImageField(blank=True, upload_to='radiology/images/'),
+        ),
+        migrations.AddIndex(
+            model_name='imagingimage',
+            index=models.Index(fields=['study', 'series_number', 'instance_number', 'id'], name='radiology_i_study_i_384e8a_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_dispatch'),
+        ('doctors', '0001_initial'),
+        ('patients', '0004_master_patient_index'),
+        ('radiology', '0002_imaging_ingest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='radiologyorder',
+            index=models.Index(fields=['patient', 'order_date', 'id'], name='radiology_r_patient_bd5332_idx'),
+        ),
+    ]
@@ -159,6 +159,8 @@ class RadiologyOrder(SerialNumberMixin):
             models.Index(fields=['patient']),
             models.Index(fields=['ordering_doctor']),
             models.Index(fields=['status']),
+            # Patient timeline pages (apps.patients.timeline)
+            models.Index(fields=['patient', 'order_date', 'id']),
         ]
     
     def __str__(self):
@@ -304,7 +306,7 @@ class ImagingStudy(models.Model):
 class ImagingImage(models.Model):
     """Individual images within an imaging study"""
     study = models.ForeignKey(ImagingStudy, on_delete=models.CASCADE, related_name='images')
-    image_file = models.ImageField(upload_to='radiology/images/')
+    image_file = models.ImageField(upload_to='radiology/images/', blank=True)  # Optional when a DICOM file is given
     dicom_file = models.FileField(upload_to='radiology/dicom/', null=True, blank=True)
     
     # Image Metadata
@@ -318,10 +320,28 @@ class ImagingImage(models.Model):
     description = models.CharField(max_length=200, blank=True)
     view_position = models.CharField(max_length=50, blank=True)  # AP, PA, LAT, etc.
     
+    # Ingest (apps.radiology.imaging): header fields above are filled from the DICOM file
+    INGEST_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+    ]
+    ingest_status = models.CharField(max_length=10, choices=INGEST_STATUS_CHOICES, default='PENDING')
+    ingest_error = models.TextField(blank=True)
+    series_instance_uid = models.CharField(max_length=64, blank=True)
+    sop_instance_uid = models.CharField(max_length=64, blank=True)
+    rows = models.PositiveIntegerField(null=True, blank=True)
+    columns = models.PositiveIntegerField(null=True, blank=True)
+    source_sha256 = models.CharField(max_length=64, blank=True, help_text="Content hash of the source file; keys the preview cache")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['series_number', 'instance_number']
+        indexes = [
+            # Paged series API: one series of a study, in slice order
+            models.Index(fields=['study', 'series_number', 'instance_number', 'id']),
+        ]
     
     def __str__(self):
         return f"Image {self.instance_number} - {self.study}"
@@ -0,0 +1,34 @@
+# apps/radiology/signals.py
+"""
+Radiology signal handlers: queue new or replaced imaging files for ingest
+(header parsing and preview rendering, see apps.radiology.imaging).
+"""
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+
+def _source_names(instance):
+    return (instance.__dict__.get('dicom_file') and str(instance.__dict__['dicom_file']),
+            instance.__dict__.get('image_file') and str(instance.__dict__['image_file']))
+
+
+@receiver(post_init, sender='radiology.ImagingImage')
+def remember_imaging_sources(sender, instance, **kwargs):
+    """Keep the loaded file names so post_save can tell a new upload from a metadata edit"""
+    instance._ingest_sources = _source_names(instance)
+
+
+@receiver(post_save, sender='radiology.ImagingImage')
+def queue_imaging_ingest(sender, instance, created, **kwargs):
+    sources = _source_names(instance)
+    if not created and sources == getattr(instance, '_ingest_sources', None):
+        return
+    instance._ingest_sources = sources
+    if not created:
+        # Renditions of the old file must not be served while the new one is ingested
+        sender.objects.filter(pk=instance.pk).update(ingest_status='PENDING', ingest_error='')
+
+    from .imaging import imaging_ingestor
+    image_id = instance.pk
+    transaction.on_commit(lambda: imaging_ingestor.submit(image_id))
@@ -1,3 +1,142 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from unittest import mock
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+from .imaging import PreviewCache, PreviewRenderer, imaging_ingestor
+from .models import ImagingImage, ImagingStudy, RadiologyOrder, RadiologyOrderItem, StudyType
+
+
+def dicom_bytes(series_number, instance_number, window=(40, 400)):
+    """A small 16-bit CT slice, written the way scanners send them"""
+    import numpy
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b'\0' * 128)
+    ds.is_little_endian, ds.is_implicit_VR = True, False
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID, ds.SeriesInstanceUID = generate_uid(), generate_uid()
+    ds.SeriesNumber, ds.InstanceNumber = series_number, instance_number
+    ds.SeriesDescription = 'Axial brain'
+    ds.SliceThickness = 5.0
+    ds.WindowCenter, ds.WindowWidth = window
+    ds.Rows = ds.Columns = 16
+    ds.SamplesPerPixel, ds.PhotometricInterpretation = 1, 'MONOCHROME2'
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 16, 16, 15, 0
+    ds.PixelData = (numpy.arange(256, dtype=numpy.uint16) * instance_number).tobytes()
+    buffer = io.BytesIO()
+    ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue()
+
+
+class ImagingIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(username='radadmin', password='x', email='r@example.com')
+        doctor = Doctor.objects.create(
+            first_name='Omar', last_name='Saleh', specialization='GENERAL', license_number='LIC-1',
+            phone_number='0509999999', email='omar@example.com', date_of_birth=date(1975, 1, 1),
+            address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F', phone='0501234567',
+        )
+        study_type = StudyType.objects.create(name='CT Brain', modality='CT', price=Decimal('100.00'))
+        order = RadiologyOrder.objects.create(patient=patient, ordering_doctor=doctor)
+        item = RadiologyOrderItem.objects.create(order=order, study_type=study_type, price=Decimal('100.00'))
+        cls.study = ImagingStudy.objects.create(order_item=item, study_instance_uid='1.2.3', modality='CT')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media, IMAGING_PREVIEW_FORMAT='webp')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Ingest inline instead of on the background worker
+        inline = mock.patch.object(imaging_ingestor, 'enabled', False)
+        inline.start()
+        self.addCleanup(inline.stop)
+        self.client.force_login(self.user)
+
+    def upload(self, series_number, instance_number, **options):
+        image = ImagingImage(study=self.study)
+        image.dicom_file.save(f's{series_number}i{instance_number}.dcm',
+                              ContentFile(dicom_bytes(series_number, instance_number, **options)), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        image.refresh_from_db()
+        return image
+
+    def test_saved_dicom_is_ingested_from_its_header(self):
+        image = self.upload(3, 7)
+        self.assertEqual(image.ingest_status, 'READY', image.ingest_error)
+        self.assertEqual((image.series_number, image.instance_number, image.window_center, image.window_width),
+                         (3, 7, 40, 400))
+        self.assertEqual((image.rows, image.columns, image.description), (16, 16, 'Axial brain'))
+        self.study.refresh_from_db()
+        self.assertEqual(self.study.image_count, 1)
+
+        thumb = PreviewCache.digest(image.source_sha256, 'thumb', 'webp')
+        self.assertTrue(default_storage.exists(PreviewCache.path(thumb, 'webp')))
+
+    def test_identical_upload_reuses_the_cached_renditions(self):
+        data = dicom_bytes(1, 1)
+        first = ImagingImage(study=self.study)
+        first.dicom_file.save('a.dcm', ContentFile(data), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+
+        second = ImagingImage(study=self.study)
+        second.dicom_file.save('b.dcm', ContentFile(data), save=False)
+        with mock.patch.object(PreviewRenderer, 'render_many', wraps=PreviewRenderer.render_many) as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                second.save()
+        render.assert_called_once_with([])
+        second.refresh_from_db()
+        self.assertEqual(second.ingest_status, 'READY')
+
+    def test_series_api_pages_in_slice_order(self):
+        for instance_number in (3, 1, 2):
+            self.upload(2, instance_number)
+        url = reverse('radiology:series_images_api', kwargs={'pk': self.study.pk, 'series_number': 2})
+        data = self.client.get(url, {'offset': 1, 'limit': 5}).json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual([image['instance_number'] for image in data['images']], [2, 3])
+        self.assertIn('thumb_url', data['images'][0])
+
+        series = self.client.get(reverse('radiology:study_series_api', kwargs={'pk': self.study.pk})).json()
+        self.assertEqual([(row['series_number'], row['image_count']) for row in series['series']], [(2, 3)])
+
+    def test_rendition_negotiates_format_and_revalidates(self):
+        image = self.upload(1, 1)
+        url = reverse('radiology:imaging_rendition', kwargs={'pk': image.pk, 'variant': 'preview'})
+
+        response = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                                         HTTP_ACCEPT='image/webp').status_code, 304)
+
+        png = self.client.get(url, HTTP_ACCEPT='image/*')
+        self.assertEqual(png['Content-Type'], 'image/png')
+        self.assertNotEqual(png['ETag'], response['ETag'])
+
+        # Another window is rendered on request
+        custom = self.client.get(url, {'wc': 80, 'ww': 200}, HTTP_ACCEPT='image/webp')
+        self.assertEqual(custom.status_code, 200)
+        self.assertNotEqual(custom['ETag'], response['ETag'])
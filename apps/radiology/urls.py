@@ -38,4 +38,9 @@ urlpatterns = [
     # API endpoints for AJAX calls
     path('api/patient-search/', views.PatientSearchAPIView.as_view(), name='patient_search_api'),
     path('api/study-types/', views.StudyTypeAPIView.as_view(), name='study_type_api'),
+    
+    # Imaging viewer: paged series and cached thumbnails/previews
+    path('api/studies/<uuid:pk>/series/', views.study_series_api, name='study_series_api'),
+    path('api/studies/<uuid:pk>/series/<int:series_number>/images/', views.series_images_api, name='series_images_api'),
+    path('api/images/<int:pk>/<str:variant>/', views.imaging_rendition, name='imaging_rendition'),
 ]
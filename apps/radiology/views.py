@@ -8,8 +8,10 @@ from django.urls import reverse_lazy, reverse
 from django.utils import timezone
 from django.db import transaction
 from django.db import models
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404
 from django.core.paginator import Paginator
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 # ZAIN HMS unified system mixins
@@ -17,7 +19,9 @@ from apps.core.mixins import UnifiedSystemMixin
 
 # from apps.accounts.services import UserManagementService
 
-from .models import StudyType, RadiologyOrder, RadiologyOrderItem, ImagingStudy, RadiologyEquipment
+from .models import StudyType, RadiologyOrder, RadiologyOrderItem, ImagingStudy, ImagingImage, RadiologyEquipment
+from .dicom_render import FORMATS, VARIANT_SIZES
+from .imaging import default_format, rendition
 from .forms import (
     StudyTypeForm, RadiologyOrderForm, RadiologyOrderItemForm, 
     ImagingStudyForm, RadiologyEquipmentForm, RadiologistReportForm
@@ -586,3 +590,131 @@ class StudyTypeAPIView(ListView):  # TenantFilterMixin temporarily commented:
             })
             
         return JsonResponse({'results': results})
+
+
+# Imaging viewer API: the viewer pages through a series and loads only the renditions in view
+def _can_view_images(user):
+    return user.has_perm('radiology.view_imagingstudy')
+
+
+def _rendition_urls(image):
+    # The content hash in the query string makes the URLs safe to cache forever
+    version = image.source_sha256[:12]
+    return {
+        variant: f"{reverse('radiology:imaging_rendition', kwargs={'pk': image.pk, 'variant': variant})}?v={version}"
+        for variant in VARIANT_SIZES
+    }
+
+
+@login_required
+def study_series_api(request, pk):
+    """Series of a study with their image counts and a thumbnail of the first slice"""
+    if not _can_view_images(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    study = get_object_or_404(ImagingStudy.objects.only('id', 'modality'), pk=pk)
+
+    series_images = ImagingImage.objects.filter(study=study, series_number=OuterRef('series_number'))
+    series = (
+        ImagingImage.objects.filter(study=study)
+        .values('series_number')
+        .annotate(
+            image_count=Count('id'),
+            first_image_id=Subquery(series_images.order_by('instance_number', 'id').values('id')[:1]),
+        )
+        .order_by('series_number')
+    )
+    first_images = ImagingImage.objects.only('id', 'description', 'source_sha256', 'ingest_status').in_bulk(
+        [row['first_image_id'] for row in series]
+    )
+
+    results = []
+    for row in series:
+        first = first_images.get(row['first_image_id'])
+        results.append({
+            'series_number': row['series_number'],
+            'description': first.description if first else '',
+            'image_count': row['image_count'],
+            'thumbnail_url': _rendition_urls(first)['thumb'] if first and first.ingest_status == 'READY' else None,
+        })
+    return JsonResponse({'study': str(study.pk), 'modality': study.modality, 'series': results})
+
+
+@login_required
+def series_images_api(request, pk, series_number):
+    """One window of a series in slice order: ``?offset=&limit=`` (limit capped)"""
+    if not _can_view_images(request.user):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    max_limit = getattr(settings, 'IMAGING_SERIES_PAGE_MAX', 50)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', 20)), 1), max_limit)
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers'}, status=400)
+
+    images = ImagingImage.objects.filter(study_id=pk, series_number=series_number).order_by('instance_number', 'id')
+    total = images.count()
+    page = images.only(
+        'id', 'instance_number', 'slice_thickness', 'window_center', 'window_width', 'rows', 'columns',
+        'source_sha256', 'ingest_status',
+    )[offset:offset + limit]
+
+    return JsonResponse({
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'images': [
+            {
+                'id': image.pk,
+                'instance_number': image.instance_number,
+                'slice_thickness': image.slice_thickness,
+                'window_center': image.window_center,
+                'window_width': image.window_width,
+                'rows': image.rows,
+                'columns': image.columns,
+                'status': image.ingest_status,
+                **({f'{variant}_url': url for variant, url in _rendition_urls(image).items()}
+                   if image.ingest_status == 'READY' else {}),
+            }
+            for image in page
+        ],
+    })
+
+
+@login_required
+def imaging_rendition(request, pk, variant):
+    """Thumbnail or preview of one image; ``?wc=&ww=`` renders (and caches) another window"""
+    if not _can_view_images(request.user):
+        return HttpResponse(status=403)
+    if variant not in VARIANT_SIZES:
+        raise Http404('Unknown rendition')
+    image = get_object_or_404(
+        ImagingImage.objects.only('id', 'dicom_file', 'image_file', 'window_center', 'window_width',
+                                  'source_sha256', 'ingest_status'),
+        pk=pk,
+    )
+    if image.ingest_status != 'READY':
+        return JsonResponse({'status': image.ingest_status}, status=409)
+
+    try:
+        window_center = int(request.GET['wc']) if 'wc' in request.GET else None
+        window_width = int(request.GET['ww']) if 'ww' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'wc and ww must be integers'}, status=400)
+
+    # WebP where the browser accepts it, PNG otherwise
+    fmt = default_format()
+    if fmt == 'webp' and 'image/webp' not in request.META.get('HTTP_ACCEPT', ''):
+        fmt = 'png'
+
+    digest, data = rendition(image, variant, fmt, window_center, window_width)
+    if data is None:
+        return JsonResponse({'error': 'Rendering failed'}, status=500)
+
+    etag = f'"{digest}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        return HttpResponseNotModified()
+    response = HttpResponse(data, content_type=FORMATS[fmt][1])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response['Vary'] = 'Accept'
+    return response
@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from apps.core.mixins import UnifiedSystemMixin
+from apps.core.db_routing import reporting_db
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.http import JsonResponse, HttpResponse
@@ -348,6 +349,7 @@ def use_template(request, pk):
 
 
 @login_required
+@reporting_db
 def patients_report(request):
     """Quick patients report"""
     tenant = request.user.tenant
@@ -377,6 +379,7 @@ def patients_report(request):
 
 
 @login_required
+@reporting_db
 def appointments_report(request):
     """Quick appointments report"""
     tenant = request.user.tenant
@@ -404,6 +407,7 @@ def appointments_report(request):
 
 
 @login_required
+@reporting_db
 def billing_report(request):
     """Quick billing report"""
     tenant = request.user.tenant
@@ -437,6 +441,7 @@ def financial_dashboard(request):
 
 
 @login_required
+@reporting_db
 def financial_report(request):
     """Quick financial report API"""
     # Get hospital from session for hospital admin
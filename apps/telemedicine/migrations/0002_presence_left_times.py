@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telemedicine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='virtualwaitingroom',
+            name='doctor_left_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='virtualwaitingroom',
+            name='patient_left_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -47,6 +47,8 @@ class VirtualWaitingRoom(models.Model):
     doctor_joined = models.BooleanField(default=False)
     patient_join_time = models.DateTimeField(blank=True, null=True)
     doctor_join_time = models.DateTimeField(blank=True, null=True)
+    patient_left_time = models.DateTimeField(blank=True, null=True)
+    doctor_left_time = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         db_table = 'telemedicine_virtual_waiting_room'
@@ -0,0 +1,246 @@
+# apps/telemedicine/presence.py
+"""
+Telemedicine waiting-room presence.
+
+Who is in a consultation room lives in the cache, one entry per participant
+(patient / doctor) holding when they joined and when they were last seen.
+Clients keep it fresh with heartbeats: an open Server-Sent Events stream
+(``presence_stream``, ASGI) beats by itself every
+``TELEMEDICINE_PRESENCE_HEARTBEAT`` seconds, other clients POST
+``presence_heartbeat``. A participant not seen for
+``TELEMEDICINE_PRESENCE_TIMEOUT`` seconds has left; ``sweep()`` (Celery beat)
+records that.
+
+Join and leave times reach ``VirtualWaitingRoom`` in batches through
+``presence_recorder`` (apps.core.batching), so heartbeats never write rows.
+Arrivals and departures are pushed on the event stream (apps.core.events) as
+``telemedicine.presence`` events addressed to the other participant - the
+doctor hears about a patient arriving on any page with the stream open.
+
+Only the appointment's own accounts take part: the doctor's user and the
+patient's portal user (``Patient.user``); anyone else is refused.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pathlib import Path
+import logging
+import time
+
+from apps.core.batching import SpillingBatchQueue
+from apps.core.events import event_broker
+from apps.core.sqlite import serialized_write
+from .models import TeleconsultationAppointment, VirtualWaitingRoom
+
+logger = logging.getLogger('zain_hms.performance')
+
+PRESENCE_KEY = 'zain_hms:telemedicine:presence'
+ROLES = ('PATIENT', 'DOCTOR')
+NOT_A_PARTICIPANT = "Only the appointment's patient and doctor can enter its room"
+
+
+def _timeout():
+    return getattr(settings, 'TELEMEDICINE_PRESENCE_TIMEOUT', 30)
+
+
+def participant_role(appointment, user):
+    """``'DOCTOR'`` or ``'PATIENT'`` for the appointment's own accounts, None for anyone else"""
+    if user.pk is None:
+        return None
+    if user.pk == appointment.doctor.user_id:
+        return 'DOCTOR'
+    if user.pk == appointment.patient.user_id:
+        return 'PATIENT'
+    return None
+
+
+def _role(appointment, user):
+    role = participant_role(appointment, user)
+    if role is None:
+        raise PermissionDenied(NOT_A_PARTICIPANT)
+    return role
+
+
+class PresenceRecorder(SpillingBatchQueue):
+    """Queue join/leave events and write them to VirtualWaitingRoom in batches"""
+
+    name = 'presence-recorder'
+
+    def __init__(self):
+        super().__init__(
+            spill_path=Path(getattr(
+                settings, 'TELEMEDICINE_PRESENCE_SPILL_PATH',
+                Path(settings.BASE_DIR) / 'logs' / 'presence_spill.jsonl',
+            )),
+            enabled=getattr(settings, 'TELEMEDICINE_PRESENCE_ASYNC', True),
+            queue_size=getattr(settings, 'TELEMEDICINE_PRESENCE_QUEUE_SIZE', 5000),
+            flush_interval=getattr(settings, 'TELEMEDICINE_PRESENCE_FLUSH_INTERVAL', 2.0),
+            batch_size=getattr(settings, 'TELEMEDICINE_PRESENCE_FLUSH_BATCH', 200),
+            log=logger,
+        )
+
+    def submit(self, appointment_id, role, event, at=None):
+        self.put({'appointment_id': appointment_id, 'role': role, 'event': event, 'at': at or timezone.now()})
+
+    def process(self, records):
+        """Apply the events in order: one read, then bulk_create / bulk_update"""
+        ids = {record['appointment_id'] for record in records}
+        rooms = {room.appointment_id: room for room in VirtualWaitingRoom.objects.filter(appointment_id__in=ids)}
+        missing = ids - set(rooms)
+        if missing:
+            # Rooms are created on first join; skip appointments deleted since
+            existing = TeleconsultationAppointment.objects.filter(pk__in=missing).values_list('pk', flat=True)
+            created = {pk: VirtualWaitingRoom(appointment_id=pk) for pk in existing}
+        else:
+            created = {}
+
+        fields = set()
+        for record in records:
+            room = rooms.get(record['appointment_id']) or created.get(record['appointment_id'])
+            if room is None:
+                continue
+            at = record['at']
+            if isinstance(at, str):  # replayed from the spill file
+                at = parse_datetime(at)
+            prefix = record['role'].lower()
+            stamp = f'{prefix}_join_time' if record['event'] == 'join' else f'{prefix}_left_time'
+            setattr(room, f'{prefix}_joined', record['event'] == 'join')
+            setattr(room, stamp, at)
+            fields.update((f'{prefix}_joined', stamp))
+
+        with serialized_write():
+            if created:
+                VirtualWaitingRoom.objects.bulk_create(created.values(), batch_size=self.batch_size)
+            if rooms:
+                # Only the columns this batch touched, so a concurrent sweep's changes survive
+                VirtualWaitingRoom.objects.bulk_update(rooms.values(), sorted(fields), batch_size=self.batch_size)
+        return []
+
+
+presence_recorder = PresenceRecorder()
+
+
+class WaitingRoomPresence:
+    """Join, heartbeat and leave consultation rooms; read who is in them"""
+
+    @staticmethod
+    def _key(appointment_id, role):
+        return f"{PRESENCE_KEY}:{appointment_id}:{role}"
+
+    @staticmethod
+    def _live(entry, now):
+        return entry is not None and now - entry['seen'] < _timeout()
+
+    @classmethod
+    def _store(cls, appointment_id, role, entry):
+        # Kept past the timeout so the sweep can still read when the participant was last seen
+        cache.set(cls._key(appointment_id, role), entry, _timeout() * 4)
+
+    @classmethod
+    def room(cls, appointment_id):
+        """``{'PATIENT': {...} or None, 'DOCTOR': ...}`` - who is in the room now (cache only)"""
+        now = time.time()
+        keys = {cls._key(appointment_id, role): role for role in ROLES}
+        found = cache.get_many(list(keys))
+        state = {}
+        for key, role in keys.items():
+            entry = found.get(key)
+            state[role] = {
+                'user_id': entry['user_id'],
+                'name': entry['name'],
+                'joined_at': entry['joined_at'],
+                'seconds_since_seen': int(now - entry['seen']),
+            } if cls._live(entry, now) else None
+        return state
+
+    @classmethod
+    def heartbeat(cls, appointment, user):
+        """
+        Mark ``user`` present in the room (joining it if they were not) and
+        return the room state. Only a join is recorded and announced;
+        repeated heartbeats just refresh the cache entry. Raises
+        ``PermissionDenied`` unless ``user`` is the appointment's patient or
+        doctor.
+        """
+        role = _role(appointment, user)
+        now = time.time()
+        key = cls._key(appointment.pk, role)
+        entry = cache.get(key)
+        joined = not cls._live(entry, now) or entry['user_id'] != user.pk
+        if joined:
+            entry = {'user_id': user.pk, 'name': user.get_full_name() or user.get_username(),
+                     'joined_at': timezone.now().isoformat()}
+        entry['seen'] = now
+        cls._store(appointment.pk, role, entry)
+
+        state = cls.room(appointment.pk)
+        if joined:
+            presence_recorder.submit(appointment.pk, role, 'join')
+            cls._announce(appointment.pk, role, 'joined', state, appointment.doctor.user_id)
+        return state
+
+    @classmethod
+    def leave(cls, appointment, user):
+        role = _role(appointment, user)
+        entry = cache.get(cls._key(appointment.pk, role))
+        if entry is None or entry['user_id'] != user.pk:
+            return cls.room(appointment.pk)
+        cache.delete(cls._key(appointment.pk, role))
+        presence_recorder.submit(appointment.pk, role, 'leave')
+        state = cls.room(appointment.pk)
+        cls._announce(appointment.pk, role, 'left', state, appointment.doctor.user_id)
+        return state
+
+    @staticmethod
+    def _announce(appointment_id, role, change, state, doctor_user_id):
+        """Tell the other side (and the doctor, wherever they are) that someone arrived or left"""
+        users = {entry['user_id'] for entry in state.values() if entry}
+        if role == 'PATIENT' and doctor_user_id:
+            users.add(doctor_user_id)
+        if not users:
+            return
+        event = 'patient_arrived' if role == 'PATIENT' and change == 'joined' else f'{role.lower()}_{change}'
+        event_broker.publish('telemedicine.presence', {
+            'appointment_id': appointment_id,
+            'event': event,
+            'role': role,
+            'room': state,
+        }, users=sorted(users))
+
+    @classmethod
+    def sweep(cls):
+        """Record participants who stopped sending heartbeats as left; returns how many"""
+        open_rooms = list(
+            VirtualWaitingRoom.objects.filter(Q(patient_joined=True) | Q(doctor_joined=True))
+            .values_list('appointment_id', 'patient_joined', 'doctor_joined', 'appointment__doctor__user_id')
+        )
+        keys = {}
+        for appointment_id, patient_joined, doctor_joined, _ in open_rooms:
+            for role, joined in (('PATIENT', patient_joined), ('DOCTOR', doctor_joined)):
+                if joined:
+                    keys[cls._key(appointment_id, role)] = (appointment_id, role)
+        found = cache.get_many(list(keys))
+
+        now = time.time()
+        events, gone = [], []
+        for key, (appointment_id, role) in keys.items():
+            entry = found.get(key)
+            if cls._live(entry, now):
+                continue
+            left = timezone.now() if entry is None else datetime.fromtimestamp(entry['seen'], tz=dt_timezone.utc)
+            events.append({'appointment_id': appointment_id, 'role': role, 'event': 'leave', 'at': left})
+            gone.append((appointment_id, role))
+        if not events:
+            return 0
+
+        presence_recorder.process(events)
+        doctors = {appointment_id: doctor_user_id for appointment_id, _, _, doctor_user_id in open_rooms}
+        for appointment_id, role in gone:
+            cls._announce(appointment_id, role, 'left', cls.room(appointment_id), doctors.get(appointment_id))
+        logger.info(f"Waiting room presence: {len(events)} participants timed out")
+        return len(events)
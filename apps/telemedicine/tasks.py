@@ -0,0 +1,14 @@
+# apps/telemedicine/tasks.py
+"""
+Periodic telemedicine tasks; scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+
+from celery import shared_task
+
+from .presence import WaitingRoomPresence
+
+
+@shared_task(ignore_result=True)
+def sweep_waiting_room_presence():
+    """Record participants whose heartbeats stopped as having left"""
+    WaitingRoomPresence.sweep()
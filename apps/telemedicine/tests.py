@@ -1,3 +1,128 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
 
-# Create your tests here.
+from apps.doctors.models import Doctor
+from apps.patients.models import Patient
+from .models import TeleconsultationAppointment, VirtualWaitingRoom
+from .presence import WaitingRoomPresence, presence_recorder
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   TELEMEDICINE_PRESENCE_TIMEOUT=30)
+class WaitingRoomPresenceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.patient_user = User.objects.create_user(username='amina', password='x', role='PATIENT',
+                                                    first_name='Amina', last_name='Khan')
+        cls.doctor_user = User.objects.create_user(username='drsaleh', password='x', role='DOCTOR')
+        doctor = Doctor.objects.create(
+            user=cls.doctor_user, first_name='Omar', last_name='Saleh', specialization='GENERAL',
+            license_number='LIC-1', phone_number='0509999999', email='omar@example.com',
+            date_of_birth=date(1975, 1, 1), address='Clinic', joining_date=date(2020, 1, 1),
+        )
+        patient = Patient.objects.create(
+            first_name='Amina', last_name='Khan', date_of_birth=date(1985, 3, 2), gender='F', phone='0501234567',
+            user=cls.patient_user,
+        )
+        cls.stranger = User.objects.create_user(username='other', password='x', role='PATIENT')
+        cls.appointment = TeleconsultationAppointment.objects.create(
+            patient=patient, doctor=doctor, appointment_date=timezone.now(), meeting_room_id='room-1',
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Record presence inline instead of on the background worker
+        inline = mock.patch.object(presence_recorder, 'enabled', False)
+        inline.start()
+        self.addCleanup(inline.stop)
+        publish = mock.patch('apps.telemedicine.presence.event_broker.publish')
+        self.publish = publish.start()
+        self.addCleanup(publish.stop)
+
+    def room(self):
+        return VirtualWaitingRoom.objects.get(appointment=self.appointment)
+
+    def test_only_the_first_heartbeat_is_recorded_and_announced(self):
+        state = WaitingRoomPresence.heartbeat(self.appointment, self.patient_user)
+        self.assertEqual(state['PATIENT']['name'], 'Amina Khan')
+        self.assertIsNone(state['DOCTOR'])
+        joined_at = self.room().patient_join_time
+        self.assertTrue(self.room().patient_joined)
+        self.assertEqual(self.publish.call_args.args[1]['event'], 'patient_arrived')
+        self.assertEqual(self.publish.call_args.kwargs['users'], sorted([self.patient_user.pk, self.doctor_user.pk]))
+
+        with self.assertNumQueries(0):
+            WaitingRoomPresence.heartbeat(self.appointment, self.patient_user)
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertEqual(self.room().patient_join_time, joined_at)
+
+    def test_leave_records_the_time_and_tells_the_doctor(self):
+        WaitingRoomPresence.heartbeat(self.appointment, self.doctor_user)
+        WaitingRoomPresence.heartbeat(self.appointment, self.patient_user)
+        state = WaitingRoomPresence.leave(self.appointment, self.patient_user)
+        self.assertIsNone(state['PATIENT'])
+        self.assertEqual(state['DOCTOR']['user_id'], self.doctor_user.pk)
+
+        room = self.room()
+        self.assertEqual((room.patient_joined, room.doctor_joined), (False, True))
+        self.assertIsNotNone(room.patient_left_time)
+        self.assertEqual(self.publish.call_args.args[1]['event'], 'patient_left')
+        self.assertEqual(self.publish.call_args.kwargs['users'], [self.doctor_user.pk])
+
+    def test_sweep_records_silent_participants_as_left_when_last_seen(self):
+        WaitingRoomPresence.heartbeat(self.appointment, self.patient_user)
+        key = WaitingRoomPresence._key(self.appointment.pk, 'PATIENT')
+        entry = cache.get(key)
+        entry['seen'] -= 45
+        cache.set(key, entry)
+
+        self.assertEqual(WaitingRoomPresence.sweep(), 1)
+        room = self.room()
+        self.assertFalse(room.patient_joined)
+        self.assertAlmostEqual(room.patient_left_time, timezone.now() - timedelta(seconds=45),
+                               delta=timedelta(seconds=5))
+        self.assertEqual(WaitingRoomPresence.sweep(), 0)
+
+    def test_only_the_appointments_patient_and_doctor_may_enter(self):
+        WaitingRoomPresence.heartbeat(self.appointment, self.patient_user)
+        self.publish.reset_mock()
+        with self.assertRaises(PermissionDenied):
+            WaitingRoomPresence.heartbeat(self.appointment, self.stranger)
+
+        self.client.force_login(self.stranger)
+        for name in ('presence_heartbeat', 'leave_consultation', 'join_consultation'):
+            method = self.client.get if name == 'join_consultation' else self.client.post
+            response = method(reverse(f'telemedicine:{name}', args=[self.appointment.pk]))
+            self.assertEqual(response.status_code, 403, name)
+        self.assertEqual(WaitingRoomPresence.room(self.appointment.pk)['PATIENT']['user_id'], self.patient_user.pk)
+        self.publish.assert_not_called()
+
+        self.client.force_login(self.doctor_user)
+        response = self.client.post(reverse('telemedicine:presence_heartbeat', args=[self.appointment.pk]))
+        self.assertEqual(response.json()['presence']['DOCTOR']['user_id'], self.doctor_user.pk)
+
+    def test_batch_applies_events_in_order_with_one_write(self):
+        now = timezone.now()
+        events = [
+            {'appointment_id': self.appointment.pk, 'role': 'DOCTOR', 'event': 'join', 'at': now},
+            {'appointment_id': self.appointment.pk, 'role': 'DOCTOR', 'event': 'leave', 'at': now.isoformat()},
+            {'appointment_id': self.appointment.pk + 100, 'role': 'PATIENT', 'event': 'join', 'at': now},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            presence_recorder.process(events)
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual([verb for verb in statements if verb in ('SELECT', 'INSERT', 'UPDATE')],
+                         ['SELECT', 'SELECT', 'INSERT'])
+        room = self.room()
+        self.assertEqual((room.doctor_joined, room.doctor_join_time, room.doctor_left_time), (False, now, now))
+        self.assertEqual(VirtualWaitingRoom.objects.count(), 1)
@@ -9,4 +9,7 @@ urlpatterns = [
     path('teleconsultations/', views.teleconsultation_list, name='teleconsultation_list'),
     path('consultation/<int:appointment_id>/', views.virtual_consultation_room, name='virtual_room'),
     path('join/<int:appointment_id>/', views.join_consultation, name='join_consultation'),
+    path('presence/<int:appointment_id>/heartbeat/', views.presence_heartbeat, name='presence_heartbeat'),
+    path('presence/<int:appointment_id>/leave/', views.leave_consultation, name='leave_consultation'),
+    path('presence/<int:appointment_id>/stream/', views.presence_stream, name='presence_stream'),
 ]
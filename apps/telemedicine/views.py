@@ -1,8 +1,23 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.utils import timezone
-from .models import TeleconsultationAppointment, VirtualWaitingRoom
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+from apps.core.events import event_broker
+from .models import TeleconsultationAppointment
+from .presence import NOT_A_PARTICIPANT, WaitingRoomPresence, participant_role
+
+EVENT_STREAM_RETRY_MS = 5000     # client reconnect delay
+
+
+def _room_appointment(appointment_id):
+    appointments = TeleconsultationAppointment.objects.select_related('doctor', 'patient')
+    return get_object_or_404(appointments, id=appointment_id)
 
 
 @login_required
@@ -35,6 +50,7 @@ def virtual_consultation_room(request, appointment_id):
     
     context = {
         'appointment': appointment,
+        'presence': WaitingRoomPresence.room(appointment.pk),
         'title': f'Virtual Consultation - {appointment.patient.user.get_full_name()}',
         'page_name': 'Virtual Consultation',
     }
@@ -44,22 +60,87 @@ def virtual_consultation_room(request, appointment_id):
 @login_required 
 def join_consultation(request, appointment_id):
     """Join a consultation"""
-    appointment = get_object_or_404(TeleconsultationAppointment, id=appointment_id)
-    
-    # Update join status based on user role
-    waiting_room, created = VirtualWaitingRoom.objects.get_or_create(appointment=appointment)
+    appointment = _room_appointment(appointment_id)
+    if participant_role(appointment, request.user) is None:
+        return JsonResponse({'success': False, 'error': NOT_A_PARTICIPANT}, status=403)
     
-    if request.user.role == 'DOCTOR':
-        waiting_room.doctor_joined = True
-        waiting_room.doctor_join_time = timezone.now()
-    else:
-        waiting_room.patient_joined = True 
-        waiting_room.patient_join_time = timezone.now()
-    
-    waiting_room.save()
+    # Presence is kept in the cache; join times reach VirtualWaitingRoom in batches
+    room = WaitingRoomPresence.heartbeat(appointment, request.user)
     
     return JsonResponse({
         'success': True,
         'meeting_url': appointment.meeting_url,
-        'room_id': appointment.meeting_room_id
+        'room_id': appointment.meeting_room_id,
+        'presence': room,
     })
+
+
+# Waiting-room presence
+
+@login_required
+@require_POST
+def presence_heartbeat(request, appointment_id):
+    """Keep the caller in the room (polling clients); returns who is present"""
+    appointment = _room_appointment(appointment_id)
+    if participant_role(appointment, request.user) is None:
+        return JsonResponse({'success': False, 'error': NOT_A_PARTICIPANT}, status=403)
+    return JsonResponse({'presence': WaitingRoomPresence.heartbeat(appointment, request.user)})
+
+
+@login_required
+@require_POST
+def leave_consultation(request, appointment_id):
+    """Leave the room now instead of waiting for the heartbeat timeout"""
+    appointment = _room_appointment(appointment_id)
+    if participant_role(appointment, request.user) is None:
+        return JsonResponse({'success': False, 'error': NOT_A_PARTICIPANT}, status=403)
+    return JsonResponse({'presence': WaitingRoomPresence.leave(appointment, request.user)})
+
+
+@login_required
+async def presence_stream(request, appointment_id):
+    """
+    Server-Sent Events for a consultation room. The open connection is the
+    caller's presence: it joins on connect, beats every
+    ``TELEMEDICINE_PRESENCE_HEARTBEAT`` seconds and leaves on disconnect,
+    and it carries the room's arrivals and departures. Under WSGI it
+    answers 204 and the client POSTs ``presence_heartbeat`` instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    appointment = await sync_to_async(_room_appointment)(appointment_id)
+    if participant_role(appointment, user) is None:
+        return HttpResponse(NOT_A_PARTICIPANT, status=403)
+    interval = getattr(settings, 'TELEMEDICINE_PRESENCE_HEARTBEAT', 10)
+    
+    def message(event_type, data):
+        return f"event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+    
+    async def stream():
+        yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n"
+        async with event_broker.subscribe(user) as subscription:
+            room = await sync_to_async(WaitingRoomPresence.heartbeat)(appointment, user)
+            try:
+                yield message('presence', {'appointment_id': appointment.pk, 'room': room})
+                while True:
+                    try:
+                        event = await asyncio.wait_for(subscription.queue.get(), timeout=interval)
+                    except asyncio.TimeoutError:
+                        await sync_to_async(WaitingRoomPresence.heartbeat)(appointment, user)
+                        yield ": keepalive\n\n"
+                        continue
+                    if event['type'] == 'resync':
+                        room = await sync_to_async(WaitingRoomPresence.room)(appointment.pk)
+                        yield message('presence', {'appointment_id': appointment.pk, 'room': room})
+                    elif event['type'] == 'telemedicine.presence' and event['data']['appointment_id'] == appointment.pk:
+                        yield message('presence', event['data'])
+            finally:
+                # Nothing may be awaited while the stream is being closed; leave from a worker thread
+                asyncio.get_running_loop().run_in_executor(None, WaitingRoomPresence.leave, appointment, user)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
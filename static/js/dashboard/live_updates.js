@@ -0,0 +1,142 @@
+/**
+ * Dashboard live updates
+ * Subscribes to the server-push event stream and falls back to timer polling
+ * when the stream is unavailable (WSGI deployment, old browser, proxy drop).
+ */
+window.DashboardLive = (function() {
+    'use strict';
+
+    const handlers = {};        // event type -> [callback]
+    const pollers = [];         // {callback, interval, timer}
+    let source = null;
+    let connected = false;
+
+    function dispatch(type, data) {
+        (handlers[type] || []).forEach(callback => {
+            try {
+                callback(data);
+            } catch (error) {
+                console.error(`Live update handler for ${type} failed:`, error);
+            }
+        });
+    }
+
+    function startPolling() {
+        pollers.forEach(poller => {
+            if (!poller.timer) {
+                poller.timer = setInterval(poller.callback, poller.interval);
+            }
+        });
+    }
+
+    function stopPolling() {
+        pollers.forEach(poller => {
+            if (poller.timer) {
+                clearInterval(poller.timer);
+                poller.timer = null;
+            }
+        });
+    }
+
+    function listen(type) {
+        if (source && !source._zainTypes.has(type)) {
+            source._zainTypes.add(type);
+            source.addEventListener(type, event => {
+                let data = {};
+                try {
+                    data = JSON.parse(event.data);
+                } catch (error) {
+                    console.error('Malformed live update payload:', error);
+                }
+                dispatch(type, data);
+            });
+        }
+    }
+
+    function connect(url) {
+        if (!window.EventSource || !url) {
+            startPolling();
+            return;
+        }
+
+        source = new EventSource(url, { withCredentials: true });
+        source._zainTypes = new Set();
+        Object.keys(handlers).forEach(listen);
+
+        source.onopen = () => {
+            connected = true;
+            stopPolling();
+        };
+        source.onerror = () => {
+            // A 204 (no ASGI stream) closes the source for good; otherwise the
+            // browser reconnects on its own and polling covers the gap.
+            connected = false;
+            startPolling();
+        };
+    }
+
+    return {
+        on(types, callback) {
+            [].concat(types).forEach(type => {
+                (handlers[type] = handlers[type] || []).push(callback);
+                listen(type);
+            });
+        },
+
+        /**
+         * Run ``callback`` on the given events while the stream is up, and
+         * every ``interval`` ms while it is not.
+         */
+        poll(callback, interval, types) {
+            const poller = { callback, interval, timer: null };
+            pollers.push(poller);
+            if (types) {
+                this.on(types.concat('resync'), callback);
+            }
+            if (!connected) {
+                poller.timer = setInterval(callback, interval);
+            }
+            return poller;
+        },
+
+        get connected() {
+            return connected;
+        },
+
+        connect
+    };
+})();
+
+document.addEventListener('DOMContentLoaded', () => {
+    const root = document.querySelector('[data-event-stream]');
+    if (!root) {
+        return;
+    }
+
+    // htmx widgets declare their fallback interval and the events that refresh them
+    document.querySelectorAll('[data-poll-interval]').forEach(element => {
+        const types = (element.dataset.liveEvents || '').split(/\s+/).filter(Boolean);
+        DashboardLive.poll(
+            () => window.htmx && htmx.trigger(element, 'refresh'),
+            parseInt(element.dataset.pollInterval, 10) * 1000,
+            types
+        );
+    });
+
+    // Admin KPI cards arrive pre-rendered, computed once per change on the server
+    DashboardLive.on('dashboard.stats', data => {
+        const target = document.getElementById('kpi-container');
+        if (target && data.html) {
+            target.innerHTML = data.html;
+            if (window.htmx) {
+                htmx.process(target);
+            }
+        }
+    });
+
+    DashboardLive.on('notification.new', data => {
+        document.dispatchEvent(new CustomEvent('zain:notification', { detail: data }));
+    });
+
+    DashboardLive.connect(root.dataset.eventStream);
+});
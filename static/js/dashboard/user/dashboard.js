@@ -198,11 +198,24 @@ window.Dashboard = (function() {
     const realTime = {
         intervals: {},
 
+        // Server-push events that make a component's data stale
+        events: {
+            stats: ['appointment.status', 'invoice.paid'],
+            activities: ['appointment.status', 'invoice.paid'],
+            notifications: ['notification.new']
+        },
+
         start(component, callback, interval) {
             if (this.intervals[component]) {
                 clearInterval(this.intervals[component]);
             }
 
+            if (window.DashboardLive && this.events[component]) {
+                // Refresh on pushed events; the timer only runs while the stream is down
+                DashboardLive.poll(callback, interval, this.events[component]);
+                return;
+            }
+
             this.intervals[component] = setInterval(callback, interval);
         },
 
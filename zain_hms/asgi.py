@@ -3,6 +3,11 @@ ASGI config for zain_hms project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI enables the Server-Sent Events streams (dashboard
+deltas, OPD lobby screens, telemedicine room presence), e.g.:
+
+    gunicorn -k uvicorn.workers.UvicornWorker zain_hms.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -1,5 +1,9 @@
 # zain_hmsome one trysettings.py
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import environ
@@ -100,6 +104,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'apps.core.middleware.ReplicaStickinessMiddleware',  # Read-your-writes for replica reads
     'django.middleware.locale.LocaleMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -147,20 +152,51 @@ WSGI_APPLICATION = 'zain_hms.wsgi.application'
 ASGI_APPLICATION = 'zain_hms.asgi.application'
 
 # Database
-# Using SQLite for development - easy setup and no external dependencies
+# SQLite - no external dependencies; tuned so small clinics can run it in production
+# (embedded production mode, see apps.core.sqlite). Applied to every new connection:
+# WAL lets readers run alongside the writer; synchronous=NORMAL is durable across
+# application crashes under WAL and only fsyncs at checkpoints.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,          # ms to wait for the write lock before "database is locked"
+    'cache_size': -64000,           # page cache per connection, in KiB (negative = size, not pages)
+    'mmap_size': 268435456,         # 256 MiB of the file memory-mapped for reads
+    'temp_store': 'MEMORY',
+}
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
         'OPTIONS': {
             'timeout': 20,
+            # BEGIN IMMEDIATE: writers queue for the lock up front instead of failing mid-transaction
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
         }
     }
 }
+SQLITE_MAINTENANCE_INTERVAL = 900  # Seconds between WAL checkpoint + PRAGMA optimize runs
 
 # ZAIN HMS - Unified Database Configuration (Single Database Only)
 # No multi-tenant database loading - using single unified database
 
+# Optional read replica for reports, analytics and dashboards (apps.core.db_routing).
+# Set REPORTING_DB_NAME (plus host/user/password for a server database) to enable;
+# when unset, or unreachable, those reads stay on 'default'. For SQLite installs a
+# copy refreshed by `manage.py refresh_reporting_replica` stands in for a replica.
+if env('REPORTING_DB_NAME', default=''):
+    DATABASES['reporting'] = {
+        **DATABASES['default'],
+        'NAME': env('REPORTING_DB_NAME'),
+        'HOST': env('REPORTING_DB_HOST', default=DATABASES['default'].get('HOST', '')),
+        'PORT': env('REPORTING_DB_PORT', default=DATABASES['default'].get('PORT', '')),
+        'USER': env('REPORTING_DB_USER', default=DATABASES['default'].get('USER', '')),
+        'PASSWORD': env('REPORTING_DB_PASSWORD', default=DATABASES['default'].get('PASSWORD', '')),
+    }
+REPORTING_STICKY_SECONDS = 10   # Reads stay on default this long after a browser's own write
+REPORTING_DB_RECHECK = 30       # Seconds between replica availability checks
+
 # Uncomment below for PostgreSQL in production
 # DATABASES = {
 #     'default': {
@@ -183,8 +219,8 @@ CACHES = {
     }
 }
 
-# Unified Database (No Multi-database routing)
-DATABASE_ROUTERS = []
+# Unified database; only opted-in analytical reads are routed to 'reporting'
+DATABASE_ROUTERS = ['apps.core.db_routing.ReportingRouter']
 
 # Celery Configuration
 CELERY_BROKER_URL = env('REDIS_URL', default='redis://127.0.0.1:6379/0')
@@ -194,6 +230,12 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'sqlite-maintenance': {
+        'task': 'apps.core.tasks.sqlite_maintenance',
+        'schedule': SQLITE_MAINTENANCE_INTERVAL,
+    },
+}
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.CustomUser'
@@ -275,7 +317,16 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 # Session Configuration
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# SESSION_STORE picks the engine: 'db', 'cached_db' (reads served from the cache,
+# writes go to both), 'cache' (cache only) or 'signed_cookies' (no server-side rows; data lives in the
+# signed cookie, so logout cannot revoke a copied cookie before it expires).
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[env('SESSION_STORE', default='cached_db')]
 SESSION_SERIALIZER = 'apps.core.serializers.DateTimeAwareJSONSerializer'  # Handle datetime objects
 SESSION_COOKIE_AGE = env.int('SESSION_COOKIE_AGE', default=86400)  # 24 hours default, overridden in production
 SESSION_COOKIE_SECURE = not DEBUG
@@ -348,6 +399,9 @@ if not DEBUG:
 
 # Enterprise Security Settings
 SESSION_TIMEOUT = 3600  # 1 hour session timeout
+# Last-seen times are kept in the cache on every request but written to the
+# session (one session save) at most this often - see apps.core.session_activity
+SESSION_ACTIVITY_FLUSH_INTERVAL = 60
 MAX_FAILED_ATTEMPTS = 5  # Max failed login attempts before blocking
 MAX_LOGIN_ATTEMPTS = 3  # Max login attempts from same IP
 LOGIN_ATTEMPT_TIMEOUT = 300  # 5 minutes timeout for failed attempts
@@ -355,7 +409,7 @@ LOGIN_ATTEMPT_TIMEOUT = 300  # 5 minutes timeout for failed attempts
 # Enhanced Session Security
 SESSION_COOKIE_HTTPONLY = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # Activity stamps are coalesced; saving every request is one UPDATE per hit
 
 # Enhanced CSRF Protection
 CSRF_COOKIE_HTTPONLY = True
@@ -508,6 +562,227 @@ HEALTH_CHECK = {
     'MEMORY_MIN': 100,     # Fail if available memory is under 100 MB
 }
 
+# ===========================
+# TWO-TIER CACHE SETTINGS (apps.core.tiered_cache)
+# ===========================
+TIERED_CACHE_LOCAL_MAX_ENTRIES = 512   # Process-local LRU size
+TIERED_CACHE_LOCAL_TTL = 30            # Seconds a value may be served from process memory
+TIERED_CACHE_STALE_TTL = 120           # Seconds a stale value is served while refreshing
+TIERED_CACHE_LOCK_TIMEOUT = 30         # Single-flight recompute lock lifetime
+
+# Expired and superseded DashboardCache rows (apps.dashboard.models) are deleted on this interval
+DASHBOARD_CACHE_PURGE_INTERVAL = 60 * 60   # Seconds between purges
+CELERY_BEAT_SCHEDULE['dashboard-cache-purge'] = {
+    'task': 'apps.dashboard.tasks.purge_dashboard_cache',
+    'schedule': DASHBOARD_CACHE_PURGE_INTERVAL,
+}
+
+# ===========================
+# SERVER-PUSH EVENT STREAM (apps.core.events)
+# ===========================
+# Served only under ASGI (e.g. gunicorn -k uvicorn.workers.UvicornWorker zain_hms.asgi:application);
+# WSGI deployments answer 204 and dashboards keep polling.
+EVENT_STREAM_POLL_INTERVAL = 1.0       # Seconds between shared event-log reads, per worker
+EVENT_STREAM_QUEUE_SIZE = 100          # Buffered events per connection before a resync
+
+# ===========================
+# LABEL PRINTING (apps.core.utils.label_service)
+# ===========================
+LABEL_CACHE_DIR = 'labels'             # Content-addressed PNG cache under MEDIA_ROOT
+LABEL_RENDER_WORKERS = min(4, os.cpu_count() or 1)  # Process pool size for batch rendering
+LABEL_POOL_MIN_BATCH = 8               # Smaller batches render inline
+LABEL_BATCH_MAX = 500                  # Labels per batch request
+LABEL_PAGE_SIZE_MM = (62, 29)          # Label stock (width, height); one label per PDF page
+
+# ===========================
+# AUDIT WRITER (apps.core.audit)
+# ===========================
+# Audit rows are queued in-process and bulk-written by a background thread;
+# overflow, failed batches and anything pending at shutdown go to the spill file.
+AUDIT_ASYNC = True                     # False writes synchronously (tests, one-off scripts)
+AUDIT_QUEUE_SIZE = 10000               # Queued records per process before spilling to disk
+AUDIT_FLUSH_INTERVAL = 0.5             # Seconds between bulk writes
+AUDIT_FLUSH_BATCH = 200                # Records per bulk write
+AUDIT_REPLAY_INTERVAL = 60             # Seconds between attempts to replay the spill file
+AUDIT_SPILL_PATH = BASE_DIR / 'logs' / 'audit_spill.jsonl'
+
+# ===========================
+# AUDIT RETENTION (apps.core.retention)
+# ===========================
+# manage.py archive_audit_logs (or cleanup_logs --activity-logs) moves rows older
+# than these to gzip JSONL under AUDIT_ARCHIVE_ROOT, then deletes them in chunks.
+AUDIT_ARCHIVE_ROOT = BASE_DIR / 'archive'
+AUDIT_RETENTION_DAYS = {
+    'core.ActivityLog': 365,
+    'apps_dashboard.ActivityLog': 90,
+    'notifications.DeliveryLog': 90,
+    'communications.CommunicationLog': 365,
+}
+AUDIT_ARCHIVE_READ_CHUNK = 2000        # Rows fetched per cursor round trip
+AUDIT_RETENTION_DELETE_CHUNK = 500     # Rows per delete statement
+AUDIT_RETENTION_DELETE_PAUSE = 0.2     # Seconds between delete chunks
+
+# ===========================
+# MESSAGING WEBHOOK INGESTION (apps.communications.ingest)
+# ===========================
+# Provider status callbacks are acknowledged immediately and applied in batches.
+WEBHOOK_INGEST_ASYNC = True            # False applies each payload inline
+WEBHOOK_QUEUE_SIZE = 5000              # Queued payloads per process before spilling to disk
+WEBHOOK_FLUSH_INTERVAL = 1.0           # Seconds between batches
+WEBHOOK_FLUSH_BATCH = 100              # Payloads per batch
+WEBHOOK_SPILL_PATH = BASE_DIR / 'logs' / 'webhook_spill.jsonl'
+
+# ===========================
+# LAB ANALYZER IMPORT (apps.laboratory.analyzer_import)
+# ===========================
+# Analyzer result files are matched, flagged and written in chunks of this many results
+LAB_IMPORT_CHUNK = 500
+
+# ===========================
+# IMAGING INGEST (apps.radiology.imaging)
+# ===========================
+# Uploaded DICOM/images are ingested in the background: header fields, thumbnail, windowed preview.
+IMAGING_INGEST_ASYNC = True            # False ingests inline on save
+IMAGING_INGEST_BATCH = 16              # Images per ingest batch
+IMAGING_FLUSH_INTERVAL = 2.0           # Seconds between batches
+IMAGING_SPILL_PATH = BASE_DIR / 'logs' / 'imaging_spill.jsonl'
+IMAGING_PREVIEW_CACHE_DIR = 'imaging'  # Content-addressed renditions under MEDIA_ROOT
+IMAGING_PREVIEW_FORMAT = 'webp'        # Rendered at ingest; PNG is rendered on demand for other browsers
+IMAGING_RENDER_WORKERS = min(4, os.cpu_count() or 1)  # Process pool size for batch rendering
+IMAGING_POOL_MIN_BATCH = 4             # Smaller batches render inline
+IMAGING_SERIES_PAGE_MAX = 50           # Images per series API page
+
+# ===========================
+# PHARMACY BATCH INVENTORY (apps.pharmacy.inventory)
+# ===========================
+# Stock-on-date reads the latest snapshot plus the ledger since it.
+PHARMACY_SNAPSHOT_INTERVAL = 6 * 60 * 60     # Seconds between stock snapshots
+PHARMACY_SNAPSHOT_RETENTION_DAYS = 400       # Older snapshots are pruned (the latest is always kept)
+CELERY_BEAT_SCHEDULE['pharmacy-stock-snapshots'] = {
+    'task': 'apps.pharmacy.tasks.take_stock_snapshots',
+    'schedule': PHARMACY_SNAPSHOT_INTERVAL,
+}
+
+# Demand forecasting (apps.pharmacy.forecasting), recomputed nightly for the whole formulary
+PHARMACY_FORECAST_INTERVAL = 24 * 60 * 60    # Seconds between forecast runs
+PHARMACY_FORECAST_HISTORY_DAYS = 90          # Days of sales history loaded
+PHARMACY_FORECAST_WINDOW_DAYS = 28           # Moving-average / variability window
+PHARMACY_FORECAST_SMOOTHING_ALPHA = 0.3      # Exponential smoothing weight of the latest day
+PHARMACY_FORECAST_LEAD_TIME_DAYS = 7         # Supplier lead time
+PHARMACY_FORECAST_REVIEW_DAYS = 30           # Cover ordered beyond the lead time
+PHARMACY_FORECAST_SERVICE_Z = 1.65           # Safety stock z-score (~95% service level)
+CELERY_BEAT_SCHEDULE['pharmacy-forecast'] = {
+    'task': 'apps.pharmacy.tasks.forecast_formulary',
+    'schedule': PHARMACY_FORECAST_INTERVAL,
+}
+
+# ===========================
+# POS CATALOG INDEX (apps.core.catalog_index)
+# ===========================
+# Till searches and scans read a per-process index; it re-reads changed rows when its cache tag moves.
+CATALOG_INDEX_CHECK_INTERVAL = 2.0     # Seconds between version checks (a cache read)
+CATALOG_INDEX_FULL_RELOAD = 900        # Seconds between full rebuilds (picks up deletes)
+
+# ===========================
+# IPD BED BOARD (apps.ipd.bed_board)
+# ===========================
+# Ward occupancy bitmaps are flipped on admission/transfer/discharge; the TTL bounds drift between workers.
+IPD_BED_BOARD_OCCUPANCY_TTL = 60       # Seconds before ward bitmaps are re-read from the beds table
+
+# ===========================
+# EMERGENCY TRIAGE QUEUE (apps.emergency.triage_queue)
+# ===========================
+# A waiting case moves up one triage level for every target period it waits at its current level.
+EMERGENCY_TRIAGE_TARGET_MINUTES = {
+    'urgent': 15,
+    'semi_urgent': 60,
+    'non_urgent': 120,
+}
+EMERGENCY_TRIAGE_CHECK_INTERVAL = 1.0           # Seconds between queue version checks on reads (a cache read)
+EMERGENCY_TRIAGE_ESCALATION_INTERVAL = 60       # Seconds between escalation sweeps
+CELERY_BEAT_SCHEDULE['emergency-triage-escalation'] = {
+    'task': 'apps.emergency.tasks.escalate_triage_queue',
+    'schedule': EMERGENCY_TRIAGE_ESCALATION_INTERVAL,
+}
+
+# ===========================
+# OPD TOKEN QUEUE (apps.opd.token_queue)
+# ===========================
+# Per-doctor token queues live in the cache; wait estimates use the doctor's latest consultation times.
+OPD_QUEUE_TTL = 300                      # Seconds a queue entry lives without a transition (then rebuilt)
+OPD_QUEUE_DURATION_SAMPLES = 10          # Recent consultations in the rolling average
+OPD_QUEUE_DEFAULT_CONSULT_MINUTES = 10   # Estimate until a doctor has completed consultations
+
+# ===========================
+# TELEMEDICINE PRESENCE (apps.telemedicine.presence)
+# ===========================
+# Room presence lives in the cache; join/leave times are written to VirtualWaitingRoom in batches.
+TELEMEDICINE_PRESENCE_HEARTBEAT = 10          # Seconds between heartbeats from an open presence stream
+TELEMEDICINE_PRESENCE_TIMEOUT = 30            # Seconds without a heartbeat before a participant has left
+TELEMEDICINE_PRESENCE_ASYNC = True            # False writes each join/leave inline
+TELEMEDICINE_PRESENCE_FLUSH_INTERVAL = 2.0    # Seconds between batch writes
+TELEMEDICINE_PRESENCE_FLUSH_BATCH = 200       # Join/leave events per batch write
+TELEMEDICINE_PRESENCE_SPILL_PATH = BASE_DIR / 'logs' / 'presence_spill.jsonl'
+CELERY_BEAT_SCHEDULE['telemedicine-presence-sweep'] = {
+    'task': 'apps.telemedicine.tasks.sweep_waiting_room_presence',
+    'schedule': TELEMEDICINE_PRESENCE_TIMEOUT,
+}
+
+# ===========================
+# APPOINTMENT REMINDERS (apps.appointments.reminders)
+# ===========================
+# Reminder rows are planned ahead by risk and preferences, then sent in per-channel batches.
+APPOINTMENT_REMINDER_HORIZON_DAYS = 7         # Days ahead the planner materializes reminders for
+APPOINTMENT_REMINDER_BATCH_SIZES = {          # Messages per provider call
+    'EMAIL': 100,
+    'SMS': 200,
+    'WHATSAPP': 80,
+}
+APPOINTMENT_REMINDER_DISPATCH_LIMIT = 5000    # Due reminders sent per dispatch run
+APPOINTMENT_REMINDER_LOCK_TIMEOUT = 300       # Seconds a plan/dispatch run holds its lock
+APPOINTMENT_REMINDER_MAX_ATTEMPTS = 5         # Sends tried before a failing reminder is given up
+APPOINTMENT_REMINDER_RETRY_DELAY = 300        # Seconds before the first retry, doubled each attempt
+APPOINTMENT_REMINDER_GATEWAYS = {}            # Reminder type -> dotted path of its batch sender; email is built in
+CELERY_BEAT_SCHEDULE['appointment-reminder-plan'] = {
+    'task': 'apps.appointments.tasks.plan_appointment_reminders',
+    'schedule': 3600,
+}
+CELERY_BEAT_SCHEDULE['appointment-reminder-dispatch'] = {
+    'task': 'apps.appointments.tasks.dispatch_appointment_reminders',
+    'schedule': 60,
+}
+
+# ===========================
+# PATIENT IMPORT (apps.patients.bulk_import)
+# ===========================
+# Registry rows are validated, de-duplicated and written in chunks of this many rows
+PATIENT_IMPORT_CHUNK = 1000
+# Queued uploads and rejected-rows reports (full patient rows): private, never under MEDIA_ROOT
+PATIENT_IMPORT_ROOT = BASE_DIR / 'private' / 'patient_imports'
+
+# ===========================
+# MASTER PATIENT INDEX (apps.patients.mpi)
+# ===========================
+# Patients are compared only within blocking keys (phonetic name, DOB + surname, phone, national ID).
+MPI_DUPLICATE_THRESHOLD = 0.8         # Similarity from which a pair is a possible duplicate
+MPI_CANDIDATE_LIMIT = 200             # Patients scored per registration check
+MPI_MAX_BLOCK_SIZE = 200              # Larger blocks are compared within a date-of-birth window
+MPI_BLOCK_WINDOW = 20                 # Neighbours compared per patient in a large block
+MPI_DEDUP_INTERVAL = 24 * 60 * 60     # Seconds between batch duplicate searches
+MPI_LOCK_TIMEOUT = 60 * 60            # Seconds a batch search holds its lock
+CELERY_BEAT_SCHEDULE['patients-find-duplicates'] = {
+    'task': 'apps.patients.tasks.find_duplicate_patients',
+    'schedule': MPI_DEDUP_INTERVAL,
+}
+
+# ===========================
+# PATIENT TIMELINE (apps.patients.timeline)
+# ===========================
+# EMR, lab, radiology, billing and pharmacy records merged newest first; each page costs one query per source.
+PATIENT_TIMELINE_PAGE_SIZE = 25           # Entries per page by default
+PATIENT_TIMELINE_MAX_PAGE_SIZE = 100      # Largest ?limit= accepted
+PATIENT_TIMELINE_CACHE_TIMEOUT = 5 * 60   # Seconds a patient's first page is cached
+
 # ===========================
 # RATE LIMITING SETTINGS
 # ===========================
@@ -523,7 +798,7 @@ LOGIN_ATTEMPT_TIMEOUT = 300  # 5 minutes
 
 # Session security
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
 
 # CSRF settings
 CSRF_COOKIE_SECURE = not DEBUG
@@ -667,19 +942,19 @@ if ENVIRONMENT == 'production':
         }
     }
     
-    # Use Redis for sessions (performance + security)
-    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+    # Use Redis for sessions (performance + security); SESSION_STORE=cached_db keeps a DB copy
+    SESSION_ENGINE = SESSION_ENGINES[env('SESSION_STORE', default='cache')]
     SESSION_CACHE_ALIAS = 'sessions'
     
     # Production Database optimization
-    DATABASES['default'].update({
-        'CONN_MAX_AGE': 60,
-        'OPTIONS': {
+    DATABASES['default']['CONN_MAX_AGE'] = 60  # Persistent connections keep page cache and mmap warm
+    if DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+        # SQLite keeps the embedded production options configured above
+        DATABASES['default']['OPTIONS'] = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'isolation_level': None,
         }
-    })
     
     # Static Files with WhiteNoise optimization
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -817,4 +1092,25 @@ if ENVIRONMENT == 'production':
             environment='production',
         )
 
-
+# ===========================
+# TEST RUNS
+# ===========================
+# Test runs must not leave audit rows, spill files or log lines in logs/: the
+# background writers run inline and every file they would touch goes to a temp dir.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_OUTPUT_DIR = Path(tempfile.mkdtemp(prefix='zain_hms_test_'))
+    atexit.register(shutil.rmtree, TEST_OUTPUT_DIR, ignore_errors=True)
+    AUDIT_ASYNC = False
+    WEBHOOK_INGEST_ASYNC = False
+    IMAGING_INGEST_ASYNC = False
+    TELEMEDICINE_PRESENCE_ASYNC = False
+    AUDIT_SPILL_PATH = TEST_OUTPUT_DIR / 'audit_spill.jsonl'
+    WEBHOOK_SPILL_PATH = TEST_OUTPUT_DIR / 'webhook_spill.jsonl'
+    IMAGING_SPILL_PATH = TEST_OUTPUT_DIR / 'imaging_spill.jsonl'
+    TELEMEDICINE_PRESENCE_SPILL_PATH = TEST_OUTPUT_DIR / 'presence_spill.jsonl'
+    AUDIT_ARCHIVE_ROOT = TEST_OUTPUT_DIR / 'archive'
+    PATIENT_IMPORT_ROOT = TEST_OUTPUT_DIR / 'patient_imports'
+    for handler in LOGGING['handlers'].values():
+        if 'filename' in handler:
+            handler['filename'] = TEST_OUTPUT_DIR / Path(handler['filename']).name